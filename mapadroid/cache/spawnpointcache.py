@@ -0,0 +1,68 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+
+class SpawnpointCache:
+    """
+    LRU bound in-process cache of the despawn time (calc_endminsec) of spawnpoints.
+    Spawnpoints without a known despawn time are only considered cached for `unknown_ttl` seconds so that
+    despawn times learned by other processes are picked up eventually. The spawndef is not cached, it is changed
+    by all processes and therefore only updated in the DB.
+    """
+
+    def __init__(self, maxsize: int = 100000, unknown_ttl: int = 300):
+        self.maxsize: int = maxsize
+        self._unknown_ttl: int = unknown_ttl
+        self._entries: Optional[LRUCache] = LRUCache(maxsize=maxsize) if maxsize > 0 else None
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._entries is not None
+
+    def get_many(self, spawn_ids: Iterable[int]) -> Tuple[Dict[int, Optional[str]], List[int]]:
+        """
+        Look up the given spawnpoints
+        :return: dict of the cached spawnpoints mapping to their calc_endminsec and the list of missing ids
+        """
+        found = {}
+        missing = []
+        seen = set()
+        now = time.time()
+        for spawn_id in spawn_ids:
+            if spawn_id in seen:
+                continue
+            seen.add(spawn_id)
+            entry = self._entries.get(spawn_id) if self._entries is not None else None
+            if entry is None or (entry[0] is None and now - entry[1] > self._unknown_ttl):
+                missing.append(spawn_id)
+                self.misses += 1
+                continue
+            found[spawn_id] = entry[0]
+            self.hits += 1
+        return found, missing
+
+    def set(self, spawn_id: int, calc_endminsec: Optional[str]):
+        if self._entries is None:
+            return
+        self._entries[spawn_id] = (calc_endminsec, time.time())
+
+    def clear(self):
+        if self._entries is not None:
+            self._entries.clear()
+
+    def get_statistics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries) if self._entries is not None else 0,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+    def __len__(self):
+        return len(self._entries) if self._entries is not None else 0
@@ -0,0 +1,189 @@
+import time
+from datetime import datetime, timedelta
+from itertools import chain
+from threading import Lock, RLock
+from typing import Dict, Iterable, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+import numpy as np
+
+from mapadroid.geofence.geofenceHelper import GeofenceHelper
+from mapadroid.utils.collections import Location
+
+# spawnpoint, latitude, longitude, spawndef, calc_endminsec
+SpawnEntry = Tuple[int, float, float, int, str]
+# timestamp of the spawn, location of the spawnpoint
+NextSpawn = Tuple[float, Location]
+
+# the spawn durations known, see get_spawn_duration
+SPAWN_DURATIONS = (1800, 3600)
+
+
+def get_spawn_duration(spawndef: int) -> int:
+    """ Seconds a mon of the spawnpoint stays, 60 minutes for the spawndef 15 else 30 minutes """
+    return 3600 if spawndef == 15 else 1800
+
+
+def parse_endminsec(calc_endminsec: str) -> Optional[int]:
+    """ Second of the hour of a "MM:SS" despawn time, None if it cannot be parsed """
+    try:
+        minutes, seconds = calc_endminsec.split(":")
+        second_of_hour = int(minutes) * 60 + int(seconds)
+    except (AttributeError, ValueError):
+        return None
+    return second_of_hour if 0 <= second_of_hour < 3600 else None
+
+
+class SpawnTimetable:
+    """
+    Spawnpoints of an area with a known despawn time. The spawnpoints are kept in arrays sorted by the second of
+    the hour they despawn at (one set of arrays per spawn duration), the spawns of the next hour are looked up with
+    binary searches over those arrays instead of computing the time of every spawnpoint.
+
+    Updates are collected and the arrays rebuilt on the next lookup. The timetable is not pickled, every process
+    fills its own.
+    """
+
+    def __init__(self):
+        # spawnpoint -> second of the hour it despawns at, spawn duration in seconds, latitude, longitude
+        self._spawns: Dict[int, Tuple[int, int, float, float]] = {}
+        # spawn duration -> despawn seconds of the hour (sorted), latitudes, longitudes
+        self._table: Optional[Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]] = None
+        self.lock: RLock = RLock()
+        # state of the refresh from the DB, see DbWrapper
+        self.loaded_at: float = 0.0
+        self.refreshed_at: float = 0.0
+        self.watermark = None
+        self.event_id: Optional[int] = None
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def __len__(self):
+        return len(self._spawns)
+
+    def __contains__(self, spawnpoint: int):
+        return spawnpoint in self._spawns
+
+    def update(self, spawns: Iterable[SpawnEntry]) -> int:
+        """
+        Add the spawnpoints or update their despawn time and duration, spawnpoints without a valid despawn time
+        are skipped
+        :return: amount of spawnpoints added or updated
+        """
+        updated = 0
+        with self.lock:
+            for spawnpoint, lat, lng, spawndef, calc_endminsec in spawns:
+                second_of_hour = parse_endminsec(calc_endminsec)
+                if second_of_hour is None:
+                    continue
+                self._spawns[spawnpoint] = (second_of_hour, get_spawn_duration(spawndef), float(lat), float(lng))
+                updated += 1
+            if updated:
+                self._table = None
+        return updated
+
+    def remove(self, spawnpoint: int) -> bool:
+        with self.lock:
+            if self._spawns.pop(spawnpoint, None) is None:
+                return False
+            self._table = None
+            return True
+
+    def clear(self):
+        with self.lock:
+            self._spawns.clear()
+            self._table = None
+
+    def _get_table(self) -> Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        if self._table is None:
+            table = {}
+            values = np.fromiter(chain.from_iterable(self._spawns.values()), dtype=np.float64,
+                                 count=len(self._spawns) * 4).reshape(-1, 4)
+            for duration in SPAWN_DURATIONS:
+                of_duration = values[values[:, 1] == duration]
+                order = np.argsort(of_duration[:, 0], kind="stable")
+                table[duration] = (of_duration[order, 0], of_duration[order, 2], of_duration[order, 3])
+            self._table = table
+        return self._table
+
+    def get_next_spawns(self, within: Optional[float] = None,
+                        current_time: Optional[float] = None) -> List[NextSpawn]:
+        """
+        The spawns of the next hour, the earliest first. The spawn time is the despawn time of the current or
+        next hour minus the spawn duration, moved by an hour if it has passed already. Spawnpoints despawning in
+        the current minute before the current second are skipped since their spawn has been due an hour ago.
+        :param within: only return the spawns due in the next within seconds
+        :param current_time: time.time() the spawns are looked up for, defaults to now
+        """
+        if current_time is None:
+            current_time = time.time()
+        current_time_of_day = datetime.fromtimestamp(current_time).replace(microsecond=0)
+        hour_start = current_time_of_day.replace(minute=0, second=0)
+        this_hour = time.mktime(hour_start.timetuple())
+        next_hour = time.mktime((hour_start + timedelta(hours=1)).timetuple())
+        minute_start = current_time_of_day.minute * 60
+        now_second = minute_start + current_time_of_day.second
+        due_until = current_time + within if within is not None else None
+
+        timestamps: List[np.ndarray] = []
+        lats: List[np.ndarray] = []
+        lngs: List[np.ndarray] = []
+        with self.lock:
+            table = self._get_table()
+        for duration, (ends, end_lats, end_lngs) in table.items():
+            # despawning in the rest of the current hour and in the next hour up to the current minute
+            segments = ((int(np.searchsorted(ends, now_second)), len(ends), this_hour),
+                        (0, int(np.searchsorted(ends, minute_start)), next_hour))
+            # spawn times of the segments in ascending order, the ones passed already are moved by an hour
+            for moved in (False, True):
+                for first, last, hour in segments:
+                    passed = min(max(int(np.searchsorted(ends, current_time + duration - hour)), first), last)
+                    if moved:
+                        last, base = passed, hour - duration + 3600
+                    else:
+                        first, base = passed, hour - duration
+                    if due_until is not None:
+                        last = min(max(int(np.searchsorted(ends, due_until - base)), first), last)
+                    if first >= last:
+                        continue
+                    timestamps.append(ends[first:last] + base)
+                    lats.append(end_lats[first:last])
+                    lngs.append(end_lngs[first:last])
+        if not timestamps:
+            return []
+        all_timestamps = np.concatenate(timestamps)
+        order = np.argsort(all_timestamps, kind="stable")
+        return [(timestamp, Location(lat, lng)) for timestamp, lat, lng in
+                zip(all_timestamps[order].tolist(), np.concatenate(lats)[order].tolist(),
+                    np.concatenate(lngs)[order].tolist())]
+
+
+class SpawnTimetables:
+    """
+    Spawn timetables by geofence, a timetable is dropped with its geofence. Not pickled like the timetables
+    """
+
+    def __init__(self):
+        self._timetables: WeakKeyDictionary = WeakKeyDictionary()
+        self._lock: Lock = Lock()
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def __len__(self):
+        return len(self._timetables)
+
+    def get(self, geofence_helper: GeofenceHelper) -> SpawnTimetable:
+        with self._lock:
+            spawn_timetable = self._timetables.get(geofence_helper)
+            if spawn_timetable is None:
+                spawn_timetable = SpawnTimetable()
+                self._timetables[geofence_helper] = spawn_timetable
+        return spawn_timetable
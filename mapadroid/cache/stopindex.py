@@ -0,0 +1,218 @@
+import heapq
+import math
+from threading import RLock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from weakref import WeakKeyDictionary
+
+from mapadroid.geofence.geofenceHelper import GeofenceHelper
+
+# stop_id, latitude, longitude
+StopEntry = Tuple[str, float, float]
+
+
+class StopIndex:
+    """
+    In-process index of the locations of the stops for nearest neighbour lookups. The stops are bucketed in a
+    uniform grid of cell_size degrees, a lookup only visits the cells around the position searched.
+    Distances are euclidean in degrees of latitude and longitude like the distance formula of the stop queries
+    (69.1 miles per degree).
+
+    The stops inside a geofence are indexed once more on the first lookup with the geofence, updates are applied
+    to those indexes as well. The index is not pickled, every process fills its own.
+    """
+
+    def __init__(self, cell_size: float = 0.01):
+        self._cell_size: float = cell_size
+        self._stops: Dict[str, Tuple[float, float]] = {}
+        self._cells: Dict[Tuple[int, int], Dict[str, Tuple[float, float]]] = {}
+        # bounds of the cells holding stops
+        self._bounds: Optional[List[int]] = None
+        self._fenced: WeakKeyDictionary = WeakKeyDictionary()
+        self.lock: RLock = RLock()
+        # state of the refresh from the DB, see DbWrapper
+        self.loaded_at: float = 0.0
+        self.refreshed_at: float = 0.0
+        self.watermark = None
+
+    def __getstate__(self):
+        return {"cell_size": self._cell_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["cell_size"])
+
+    def __len__(self):
+        return len(self._stops)
+
+    def __contains__(self, stop_id: str):
+        return stop_id in self._stops
+
+    def _get_cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self._cell_size), math.floor(lng / self._cell_size)
+
+    def _set(self, stop_id: str, lat: float, lng: float):
+        self._remove(stop_id)
+        location = (lat, lng)
+        cell = self._get_cell(lat, lng)
+        self._stops[stop_id] = location
+        self._cells.setdefault(cell, {})[stop_id] = location
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            self._bounds[0] = min(self._bounds[0], cell[0])
+            self._bounds[1] = max(self._bounds[1], cell[0])
+            self._bounds[2] = min(self._bounds[2], cell[1])
+            self._bounds[3] = max(self._bounds[3], cell[1])
+
+    def _remove(self, stop_id: str) -> bool:
+        location = self._stops.pop(stop_id, None)
+        if location is None:
+            return False
+        cell = self._get_cell(*location)
+        stops_of_cell = self._cells.get(cell)
+        if stops_of_cell is not None:
+            stops_of_cell.pop(stop_id, None)
+            if not stops_of_cell:
+                del self._cells[cell]
+        return True
+
+    def update(self, stops: Iterable[StopEntry]):
+        """
+        Add the stops or move them to their new location
+        """
+        stops = [(stop_id, float(lat), float(lng)) for stop_id, lat, lng in stops]
+        with self.lock:
+            for stop_id, lat, lng in stops:
+                self._set(stop_id, lat, lng)
+            if not stops:
+                return
+            for geofence_helper, fenced_index in list(self._fenced.items()):
+                mask = geofence_helper.get_geofenced_mask([(lat, lng) for _, lat, lng in stops])
+                with fenced_index.lock:
+                    for (stop_id, lat, lng), inside in zip(stops, mask.tolist()):
+                        if inside:
+                            fenced_index._set(stop_id, lat, lng)
+                        else:
+                            fenced_index._remove(stop_id)
+
+    def remove(self, stop_id: str) -> bool:
+        with self.lock:
+            for fenced_index in list(self._fenced.values()):
+                with fenced_index.lock:
+                    fenced_index._remove(stop_id)
+            return self._remove(stop_id)
+
+    def remove_at(self, lat: float, lng: float) -> List[str]:
+        """
+        Remove the stops at exactly the location given
+        :return: IDs of the stops removed
+        """
+        with self.lock:
+            stops_of_cell = self._cells.get(self._get_cell(lat, lng), {})
+            stop_ids = [stop_id for stop_id, location in stops_of_cell.items() if location == (lat, lng)]
+            for stop_id in stop_ids:
+                self.remove(stop_id)
+        return stop_ids
+
+    def clear(self):
+        with self.lock:
+            self._stops.clear()
+            self._cells.clear()
+            self._bounds = None
+            self._fenced.clear()
+
+    def get_fenced_index(self, geofence_helper: GeofenceHelper) -> "StopIndex":
+        """
+        Index of the stops inside the geofence, built on first use
+        """
+        with self.lock:
+            fenced_index = self._fenced.get(geofence_helper)
+            if fenced_index is None:
+                fenced_index = StopIndex(self._cell_size)
+                if self._stops:
+                    stop_ids = list(self._stops.keys())
+                    mask = geofence_helper.get_geofenced_mask(list(self._stops.values()))
+                    for stop_id, inside in zip(stop_ids, mask.tolist()):
+                        if inside:
+                            fenced_index._set(stop_id, *self._stops[stop_id])
+                self._fenced[geofence_helper] = fenced_index
+        return fenced_index
+
+    def _get_ring(self, center: Tuple[int, int], ring: int) -> Iterable[Tuple[int, int]]:
+        """
+        Cells holding stops at a chebyshev distance of ring cells around the center
+        """
+        min_lat, max_lat, min_lng, max_lng = self._bounds
+        center_lat, center_lng = center
+        if ring == 0:
+            yield center
+            return
+        first_lng, last_lng = max(center_lng - ring, min_lng), min(center_lng + ring, max_lng)
+        for cell_lat in (center_lat - ring, center_lat + ring):
+            if min_lat <= cell_lat <= max_lat:
+                for cell_lng in range(first_lng, last_lng + 1):
+                    yield cell_lat, cell_lng
+        first_lat, last_lat = max(center_lat - ring + 1, min_lat), min(center_lat + ring - 1, max_lat)
+        for cell_lng in (center_lng - ring, center_lng + ring):
+            if min_lng <= cell_lng <= max_lng:
+                for cell_lat in range(first_lat, last_lat + 1):
+                    yield cell_lat, cell_lng
+
+    def _get_max_ring(self, center: Tuple[int, int], max_distance: Optional[float]) -> int:
+        min_lat, max_lat, min_lng, max_lng = self._bounds
+        max_ring = max(center[0] - min_lat, max_lat - center[0], center[1] - min_lng, max_lng - center[1], 0)
+        if max_distance is not None:
+            max_ring = min(max_ring, int(max_distance / self._cell_size) + 1)
+        return max_ring
+
+    def nearest(self, lat: float, lng: float, limit: int, exclude: Optional[Set[str]] = None,
+                max_distance: Optional[float] = None) -> List[StopEntry]:
+        """
+        The stops closest to the position, the closest first
+        :param limit: maximum amount of stops returned, all stops if <= 0
+        :param exclude: IDs of stops to be skipped, e.g. the stops visited
+        :param max_distance: maximum distance of the stops in degrees
+        """
+        with self.lock:
+            if not self._stops:
+                return []
+            if limit <= 0:
+                limit = len(self._stops)
+            center = self._get_cell(lat, lng)
+            # max-heap of the closest stops found so far
+            closest: List[Tuple[float, str, float, float]] = []
+            for ring in range(self._get_max_ring(center, max_distance) + 1):
+                # the stops of the ring are at least ring - 1 cells away from the position
+                if len(closest) >= limit and -closest[0][0] <= (ring - 1) * self._cell_size:
+                    break
+                for cell in self._get_ring(center, ring):
+                    stops_of_cell = self._cells.get(cell)
+                    if not stops_of_cell:
+                        continue
+                    for stop_id, (stop_lat, stop_lng) in stops_of_cell.items():
+                        if exclude and stop_id in exclude:
+                            continue
+                        distance = math.hypot(stop_lat - lat, stop_lng - lng)
+                        if max_distance is not None and distance > max_distance:
+                            continue
+                        if len(closest) < limit:
+                            heapq.heappush(closest, (-distance, stop_id, stop_lat, stop_lng))
+                        elif distance < -closest[0][0]:
+                            heapq.heapreplace(closest, (-distance, stop_id, stop_lat, stop_lng))
+        closest.sort(reverse=True)
+        return [(stop_id, stop_lat, stop_lng) for _, stop_id, stop_lat, stop_lng in closest]
+
+    def within(self, lat: float, lng: float, max_distance: float) -> List[StopEntry]:
+        """
+        The stops within max_distance degrees of the position in no particular order
+        """
+        found: List[StopEntry] = []
+        with self.lock:
+            if not self._stops:
+                return found
+            center = self._get_cell(lat, lng)
+            for ring in range(self._get_max_ring(center, max_distance) + 1):
+                for cell in self._get_ring(center, ring):
+                    for stop_id, (stop_lat, stop_lng) in self._cells.get(cell, {}).items():
+                        if math.hypot(stop_lat - lat, stop_lng - lng) <= max_distance:
+                            found.append((stop_id, stop_lat, stop_lng))
+        return found
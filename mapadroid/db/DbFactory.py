@@ -22,12 +22,15 @@ class DbFactory:
             logger.error("Invalid db_method in config. Exiting")
             sys.exit(1)
 
-        PooledQuerySyncManager.register("PooledQueryExecutor", PooledQueryExecutor)
+        # execute_stream is a generator, its proxy fetches the chunks of rows one by one
+        PooledQuerySyncManager.register("PooledQueryExecutor", PooledQueryExecutor,
+                                        method_to_typeid={"execute_stream": "Iterator"})
         db_pool_manager = PooledQuerySyncManager()
         db_pool_manager.start()
         db_exec = db_pool_manager.PooledQueryExecutor(host=args.dbip, port=args.dbport,
                                                       username=args.dbusername, password=args.dbpassword,
-                                                      database=args.dbname, poolsize=args.db_poolsize)
+                                                      database=args.dbname, poolsize=args.db_poolsize,
+                                                      statement_cache_size=args.db_statement_cache_size)
         db_wrapper = DbWrapper(db_exec=db_exec, args=args)
 
         return db_wrapper, db_pool_manager
@@ -2,16 +2,20 @@ import json
 import math
 import time
 from datetime import datetime, timedelta
-
-from bitstring import BitArray
+from typing import Dict, List, Optional, Tuple
 
 from mapadroid.cache import get_cache
+from mapadroid.cache.spawnpointcache import SpawnpointCache
+from mapadroid.db.DbWriteBatch import DbWriteBatch
 from mapadroid.db.PooledQueryExecutor import PooledQueryExecutor
+from mapadroid.mitm_receiver.DetectionStatsCollector import \
+    DetectionStatsCollector
 from mapadroid.utils.gamemechanicutil import (gen_despawn_timestamp,
                                               is_mon_ditto)
 from mapadroid.utils.logging import LoggerEnums, get_logger, get_origin_logger
 from mapadroid.utils.questGen import QuestGen
 from mapadroid.utils.s2Helper import S2Helper
+from mapadroid.webhook.webhookchangefeed import WebhookChangeFeed
 
 logger = get_logger(LoggerEnums.database)
 
@@ -23,12 +27,104 @@ class DbPogoProtoSubmit:
     moved outside the db package.
     """
     default_spawndef = 240
+    # seconds to reuse the active event looked up for the spawnpoints
+    ACTIVE_EVENT_TTL = 60
 
     def __init__(self, db_exec: PooledQueryExecutor, args):
         self._db_exec: PooledQueryExecutor = db_exec
         self._args = args
+        self._write_batch: Optional[DbWriteBatch] = None
+        self._spawnpoint_cache: SpawnpointCache = SpawnpointCache(maxsize=args.spawnpoint_cache_size)
+        self._change_feed: Optional[WebhookChangeFeed] = None
+        self._pending_changes: Dict[str, list] = {}
+        # despawn times of the spawnpoints in the current write batch, not written to the DB yet
+        self._batch_despawn_times: Dict[int, str] = {}
+        self._active_event: Optional[Tuple[int, float]] = None
+
+    def set_change_feed(self, change_feed: Optional[WebhookChangeFeed]):
+        """
+        Publish the keys of written pokemon, raids, gyms, stops, quests and weather to the given change feed
+        """
+        self._change_feed = change_feed
+
+    def _record_changes(self, kind: str, keys: list):
+        """
+        Publish the keys of rows written to the change feed or hold them back until the current write batch is flushed
+        """
+        if self._change_feed is None or not keys:
+            return
+        if self._write_batch is not None:
+            self._pending_changes.setdefault(kind, []).extend(keys)
+        else:
+            self._change_feed.publish({kind: keys})
+
+    def warm_spawnpoint_cache(self) -> int:
+        """
+        Load the most recently scanned spawnpoints into the spawnpoint cache
+        :return: amount of spawnpoints loaded
+        """
+        if not self._spawnpoint_cache.enabled:
+            return 0
+        query = (
+            "SELECT spawnpoint, calc_endminsec "
+            "FROM trs_spawn "
+            "ORDER BY last_scanned DESC "
+            "LIMIT %s"
+        )
+        res = self._db_exec.execute(query, (self._spawnpoint_cache.maxsize,))
+        if not res:
+            return 0
+        # insert the least recently scanned spawnpoints first to have them evicted first
+        for spawnpoint, calc_endminsec in reversed(res):
+            self._spawnpoint_cache.set(int(spawnpoint), str(calc_endminsec) if calc_endminsec else None)
+        logger.info("Loaded {} spawnpoints into the spawnpoint cache", len(res))
+        return len(res)
+
+    def get_spawnpoint_cache_stats(self) -> dict:
+        return self._spawnpoint_cache.get_statistics()
+
+    def start_write_batch(self):
+        """
+        Defer the multi-row writes of the GMO methods until flush_write_batch is called
+        """
+        if self._write_batch is None:
+            self._write_batch = DbWriteBatch()
 
-    def mons(self, origin: str, timestamp: float, map_proto: dict, mitm_mapper):
+    def flush_write_batch(self) -> int:
+        """
+        Write all deferred rows in a single transaction and stop deferring writes
+        :return: amount of rows written after de-duplication
+        """
+        batch, self._write_batch = self._write_batch, None
+        changes, self._pending_changes = self._pending_changes, {}
+        self._batch_despawn_times = {}
+        rows_written = 0
+        if batch:
+            statements = batch.statements()
+            if not self._db_exec.execute_batch(statements):
+                logger.warning("Failed writing batch in one transaction, submitting {} statements one by one",
+                               len(statements))
+                for sql, rows in statements:
+                    self._db_exec.executemany(sql, rows, commit=True)
+            rows_written = batch.unique_row_count()
+        # the keys of rows written directly (IVs, quests, stop details) are held back even without deferred rows
+        if self._change_feed is not None and changes:
+            self._change_feed.publish(changes)
+        return rows_written
+
+    def _submit_many(self, sql: str, rows: list, key_columns: Optional[int] = 1, merge=None):
+        """
+        Run executemany for the given rows or add them to the current write batch
+        :param key_columns: number of leading columns forming the primary key, None to not de-duplicate rows
+        :param merge: function merging rows of the same key in the write batch, see DbWriteBatch.add
+        """
+        if self._write_batch is not None:
+            self._write_batch.add(sql, rows, key_columns=key_columns, merge=merge)
+        else:
+            self._db_exec.executemany(sql, rows, commit=True)
+
+    def mons(self, origin: str, timestamp: float, map_proto: dict,
+             stats_collector: Optional[DetectionStatsCollector] = None):
         """
         Update/Insert mons from a map_proto dict
         """
@@ -60,6 +156,8 @@ class DbPogoProtoSubmit:
 
         mon_args = []
         encounters = []
+        despawn_times = self._get_despawn_times(
+            [int(str(wild_mon["spawnpoint_id"]), 16) for cell in cells for wild_mon in cell["wild_pokemon"]])
         for cell in cells:
             for wild_mon in cell["wild_pokemon"]:
 
@@ -68,7 +166,8 @@ class DbPogoProtoSubmit:
                 if encounter_id < 0:
                     encounter_id = encounter_id + 2 ** 64
 
-                mitm_mapper.collect_mon_stats(origin, str(encounter_id))
+                if stats_collector is not None:
+                    stats_collector.collect_mon(origin, str(encounter_id))
                 cache_key = "mon{}-{}".format(encounter_id, mon_id)
                 if cache.exists(cache_key):
                     continue
@@ -86,7 +185,7 @@ class DbPogoProtoSubmit:
                 now = datetime.utcfromtimestamp(time.time()).strftime("%Y-%m-%d %H:%M:%S")
 
                 # get known spawn end time and feed into despawn time calculation
-                getdetspawntime = self._get_detected_endtime(str(spawnid))
+                getdetspawntime = self._detected_endtime_from_despawn_times(despawn_times, spawnid)
                 despawn_time_unix = gen_despawn_timestamp(getdetspawntime, timestamp,
                                                           self._args.default_unknown_timeleft)
                 despawn_time = datetime.utcfromtimestamp(despawn_time_unix).strftime("%Y-%m-%d %H:%M:%S")
@@ -112,7 +211,8 @@ class DbPogoProtoSubmit:
                 if cache_time > 0:
                     cache.set(cache_key, 1, ex=cache_time)
 
-        self._db_exec.executemany(query_mons, mon_args, commit=True)
+        self._submit_many(query_mons, mon_args)
+        self._record_changes("pokemon", [encounter_id for encounter_id, _ in encounters])
         return encounters
 
     def nearby_mons(self, origin: str, timestamp: float, map_proto: dict, mitm_mapper):
@@ -189,9 +289,9 @@ class DbPogoProtoSubmit:
                 else:
                     db_cell = None
                     seen_type = "nearby_stop"
-                    stop = self._db_exec.execute(stop_query, stopid)
+                    stop = self._db_exec.execute(stop_query, stopid, prepared=True)
                     if (not stop) or (not len(stop) > 0) or (not stop[0][0]):
-                        stop = self._db_exec.execute(gym_query, stopid)
+                        stop = self._db_exec.execute(gym_query, stopid, prepared=True)
 
                     if stop:
                         lat, lon = stop[0]
@@ -210,10 +310,12 @@ class DbPogoProtoSubmit:
                 )
                 cache.set(cache_key, 1, ex=60 * 60)
 
-        self._db_exec.executemany(query_nearby, nearby_args, commit=True)
+        self._submit_many(query_nearby, nearby_args)
+        self._record_changes("pokemon", [nearby[0] for nearby in nearby_args])
         return cell_encounters, stop_encounters
 
-    def mon_iv(self, origin: str, timestamp: float, encounter_proto: dict, mitm_mapper):
+    def mon_iv(self, origin: str, timestamp: float, encounter_proto: dict,
+               stats_collector: Optional[DetectionStatsCollector] = None):
         """
         Update/Insert a mon with IVs
         """
@@ -236,14 +338,15 @@ class DbPogoProtoSubmit:
         if encounter_id < 0:
             encounter_id = encounter_id + 2 ** 64
 
-        mitm_mapper.collect_mon_iv_stats(origin, encounter_id, int(shiny))
+        if stats_collector is not None:
+            stats_collector.collect_mon_iv(origin, str(encounter_id), int(shiny))
         cache_key = "moniv{}-{}-{}".format(encounter_id, weather_boosted, mon_id)
         if cache.exists(cache_key):
             return
 
         now = datetime.utcfromtimestamp(time.time()).strftime("%Y-%m-%d %H:%M:%S")
 
-        getdetspawntime = self._get_detected_endtime(str(spawnid))
+        getdetspawntime = self._get_detected_endtime(spawnid)
         despawn_time_unix = gen_despawn_timestamp(getdetspawntime, timestamp, self._args.default_unknown_timeleft)
         despawn_time = datetime.utcfromtimestamp(despawn_time_unix).strftime("%Y-%m-%d %H:%M:%S")
 
@@ -311,6 +414,7 @@ class DbPogoProtoSubmit:
 
         self._db_exec.execute(query, insert_values, commit=True)
         self.maybe_save_ditto(pokemon_display, encounter_id, mon_id, pokemon_data)
+        self._record_changes("pokemon", [encounter_id])
         cache_time = int(despawn_time_unix - datetime.now().timestamp())
         if cache_time > 0:
             cache.set(cache_key, 1, ex=int(cache_time))
@@ -380,6 +484,7 @@ class DbPogoProtoSubmit:
         self._db_exec.execute(query, insert_values, commit=True)
 
         self.maybe_save_ditto(display, encounter_id, mon_id, pokemon_data)
+        self._record_changes("pokemon", [encounter_id])
 
         cache.set(cache_key, 1, ex=60 * 3)
         origin_logger.debug3("Done updating lure mon with iv in DB")
@@ -458,7 +563,8 @@ class DbPogoProtoSubmit:
                     )
                     encounters.append((encounter_id, now))
 
-        self._db_exec.executemany(query_lures, lure_args, commit=True)
+        self._submit_many(query_lures, lure_args)
+        self._record_changes("pokemon", [encounter_id for encounter_id, _ in encounters])
         return encounters
 
     def update_seen_type_stats(self, **kwargs):
@@ -501,7 +607,7 @@ class DbPogoProtoSubmit:
                     nearby_cell, lure_encounter, lure_wild
                 )
             )
-        self._db_exec.executemany(base_query, base_args, commit=True)
+        self._submit_many(base_query, base_args, key_columns=None)
 
     def spawnpoints(self, origin: str, map_proto: dict, proto_dt: datetime):
         origin_logger = get_origin_logger(logger, origin=origin)
@@ -509,86 +615,68 @@ class DbPogoProtoSubmit:
         cells = map_proto.get("cells", None)
         if cells is None:
             return False
-        spawnpoint_args, spawnpoint_args_unseen = [], []
-        spawn_ids = []
-
+        wild_mons = [wild_mon for cell in cells for wild_mon in cell["wild_pokemon"]]
+        if not wild_mons:
+            return True
+
+        event_id = self._get_active_event_id()
+        clear_mask, set_mask = self._get_spawndef_masks(self._get_current_spawndef_pos())
+        # the spawndef of a spawnpoint is only updated while the event it has been detected in is active.
+        # Spawnpoints of the default event (1) are only updated outside of events and vice versa.
+        # The bit of the current quarter of an hour is merged into the spawndef in the DB, other processors
+        # update the bits of the same spawnpoints concurrently
         query_spawnpoints = (
-            "INSERT INTO trs_spawn (spawnpoint, latitude, longitude, earliest_unseen, "
-            "last_scanned, spawndef, calc_endminsec, eventid) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, "
-            "(select id from trs_event where now() between event_start and "
-            "event_end order by event_start desc limit 1)) "
+            "INSERT INTO trs_spawn (spawnpoint, latitude, longitude, earliest_unseen, last_scanned, "
+            "last_non_scanned, spawndef, calc_endminsec, eventid) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) "
             "ON DUPLICATE KEY UPDATE "
-            "last_scanned=VALUES(last_scanned), "
+            "last_scanned=COALESCE(VALUES(last_scanned), last_scanned), "
+            "last_non_scanned=COALESCE(VALUES(last_non_scanned), last_non_scanned), "
             "earliest_unseen=LEAST(earliest_unseen, VALUES(earliest_unseen)), "
-            "spawndef=if(((select id from trs_event where now() between event_start and event_end order "
-            "by event_start desc limit 1)=1 and eventid=1) or (select id from trs_event where now() between "
-            "event_start and event_end order by event_start desc limit 1)<>1 and eventid<>1, VALUES(spawndef), "
-            "spawndef), "
-            "calc_endminsec=VALUES(calc_endminsec)"
-        )
-
-        query_spawnpoints_unseen = (
-            "INSERT INTO trs_spawn (spawnpoint, latitude, longitude, earliest_unseen, last_non_scanned, spawndef, "
-            "eventid) VALUES (%s, %s, %s, %s, %s, %s, "
-            "(select id from trs_event where now() between event_start and "
-            "event_end order by event_start desc limit 1)) "
-            "ON DUPLICATE KEY UPDATE "
-            "spawndef=if(((select id from trs_event where now() between event_start and event_end order "
-            "by event_start desc limit 1)=1 and eventid=1) or (select id from trs_event where now() between "
-            "event_start and event_end order by event_start desc limit 1)<>1 and eventid<>1, VALUES(spawndef), "
-            "spawndef), "
-            "last_non_scanned=VALUES(last_non_scanned)"
-        )
+            "spawndef=IF(eventid {} 1, (spawndef & {}) | {}, spawndef), "
+            "calc_endminsec=COALESCE(VALUES(calc_endminsec), calc_endminsec)"
+        ).format("=" if event_id == 1 else "<>", clear_mask & 0xFF, set_mask)
 
         now = proto_dt.strftime("%Y-%m-%d %H:%M:%S")
-        dt = proto_dt
-
-        for cell in cells:
-            for wild_mon in cell["wild_pokemon"]:
-                spawn_ids.append(int(str(wild_mon['spawnpoint_id']), 16))
-
-        spawndef = self._get_spawndef(spawn_ids)
-
-        for cell in cells:
-            for wild_mon in cell["wild_pokemon"]:
-                spawnid = int(str(wild_mon["spawnpoint_id"]), 16)
-                lat, lng, _ = S2Helper.get_position_from_cell(
-                    int(str(wild_mon["spawnpoint_id"]) + "00000", 16))
-                despawntime = wild_mon["time_till_hidden"]
-
-                minpos = self._get_current_spawndef_pos()
-                # TODO: retrieve the spawndefs by a single executemany and pass that...
-
-                spawndef_ = spawndef.get(spawnid, False)
-                if spawndef_:
-                    newspawndef = self._set_spawn_see_minutesgroup(spawndef_, minpos)
-                else:
-                    newspawndef = self._set_spawn_see_minutesgroup(self.default_spawndef, minpos)
-
-                last_scanned = None
-                last_non_scanned = None
-
-                if 0 <= int(despawntime) <= 90000:
-                    fulldate = dt + timedelta(milliseconds=despawntime)
-                    earliest_unseen = int(despawntime)
-                    last_scanned = now
-                    calcendtime = fulldate.strftime("%M:%S")
-
-                    spawnpoint_args.append(
-                        (spawnid, lat, lng, earliest_unseen, last_scanned, newspawndef, calcendtime)
-                    )
-                else:
-                    earliest_unseen = 99999999
-                    last_non_scanned = now
+        # the spawndef of new spawnpoints
+        newspawndef = self.default_spawndef & clear_mask | set_mask
+
+        spawnpoint_args = []
+        for wild_mon in wild_mons:
+            spawnid = int(str(wild_mon["spawnpoint_id"]), 16)
+            lat, lng = S2Helper.get_position_from_spawnpoint(str(wild_mon["spawnpoint_id"]))
+            despawntime = int(wild_mon["time_till_hidden"])
+
+            if 0 <= despawntime <= 90000:
+                calcendtime = (proto_dt + timedelta(milliseconds=despawntime)).strftime("%M:%S")
+                spawnpoint_args.append(
+                    (spawnid, lat, lng, despawntime, now, None, newspawndef, calcendtime, event_id)
+                )
+                self._spawnpoint_cache.set(spawnid, calcendtime)
+                if self._write_batch is not None:
+                    self._batch_despawn_times[spawnid] = calcendtime
+            else:
+                spawnpoint_args.append(
+                    (spawnid, lat, lng, 99999999, None, now, newspawndef, None, event_id)
+                )
 
-                    spawnpoint_args_unseen.append(
-                        (spawnid, lat, lng, earliest_unseen, last_non_scanned, newspawndef)
-                    )
+        self._submit_many(query_spawnpoints, spawnpoint_args, merge=self._merge_spawnpoint_rows)
+        return True
 
-        self._db_exec.executemany(query_spawnpoints, spawnpoint_args, commit=True)
-        self._db_exec.executemany(query_spawnpoints_unseen,
-                                  spawnpoint_args_unseen, commit=True)
+    @staticmethod
+    def _merge_spawnpoint_rows(previous: tuple, row: tuple) -> tuple:
+        """
+        Merge two rows of a spawnpoint seen in multiple GMOs of a write batch the way the upsert of spawnpoints
+        would have applied them one after another. Rows of the same statement carry the same spawndef, the bit of
+        another quarter of an hour is written by a statement of its own.
+        """
+        spawnid, lat, lng, earliest_unseen, last_scanned, last_non_scanned, spawndef, calc_endminsec, event_id = row
+        return (spawnid, lat, lng, min(previous[3], earliest_unseen),
+                last_scanned if last_scanned is not None else previous[4],
+                last_non_scanned if last_non_scanned is not None else previous[5],
+                spawndef,
+                calc_endminsec if calc_endminsec is not None else previous[7],
+                event_id)
 
     def stops(self, origin: str, map_proto: dict):
         """
@@ -625,7 +713,8 @@ class DbPogoProtoSubmit:
                     cache.set(cache_key, 1, ex=900)
                     stops_args.append(stop)
 
-        self._db_exec.executemany(query_stops, stops_args, commit=True)
+        self._submit_many(query_stops, stops_args)
+        self._record_changes("pokestop", [stop[0] for stop in stops_args])
         return True
 
     def stop_details(self, stop_proto: dict):
@@ -654,9 +743,11 @@ class DbPogoProtoSubmit:
                 return
             cache.set(cache_key, 1, ex=900)
             self._db_exec.execute(query_stops, stop_args, commit=True)
+            self._record_changes("pokestop", [stop_args[0]])
         return True
 
-    def quest(self, origin: str, quest_proto: dict, mitm_mapper, quest_gen: QuestGen):
+    def quest(self, origin: str, quest_proto: dict, quest_gen: QuestGen,
+              stats_collector: Optional[DetectionStatsCollector] = None):
         origin_logger = get_origin_logger(logger, origin=origin)
         origin_logger.debug3("DbPogoProtoSubmit::quest called")
         fort_id = quest_proto.get("fort_id", None)
@@ -703,7 +794,8 @@ class DbPogoProtoSubmit:
         task = quest_gen.questtask(int(quest_type), json_condition, int(target), str(quest_template),
                                    quest_title_resource_id)
 
-        mitm_mapper.collect_quest_stats(origin, fort_id)
+        if stats_collector is not None:
+            stats_collector.collect_quest(origin, fort_id)
 
         query_quests = (
             "INSERT INTO trs_quest (GUID, quest_type, quest_timestamp, quest_stardust, quest_pokemon_id, "
@@ -728,6 +820,7 @@ class DbPogoProtoSubmit:
         )
         origin_logger.debug3("DbPogoProtoSubmit::quest submitted quest type {} at stop {}", quest_type, fort_id)
         self._db_exec.execute(query_quests, insert_values, commit=True)
+        self._record_changes("quest", [fort_id])
 
         return True
 
@@ -804,8 +897,9 @@ class DbPogoProtoSubmit:
                     )
 
                     cache.set(cache_key, 1, ex=900)
-        self._db_exec.executemany(query_gym, gym_args, commit=True)
-        self._db_exec.executemany(query_gym_details, gym_details_args, commit=True)
+        self._submit_many(query_gym, gym_args)
+        self._submit_many(query_gym_details, gym_details_args)
+        self._record_changes("gym", [gym[0] for gym in gym_args])
         return True
 
     def gym(self, origin: str, map_proto: dict):
@@ -850,7 +944,7 @@ class DbPogoProtoSubmit:
 
         return True
 
-    def raids(self, origin: str, map_proto: dict, mitm_mapper):
+    def raids(self, origin: str, map_proto: dict, stats_collector: Optional[DetectionStatsCollector] = None):
         """
         Update/Insert raids from a map_proto dict
         """
@@ -913,7 +1007,8 @@ class DbPogoProtoSubmit:
                     level = gym["gym_details"]["raid_info"]["level"]
                     gymid = gym["id"]
 
-                    mitm_mapper.collect_raid_stats(origin, gymid)
+                    if stats_collector is not None:
+                        stats_collector.collect_raid(origin, gymid)
 
                     origin_logger.debug3("Adding/Updating gym {} with level {} ending at {}", gymid, level,
                                          raidend_date)
@@ -940,7 +1035,8 @@ class DbPogoProtoSubmit:
 
                     cache.set(cache_key, 1, ex=900)
 
-        self._db_exec.executemany(query_raid, raid_args, commit=True)
+        self._submit_many(query_raid, raid_args)
+        self._record_changes("raid", [raid[0] for raid in raid_args])
         origin_logger.debug3("DbPogoProtoSubmit::raids: Done submitting raids with data received")
         return True
 
@@ -978,7 +1074,8 @@ class DbPogoProtoSubmit:
 
             list_of_weather_args.append(weather)
             cache.set(cache_key, 1, ex=900)
-        self._db_exec.executemany(query_weather, list_of_weather_args, commit=True)
+        self._submit_many(query_weather, list_of_weather_args)
+        self._record_changes("weather", [weather[0] for weather in list_of_weather_args])
         return True
 
     def cells(self, origin: str, map_proto: dict):
@@ -1002,7 +1099,7 @@ class DbPogoProtoSubmit:
 
             cells.append((cell_id, level, lat, lng, cell["current_timestamp"] / 1000))
 
-        self._db_exec.executemany(query, cells, commit=True)
+        self._submit_many(query, cells)
 
     def _extract_args_single_stop(self, stop_data):
         if stop_data["type"] != 1:
@@ -1117,42 +1214,64 @@ class DbPogoProtoSubmit:
             time_of_day, now
         )
 
-    def _get_detected_endtime(self, spawn_id):
-        logger.debug3("DbPogoProtoSubmit::_get_detected_endtime called")
+    def _get_despawn_times(self, spawn_ids: List[int]) -> Dict[int, Optional[str]]:
+        """
+        Bulk lookup of the despawn time of spawnpoints. Despawn times of the current write batch are used first,
+        spawnpoints missing in the spawnpoint cache are fetched with a single query.
+        :return: dict mapping spawnpoint ids to their calc_endminsec, None if it is unknown
+        """
+        if self._batch_despawn_times:
+            spawn_ids = list(spawn_ids)
+            pending = {spawn_id: self._batch_despawn_times[spawn_id] for spawn_id in spawn_ids
+                       if spawn_id in self._batch_despawn_times}
+            spawn_ids = [spawn_id for spawn_id in spawn_ids if spawn_id not in pending]
+        else:
+            pending = {}
+        despawn_times, missing = self._spawnpoint_cache.get_many(spawn_ids)
+        despawn_times.update(pending)
+        if not missing:
+            return despawn_times
+        logger.debug3("DbPogoProtoSubmit::_get_despawn_times fetching {} spawnpoints", len(missing))
 
         query = (
-            "SELECT calc_endminsec "
+            "SELECT spawnpoint, calc_endminsec "
             "FROM trs_spawn "
-            "WHERE spawnpoint=%s"
-        )
-        args = (
-            spawn_id,
+            "WHERE spawnpoint IN ({})".format(",".join(["%s"] * len(missing)))
         )
+        res = self._db_exec.execute(query, tuple(missing))
+        for spawnpoint, calc_endminsec in res or []:
+            despawn_times[int(spawnpoint)] = str(calc_endminsec) if calc_endminsec else None
+        for spawn_id in missing:
+            self._spawnpoint_cache.set(spawn_id, despawn_times.setdefault(spawn_id, None))
+        return despawn_times
+
+    @staticmethod
+    def _detected_endtime_from_despawn_times(despawn_times, spawn_id: int):
+        calc_endminsec = despawn_times.get(spawn_id)
+        return calc_endminsec if calc_endminsec else False
+
+    def _get_detected_endtime(self, spawn_id: int):
+        logger.debug3("DbPogoProtoSubmit::_get_detected_endtime called")
+        return self._detected_endtime_from_despawn_times(self._get_despawn_times([spawn_id]), spawn_id)
 
-        found = self._db_exec.execute(query, args)
-
-        if found and len(found) > 0 and found[0][0]:
-            return str(found[0][0])
-        else:
-            return False
-
-    def _get_spawndef(self, spawn_ids):
-        if not spawn_ids:
-            return False
-        logger.debug3("DbPogoProtoSubmit::_get_spawndef called")
-
-        spawnids = ",".join(map(str, spawn_ids))
-        spawnret = {}
-
+    def _get_active_event_id(self) -> int:
+        """
+        ID of the most recently started active event, looked up at most every ACTIVE_EVENT_TTL seconds.
+        Falls back to the default event (1)
+        """
+        if self._active_event is not None and time.time() - self._active_event[1] < self.ACTIVE_EVENT_TTL:
+            return self._active_event[0]
         query = (
-            "SELECT spawnpoint, spawndef "
-            "FROM trs_spawn where spawnpoint in (%s)" % (spawnids)
+            "SELECT id "
+            "FROM trs_event "
+            "WHERE NOW() BETWEEN event_start AND event_end "
+            "ORDER BY event_start DESC "
+            "LIMIT 1"
         )
-
         res = self._db_exec.execute(query)
-        for row in res:
-            spawnret[int(row[0])] = row[1]
-        return spawnret
+        event_id = int(res[0][0]) if res and res[0][0] else 1
+        self._active_event = (event_id, time.time())
+        return event_id
 
     def _get_current_spawndef_pos(self):
         minute_value = int(datetime.now().strftime("%M"))
@@ -1168,18 +1287,18 @@ class DbPogoProtoSubmit:
             pos = None
         return pos
 
+    @staticmethod
+    def _get_spawndef_masks(pos) -> Tuple[int, int]:
+        """
+        The spawndef holds a bit per quarter of an hour a spawnpoint has been seen (low nibble) and not been seen
+        yet (high nibble), the highest bit belonging to the first quarter. Seeing a spawnpoint in the quarter at
+        pos (4 to 7) clears the bit pos - 4 and sets the bit pos, counted from the highest bit
+        :return: the masks to AND and OR the spawndef with
+        """
+        if pos not in (4, 5, 6, 7):
+            return ~0, 0
+        return ~(1 << (11 - pos)), 1 << (7 - pos)
+
     def _set_spawn_see_minutesgroup(self, spawndef, pos):
-        minte_group = BitArray(uint=spawndef, length=8)
-        if pos == 4:
-            minte_group[0] = 0
-            minte_group[4] = 1
-        if pos == 5:
-            minte_group[1] = 0
-            minte_group[5] = 1
-        if pos == 6:
-            minte_group[2] = 0
-            minte_group[6] = 1
-        if pos == 7:
-            minte_group[3] = 0
-            minte_group[7] = 1
-        return minte_group.uint
+        clear_mask, set_mask = self._get_spawndef_masks(pos)
+        return spawndef & clear_mask | set_mask
@@ -1,6 +1,8 @@
+import time
 from datetime import datetime, timedelta
 from typing import List, Optional
 
+from mapadroid.db.DbStatsRollup import RETENTION, DbStatsRollup, hour_of
 from mapadroid.db.PooledQueryExecutor import PooledQueryExecutor
 from mapadroid.utils.logging import LoggerEnums, get_logger, get_origin_logger
 
@@ -9,8 +11,18 @@ logger = get_logger(LoggerEnums.database)
 
 class DbStatsReader:
 
-    def __init__(self, db_exec: PooledQueryExecutor):
+    def __init__(self, db_exec: PooledQueryExecutor, stats_rollup: DbStatsRollup):
         self._db_exec: PooledQueryExecutor = db_exec
+        self._stats_rollup: DbStatsRollup = stats_rollup
+
+    @staticmethod
+    def _get_start(minutes) -> int:
+        """
+        Start of the statistics to read, minutes before the current full hour or all the raw statistics kept
+        """
+        if minutes:
+            return hour_of(time.time()) - int(minutes) * 60
+        return int(time.time()) - RETENTION
 
     def get_shiny_stats(self):
         logger.debug3('Fetching shiny pokemon stats from db')
@@ -71,31 +83,11 @@ class DbStatsReader:
     def get_detection_count(self, minutes=False, grouped=True, worker=False):
         tmp_logger = get_origin_logger(logger, origin=worker)
         tmp_logger.debug3('Fetching group detection count from db')
-        grouped_query = ""
-        worker_where = ""
-        if worker and minutes:
-            worker_where = ' and worker = \'%s\' ' % str(worker)
-        if worker and not minutes:
-            worker_where = ' where worker = \'%s\' ' % str(worker)
-        if grouped:
-            grouped_query = ", day(FROM_UNIXTIME(timestamp_scan)), hour(FROM_UNIXTIME(timestamp_scan))"
-        query_where = ''
-        query_date = "unix_timestamp(DATE_FORMAT(from_unixtime(MIN(timestamp_scan)), '%y-%m-%d %k:00:00'))"
-        if minutes:
-            minutes = datetime.now().replace(
-                minute=0, second=0, microsecond=0) - timedelta(minutes=int(minutes))
-            query_where = ' where (timestamp_scan) >= unix_timestamp(\'%s\') ' % str(minutes)
-
-        query = (
-            "SELECT  %s, worker, sum(mon) as Mon, sum(mon_iv) as MonIV, sum(raid) as Raids, sum(quest) as Quests "
-            "FROM trs_stats_detect %s %s "
-            "GROUP BY worker %s "
-            "ORDER BY timestamp_scan" %
-            (str(query_date), str(query_where), str(worker_where), str(grouped_query))
-        )
-        res = self._db_exec.execute(query)
-
-        return res
+        filters = {"worker": worker} if worker else None
+        groups = self._stats_rollup.aggregate("detect", self._get_start(minutes), ["worker"], by_hour=grouped,
+                                              filters=filters)
+        return [(group["period"], group["worker"], group["mon"], group["mon_iv"], group["raid"], group["quest"])
+                for group in groups]
 
     def get_shiny_stats_hour(self):
         logger.debug3('Fetching shiny pokemon stats from db')
@@ -111,89 +103,46 @@ class DbStatsReader:
     def get_avg_data_time(self, minutes=False, grouped=True, worker=False):
         tmp_logger = get_origin_logger(logger, origin=worker)
         tmp_logger.debug3('Fetching group detection count from db')
-        grouped_query = ""
-        query_where = ""
-        worker_where = ""
+        filters = {"success": 1, "type": (0, 1), "walker": ("mon_mitm", "iv_mitm", "pokestops")}
         if worker:
-            worker_where = ' and worker = \'%s\' ' % str(worker)
+            filters["worker"] = worker
+        dimensions = ["worker", "walker"]
         if grouped:
-            grouped_query = ", day(FROM_UNIXTIME(period)), hour(FROM_UNIXTIME(period)), transporttype"
-        if minutes:
-            minutes = datetime.now().replace(
-                minute=0, second=0, microsecond=0) - timedelta(minutes=int(minutes))
-            query_where = ' and (period) >= unix_timestamp(\'%s\') ' % str(minutes)
-
-        query_date = "unix_timestamp(DATE_FORMAT(FROM_UNIXTIME(period), '%y-%m-%d %k:00:00'))"
-
-        query = (
-            "SELECT %s, if(transporttype=0,'Teleport',if(transporttype=1,'Walk', "
-            "'other')), worker, count(fix_ts), avg(data_ts-fix_ts) as data_time, walker from trs_stats_location_raw "
-            "where success=1 and type in (0,1) and (walker='mon_mitm' or walker='iv_mitm' or walker='pokestops') "
-            "%s %s group by worker %s" %
-            (str(query_date), (query_where), str(worker_where), str(grouped_query))
-        )
-
-        res = self._db_exec.execute(query)
-
-        return res
+            dimensions.append("transporttype")
+        groups = self._stats_rollup.aggregate("location_raw", self._get_start(minutes), dimensions,
+                                              by_hour=grouped, filters=filters)
+        transport_types = {0: 'Teleport', 1: 'Walk'}
+        return [(group["period"], transport_types.get(group.get("transporttype"), 'other'), group["worker"],
+                 group["locations"], group["data_time"] / group["locations"] if group["locations"] else 0,
+                 group["walker"])
+                for group in groups]
 
     def get_locations(self, minutes=False, grouped=True, worker=False):
         tmp_logger = get_origin_logger(logger, origin=worker)
         tmp_logger.debug3('Fetching group locations count from db')
-        grouped_query = ""
-        query_where = ""
-        worker_where = ""
-        if worker and minutes:
-            worker_where = ' and worker = \'%s\' ' % str(worker)
-        if worker and not minutes:
-            worker_where = ' where worker = \'%s\' ' % str(worker)
-        if grouped:
-            grouped_query = ", day(FROM_UNIXTIME(timestamp_scan)), hour(FROM_UNIXTIME(timestamp_scan))"
-        if minutes:
-            minutes = datetime.now().replace(
-                minute=0, second=0, microsecond=0) - timedelta(minutes=int(minutes))
-            query_where = ' where (timestamp_scan) >= unix_timestamp(\'%s\') ' % str(minutes)
-
-        query_date = "unix_timestamp(DATE_FORMAT(FROM_UNIXTIME(timestamp_scan), '%y-%m-%d %k:00:00'))"
-
-        query = (
-            "SELECT %s, worker, sum(location_count), sum(location_ok), sum(location_nok) from trs_stats_location "
-            " %s %s group by worker %s" %
-            (str(query_date), (query_where), str(worker_where), str(grouped_query))
-        )
-        res = self._db_exec.execute(query)
-
-        return res
+        filters = {"worker": worker} if worker else None
+        groups = self._stats_rollup.aggregate("location", self._get_start(minutes), ["worker"], by_hour=grouped,
+                                              filters=filters)
+        return [(group["period"], group["worker"], group["location_count"], group["location_ok"],
+                 group["location_nok"])
+                for group in groups]
 
     def get_locations_dataratio(self, minutes=False, grouped=True, worker=False):
         tmp_logger = get_origin_logger(logger, origin=worker)
         tmp_logger.debug3('Fetching group locations dataratio from db')
-        grouped_query = ""
-        query_where = ""
-        worker_where = ""
-        if worker and minutes:
-            worker_where = ' and worker = \'%s\' ' % str(worker)
-        if worker and not minutes:
-            worker_where = ' where worker = \'%s\' ' % str(worker)
-        if grouped:
-            grouped_query = ", success, type"
-        if minutes:
-            minutes = datetime.now().replace(
-                minute=0, second=0, microsecond=0) - timedelta(minutes=int(minutes))
-            query_where = ' where (period) >= unix_timestamp(\'%s\') ' % str(minutes)
-
-        query_date = "unix_timestamp(DATE_FORMAT(FROM_UNIXTIME(period), '%y-%m-%d %k:00:00'))"
-
-        query = (
-            "SELECT %s, worker, count(period), if(type=0,if(success=1,'OK-Normal','NOK-Normal'),"
-            "if(success=1,'OK-PrioQ','NOK-PrioQ')) from trs_stats_location_raw "
-            " %s %s and type in(0,1) group by worker %s" %
-            (str(query_date), (query_where), str(worker_where), str(grouped_query))
-        )
-
-        res = self._db_exec.execute(query)
-
-        return res
+        filters = {"type": (0, 1)}
+        if worker:
+            filters["worker"] = worker
+        dimensions = ["worker", "success", "type"] if grouped else ["worker"]
+        groups = self._stats_rollup.aggregate("location_raw", self._get_start(minutes), dimensions,
+                                              filters=filters)
+        ratios = []
+        for group in groups:
+            label = None
+            if grouped:
+                label = ("OK-" if group["success"] == 1 else "NOK-") + ("Normal" if group["type"] == 0 else "PrioQ")
+            ratios.append((group["period"], group["worker"], group["locations"], label))
+        return ratios
 
     def get_all_empty_scans(self):
         logger.debug3('Fetching all empty locations from db')
@@ -265,14 +214,10 @@ class DbStatsReader:
 
     def get_location_info(self):
         logger.debug3('Fetching all empty locations from db')
-        query = (
-            "SELECT worker, sum(location_count), sum(location_ok), sum(location_nok), "
-            "sum(location_nok) / sum(location_count) * 100 as Loc_fail_rate "
-            "FROM trs_stats_location "
-            "GROUP BY worker"
-        )
-        res = self._db_exec.execute(query)
-        return res
+        groups = self._stats_rollup.aggregate("location", self._get_start(False), ["worker"])
+        return [(group["worker"], group["location_count"], group["location_ok"], group["location_nok"],
+                 group["location_nok"] / group["location_count"] * 100 if group["location_count"] else None)
+                for group in sorted(groups, key=lambda group: group["worker"])]
 
     def get_pokemon_count(self, minutes):
         logger.debug3('Fetching pokemon spawns count from db')
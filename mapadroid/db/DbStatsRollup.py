@@ -0,0 +1,319 @@
+import time
+from threading import Event, Thread
+from typing import Dict, List, Optional, Tuple
+
+from mapadroid.db.PooledQueryExecutor import PooledQueryExecutor
+from mapadroid.utils.logging import LoggerEnums, get_logger
+
+logger = get_logger(LoggerEnums.database)
+
+HOUR = 3600
+DAY = 86400
+# raw statistics are deleted after a week, see DbStatsSubmit.cleanup_statistics
+RETENTION = 604800
+# completed hours folded again on every run, raw rows of a worker are submitted up to game_stats_save_time late
+REFOLD_HOURS = 2
+# hours folded per transaction while backfilling
+FOLD_CHUNK_HOURS = 24
+
+
+class StatsRollup:
+    """
+    Describes how the rows of a raw statistics table are folded into its hourly and daily rollup tables.
+    Every measure is an aggregate over the raw rows that can be summed up again.
+    """
+
+    def __init__(self, name: str, source: str, time_column: str, dimensions: List[str],
+                 measures: List[Tuple[str, str]]):
+        self.name: str = name
+        self.source: str = source
+        self.time_column: str = time_column
+        self.dimensions: List[str] = dimensions
+        self.measures: List[Tuple[str, str]] = measures
+
+    @property
+    def hourly_table(self) -> str:
+        return self.source + "_hourly"
+
+    @property
+    def daily_table(self) -> str:
+        return self.source + "_daily"
+
+    @property
+    def measure_names(self) -> List[str]:
+        return [name for name, _ in self.measures]
+
+
+ROLLUPS: Dict[str, StatsRollup] = {rollup.name: rollup for rollup in (
+    StatsRollup("detect", "trs_stats_detect", "timestamp_scan", ["worker"],
+                [("mon", "SUM(mon)"), ("mon_iv", "SUM(mon_iv)"), ("raid", "SUM(raid)"), ("quest", "SUM(quest)")]),
+    StatsRollup("location", "trs_stats_location", "timestamp_scan", ["worker"],
+                [("location_count", "SUM(location_count)"), ("location_ok", "SUM(location_ok)"),
+                 ("location_nok", "SUM(location_nok)")]),
+    StatsRollup("location_raw", "trs_stats_location_raw", "period",
+                ["worker", "walker", "type", "success", "transporttype"],
+                [("locations", "COUNT(*)"), ("data_time", "SUM(data_ts - fix_ts)")])
+)}
+
+
+def hour_of(timestamp: int) -> int:
+    return int(timestamp) // HOUR * HOUR
+
+
+def day_of(timestamp: int) -> int:
+    return int(timestamp) // DAY * DAY
+
+
+def split_by_rollup(start: int, folded_until: int, end: Optional[int] = None,
+                    use_daily: bool = True) -> List[Tuple[str, int, int]]:
+    """
+    Splits [start, end) into the ranges read from the daily rollups, the hourly rollups and the raw rows.
+    Rollups only cover complete buckets before folded_until, everything after is read from the raw rows.
+    :return: list of (source, from, to) with source being one of "daily", "hourly" and "raw"
+    """
+    end = int(time.time()) + 1 if end is None else end
+    folded_until = min(max(folded_until, start), end)
+    # hours partially before start are left to the raw rows, they have been deleted anyway
+    first_hour = min(hour_of(start + HOUR - 1), folded_until)
+    ranges = []
+    if start < first_hour:
+        ranges.append(("raw", start, first_hour))
+    first_day = day_of(first_hour + DAY - 1)
+    last_day = day_of(folded_until)
+    if use_daily and first_day < last_day:
+        ranges += [("hourly", first_hour, first_day), ("daily", first_day, last_day),
+                   ("hourly", last_day, folded_until)]
+    else:
+        ranges.append(("hourly", first_hour, folded_until))
+    ranges.append(("raw", folded_until, end))
+    return [(source, range_from, range_to) for source, range_from, range_to in ranges if range_from < range_to]
+
+
+class DbStatsRollup:
+    """
+    Folds the raw statistics into hourly and daily rollup tables per worker and type. The hours folded so far are
+    tracked per rollup in trs_stats_rollup. Readers combine the rollups of completed hours with the raw rows of
+    the hours not folded yet, see aggregate.
+    """
+
+    def __init__(self, db_exec: PooledQueryExecutor):
+        self._db_exec: PooledQueryExecutor = db_exec
+        self._stop_job: Event = Event()
+
+    def get_folded_until(self, name: str) -> int:
+        res = self._db_exec.execute("SELECT folded_until FROM trs_stats_rollup WHERE rollup = %s", (name,))
+        return int(res[0][0]) if res else 0
+
+    def start_rollup_job(self, interval: int):
+        rollup_thread = Thread(name='system', target=self._rollup_job, args=(interval,))
+        rollup_thread.daemon = True
+        rollup_thread.start()
+
+    def stop_rollup_job(self):
+        self._stop_job.set()
+
+    def _rollup_job(self, interval: int):
+        while not self._stop_job.is_set():
+            try:
+                self.update()
+                self.cleanup()
+            except Exception as e:
+                logger.exception("Failed updating the statistics rollups: {}", e)
+            self._stop_job.wait(interval)
+
+    def update(self):
+        """
+        Folds the raw rows of all hours completed since the last run
+        """
+        for rollup in ROLLUPS.values():
+            folded_until = self.get_folded_until(rollup.name)
+            if folded_until:
+                self.fold(rollup, folded_until - REFOLD_HOURS * HOUR)
+            else:
+                logger.info("Statistics rollup {} has not been built yet, backfilling", rollup.name)
+                self.fold(rollup, None)
+
+    def backfill(self, since: Optional[int] = None):
+        """
+        Builds all rollups again from the raw rows
+        :param since: epoch to start at, defaults to the oldest raw row
+        """
+        for rollup in ROLLUPS.values():
+            self.fold(rollup, since)
+
+    def fold(self, rollup: StatsRollup, since: Optional[int]):
+        until = hour_of(time.time())
+        if since is None:
+            res = self._db_exec.execute("SELECT MIN({}) FROM {}".format(rollup.time_column, rollup.source))
+            since = res[0][0] if res and res[0][0] is not None else until
+        start = hour_of(since)
+        started = time.time()
+        while True:
+            chunk_end = min(start + FOLD_CHUNK_HOURS * HOUR, until)
+            if not self._fold_range(rollup, start, chunk_end):
+                logger.warning("Failed folding {} from {} to {}, trying again on the next run",
+                               rollup.source, start, chunk_end)
+                return
+            start = chunk_end
+            if start >= until:
+                break
+        logger.debug("Folded {} up to {} in {}s", rollup.source, until, round(time.time() - started, 2))
+
+    def _fold_range(self, rollup: StatsRollup, start: int, end: int) -> bool:
+        """
+        Folds the hours of [start, end) and the days touched again in one transaction. The rows of a bucket and group
+        are replaced by the aggregates of the rows they are built from, folding a range again does not count twice
+        """
+        dimensions = ", ".join(rollup.dimensions)
+        measures = ", ".join(rollup.measure_names)
+        aggregates = ", ".join(aggregate for _, aggregate in rollup.measures)
+        sums = ", ".join("SUM({})".format(name) for name in rollup.measure_names)
+        updates = ", ".join("{0} = VALUES({0})".format(name) for name in rollup.measure_names)
+        first_day = day_of(start)
+        last_day = day_of(end - 1) + DAY if end > start else first_day
+        statements = [
+            ("INSERT INTO {table} (period, {dimensions}, {measures}) "
+             "SELECT FLOOR({time} / {hour}) * {hour} AS bucket, {dimensions}, {aggregates} FROM {source} "
+             "WHERE {time} >= %s AND {time} < %s "
+             "GROUP BY bucket, {dimensions} "
+             "ON DUPLICATE KEY UPDATE {updates}".format(
+                 table=rollup.hourly_table, dimensions=dimensions, measures=measures, time=rollup.time_column,
+                 hour=HOUR, aggregates=aggregates, source=rollup.source, updates=updates),
+             [(start, end)]),
+            ("INSERT INTO {daily} (period, {dimensions}, {measures}) "
+             "SELECT FLOOR(period / {day}) * {day} AS bucket, {dimensions}, {sums} FROM {hourly} "
+             "WHERE period >= %s AND period < %s "
+             "GROUP BY bucket, {dimensions} "
+             "ON DUPLICATE KEY UPDATE {updates}".format(
+                 daily=rollup.daily_table, dimensions=dimensions, measures=measures, day=DAY, sums=sums,
+                 hourly=rollup.hourly_table, updates=updates),
+             [(first_day, last_day)]),
+            ("INSERT INTO trs_stats_rollup (rollup, folded_until) VALUES (%s, %s) "
+             "ON DUPLICATE KEY UPDATE folded_until = GREATEST(folded_until, VALUES(folded_until))",
+             [(rollup.name, end)])
+        ]
+        return self._db_exec.execute_batch(statements)
+
+    def cleanup(self):
+        cutoff = int(time.time()) - RETENTION
+        for rollup in ROLLUPS.values():
+            self._db_exec.execute("DELETE FROM {} WHERE period < %s".format(rollup.hourly_table),
+                                  (hour_of(cutoff),), commit=True)
+            self._db_exec.execute("DELETE FROM {} WHERE period < %s".format(rollup.daily_table),
+                                  (day_of(cutoff),), commit=True)
+
+    def aggregate(self, name: str, start: int, dimensions: List[str], by_hour: bool = False,
+                  filters: Optional[Dict[str, object]] = None) -> List[dict]:
+        """
+        Sums up the measures of a rollup since start per dimension (and hour)
+        :param filters: values of dimensions to restrict to, a list or tuple of values matches any of them
+        :return: one dict per group holding the dimensions, the measures and the first hour of the group as period
+        """
+        rollup = ROLLUPS[name]
+        where, where_args = self._build_filters(filters)
+        groups: Dict[tuple, dict] = {}
+        ranges = split_by_rollup(start, self.get_folded_until(name), use_daily=not by_hour)
+        for source, range_from, range_to in ranges:
+            if source == "raw":
+                query = (
+                    "SELECT FLOOR({time} / {hour}) * {hour} AS bucket, {dimensions}, {aggregates} FROM {table} "
+                    "WHERE {time} >= %s AND {time} < %s {where} GROUP BY bucket, {dimensions}"
+                ).format(time=rollup.time_column, hour=HOUR, aggregates=", ".join(
+                    aggregate for _, aggregate in rollup.measures), table=rollup.source,
+                    dimensions=", ".join(dimensions), where=where)
+            else:
+                query = (
+                    "SELECT period, {dimensions}, {sums} FROM {table} "
+                    "WHERE period >= %s AND period < %s {where} GROUP BY period, {dimensions}"
+                ).format(dimensions=", ".join(dimensions), sums=", ".join(
+                    "SUM({})".format(measure) for measure in rollup.measure_names),
+                    table=rollup.hourly_table if source == "hourly" else rollup.daily_table, where=where)
+            for row in self._db_exec.execute(query, (range_from, range_to) + where_args):
+                period = int(row[0])
+                values = row[1:1 + len(dimensions)]
+                key = (period,) + tuple(values) if by_hour else tuple(values)
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = dict(zip(dimensions, values))
+                    group["period"] = period
+                    for measure in rollup.measure_names:
+                        group[measure] = 0
+                group["period"] = min(group["period"], period)
+                for measure, value in zip(rollup.measure_names, row[1 + len(dimensions):]):
+                    group[measure] += int(value or 0)
+        return sorted(groups.values(), key=lambda group: group["period"])
+
+    @staticmethod
+    def _build_filters(filters: Optional[Dict[str, object]]) -> Tuple[str, tuple]:
+        where = ""
+        args = ()
+        for column, value in (filters or {}).items():
+            if isinstance(value, (list, tuple, set)):
+                where += " AND {} IN ({})".format(column, ", ".join(["%s"] * len(value)))
+                args += tuple(value)
+            else:
+                where += " AND {} = %s".format(column)
+                args += (value,)
+        return where, args
+
+    def check_consistency(self, since: Optional[int] = None) -> List[dict]:
+        """
+        Compares the hourly rollups of completed hours with the raw rows and the daily rollups with the hourly ones
+        :param since: epoch to start at, defaults to the retention period of the raw rows
+        :return: the groups not matching
+        """
+        since = hour_of(int(time.time()) - RETENTION + HOUR) if since is None else hour_of(since)
+        mismatches = []
+        for rollup in ROLLUPS.values():
+            folded_until = self.get_folded_until(rollup.name)
+            if folded_until <= since:
+                continue
+            dimensions = ", ".join(rollup.dimensions)
+            raw = self._db_exec.execute(
+                "SELECT FLOOR({time} / {hour}) * {hour} AS bucket, {dimensions}, {aggregates} FROM {source} "
+                "WHERE {time} >= %s AND {time} < %s GROUP BY bucket, {dimensions}".format(
+                    time=rollup.time_column, hour=HOUR, dimensions=dimensions, source=rollup.source,
+                    aggregates=", ".join(aggregate for _, aggregate in rollup.measures)),
+                (since, folded_until))
+            hourly = self._db_exec.execute(
+                "SELECT period, {dimensions}, {measures} FROM {table} WHERE period >= %s AND period < %s".format(
+                    dimensions=dimensions, measures=", ".join(rollup.measure_names), table=rollup.hourly_table),
+                (since, folded_until))
+            mismatches += self._compare(rollup, "hourly", raw, hourly)
+
+            first_day = day_of(since + DAY - 1)
+            hourly_per_day = self._db_exec.execute(
+                "SELECT FLOOR(period / {day}) * {day} AS bucket, {dimensions}, {sums} FROM {table} "
+                "WHERE period >= %s AND period < %s GROUP BY bucket, {dimensions}".format(
+                    day=DAY, dimensions=dimensions, table=rollup.hourly_table,
+                    sums=", ".join("SUM({})".format(measure) for measure in rollup.measure_names)),
+                (first_day, folded_until))
+            daily = self._db_exec.execute(
+                "SELECT period, {dimensions}, {measures} FROM {table} WHERE period >= %s AND period < %s".format(
+                    dimensions=dimensions, measures=", ".join(rollup.measure_names), table=rollup.daily_table),
+                (first_day, folded_until))
+            mismatches += self._compare(rollup, "daily", hourly_per_day, daily)
+        return mismatches
+
+    @staticmethod
+    def _compare(rollup: StatsRollup, table: str, expected_rows, actual_rows) -> List[dict]:
+        key_length = 1 + len(rollup.dimensions)
+
+        def by_key(rows):
+            return {tuple(row[:key_length]): [int(value or 0) for value in row[key_length:]] for row in rows}
+
+        expected = by_key(expected_rows)
+        actual = by_key(actual_rows)
+        zero = [0] * len(rollup.measures)
+        mismatches = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            if expected.get(key, zero) != actual.get(key, zero):
+                mismatches.append({
+                    "rollup": rollup.name,
+                    "table": table,
+                    "period": int(key[0]),
+                    "group": dict(zip(rollup.dimensions, key[1:])),
+                    "expected": dict(zip(rollup.measure_names, expected.get(key, zero))),
+                    "actual": dict(zip(rollup.measure_names, actual.get(key, zero)))
+                })
+        return mismatches
@@ -1,10 +1,14 @@
 from datetime import datetime, timezone
+from typing import Collection, List
 
 from mapadroid.db.PooledQueryExecutor import PooledQueryExecutor
 from mapadroid.utils.logging import LoggerEnums, get_logger
 
 logger = get_logger(LoggerEnums.database)
 
+# amount of keys to look up per query when reading the rows announced by the change feed
+KEYS_PER_QUERY = 500
+
 
 class DbWebhookReader:
 
@@ -15,9 +19,35 @@ class DbWebhookReader:
         # resolved in future iterations.
         self._db_wrapper = db_wrapper
 
+    @staticmethod
+    def _to_datetime_string(timestamp) -> str:
+        return datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _execute_for_keys(self, query: str, column: str, keys: Collection, args: tuple = ()) -> list:
+        """
+        Run the query with `column IN (...)` substituted for {keys} in chunks of KEYS_PER_QUERY keys
+        """
+        keys = list(keys)
+        res = []
+        for start in range(0, len(keys), KEYS_PER_QUERY):
+            chunk = keys[start:start + KEYS_PER_QUERY]
+            condition = "{} IN ({})".format(column, ",".join(["%s"] * len(chunk)))
+            res += self._db_exec.execute(query.format(keys=condition), args + tuple(chunk)) or []
+        return res
+
     def get_raids_changed_since(self, timestamp):
         logger.debug2("DbWebhookReader::get_raids_changed_since called")
-        query = (
+        res = self._db_exec.execute(self._raids_query("raid.last_scanned >= %s"),
+                                    (self._to_datetime_string(timestamp),))
+        return self._get_raids_rows(res)
+
+    def get_raids_by_gym_ids(self, gym_ids: Collection[str]):
+        logger.debug2("DbWebhookReader::get_raids_by_gym_ids called")
+        return self._get_raids_rows(self._execute_for_keys(self._raids_query("{keys}"), "raid.gym_id", gym_ids))
+
+    @staticmethod
+    def _raids_query(where: str) -> str:
+        return (
             "SELECT raid.gym_id, raid.level, raid.spawn, raid.start, raid.end, raid.pokemon_id, "
             "raid.cp, raid.move_1, raid.move_2, raid.last_scanned, raid.form, raid.is_exclusive, raid.gender, "
             "raid.costume, raid.evolution, gymdetails.name, gymdetails.url, gym.latitude, gym.longitude, "
@@ -25,11 +55,11 @@ class DbWebhookReader:
             "FROM raid "
             "LEFT JOIN gymdetails ON gymdetails.gym_id = raid.gym_id "
             "LEFT JOIN gym ON gym.gym_id = raid.gym_id "
-            "WHERE raid.last_scanned >= %s"
+            "WHERE " + where
         )
-        tsdt = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-        res = self._db_exec.execute(query, (tsdt,))
 
+    @staticmethod
+    def _get_raids_rows(res) -> List[dict]:
         ret = []
         for (gym_id, level, spawn, start, end, pokemon_id,
              cp, move_1, move_2, last_scanned, form, is_exclusive, gender,
@@ -68,9 +98,19 @@ class DbWebhookReader:
             "FROM weather "
             "WHERE last_updated >= %s"
         )
-        tsdt = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-        res = self._db_exec.execute(query, (tsdt,))
+        return self._get_weather_rows(self._db_exec.execute(query, (self._to_datetime_string(timestamp),)))
+
+    def get_weather_by_cell_ids(self, cell_ids: Collection[int]):
+        logger.debug2("DbWebhookReader::get_weather_by_cell_ids called")
+        query = (
+            "SELECT * "
+            "FROM weather "
+            "WHERE {keys}"
+        )
+        return self._get_weather_rows(self._execute_for_keys(query, "s2_cell_id", cell_ids))
 
+    @staticmethod
+    def _get_weather_rows(res) -> List[dict]:
         ret = []
         for (s2_cell_id, latitude, longitude, cloud_level, rain_level, wind_level,
              snow_level, fog_level, wind_direction, gameplay_weather, severity,
@@ -97,19 +137,38 @@ class DbWebhookReader:
         logger.debug2("DbWebhookReader::get_quests_changed_since called")
         return self._db_wrapper.quests_from_db(timestamp=timestamp)
 
+    def get_quests_by_pokestop_ids(self, pokestop_ids: Collection[str]):
+        logger.debug2("DbWebhookReader::get_quests_by_pokestop_ids called")
+        pokestop_ids = list(pokestop_ids)
+        quests = {}
+        for start in range(0, len(pokestop_ids), KEYS_PER_QUERY):
+            quests.update(self._db_wrapper.quests_from_db(
+                pokestop_ids=pokestop_ids[start:start + KEYS_PER_QUERY]))
+        return quests
+
     def get_gyms_changed_since(self, timestamp):
         logger.debug2("DbWebhookReader::get_gyms_changed_since called")
-        query = (
+        res = self._db_exec.execute(self._gyms_query("gym.last_scanned >= %s"),
+                                    (self._to_datetime_string(timestamp),))
+        return self._get_gyms_rows(res)
+
+    def get_gyms_by_ids(self, gym_ids: Collection[str]):
+        logger.debug2("DbWebhookReader::get_gyms_by_ids called")
+        return self._get_gyms_rows(self._execute_for_keys(self._gyms_query("{keys}"), "gym.gym_id", gym_ids))
+
+    @staticmethod
+    def _gyms_query(where: str) -> str:
+        return (
             "SELECT name, description, url, gym.gym_id, team_id, guard_pokemon_id, slots_available, "
             "latitude, longitude, total_cp, is_in_battle, weather_boosted_condition, "
             "last_modified, gym.last_scanned, gym.is_ex_raid_eligible, gym.is_ar_scan_eligible "
             "FROM gym "
             "LEFT JOIN gymdetails ON gym.gym_id = gymdetails.gym_id "
-            "WHERE gym.last_scanned >= %s"
+            "WHERE " + where
         )
-        tsdt = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-        res = self._db_exec.execute(query, (tsdt,))
 
+    @staticmethod
+    def _get_gyms_rows(res) -> List[dict]:
         ret = []
         for (name, description, url, gym_id, team_id, guard_pokemon_id, slots_available,
              latitude, longitude, total_cp, is_in_battle, weather_boosted_condition,
@@ -136,16 +195,25 @@ class DbWebhookReader:
 
     def get_stops_changed_since(self, timestamp):
         logger.debug2("DbWebhookReader::get_stops_changed_since called")
-        query = (
+        res = self._db_exec.execute(self._stops_query("last_updated >= %s"), (self._to_datetime_string(timestamp),))
+        return self._get_stops_rows(res)
+
+    def get_stops_by_ids(self, pokestop_ids: Collection[str]):
+        logger.debug2("DbWebhookReader::get_stops_by_ids called")
+        return self._get_stops_rows(self._execute_for_keys(self._stops_query("{keys}"), "pokestop_id", pokestop_ids))
+
+    @staticmethod
+    def _stops_query(where: str) -> str:
+        return (
             "SELECT pokestop_id, latitude, longitude, lure_expiration, name, image, active_fort_modifier, "
             "last_modified, last_updated, incident_start, incident_expiration, incident_grunt_type "
             "FROM pokestop "
-            "WHERE last_updated >= %s AND (DATEDIFF(lure_expiration, '1970-01-01 00:00:00') > 0 OR "
+            "WHERE " + where + " AND (DATEDIFF(lure_expiration, '1970-01-01 00:00:00') > 0 OR "
             "incident_start IS NOT NULL)"
         )
-        tsdt = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-        res = self._db_exec.execute(query, (tsdt,))
 
+    @staticmethod
+    def _get_stops_rows(res) -> List[dict]:
         ret = []
         for (pokestop_id, latitude, longitude, lure_expiration, name, image, active_fort_modifier,
              last_modified, last_updated, incident_start, incident_expiration, incident_grunt_type) in res:
@@ -172,6 +240,17 @@ class DbWebhookReader:
 
     def get_mon_changed_since(self, timestamp, mon_types=None):
         logger.debug2("DbWebhookReader::get_mon_changed_since called")
+        query = self._mon_query("pokemon.last_modified >= %s", mon_types)
+        return self._get_mon_rows(self._db_exec.execute(query, (self._to_datetime_string(timestamp),)))
+
+    def get_mon_by_encounter_ids(self, encounter_ids: Collection[int], mon_types=None):
+        logger.debug2("DbWebhookReader::get_mon_by_encounter_ids called")
+        # _mon_query formats the query once, the doubled braces keep the placeholder for the keys
+        query = self._mon_query("{{keys}}", mon_types)
+        return self._get_mon_rows(self._execute_for_keys(query, "pokemon.encounter_id", encounter_ids))
+
+    @staticmethod
+    def _mon_query(where: str, mon_types=None) -> str:
         if mon_types is None:
             mon_types = {"encounter", "lure_encounter"}
         query = (
@@ -188,7 +267,7 @@ class DbWebhookReader:
             "FROM pokemon "
             "LEFT JOIN trs_spawn ON pokemon.spawnpoint_id = trs_spawn.spawnpoint {} "
             "LEFT JOIN pokemon_display ON pokemon.encounter_id=pokemon_display.encounter_id "
-            "WHERE pokemon.last_modified >= %s "
+            "WHERE " + where + " "
         )
         query_mon_types = ["'" + t + "'" for t in mon_types]
         query += "AND seen_type in (" + ",".join(query_mon_types) + ")"
@@ -206,11 +285,10 @@ class DbWebhookReader:
         else:
             extra_select += "NULL "
 
-        query = query.format(extra_select, extra_join)
-
-        tsdt = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-        res = self._db_exec.execute(query, (tsdt,))
+        return query.format(extra_select, extra_join)
 
+    @staticmethod
+    def _get_mon_rows(res) -> List[dict]:
         ret = []
         for (encounter_id, spawnpoint_id, pokemon_id, latitude,
              longitude, disappear_time, individual_attack,
@@ -1,15 +1,20 @@
 import json
+import math
 import random
 import re
 import time
 from datetime import datetime, timedelta, timezone
 from functools import reduce
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
+from mapadroid.cache.spawntimetable import (NextSpawn, SpawnTimetable,
+                                            SpawnTimetables)
+from mapadroid.cache.stopindex import StopIndex
 from mapadroid.db.DbPogoProtoSubmit import DbPogoProtoSubmit
 from mapadroid.db.DbSanityCheck import DbSanityCheck
 from mapadroid.db.DbSchemaUpdater import DbSchemaUpdater
 from mapadroid.db.DbStatsReader import DbStatsReader
+from mapadroid.db.DbStatsRollup import DbStatsRollup
 from mapadroid.db.DbStatsSubmit import DbStatsSubmit
 from mapadroid.db.DbWebhookReader import DbWebhookReader
 from mapadroid.geofence.geofenceHelper import GeofenceHelper
@@ -19,6 +24,16 @@ from mapadroid.utils.s2Helper import S2Helper
 
 logger = get_logger(LoggerEnums.database)
 
+# seconds after which the stop index is loaded completely again to drop the stops deleted by other processes
+STOP_INDEX_RELOAD_INTERVAL = 3600
+# the stop queries measure distances in miles, 69.1 miles per degree
+MILES_PER_DEGREE = 69.1
+# seconds after which a spawn timetable is loaded completely again, e.g. to drop the spawnpoints deleted in MADmin
+SPAWN_TIMETABLE_RELOAD_INTERVAL = 3600
+# the refresh of a spawn timetable reads the spawnpoints seen up to this many seconds before the latest one known
+# again since the protos of the devices are not processed in the order they have been received
+SPAWN_TIMETABLE_REFRESH_OVERLAP = 300
+
 
 class DbWrapper:
     def __init__(self, db_exec, args):
@@ -33,8 +48,11 @@ class DbWrapper:
         self.schema_updater: DbSchemaUpdater = DbSchemaUpdater(db_exec, args.dbname)
         self.proto_submit: DbPogoProtoSubmit = DbPogoProtoSubmit(db_exec, args)
         self.stats_submit: DbStatsSubmit = DbStatsSubmit(db_exec, args)
-        self.stats_reader: DbStatsReader = DbStatsReader(db_exec)
+        self.stats_rollup: DbStatsRollup = DbStatsRollup(db_exec)
+        self.stats_reader: DbStatsReader = DbStatsReader(db_exec, self.stats_rollup)
         self.webhook_reader: DbWebhookReader = DbWebhookReader(db_exec, self)
+        self._stop_index: StopIndex = StopIndex()
+        self._spawn_timetables: SpawnTimetables = SpawnTimetables()
         try:
             self.get_instance_id()
         except Exception:
@@ -54,6 +72,16 @@ class DbWrapper:
     def executemany(self, sql, args, commit=False, **kwargs):
         return self._db_exec.executemany(sql, args, commit, **kwargs)
 
+    def execute_batch(self, statements):
+        return self._db_exec.execute_batch(statements)
+
+    def execute_stream(self, sql, args=None, chunk_size=1000, **kwargs):
+        """ Iterate the rows of a large result set in lists of up to chunk_size rows """
+        return self._db_exec.execute_stream(sql, args, chunk_size, **kwargs)
+
+    def get_statement_statistics(self, limit=None):
+        return self._db_exec.get_statement_statistics(limit)
+
     def autofetch_all(self, sql, args=(), **kwargs):
         """ Fetch all data and have it returned as a dictionary """
         return self._db_exec.autofetch_all(sql, args=args, **kwargs)
@@ -276,19 +304,13 @@ class DbWrapper:
         query = query + str(query_where)
 
         res = self.execute(query)
-        list_of_coords: List[Location] = []
-        for (latitude, longitude) in res:
-            list_of_coords.append(Location(latitude, longitude))
-
         if geofence_helper is not None:
-            geofenced_coords = geofence_helper.get_geofenced_coordinates(
-                list_of_coords)
-            return geofenced_coords
-        else:
-            return list_of_coords
+            inside = geofence_helper.get_geofenced_mask(res).tolist()
+            return [Location(latitude, longitude) for (latitude, longitude), keep in zip(res, inside) if keep]
+        return [Location(latitude, longitude) for (latitude, longitude) in res]
 
     def quests_from_db(self, ne_lat=None, ne_lon=None, sw_lat=None, sw_lon=None, o_ne_lat=None, o_ne_lon=None,
-                       o_sw_lat=None, o_sw_lon=None, timestamp=None, fence=None):
+                       o_sw_lat=None, o_sw_lon=None, timestamp=None, fence=None, pokestop_ids=None):
         """
         Retrieve all the pokestops valid within the area set by geofence_helper
         :return: numpy array with coords
@@ -333,7 +355,14 @@ class DbWrapper:
             query_where = query_where + " and ST_CONTAINS(ST_GEOMFROMTEXT( 'POLYGON(( {} ))'), " \
                                         "POINT(pokestop.latitude, pokestop.longitude))".format(str(fence))
 
-        res = self.execute(query + query_where)
+        query_args = None
+        if pokestop_ids is not None:
+            if not pokestop_ids:
+                return questinfo
+            query_where += " AND trs_quest.GUID IN ({})".format(",".join(["%s"] * len(pokestop_ids)))
+            query_args = tuple(pokestop_ids)
+
+        res = self.execute(query + query_where, query_args)
 
         for (pokestop_id, latitude, longitude, quest_type, quest_stardust, quest_pokemon_id,
              quest_pokemon_form_id, quest_pokemon_costume_id, quest_reward_type,
@@ -411,14 +440,16 @@ class DbWrapper:
             elif latitude is None or longitude is None:
                 logger.warning("lat or lng is none")
                 continue
-            elif geofence_helper and not geofence_helper.is_coord_inside_include_geofence(
-                    [latitude, longitude]):
-                logger.debug3("Excluded encounter at {}, {} since the coordinate is not inside the given include "
-                              " fences", latitude, longitude)
-                continue
 
             next_to_encounter.append((pokemon_id, Location(latitude, longitude), encounter_id, seen_type, cellid))
 
+        if geofence_helper and next_to_encounter:
+            inside = geofence_helper.get_geofenced_mask(
+                [location for _, location, _, _, _ in next_to_encounter]).tolist()
+            logger.debug3("Excluded {} encounters since the coordinates are not inside the given include fences",
+                          inside.count(False))
+            next_to_encounter = [encounter for encounter, keep in zip(next_to_encounter, inside) if keep]
+
         # now filter by the order of eligible_mon_ids
         to_be_encountered = []
         i = 0
@@ -554,31 +585,32 @@ class DbWrapper:
 
         # fetch gyms only in a certain rectangle
         query_where = (
-            " WHERE (latitude >= {} AND longitude >= {} "
-            " AND latitude <= {} AND longitude <= {}) "
-        ).format(sw_lat, sw_lon, ne_lat, ne_lon)
+            " WHERE (gym.latitude >= %s AND gym.longitude >= %s "
+            " AND gym.latitude <= %s AND gym.longitude <= %s) "
+        )
+        args = [sw_lat, sw_lon, ne_lat, ne_lon]
 
         # but don't fetch gyms from a known rectangle
         if o_ne_lat is not None and o_ne_lon is not None and o_sw_lat is not None and o_sw_lon is not None:
             oquery_where = (
-                " AND NOT (latitude >= {} AND longitude >= {} "
-                " AND latitude <= {} AND longitude <= {}) "
-            ).format(o_sw_lat, o_sw_lon, o_ne_lat, o_ne_lon)
+                " AND NOT (gym.latitude >= %s AND gym.longitude >= %s "
+                " AND gym.latitude <= %s AND gym.longitude <= %s) "
+            )
+            args += [o_sw_lat, o_sw_lon, o_ne_lat, o_ne_lon]
 
             query_where = query_where + oquery_where
 
         # there's no old rectangle so check for a timestamp to send only updated stuff
         elif timestamp is not None:
-            tsdt = datetime.utcfromtimestamp(int(timestamp)).strftime("%Y-%m-%d %H:%M:%S")
+            tsdt = datetime.utcfromtimestamp(int(float(timestamp))).strftime("%Y-%m-%d %H:%M:%S")
 
-            # TODO ish: until we don't show any other information like raids
-            #          we can use last_modified, since that will give us actual
-            #          changes like gym color change
-            oquery_where = " AND last_modified >= '{}' ".format(tsdt)
+            # gym changes like a team change update last_modified, new raids only the raid row
+            oquery_where = " AND (gym.last_modified >= %s OR raid.last_scanned >= %s) "
+            args += [tsdt, tsdt]
 
             query_where = query_where + oquery_where
 
-        res = self.execute(query + query_where)
+        res = self.execute(query + query_where, tuple(args))
 
         for (gym_id, latitude, longitude, name, url, team_id, last_updated,
              level, spawn, start, end, mon_id, form, costume, evolution, last_scanned) in res:
@@ -627,31 +659,34 @@ class DbWrapper:
             "height, gender, form, costume, weather_boosted_condition, "
             "last_modified, seen_type "
             "FROM pokemon "
-            "WHERE disappear_time > '{}'"
-        ).format(now)
+            "WHERE disappear_time > %s"
+        )
 
         query_where = (
-            " AND (latitude >= {} AND longitude >= {} "
-            " AND latitude <= {} AND longitude <= {}) "
-        ).format(sw_lat, sw_lon, ne_lat, ne_lon)
+            " AND (latitude >= %s AND longitude >= %s "
+            " AND latitude <= %s AND longitude <= %s) "
+        )
+        args = [now, sw_lat, sw_lon, ne_lat, ne_lon]
 
         if o_ne_lat is not None and o_ne_lon is not None and o_sw_lat is not None and o_sw_lon is not None:
             oquery_where = (
-                " AND NOT (latitude >= {} AND longitude >= {} "
-                " AND latitude <= {} AND longitude <= {}) "
-            ).format(o_sw_lat, o_sw_lon, o_ne_lat, o_ne_lon)
+                " AND NOT (latitude >= %s AND longitude >= %s "
+                " AND latitude <= %s AND longitude <= %s) "
+            )
+            args += [o_sw_lat, o_sw_lon, o_ne_lat, o_ne_lon]
 
             query_where = query_where + oquery_where
 
         # there's no old rectangle so check for a timestamp to send only updated stuff
         elif timestamp is not None:
-            tsdt = datetime.utcfromtimestamp(int(timestamp)).strftime("%Y-%m-%d %H:%M:%S")
+            tsdt = datetime.utcfromtimestamp(int(float(timestamp))).strftime("%Y-%m-%d %H:%M:%S")
 
-            oquery_where = " AND last_modified >= '{}' ".format(tsdt)
+            oquery_where = " AND last_modified >= %s "
+            args += [tsdt]
 
             query_where = query_where + oquery_where
 
-        res = self.execute(query + query_where)
+        res = self.execute(query + query_where, tuple(args))
 
         for (encounter_id, spawnpoint_id, pokemon_id, latitude, longitude,
              disappear_time, individual_attack, individual_defense,
@@ -660,8 +695,10 @@ class DbWrapper:
              weather_boosted_condition, last_modified, seen_type) in res:
 
             if seen_type is not None and "nearby" in seen_type:
-                latitude += random.uniform(-0.0003, 0.0003)
-                longitude += random.uniform(-0.0005, 0.0005)
+                # jitter by encounter to keep the position of a mon stable between requests
+                jitter = random.Random(encounter_id)
+                latitude += jitter.uniform(-0.0003, 0.0003)
+                longitude += jitter.uniform(-0.0005, 0.0005)
             mons.append({
                 "encounter_id": encounter_id,
                 "spawnpoint_id": spawnpoint_id,
@@ -717,7 +754,7 @@ class DbWrapper:
             args += [o_sw_lat, o_sw_lon, o_ne_lat, o_ne_lon]
             query_where = query_where + oquery_where
         elif timestamp is not None:
-            tsdt = datetime.utcfromtimestamp(int(timestamp)).strftime("%Y-%m-%d %H:%M:%S")
+            tsdt = datetime.utcfromtimestamp(int(float(timestamp))).strftime("%Y-%m-%d %H:%M:%S")
             oquery_where = " AND ps.`last_updated` >= %%s "
             args += [tsdt]
             query_where = query_where + oquery_where
@@ -726,17 +763,8 @@ class DbWrapper:
             conversion_txt.append(adjust_tz_to_utc(conversion))
         sql = query + query_where
         pokestops = self.autofetch_all(sql % tuple(conversion_txt), args=tuple(args))
-        quests = self.quests_from_db(
-            ne_lat=ne_lat,
-            ne_lon=ne_lon,
-            sw_lat=sw_lat,
-            sw_lon=sw_lon,
-            o_ne_lat=o_ne_lat,
-            o_ne_lon=o_ne_lon,
-            o_sw_lat=o_sw_lat,
-            o_sw_lon=o_sw_lon,
-            timestamp=timestamp
-        )
+        # look up the quests of exactly the returned stops, a stop may have been updated before its quest was
+        quests = self.quests_from_db(pokestop_ids=[pokestop['pokestop_id'] for pokestop in pokestops])
         for pokestop in pokestops:
             pokestop['has_quest'] = pokestop['pokestop_id'] in quests
         return pokestops
@@ -749,6 +777,8 @@ class DbWrapper:
         )
         update_vars = (latitude, longitude, fort_id)
         self.execute(query, update_vars, commit=True)
+        if fort_id in self._stop_index:
+            self._stop_index.update([(fort_id, latitude, longitude)])
 
     def delete_stop(self, latitude: float, longitude: float):
         logger.debug3('Deleting stop from db')
@@ -757,6 +787,7 @@ class DbWrapper:
         )
         del_vars = (latitude, longitude)
         self.execute(query, del_vars, commit=True)
+        self._stop_index.remove_at(float(latitude), float(longitude))
 
     def flush_levelinfo(self, origin):
         query = "DELETE FROM trs_visited WHERE origin=%s"
@@ -788,22 +819,19 @@ class DbWrapper:
             "eventid in ({})"
         ).format(min_lat, min_lon, max_lat, max_lon, str(', '.join(str(v) for v in event_ids)))
 
-        list_of_coords: List[Location] = []
         logger.debug3("DbWrapper::get_detected_spawns executing select query")
         res = self.execute(query)
         logger.debug4("DbWrapper::get_detected_spawns result of query: {}", res)
-        for (latitude, longitude) in res:
-            list_of_coords.append(Location(latitude, longitude))
 
         if geofence_helper is not None:
             logger.debug3("DbWrapper::get_detected_spawns applying geofence")
-            geofenced_coords = geofence_helper.get_geofenced_coordinates(
-                list_of_coords)
+            inside = geofence_helper.get_geofenced_mask(res).tolist()
+            geofenced_coords: List[Location] = [Location(latitude, longitude)
+                                                for (latitude, longitude), keep in zip(res, inside) if keep]
             logger.debug4(geofenced_coords)
             return geofenced_coords
         else:
-            logger.debug3("DbWrapper::get_detected_spawns converting to numpy")
-            return list_of_coords
+            return [Location(latitude, longitude) for (latitude, longitude) in res]
 
     def get_undetected_spawns(self, geofence_helper, include_event_id):
         logger.debug3("DbWrapper::get_undetected_spawns called")
@@ -904,10 +932,8 @@ class DbWrapper:
             "SELECT spawnpoint "
             "FROM `trs_spawn`"
         )
-        res = self.execute(query)
-
-        for (spawnid, ) in res:
-            spawn.append(str(spawnid))
+        for rows in self.execute_stream(query):
+            spawn.extend(str(spawnid) for (spawnid, ) in rows)
 
         return spawn
 
@@ -962,33 +988,36 @@ class DbWrapper:
                            "< DATE(NOW()) - INTERVAL {} DAY)".format(str(olderthanxdays), str(olderthanxdays))
 
         query += query_where
-        res = self.execute(query)
-
-        for (spawnid, lat, lon, endtime, spawndef, last_scanned, first_detection, last_non_scanned, eventname,
-             eventid) in res:
-            spawn[spawnid] = {
-                'id': spawnid,
-                'lat': lat,
-                'lon': lon,
-                'endtime': endtime,
-                'spawndef': spawndef,
-                'lastscan': str(last_scanned),
-                'lastnonscan': str(last_non_scanned),
-                'first_detection': int(first_detection.timestamp()),
-                'event': eventname,
-                'eventid': eventid
-            }
+        for rows in self.execute_stream(query):
+            for (spawnid, lat, lon, endtime, spawndef, last_scanned, first_detection, last_non_scanned, eventname,
+                 eventid) in rows:
+                spawn[spawnid] = {
+                    'id': spawnid,
+                    'lat': lat,
+                    'lon': lon,
+                    'endtime': endtime,
+                    'spawndef': spawndef,
+                    'lastscan': str(last_scanned),
+                    'lastnonscan': str(last_non_scanned),
+                    'first_detection': int(first_detection.timestamp()),
+                    'event': eventname,
+                    'eventid': eventid
+                }
 
         return str(json.dumps(spawn))
 
-    def retrieve_next_spawns(self, geofence_helper):
+    def retrieve_next_spawns(self, geofence_helper, within: Optional[int] = None) -> List[NextSpawn]:
         """
-        Retrieve the spawnpoints with their respective unixtimestamp that are due in the next 300 seconds
+        Retrieve the spawnpoints with their respective unixtimestamp that are due in the next hour
         Check for Event and select only normal and (if active) current Event Spawns
+        :param within: only return the spawns due in the next within seconds
         :return:
         """
 
         logger.debug3("DbWrapper::retrieve_next_spawns called")
+        spawn_timetable = self._get_spawn_timetable(geofence_helper)
+        if spawn_timetable is not None:
+            return spawn_timetable.get_next_spawns(within=within, current_time=time.time())
 
         current_time_of_day = datetime.now().replace(microsecond=0)
         min_lat, min_lon, max_lat, max_lon = geofence_helper.get_polygon_from_fence()
@@ -1026,9 +1055,94 @@ class DbWrapper:
             timestamp = time.mktime(temp_date.timetuple()) - spawn_duration_minutes * 60
             # check if we calculated a time in the past, if so, add an hour to it...
             timestamp = timestamp + 60 * 60 if timestamp < current_time else timestamp
+            if within is not None and timestamp >= current_time + within:
+                continue
             next_up.append((timestamp, Location(latitude, longitude)))
         return next_up
 
+    def _get_spawn_timetable(self, geofence_helper: GeofenceHelper) -> Optional[SpawnTimetable]:
+        """
+        Spawn timetable of the geofence, loaded on first use. The spawnpoints seen in the DB since the last refresh
+        (e.g. despawn times learned by the MITM data processors) are added every --spawn_timetable_interval
+        seconds, the timetable is loaded again if the event changed.
+        :return: None if the timetables are disabled
+        """
+        interval = self.application_args.spawn_timetable_interval
+        if interval <= 0 or geofence_helper is None:
+            return None
+        spawn_timetable = self._spawn_timetables.get(geofence_helper)
+        with spawn_timetable.lock:
+            now = time.time()
+            if (now - spawn_timetable.loaded_at > SPAWN_TIMETABLE_RELOAD_INTERVAL
+                    or spawn_timetable.event_id != self._event_id):
+                spawn_timetable.clear()
+                spawn_timetable.loaded_at = now
+                spawn_timetable.watermark = None
+                spawn_timetable.event_id = self._event_id
+            elif now - spawn_timetable.refreshed_at <= interval:
+                return spawn_timetable
+            min_lat, min_lon, max_lat, max_lon = geofence_helper.get_polygon_from_fence()
+            query = (
+                "SELECT spawnpoint, latitude, longitude, spawndef, calc_endminsec, last_scanned, last_non_scanned "
+                "FROM trs_spawn "
+                "WHERE calc_endminsec IS NOT NULL "
+                "AND latitude >= %s AND longitude >= %s AND latitude <= %s AND longitude <= %s "
+                "AND eventid in (1, %s)"
+            )
+            args = (min_lat, min_lon, max_lat, max_lon, self._event_id)
+            if spawn_timetable.watermark is not None:
+                query += " AND (last_scanned >= %s OR last_non_scanned >= %s)"
+                since = spawn_timetable.watermark - timedelta(seconds=SPAWN_TIMETABLE_REFRESH_OVERLAP)
+                args += (since, since)
+            res = self.execute(query, args)
+            spawn_timetable.refreshed_at = now
+            if res:
+                inside = geofence_helper.get_geofenced_mask(
+                    [(row[1], row[2]) for row in res]).tolist()
+                spawn_timetable.update(row[:5] for row, keep in zip(res, inside) if keep)
+                for last_seen in (last_seen for row in res for last_seen in row[5:] if last_seen is not None):
+                    if spawn_timetable.watermark is None or last_seen > spawn_timetable.watermark:
+                        spawn_timetable.watermark = last_seen
+            if spawn_timetable.loaded_at == now:
+                logger.debug("Loaded {} spawnpoints to a spawn timetable in {:.1f}s", len(spawn_timetable),
+                             time.time() - now)
+        return spawn_timetable
+
+    def _get_stop_index(self) -> Optional[StopIndex]:
+        """
+        Index of the stops for nearest stop lookups, loaded on first use. The stops changed in the DB (e.g. by the
+        MITM data processors) are added every --stop_index_interval seconds.
+        :return: None if the index is disabled
+        """
+        interval = self.application_args.stop_index_interval
+        if interval <= 0:
+            return None
+        stop_index = self._stop_index
+        with stop_index.lock:
+            now = time.time()
+            if now - stop_index.loaded_at > STOP_INDEX_RELOAD_INTERVAL:
+                stop_index.clear()
+                stop_index.loaded_at = now
+                stop_index.watermark = None
+            elif now - stop_index.refreshed_at <= interval:
+                return stop_index
+            query = "SELECT pokestop_id, latitude, longitude, last_updated FROM pokestop"
+            if stop_index.watermark is None:
+                res = self.execute(query)
+                logger.info("Loaded {} stops to the stop index in {:.1f}s", len(res), time.time() - now)
+            else:
+                res = self.execute(query + " WHERE last_updated >= %s", (stop_index.watermark,))
+            stop_index.refreshed_at = now
+            stop_index.update((pokestop_id, latitude, longitude) for pokestop_id, latitude, longitude, _ in res)
+            for (_, _, _, last_updated) in res:
+                if last_updated is not None and (stop_index.watermark is None or last_updated > stop_index.watermark):
+                    stop_index.watermark = last_updated
+        return stop_index
+
+    def _get_visited_stop_ids(self, origin: str) -> Set[str]:
+        res = self.execute("SELECT pokestop_id FROM trs_visited WHERE origin=%s", (origin,))
+        return {pokestop_id for (pokestop_id,) in res}
+
     def get_stop_ids_and_locations_nearby(self, location: Location, max_distance: int = 0.5) \
             -> Dict[str, Tuple[Location, datetime]]:
         """
@@ -1044,12 +1158,30 @@ class DbWrapper:
             logger.warning("Cannot search for stops at negative range...")
             return {}
 
-        query = (
-            "SELECT pokestop_id, latitude, longitude, last_updated "
-            "FROM pokestop "
-            "WHERE SQRT(POW(69.1 * (latitude - {}), 2) + POW(69.1 * ({} - longitude), 2)) <= {} "
-        ).format(location.lat, location.lng, max_distance)
-        res = self.execute(query)
+        radius = max_distance / MILES_PER_DEGREE
+        stop_index = self._get_stop_index()
+        if stop_index is not None:
+            stop_ids = [stop_id for stop_id, _, _ in stop_index.within(location.lat, location.lng, radius)]
+            if not stop_ids:
+                res = []
+            else:
+                # the current location and update time of the stops found
+                query = (
+                    "SELECT pokestop_id, latitude, longitude, last_updated "
+                    "FROM pokestop "
+                    "WHERE pokestop_id IN ({})"
+                ).format(", ".join(["%s"] * len(stop_ids)))
+                res = self.execute(query, tuple(stop_ids))
+        else:
+            # the bounding box allows using the index of the coordinates
+            query = (
+                "SELECT pokestop_id, latitude, longitude, last_updated "
+                "FROM pokestop "
+                "WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s "
+                "AND SQRT(POW(69.1 * (latitude - %s), 2) + POW(69.1 * (%s - longitude), 2)) <= %s"
+            )
+            res = self.execute(query, (location.lat - radius, location.lat + radius, location.lng - radius,
+                                       location.lng + radius, location.lat, location.lng, max_distance))
 
         if not res:
             logger.warning("No stops found closeby to {} in range of {}m", str(location), max_distance)
@@ -1064,73 +1196,55 @@ class DbWrapper:
     def get_nearest_stops_from_position(self, geofence_helper, origin: str, lat, lon, limit: int = 20,
                                         ignore_spinned: bool = True, maxdistance: int = 1) -> List[Location]:
         """
-        Retrieve the nearest stops from lat / lon (optional with limit)
+        Retrieve the stops inside the geofence closest to lat / lon, the closest first
+        :param limit: maximum amount of stops returned, all stops if <= 0
+        :param ignore_spinned: skip the stops the origin has visited already
+        :param maxdistance: radius (in miles) searched first if the stop index is disabled
         :return:
         """
-
         logger.debug3("DbWrapper::get_nearest_stops_from_position called")
-        limitstr: str = ""
-        ignore_spinnedstr: str = ""
-        loopcount: int = 0
-        getlocations: bool = False
-
+        stop_index = self._get_stop_index()
+        if stop_index is None:
+            return self.__get_nearest_stops_from_db(geofence_helper, origin, lat, lon, limit, ignore_spinned,
+                                                    maxdistance)
+        visited: Set[str] = self._get_visited_stop_ids(origin) if ignore_spinned else set()
+        fenced_index = stop_index.get_fenced_index(geofence_helper) if geofence_helper is not None else stop_index
+        return [Location(stop_lat, stop_lng)
+                for _, stop_lat, stop_lng in fenced_index.nearest(float(lat), float(lon), limit, exclude=visited)]
+
+    def __get_nearest_stops_from_db(self, geofence_helper, origin: str, lat, lon, limit: int,
+                                    ignore_spinned: bool, maxdistance: int) -> List[Location]:
+        """
+        Query the stops within a box around lat / lon (bounded by the box of the geofence), doubling the box until
+        enough stops are found
+        """
         min_lat, min_lon, max_lat, max_lon = geofence_helper.get_polygon_from_fence()
-        if limit > 0:
-            limitstr = "limit {}".format(limit)
-
-        if ignore_spinned:
-            ignore_spinnedstr = "AND trs_visited.origin IS NULL"
-
-        while not getlocations:
-
-            loopcount += 1
-            if loopcount >= 10:
-                logger.warning("Not getting any new stop - abort")
-                return []
-
-            query = (
-                "SELECT latitude, longitude, SQRT("
-                "POW(69.1 * (latitude - {}), 2) + "
-                "POW(69.1 * ({} - longitude), 2)) AS distance "
-                "FROM pokestop "
-                "LEFT JOIN trs_visited ON (pokestop.pokestop_id = trs_visited.pokestop_id AND trs_visited.origin='{}') "
-                "where SQRT(POW(69.1 * (latitude - {}), 2) + POW(69.1 * ({} - longitude), 2)) <= {} and "
-                "(latitude >= {} AND longitude >= {} AND latitude <= {} AND longitude <= {}) "
-                "{} ORDER BY distance {} "
-            ).format(lat, lon, origin, lat, lon, maxdistance, min_lat, min_lon, max_lat, max_lon, ignore_spinnedstr,
-                     limitstr)
-
-            res = self.execute(query)
-
-            # getting 0 new locations - more distance!
-            if len(res) == 0 or len(res) < limit:
-                logger.debug("No location found or not getting enough locations - increasing distance")
-                maxdistance += 2
-
-            else:
-                # getting new locations
-                logger.info("Getting enough locations - checking the coords now")
-
-                stops: List[Location] = []
-
-                for (latitude, longitude, _distance) in res:
-                    stops.append(Location(latitude, longitude))
-
-                if geofence_helper is not None:
-                    geofenced_coords = geofence_helper.get_geofenced_coordinates(stops)
-                    if len(geofenced_coords) == limit:
-                        return geofenced_coords
-                    logger.debug("The coords are out of the fence - increasing distance")
-                    if loopcount >= 5:
-                        # setting middle of fence as new startposition
-                        lat, lon = geofence_helper.get_middle_from_fence()
-                    else:
-                        maxdistance += 3
-                else:
-                    return stops
-
-        logger.warning("Not getting any new stop - abort")
-        return []
+        lat, lon = float(lat), float(lon)
+        ignore_spinnedstr: str = "AND trs_visited.origin IS NULL" if ignore_spinned else ""
+        query = (
+            "SELECT pokestop.latitude, pokestop.longitude "
+            "FROM pokestop "
+            "LEFT JOIN trs_visited ON (pokestop.pokestop_id = trs_visited.pokestop_id AND trs_visited.origin=%s) "
+            "WHERE pokestop.latitude BETWEEN %s AND %s AND pokestop.longitude BETWEEN %s AND %s "
+            "{}"
+        ).format(ignore_spinnedstr)
+        radius = max(maxdistance, 1) / MILES_PER_DEGREE
+        while True:
+            covers_fence = lat - radius <= min_lat and lat + radius >= max_lat \
+                and lon - radius <= min_lon and lon + radius >= max_lon
+            res = self.execute(query, (origin, max(lat - radius, min_lat), min(lat + radius, max_lat),
+                                       max(lon - radius, min_lon), min(lon + radius, max_lon)))
+            stops = geofence_helper.get_geofenced_coordinates([Location(latitude, longitude)
+                                                               for (latitude, longitude) in res])
+            stops_by_distance = sorted((math.hypot(float(stop.lat) - lat, float(stop.lng) - lon), stop)
+                                       for stop in stops)
+            # stops outside the box may be closer than the ones found in its corners
+            within_radius = [stop for distance, stop in stops_by_distance if distance <= radius]
+            if covers_fence or 0 < limit <= len(within_radius):
+                found = [stop for _, stop in stops_by_distance] if covers_fence else within_radius
+                return found[:limit] if limit > 0 else found
+            logger.debug("Not getting enough locations - increasing distance")
+            radius *= 2
 
     def save_last_walker_position(self, origin, lat, lng):
         logger.debug3("dbWrapper::save_last_walker_position")
@@ -1296,25 +1410,28 @@ class DbWrapper:
         )
 
         query_where = (
-            " WHERE (center_latitude >= {} AND center_longitude >= {} "
-            " AND center_latitude <= {} AND center_longitude <= {}) "
-        ).format(sw_lat, sw_lon, ne_lat, ne_lon)
+            " WHERE (center_latitude >= %s AND center_longitude >= %s "
+            " AND center_latitude <= %s AND center_longitude <= %s) "
+        )
+        args = [sw_lat, sw_lon, ne_lat, ne_lon]
 
         if o_ne_lat is not None and o_ne_lon is not None and o_sw_lat is not None and o_sw_lon is not None:
             oquery_where = (
-                " AND NOT (center_latitude >= {} AND center_longitude >= {} "
-                " AND center_latitude <= {} AND center_longitude <= {}) "
-            ).format(o_sw_lat, o_sw_lon, o_ne_lat, o_ne_lon)
+                " AND NOT (center_latitude >= %s AND center_longitude >= %s "
+                " AND center_latitude <= %s AND center_longitude <= %s) "
+            )
+            args += [o_sw_lat, o_sw_lon, o_ne_lat, o_ne_lon]
 
             query_where = query_where + oquery_where
 
         elif timestamp is not None:
-            tsdt = datetime.utcfromtimestamp(int(timestamp)).strftime("%Y-%m-%d %H:%M:%S")
-            oquery_where = " AND updated >= '{}' ".format(tsdt)
+            # updated is stored as epoch
+            oquery_where = " AND updated >= %s "
+            args += [int(float(timestamp))]
 
             query_where = query_where + oquery_where
 
-        res = self.execute(query + query_where)
+        res = self.execute(query + query_where, tuple(args))
 
         cells = []
         for (cell_id, level, center_latitude, center_longitude, updated) in res:
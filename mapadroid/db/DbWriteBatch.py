@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+
+class DbWriteBatch:
+    """
+    Collects the rows of multiple executemany calls so they can be written in a single transaction.
+    Rows are grouped per SQL statement and - if the position of the primary key is known - de-duplicated by
+    it, keeping the most recent row or the row merged from all rows of a key by the merge function given for the
+    statement. Statements are written in the order they were first added.
+    """
+
+    def __init__(self):
+        self._statements: OrderedDict = OrderedDict()
+        self._key_columns = {}
+        self.row_count: int = 0
+
+    def add(self, sql: str, rows: list, key_columns: Optional[int] = 1,
+            merge: Optional[Callable[[tuple, tuple], tuple]] = None):
+        """
+        Add rows for the given statement
+        :param sql: the statement the rows are to be used with
+        :param rows: list of argument tuples
+        :param key_columns: number of leading columns forming the primary key. None disables de-duplication
+        :param merge: function combining the previous row of a key with a new one, e.g. for columns the statement
+            only updates if the new value is not NULL. The new row replaces the previous one by default
+        """
+        if not rows:
+            return
+        if sql not in self._statements:
+            self._statements[sql] = OrderedDict() if key_columns else []
+            self._key_columns[sql] = key_columns
+        collected = self._statements[sql]
+        if key_columns:
+            for row in rows:
+                key = tuple(row[:key_columns])
+                previous = collected.get(key) if merge is not None else None
+                collected[key] = merge(previous, row) if previous is not None else row
+        else:
+            collected.extend(rows)
+        self.row_count += len(rows)
+
+    def statements(self) -> List[Tuple[str, list]]:
+        """
+        Returns the collected statements with their rows. De-duplicated rows are sorted by their key to have
+        concurrent batches lock rows in the same order.
+        """
+        result = []
+        for sql, collected in self._statements.items():
+            if isinstance(collected, OrderedDict):
+                try:
+                    rows = [collected[key] for key in sorted(collected.keys())]
+                except TypeError:
+                    rows = list(collected.values())
+            else:
+                rows = list(collected)
+            result.append((sql, rows))
+        return result
+
+    def unique_row_count(self) -> int:
+        return sum(len(collected) for collected in self._statements.values())
+
+    def __len__(self):
+        return len(self._statements)
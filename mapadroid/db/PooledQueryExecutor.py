@@ -1,21 +1,94 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from multiprocessing import Lock, Semaphore
 from multiprocessing.managers import SyncManager
+from typing import Dict, List, Optional
 
 import mysql
 from mysql.connector import ProgrammingError
 from mysql.connector.pooling import MySQLConnectionPool
 
 from mapadroid.utils.logging import LoggerEnums, get_logger
+from mapadroid.utils.metrics import Histogram
 
 logger = get_logger(LoggerEnums.database)
 
+# MySQL error returned for statements prepared on a connection that has been re-established since
+ER_UNKNOWN_STMT_HANDLER = 1243
+
+DB_POOL_WAIT_SECONDS = Histogram("mad_db_pool_wait_seconds", "Time waited for a free connection of the DB pool")
+DB_WRITE_SECONDS = Histogram("mad_db_write_seconds", "Time to execute a statement writing to a table, by table",
+                             ["table"])
+WRITE_STATEMENT = re.compile(r"^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+IGNORE)?|DELETE\s+FROM)"
+                             r"\s+`?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def get_written_table(sql: str) -> Optional[str]:
+    """
+    :return: the table written by an INSERT, REPLACE, UPDATE or DELETE statement, None for other statements
+    """
+    match = WRITE_STATEMENT.match(sql)
+    return match.group(1) if match else None
+
 
 class PooledQuerySyncManager(SyncManager):
     pass
 
 
+class StatementStatistics:
+    """
+    Counts the executions, rows, failures and execution time per SQL statement. Once max_statements distinct
+    statements are known, further statements are counted as OTHER_STATEMENTS.
+    """
+    OTHER_STATEMENTS = "(other statements)"
+
+    def __init__(self, max_statements: int = 500):
+        self._max_statements: int = max_statements
+        # sql -> [calls, rows, failures, total seconds, max seconds]
+        self._statements: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, duration: float, rows: int = 0, failed: bool = False):
+        with self._lock:
+            counters = self._statements.get(sql)
+            if counters is None:
+                if len(self._statements) >= self._max_statements:
+                    sql = self.OTHER_STATEMENTS
+                counters = self._statements.setdefault(sql, [0, 0, 0, 0.0, 0.0])
+            counters[0] += 1
+            counters[1] += rows
+            counters[2] += 1 if failed else 0
+            counters[3] += duration
+            counters[4] = max(counters[4], duration)
+
+    def get(self, limit: Optional[int] = None) -> List[dict]:
+        """
+        :return: the counters per statement, the statements with the highest total execution time first
+        """
+        with self._lock:
+            statements = [(sql, list(counters)) for sql, counters in self._statements.items()]
+        statements.sort(key=lambda statement: statement[1][3], reverse=True)
+        return [{
+            "statement": sql,
+            "calls": calls,
+            "rows": rows,
+            "failures": failures,
+            "total_ms": round(total * 1000, 1),
+            "avg_ms": round(total / calls * 1000, 2),
+            "max_ms": round(maximum * 1000, 1)
+        } for sql, (calls, rows, failures, total, maximum) in statements[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+
+
 class PooledQueryExecutor:
-    def __init__(self, host, port, username, password, database, poolsize=1):
+    def __init__(self, host, port, username, password, database, poolsize=1, statement_cache_size=0):
         self.host = host
         self.port = port
         self.user = username
@@ -28,6 +101,11 @@ class PooledQueryExecutor:
 
         self._connection_semaphore = Semaphore(poolsize)
 
+        # prepared cursors per pooled connection, keyed by the SQL text in least recently used order
+        self._statement_cache_size: int = max(0, statement_cache_size)
+        self._statement_caches: Dict[int, OrderedDict] = {}
+        self._statement_statistics: StatementStatistics = StatementStatistics()
+
         self._init_pool()
 
     def _init_pool(self):
@@ -40,8 +118,11 @@ class PooledQueryExecutor:
             "database": self.database
         }
         with self._pool_mutex:
+            # resetting the session of a connection returned to the pool deallocates its prepared statements,
+            # transactions are ended explicitly in _release_connection instead
             self._pool = MySQLConnectionPool(pool_name="db_wrapper_pool",
                                              pool_size=self._poolsize,
+                                             pool_reset_session=self._statement_cache_size == 0,
                                              **dbconfig)
 
     def close(self, conn, cursor):
@@ -54,6 +135,99 @@ class PooledQueryExecutor:
         cursor.close()
         conn.close()
 
+    def _acquire_connection_slot(self):
+        start = time.perf_counter()
+        self._connection_semaphore.acquire()
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+    def _record_statement(self, sql, duration: float, rows: int = 0, failed: bool = False):
+        self._statement_statistics.record(sql, duration, rows, failed)
+        table = get_written_table(sql) if isinstance(sql, str) else None
+        if table is not None:
+            DB_WRITE_SECONDS.labels(table).observe(duration)
+
+    def _release_connection(self, conn, cursor=None, committed=False):
+        """
+        Close the cursor and return the connection to the pool. Without the session reset of the pool, a transaction
+        left open by a read is rolled back to not have the next user of the connection read a stale snapshot.
+        """
+        try:
+            if cursor is not None:
+                cursor.close()
+            if self._statement_cache_size > 0 and not committed:
+                conn.rollback()
+        except Exception as e:
+            logger.warning("Failed ending transaction of pooled connection: {}", e)
+        finally:
+            conn.close()
+            self._connection_semaphore.release()
+
+    def _get_statement_cache(self, conn) -> OrderedDict:
+        # pooled connections wrap the actual connection which is kept alive by the pool
+        actual_connection = getattr(conn, "_cnx", conn)
+        return self._statement_caches.setdefault(id(actual_connection), OrderedDict())
+
+    def _get_prepared_cursor(self, conn, sql):
+        """
+        Get the cursor holding the prepared statement of the given SQL on the connection, preparing the statement if
+        it is not cached yet
+        :return: the cursor and the SQL string to execute it with
+        """
+        statement_cache = self._get_statement_cache(conn)
+        cached = statement_cache.get(sql)
+        if cached is not None:
+            statement_cache.move_to_end(sql)
+            return cached
+        # the cursor re-prepares if it is not called with the identical string object, keep the one it got first
+        cached = (conn.cursor(prepared=True), sql)
+        statement_cache[sql] = cached
+        while len(statement_cache) > self._statement_cache_size:
+            _, (evicted_cursor, _) = statement_cache.popitem(last=False)
+            try:
+                evicted_cursor.close()
+            except Exception as e:
+                logger.debug("Failed closing evicted prepared statement: {}", e)
+        return cached
+
+    def _drop_statement_cache(self, conn):
+        statement_cache = self._get_statement_cache(conn)
+        for cursor, _ in statement_cache.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        statement_cache.clear()
+
+    def _execute_prepared(self, conn, sql, args):
+        cursor, cached_sql = self._get_prepared_cursor(conn, sql)
+        try:
+            cursor.execute(cached_sql, args)
+        except mysql.connector.Error as err:
+            if err.errno != ER_UNKNOWN_STMT_HANDLER:
+                raise
+            # the connection has been re-established, all statements prepared on it are gone
+            logger.debug("Prepared statements of a pooled connection are gone, preparing again")
+            self._drop_statement_cache(conn)
+            cursor, cached_sql = self._get_prepared_cursor(conn, sql)
+            cursor.execute(cached_sql, args)
+        return cursor
+
+    def get_statement_statistics(self, limit: Optional[int] = None) -> List[dict]:
+        """
+        :return: calls, rows, failures and execution times per SQL statement, most expensive statements first
+        """
+        return self._statement_statistics.get(limit)
+
+    def reset_statement_statistics(self):
+        self._statement_statistics.reset()
+
+    @staticmethod
+    def _display_args(args):
+        # We do not want to display binary data
+        if args and type(args) is tuple:
+            return [value[:10] if isinstance(value, bytes) else value for value in args]
+        return args
+
     def setup_cursor(self, conn, **kwargs):
         conn_args = {}
         use_dict = kwargs.get('use_dict', False)
@@ -68,71 +242,121 @@ class PooledQueryExecutor:
         """
         Execute a sql, it could be with args and with out args. The usage is
         similar with execute() function in module pymysql.
+        Parameterized single statements that are committed (or requested with prepared=True) are run as prepared
+        statements cached per connection if a statement cache size has been configured.
         :param sql: sql clause
         :param args: args need by sql clause
         :param commit: whether to commit
         :return: if commit, return None, else, return result
         """
-        self._connection_semaphore.acquire()
+        self._acquire_connection_slot()
         conn = self._pool.get_connection()
-        cursor = self.setup_cursor(conn, **kwargs)
         get_id = kwargs.get('get_id', False)
         get_dict = kwargs.get('get_dict', False)
         raise_exc = kwargs.get('raise_exc', False)
         suppress_log = kwargs.get('suppress_log', False)
-        # We do not want to display binary data
-        has_binary = False
-        disp_args = []
-        if args and type(args) is tuple:
-            for value in args:
-                if isinstance(value, bytes):
-                    disp_args.append(value[:10])
-                    has_binary = True
-                else:
-                    disp_args.append(value)
-        else:
-            disp_args = (args)
+        use_cache = (self._statement_cache_size > 0 and args not in (None, ()) and not kwargs.get('use_dict', False)
+                     and (commit or kwargs.get('prepared', False)))
+        cursor = None
+        committed = False
+        rows = 0
+        failed = False
+        start = time.perf_counter()
         try:
             multi = False
+            active_cursor = None
             if type(args) != tuple and args is not None:
                 args = (args,)
-            if sql.count(';') > 1:
+            if use_cache and sql in self._get_statement_cache(conn):
+                # only single statements are cached, no need to look for multiple statements
+                active_cursor = self._execute_prepared(conn, sql, args)
+            elif sql.count(';') > 1:
                 multi = True
                 for _ in conn.cmd_query_iter(sql):
                     pass
+            elif use_cache:
+                active_cursor = self._execute_prepared(conn, sql, args)
             else:
+                cursor = active_cursor = self.setup_cursor(conn, **kwargs)
                 cursor.execute(sql, args)
-            if not has_binary:
-                logger.debug3(cursor.statement)
-            else:
+            if args and any(isinstance(value, bytes) for value in args):
                 logger.debug3("SQL: {}", sql)
-                logger.debug3("Args: {}", disp_args)
+                logger.debug3("Args: {}", self._display_args(args))
+            elif active_cursor is not None:
+                logger.debug3(active_cursor.statement)
             if commit is True:
                 conn.commit()
+                committed = True
                 if not multi:
-                    affected_rows = cursor.rowcount
+                    affected_rows = active_cursor.rowcount
+                    rows = max(affected_rows, 0)
                     if get_id:
-                        return cursor.lastrowid
+                        return active_cursor.lastrowid
                     else:
                         return affected_rows
             else:
                 if not multi:
-                    res = cursor.fetchall()
+                    res = active_cursor.fetchall()
+                    rows = len(res)
                     if get_dict:
-                        return self.__convert_to_dict(cursor.column_names, res)
+                        return self.__convert_to_dict(active_cursor.column_names, res)
                     return res
         except mysql.connector.Error as err:
+            failed = True
             if not suppress_log:
-                logger.error("Failed executing query: {} ({}), error: {}", sql, disp_args, err)
+                logger.error("Failed executing query: {} ({}), error: {}", sql, self._display_args(args), err)
             if raise_exc:
                 raise err
             return None
         except Exception as e:
+            failed = True
             logger.error("Unspecified exception in dbWrapper: {}", str(e))
             return None
         finally:
-            self.close(conn, cursor)
-            self._connection_semaphore.release()
+            self._record_statement(sql, time.perf_counter() - start, rows, failed)
+            self._release_connection(conn, cursor, committed)
+
+    def execute_stream(self, sql, args=(), chunk_size=1000, **kwargs):
+        """
+        Execute a query and yield its rows in lists of up to chunk_size rows. The rows are fetched through an
+        unbuffered cursor, neither the executor nor the caller holds the complete result set. The connection is
+        held until the generator is exhausted or closed.
+        :param sql: sql clause
+        :param args: args need by sql clause
+        :param chunk_size: maximum amount of rows yielded at once
+        """
+        self._acquire_connection_slot()
+        conn = self._pool.get_connection()
+        cursor = conn.cursor(buffered=False)
+        raise_exc = kwargs.get('raise_exc', False)
+        rows = 0
+        failed = False
+        start = time.perf_counter()
+        try:
+            if not isinstance(args, tuple) and args is not None:
+                args = (args,)
+            cursor.execute(sql, args)
+            logger.debug3(cursor.statement)
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                rows += len(chunk)
+                yield chunk
+        except mysql.connector.Error as err:
+            failed = True
+            logger.error("Failed executing query: {} ({}), error: {}", sql, self._display_args(args), err)
+            if raise_exc:
+                raise err
+        finally:
+            try:
+                # the rows of a stream closed early have to be read before the connection can be used again
+                while conn.unread_result and cursor.fetchmany(chunk_size):
+                    pass
+            except Exception as e:
+                logger.debug("Failed discarding the remaining rows of a stream: {}", e)
+            self._record_statement(sql, time.perf_counter() - start, rows, failed)
+            self._release_connection(conn, cursor)
 
     def executemany(self, sql, args, commit=False, **kwargs):
         """
@@ -148,28 +372,75 @@ class PooledQueryExecutor:
             return None
 
         # get connection form connection pool instead of create one.
-        self._connection_semaphore.acquire()
+        self._acquire_connection_slot()
         conn = self._pool.get_connection()
         cursor = conn.cursor()
+        committed = False
+        failed = False
+        start = time.perf_counter()
 
         try:
             cursor.executemany(sql, args, **kwargs)
 
             if commit is True:
                 conn.commit()
+                committed = True
                 return None
             else:
                 res = cursor.fetchall()
                 return res
         except mysql.connector.Error as err:
+            failed = True
             logger.error("Failed executing query: {}", str(err))
             return None
         except Exception as e:
+            failed = True
             logger.error("Unspecified exception in dbWrapper: {}", str(e))
             return None
         finally:
-            self.close(conn, cursor)
-            self._connection_semaphore.release()
+            self._record_statement(sql, time.perf_counter() - start, len(args), failed)
+            self._release_connection(conn, cursor, committed)
+
+    def execute_batch(self, statements, retries=2):
+        """
+        Execute multiple executemany statements in one transaction on a single connection.
+        :param statements: list of (sql, args) tuples, args being a sequence of argument tuples
+        :param retries: amount of retries if the transaction was aborted by a deadlock
+        :return: True if the transaction has been committed, False otherwise
+        """
+        statements = [(sql, args) for sql, args in statements if args]
+        if not statements:
+            return True
+
+        self._acquire_connection_slot()
+        conn = self._pool.get_connection()
+        cursor = conn.cursor()
+        committed = False
+        try:
+            attempt = 0
+            while True:
+                try:
+                    for sql, args in statements:
+                        start = time.perf_counter()
+                        cursor.executemany(sql, args)
+                        self._record_statement(sql, time.perf_counter() - start, len(args))
+                    conn.commit()
+                    committed = True
+                    return True
+                except mysql.connector.Error as err:
+                    conn.rollback()
+                    # 1213: deadlock found when trying to get lock
+                    if err.errno == 1213 and attempt < retries:
+                        attempt += 1
+                        logger.debug("Deadlock executing batch, retrying ({}/{})", attempt, retries)
+                        continue
+                    logger.error("Failed executing batch of {} statements: {}", len(statements), str(err))
+                    return False
+        except Exception as e:
+            logger.error("Unspecified exception in dbWrapper: {}", str(e))
+            return False
+        finally:
+            self._release_connection(conn, cursor, committed)
 
     # ===================================================
     # =============== DB Helper Functions ===============
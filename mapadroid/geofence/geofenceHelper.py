@@ -1,4 +1,6 @@
-import sys
+from typing import List, Tuple
+
+import numpy as np
 
 from mapadroid.utils.logging import LoggerEnums, get_logger
 
@@ -6,21 +8,87 @@ logger = get_logger(LoggerEnums.system)
 
 # Most of the code is from RocketMap
 # https://github.com/RocketMap/RocketMap
-# Trying to import matplotlib, which is not compatible with all hardware.
-# Matlplotlib is faster for big calculations.
-try:
-    from matplotlib.path import Path
-except ImportError:
-    # Pass as this is an optional requirement. We're going to check later if it
-    # was properly imported and only use it if it's installed.
-    pass
+
+
+class CompiledPolygon:
+    """
+    Edges and bounding box of a geofence polygon, prepared once to check many coordinates against the polygon by
+    casting rays along the latitude axis.
+    """
+
+    def __init__(self, polygon: List[dict]):
+        lats = np.array([coord['lat'] for coord in polygon], dtype=np.float64)
+        lons = np.array([coord['lon'] for coord in polygon], dtype=np.float64)
+        self.min_lat, self.max_lat = lats.min(), lats.max()
+        self.min_lon, self.max_lon = lons.min(), lons.max()
+        # edge i goes from vertex i to vertex i + 1, the last one closes the polygon
+        next_lats, next_lons = np.roll(lats, -1), np.roll(lons, -1)
+        # edges parallel to the rays are never crossed
+        crossable = lons != next_lons
+        self._lat1, self._lon1 = lats[crossable], lons[crossable]
+        self._lat2, self._lon2 = next_lats[crossable], next_lons[crossable]
+        self._edge_min_lon = np.minimum(self._lon1, self._lon2)
+        self._edge_max_lon = np.maximum(self._lon1, self._lon2)
+        self._edge_max_lat = np.maximum(self._lat1, self._lat2)
+        self._dlat = self._lat2 - self._lat1
+        self._dlon = self._lon2 - self._lon1
+        self._horizontal = self._lat1 == self._lat2
+        self._edges: List[Tuple[float, float, float, float, float, float, float, bool]] = list(zip(
+            self._edge_min_lon.tolist(), self._edge_max_lon.tolist(), self._edge_max_lat.tolist(),
+            self._lat1.tolist(), self._lon1.tolist(), self._dlat.tolist(), self._dlon.tolist(),
+            self._horizontal.tolist()))
+
+    def in_bounding_box(self, coordinates: np.ndarray) -> np.ndarray:
+        return ((coordinates[:, 0] >= self.min_lat) & (coordinates[:, 0] <= self.max_lat) &
+                (coordinates[:, 1] >= self.min_lon) & (coordinates[:, 1] <= self.max_lon))
+
+    def contains(self, coordinates: np.ndarray) -> np.ndarray:
+        """
+        :param coordinates: Nx2 array of lat, lon
+        :return: boolean mask of the coordinates inside the polygon
+        """
+        inside = np.zeros(len(coordinates), dtype=bool)
+        candidates = np.flatnonzero(self.in_bounding_box(coordinates))
+        if len(candidates) == 0:
+            return inside
+        lats = coordinates[candidates, 0]
+        lons = coordinates[candidates, 1]
+        crossings = np.zeros(len(candidates), dtype=bool)
+        for edge in range(len(self._lat1)):
+            crossed = ((self._edge_min_lon[edge] < lons) & (lons <= self._edge_max_lon[edge]) &
+                       (lats <= self._edge_max_lat[edge]))
+            if not self._horizontal[edge]:
+                lat_intersection = (lons - self._lon1[edge]) * self._dlat[edge] / self._dlon[edge] + self._lat1[edge]
+                crossed &= lats <= lat_intersection
+            crossings ^= crossed
+        inside[candidates] = crossings
+        return inside
+
+    def contains_point(self, lat: float, lon: float) -> bool:
+        if lat > self.max_lat or lat < self.min_lat or lon > self.max_lon or lon < self.min_lon:
+            return False
+        inside = False
+        for edge_min_lon, edge_max_lon, edge_max_lat, lat1, lon1, dlat, dlon, horizontal in self._edges:
+            if edge_min_lon < lon <= edge_max_lon and lat <= edge_max_lat:
+                if horizontal or lat <= (lon - lon1) * dlat / dlon + lat1:
+                    inside = not inside
+        return inside
+
+
+def coordinates_to_array(coordinates) -> np.ndarray:
+    """
+    Build the Nx2 array of lat, lon expected by the batch methods from any sequence of n-tuples starting with
+    lat, lon
+    """
+    if isinstance(coordinates, np.ndarray):
+        return coordinates.astype(np.float64, copy=False).reshape(-1, 2)
+    return np.array([(coord[0], coord[1]) for coord in coordinates], dtype=np.float64).reshape(-1, 2)
 
 
 class GeofenceHelper:
     def __init__(self, include_geofence, exclude_geofence, fence_name=None):
         self.geofenced_areas = []
         self.excluded_areas = []
-        self.use_matplotlib = 'matplotlib' in sys.modules
         if include_geofence or exclude_geofence:
             self.geofenced_areas = self.parse_geofences_file(
                 include_geofence, excluded=False, fence_fallback=fence_name)
@@ -28,6 +96,8 @@ class GeofenceHelper:
                 exclude_geofence, excluded=True, fence_fallback=fence_name)
             logger.debug2("Loaded {} geofenced and {} excluded areas.", len(self.geofenced_areas),
                           len(self.excluded_areas))
+        self._geofenced_polygons: List[CompiledPolygon] = self._compile_areas(self.geofenced_areas)
+        self._excluded_polygons: List[CompiledPolygon] = self._compile_areas(self.excluded_areas)
 
     def get_polygon_from_fence(self):
         max_lat, min_lat, max_lon, min_lon = -90, 90, -180, 180
@@ -42,41 +112,46 @@ class GeofenceHelper:
         return min_lat, min_lon, max_lat, max_lon
 
     def is_coord_inside_include_geofence(self, coordinate):
+        lat, lon = coordinate[0], coordinate[1]
         # Coordinate is not valid if in one excluded area.
-        if self._is_excluded(coordinate):
-            return False
+        for polygon in self._excluded_polygons:
+            if polygon.contains_point(lat, lon):
+                return False
 
         # Coordinate is geofenced if in one geofenced area.
-        if self.geofenced_areas:
-            for va in self.geofenced_areas:
-                if self._in_area(coordinate, va):
-                    return True
-        else:
+        if not self.geofenced_areas:
             return True
+        for polygon in self._geofenced_polygons:
+            if polygon.contains_point(lat, lon):
+                return True
         return False
 
+    def get_geofenced_mask(self, coordinates) -> np.ndarray:
+        """
+        Check many coordinates at once
+        :param coordinates: Nx2 array of lat, lon (or a sequence of n-tuples starting with lat, lon)
+        :return: boolean mask of the coordinates inside the include geofences and outside the excluded areas
+        """
+        coordinates = coordinates_to_array(coordinates)
+        if self.geofenced_areas:
+            mask = np.zeros(len(coordinates), dtype=bool)
+            for polygon in self._geofenced_polygons:
+                mask |= polygon.contains(coordinates)
+        else:
+            mask = np.ones(len(coordinates), dtype=bool)
+        for polygon in self._excluded_polygons:
+            if not mask.any():
+                break
+            mask &= ~polygon.contains(coordinates)
+        return mask
+
     def get_geofenced_coordinates(self, coordinates):
 
         # Import: We are working with n-tuples in some functions be carefull
         # and do not break compatibility
-        logger.debug('Using matplotlib: {}.', self.use_matplotlib)
         logger.debug2('Found {} coordinates to geofence.', len(coordinates))
-
-        geofenced_coordinates = []
-        for coord in coordinates:
-            # Coordinate is not valid if in one excluded area.
-            if self._is_excluded(coord):
-                continue
-
-            # Coordinate is geofenced if in one geofenced area.
-            if self.geofenced_areas:
-                for va in self.geofenced_areas:
-                    if self._in_area(coord, va):
-                        geofenced_coordinates.append(coord)
-                        break
-            else:
-                geofenced_coordinates.append(coord)
-
+        mask = self.get_geofenced_mask(coordinates)
+        geofenced_coordinates = [coord for coord, inside in zip(coordinates, mask.tolist()) if inside]
         logger.debug2("Geofenced to {} coordinates", len(geofenced_coordinates))
         return geofenced_coordinates
 
@@ -121,67 +196,10 @@ class GeofenceHelper:
 
         return geofences
 
-    def _is_excluded(self, coordinate):
-        for ea in self.excluded_areas:
-            if self._in_area(coordinate, ea):
-                return True
-
-        return False
-
-    def _in_area(self, coordinate, area):
-        point = {'lat': coordinate[0], 'lon': coordinate[1]}
-        polygon = area['polygon']
-        if self.use_matplotlib:
-            return self.is_point_in_polygon_matplotlib(point, polygon)
-        else:
-            return self.is_point_in_polygon_custom(point, polygon)
-
-    @staticmethod
-    def is_point_in_polygon_matplotlib(point, polygon):
-        point_tuple = (point['lat'], point['lon'])
-        polygons = []
-        for coord in polygon:
-            coord_tuple = (coord['lat'], coord['lon'])
-            polygons.append(coord_tuple)
-
-        polygons.append(polygons[0])
-        path = Path(polygons)
-        return path.contains_point(point_tuple)
-
     @staticmethod
-    def is_point_in_polygon_custom(point, polygon):
-        # Initialize first coordinate as default.
-        max_lat = polygon[0]['lat']
-        min_lat = polygon[0]['lat']
-        max_lon = polygon[0]['lon']
-        min_lon = polygon[0]['lon']
-
-        for coords in polygon:
-            max_lat = max(coords['lat'], max_lat)
-            min_lat = min(coords['lat'], min_lat)
-            max_lon = max(coords['lon'], max_lon)
-            min_lon = min(coords['lon'], min_lon)
-
-        if ((point['lat'] > max_lat) or (point['lat'] < min_lat) or
-                (point['lon'] > max_lon) or (point['lon'] < min_lon)):
-            return False
-
-        inside = False
-        lat1, lon1 = polygon[0]['lat'], polygon[0]['lon']
-        poly_sides = len(polygon)
-        for poly_point in range(1, poly_sides + 1):
-            lat2, lon2 = polygon[poly_point % poly_sides]['lat'], polygon[poly_point % poly_sides]['lon']
-            if (min(lon1, lon2) < point['lon'] <= max(lon1, lon2) and
-                    point['lat'] <= max(lat1, lat2)):
-                if lon1 != lon2:
-                    lat_intersection = ((point['lon'] - lon1) * (lat2 - lat1) / (lon2 - lon1) + lat1)
-
-                if lat1 == lat2 or point['lat'] <= lat_intersection:
-                    inside = not inside
-
-            lat1, lon1 = lat2, lon2
-
-        return inside
+    def _compile_areas(areas) -> List[CompiledPolygon]:
+        # areas without any coordinates do not contain anything
+        return [CompiledPolygon(area['polygon']) for area in areas if area['polygon']]
 
     def get_middle_from_fence(self):
         max_lat, min_lat, max_lon, min_lon = -90, 90, -180, 180
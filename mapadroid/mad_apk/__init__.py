@@ -5,6 +5,7 @@ from .apk_enums import *  # noqa: F401 F403
 from .apk_storage_db import APKStorageDatabase  # noqa: F401
 from .apk_storage_fs import APKStorageFilesystem  # noqa: F401
 from .custom_types import *  # noqa: F401 F403
+from .delivery import PackageCache, get_package_cache  # noqa: F401
 from .utils import *  # noqa: F401 F403
 from .wizard import (APKWizard, InvalidFile, PackageImporter,  # noqa: F401
                      WizardError)
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from threading import Condition, Lock, Thread
+from typing import Callable, Generator, Iterable, Optional, Tuple
+
+from mapadroid.utils.logging import LoggerEnums, get_logger
+
+logger = get_logger(LoggerEnums.package_mgr)
+
+# (package, architecture, version, size)
+PackageKey = Tuple[int, int, str, int]
+
+
+class CachedPackage(object):
+    """ Chunks of a package loaded once from the storage.  Readers follow the chunks while they are still loaded
+
+    Args:
+        key (PackageKey): Package, architecture, version and size of the package
+    """
+
+    def __init__(self, key: PackageKey):
+        self.key: PackageKey = key
+        self.size: int = key[3]
+        self.chunks = []
+        self.loaded: int = 0
+        self.complete: bool = False
+        self.failed: bool = False
+        self._condition: Condition = Condition()
+
+    def append(self, chunk: bytes):
+        with self._condition:
+            self.chunks.append(chunk)
+            self.loaded += len(chunk)
+            self._condition.notify_all()
+
+    def finish(self, failed: bool = False):
+        with self._condition:
+            self.complete = True
+            self.failed = failed or self.loaded != self.size
+            self._condition.notify_all()
+
+    def iter_chunks(self) -> Generator:
+        index = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: index < len(self.chunks) or self.complete)
+                if index >= len(self.chunks):
+                    if self.failed:
+                        raise IOError("Loading package {} failed".format(self.key))
+                    return
+                chunk = self.chunks[index]
+            index += 1
+            yield chunk
+
+
+class PackageCache(object):
+    """ Bounded LRU cache of the packages recently requested from the database, keyed by their version.  Parallel
+        requests of a package not cached yet share a single load from the database
+
+    Args:
+        max_size (int): Maximum amount of bytes to keep
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self._packages: OrderedDict = OrderedDict()
+        self._lock: Lock = Lock()
+
+    def get(self, key: PackageKey, loader: Callable[[], Iterable[bytes]]) -> Optional[CachedPackage]:
+        """ Get the cached package, loading it in the background if required
+
+        Args:
+            key (PackageKey): Package, architecture, version and size of the package
+            loader: returns an iterable of the chunks of the package
+
+        Returns:
+            The package or None if it does not fit into the cache
+        """
+        if key[3] > self.max_size:
+            return None
+        with self._lock:
+            cached = self._packages.get(key)
+            if cached is not None and not (cached.complete and cached.failed):
+                self._packages.move_to_end(key)
+                return cached
+            # older versions of the package are not requested anymore
+            for outdated in [cached_key for cached_key in self._packages if cached_key[:2] == key[:2]]:
+                del self._packages[outdated]
+            cached = CachedPackage(key)
+            self._packages[key] = cached
+            self._evict()
+        loader_thread = Thread(name='system', target=self._load, args=(cached, loader))
+        loader_thread.daemon = True
+        loader_thread.start()
+        return cached
+
+    def _evict(self):
+        cached_size = sum(cached.size for cached in self._packages.values())
+        while cached_size > self.max_size and len(self._packages) > 1:
+            _, evicted = self._packages.popitem(last=False)
+            cached_size -= evicted.size
+
+    def _load(self, cached: CachedPackage, loader: Callable[[], Iterable[bytes]]):
+        failed = False
+        try:
+            for chunk in loader():
+                cached.append(bytes(chunk))
+        except Exception as err:
+            logger.warning("Unable to load package {} into the cache: {}", cached.key, err)
+            failed = True
+        cached.finish(failed)
+        if cached.failed:
+            with self._lock:
+                if self._packages.get(cached.key) is cached:
+                    del self._packages[cached.key]
+        else:
+            logger.info("Cached package {} ({} bytes)", cached.key, cached.size)
+
+
+def iter_byte_range(chunks: Iterable[bytes], start: int = 0, stop: Optional[int] = None) -> Generator:
+    """ Slice the byte range [start, stop) out of a stream of chunks
+
+    Args:
+        chunks: chunks of the file
+        start (int): first byte to yield
+        stop (int): byte to stop at, None for the end of the file
+    """
+    offset = 0
+    for chunk in chunks:
+        chunk_end = offset + len(chunk)
+        if chunk_end > start:
+            if stop is not None and offset >= stop:
+                break
+            begin = max(start - offset, 0)
+            end = len(chunk) if stop is None else min(stop - offset, len(chunk))
+            if begin == 0 and end == len(chunk):
+                yield chunk
+            else:
+                yield memoryview(chunk)[begin:end].tobytes()
+        offset = chunk_end
+        if stop is not None and offset >= stop:
+            break
+
+
+_package_cache: Optional[PackageCache] = None
+_package_cache_lock = Lock()
+
+
+def get_package_cache(args) -> Optional[PackageCache]:
+    """ Package cache of the process, None if disabled """
+    global _package_cache
+    max_size = int(getattr(args, 'apk_cache_size', 0)) * 1024 * 1024
+    if max_size <= 0:
+        return None
+    with _package_cache_lock:
+        if _package_cache is None:
+            _package_cache = PackageCache(max_size)
+        return _package_cache
@@ -8,7 +8,8 @@ import cachetools.func
 import requests
 from apksearch.search import HEADERS
 from apkutils.apkfile import BadZipFile, LargeZipFile
-from flask import Response, stream_with_context
+from flask import Response, request, stream_with_context
+from werkzeug.datastructures import ContentRange
 
 from mapadroid.utils.functions import get_version_codes
 from mapadroid.utils.global_variables import (BACKEND_SUPPORTED_VERSIONS,
@@ -18,6 +19,7 @@ from mapadroid.utils.logging import LoggerEnums, get_logger
 from .abstract_apk_storage import AbstractAPKStorage
 from .apk_enums import APKArch, APKPackage, APKType
 from .custom_types import MADapks, MADPackage, MADPackages
+from .delivery import PackageCache, iter_byte_range
 
 logger = get_logger(LoggerEnums.package_mgr)
 
@@ -48,13 +50,16 @@ def convert_to_backend(req_type: str, req_arch: str) -> Tuple[APKType, APKArch]:
     return (backend_type, backend_arch)
 
 
-def file_generator(db, storage_obj, package: APKType, architecture: APKArch) -> Union[Generator, Response]:
+def file_generator(db, storage_obj, package: APKType, architecture: APKArch, start: int = 0,
+                   stop: Optional[int] = None) -> Union[Generator, Response]:
     """ Create a generator for retrieving the stored package
 
     Args:
         storage_obj (AbstractAPKStorage): Storage interface for saving
         package (APKType): Package to save
         architecture (APKArch): Architecture of the package to save
+        start (int): First byte to retrieve
+        stop (int): Byte to stop at, None for the end of the package
     Returns:
         Generator for retrieving the package
     """
@@ -63,45 +68,74 @@ def file_generator(db, storage_obj, package: APKType, architecture: APKArch) ->
         return Response(status=404, response=package_info[0])
     file_info = package_info[0]
     if storage_obj.get_storage_type() == 'fs':
-        gen_func = generator_from_filesystem(storage_obj.get_package_path(file_info.filename))
+        gen_func = generator_from_filesystem(storage_obj.get_package_path(file_info.filename), start, stop)
     else:
-        gen_func = generator_from_db(db, package, architecture)
+        gen_func = generator_from_db(db, package, architecture, start, stop)
     return gen_func
 
 
-def generator_from_db(dbc, package: APKType, architecture: APKArch) -> Generator:
-    """ Create a generator for retrieving the stored package from the database
+def generator_from_db(dbc, package: APKType, architecture: APKArch, start: int = 0,
+                      stop: Optional[int] = None) -> Generator:
+    """ Create a generator for retrieving the stored package from the database.  The chunks are streamed through a
+        single query from the chunk containing the first byte requested to the one containing the last byte
 
     Args:
         dbc: database wrapper
         package (APKType): Package to save
         architecture (APKArch): Architecture of the package to save
+        start (int): First byte to retrieve
+        stop (int): Byte to stop at, None for the end of the package
     Returns:
         Generator for retrieving the package
     """
     filestore_id_sql = "SELECT `filestore_id` FROM `mad_apks` WHERE `usage` = %s AND `arch` = %s"
     filestore_id = dbc.autofetch_value(filestore_id_sql,
                                        args=(package.value, architecture.value,))
-    sql = "SELECT `chunk_id` FROM `filestore_chunks` WHERE `filestore_id` = %s"
-    data_sql = "SELECT `data` FROM `filestore_chunks` WHERE `chunk_id` = %s"
-    chunk_ids = dbc.autofetch_column(sql, args=(filestore_id,))
-    for chunk_id in chunk_ids:
-        yield dbc.autofetch_value(data_sql, args=(chunk_id))
-
-
-def generator_from_filesystem(full_path) -> Generator:
+    sql = "SELECT `chunk_id`, `size` FROM `filestore_chunks` WHERE `filestore_id` = %s ORDER BY `chunk_id`"
+    # offset of the first chunk of the range in the package
+    offset = 0
+    chunk_offset = 0
+    first_chunk_id = None
+    last_chunk_id = None
+    for chunk_id, size in dbc.execute(sql, args=(filestore_id,)) or []:
+        if stop is not None and chunk_offset >= stop:
+            break
+        if first_chunk_id is None and chunk_offset + size > start:
+            first_chunk_id = chunk_id
+            offset = chunk_offset
+        if first_chunk_id is not None:
+            last_chunk_id = chunk_id
+        chunk_offset += size
+    if first_chunk_id is None:
+        return
+    # only the chunks of the range are fetched, a stream closed early does not drain the rest of the package
+    data_sql = "SELECT `data` FROM `filestore_chunks` WHERE `filestore_id` = %s AND `chunk_id` >= %s " \
+               "AND `chunk_id` <= %s ORDER BY `chunk_id`"
+    chunks = (row[0] for rows in dbc.execute_stream(data_sql, args=(filestore_id, first_chunk_id, last_chunk_id),
+                                                    chunk_size=1)
+              for row in rows)
+    yield from iter_byte_range(chunks, start - offset, None if stop is None else stop - offset)
+
+
+def generator_from_filesystem(full_path, start: int = 0, stop: Optional[int] = None) -> Generator:
     """ Create a generator for retrieving the stored package from the disk
 
     Args:
         full_path (str): path to the file to retrieve
+        start (int): First byte to retrieve
+        stop (int): Byte to stop at, None for the end of the file
     Returns:
         Generator for retrieving the package
     """
     with open(full_path, 'rb') as fh:
-        while True:
-            data = fh.read(CHUNK_MAX_SIZE)
+        fh.seek(start)
+        remaining = None if stop is None else stop - start
+        while remaining is None or remaining > 0:
+            data = fh.read(CHUNK_MAX_SIZE if remaining is None else min(CHUNK_MAX_SIZE, remaining))
             if not data:
                 break
+            if remaining is not None:
+                remaining -= len(data)
             yield data
 
 
@@ -289,25 +323,54 @@ def parse_frontend(**kwargs) -> Union[Tuple[APKType, APKArch], Response]:
     return (package, architecture)
 
 
-def stream_package(db, storage_obj, package: APKType, architecture: APKArch) -> Response:
-    """ Stream the package to the user
+def stream_package(db, storage_obj, package: APKType, architecture: APKArch,
+                   package_cache: Optional[PackageCache] = None) -> Response:
+    """ Stream the package to the user.  A single byte range can be requested to resume a download
 
     Args:
         storage_obj (AbstractAPKStorage): Storage interface for grabbing the package
         package (APKType): Package to lookup
         architecture (APKArch): Architecture of the package to lookup
+        package_cache (PackageCache): Cache of packages stored in the database, None to always query the database
     """
     package_info: MADPackage = lookup_package_info(storage_obj, package, architecture)[0]
-    gen_func: Generator = file_generator(db, storage_obj, package, architecture)
-    if isinstance(gen_func, Response):
-        return gen_func
-    return Response(
+    if package_info is None:
+        return file_generator(db, storage_obj, package, architecture)
+    size = int(package_info.size)
+    etag = '{}-{}-{}-{}'.format(package.value, architecture.value, package_info.version, size)
+    start, stop = 0, size
+    byte_range = request.range
+    if byte_range is not None and (request.if_range.etag is None or request.if_range.etag == etag):
+        requested = byte_range.range_for_length(size)
+        if requested is None:
+            response = Response(status=416)
+            response.content_range = ContentRange('bytes', None, None, size)
+            return response
+        start, stop = requested
+    cached = None
+    if package_cache is not None and storage_obj.get_storage_type() != 'fs':
+        cached = package_cache.get((package.value, architecture.value, package_info.version, size),
+                                   lambda: generator_from_db(db, package, architecture))
+    if cached is not None:
+        gen_func = iter_byte_range(cached.iter_chunks(), start, stop)
+    else:
+        gen_func = file_generator(db, storage_obj, package, architecture, start, stop)
+        if isinstance(gen_func, Response):
+            return gen_func
+    response = Response(
         stream_with_context(gen_func),
+        status=206 if (start, stop) != (0, size) else 200,
         content_type=package_info.mimetype,
         headers={
-            'Content-Disposition': 'attachment; filename={}'.format(package_info.filename)
+            'Content-Disposition': 'attachment; filename={}'.format(package_info.filename),
+            'Content-Length': str(stop - start),
+            'Accept-Ranges': 'bytes'
         }
     )
+    response.set_etag(etag)
+    if response.status_code == 206:
+        response.content_range = ContentRange('bytes', start, stop, size)
+    return response
 
 
 def supported_pogo_version(architecture: APKArch, version: str, token: str) -> bool:
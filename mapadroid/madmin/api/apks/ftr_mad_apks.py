@@ -6,7 +6,7 @@ from apkutils.apkfile import BadZipFile, LargeZipFile
 
 from mapadroid.mad_apk import (APKArch, APKType, APKWizard, MADapks,
                                PackageImporter, WizardError, get_apk_status,
-                               stream_package)
+                               get_package_cache, stream_package)
 from mapadroid.madmin.functions import auth_required
 from mapadroid.utils import global_variables
 
@@ -26,7 +26,8 @@ class APIMadAPK(APKHandler):
     @auth_required
     def get(self, apk_type: APKType, apk_arch: APKArch):
         if flask.request.url.split('/')[-1] == 'download':
-            return stream_package(self.dbc, self.storage_obj, apk_type, apk_arch)
+            return stream_package(self.dbc, self.storage_obj, apk_type, apk_arch,
+                                  get_package_cache(self._args))
         elif flask.request.url.split('/')[-1] == 'reload':
             self.storage_obj.reload()
             return (None, 200)
@@ -0,0 +1,324 @@
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from mapadroid.utils.language import get_mon_name
+from mapadroid.utils.logging import LoggerEnums, get_logger
+from mapadroid.utils.s2Helper import S2Helper
+
+logger = get_logger(LoggerEnums.madmin)
+
+# slippy map zoom level of the tiles, a tile at zoom 13 is about 4.9km wide at the equator
+MAP_TILE_ZOOM = 13
+MAX_TILES_PER_REQUEST = 256
+MAX_CACHED_TILES = 4096
+# seconds to look back further than the last sync of a tile, rows may be committed after their timestamp was set
+REFRESH_OVERLAP = 10
+# seconds after which a tile is loaded completely again, this picks up rows deleted from the database
+FULL_RELOAD_INTERVAL = 600
+MAX_LATITUDE = 85.0511287798
+
+# (key, latitude, longitude, object)
+MapEntry = Tuple[object, float, float, dict]
+
+
+def tile_of(latitude: float, longitude: float, zoom: int = MAP_TILE_ZOOM) -> Tuple[int, int]:
+    tiles = 2 ** zoom
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    tile_x = int((longitude + 180.0) / 360.0 * tiles)
+    lat_rad = math.radians(latitude)
+    tile_y = int((1.0 - math.log(math.tan(lat_rad) + 1.0 / math.cos(lat_rad)) / math.pi) / 2.0 * tiles)
+    return min(max(tile_x, 0), tiles - 1), min(max(tile_y, 0), tiles - 1)
+
+
+def tile_bounds(tile_x: int, tile_y: int, zoom: int = MAP_TILE_ZOOM) -> Tuple[float, float, float, float]:
+    """
+    :return: ne_lat, ne_lon, sw_lat, sw_lon of the tile
+    """
+    tiles = 2 ** zoom
+
+    def latitude_of(edge_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * edge_y / tiles))))
+
+    return (latitude_of(tile_y), (tile_x + 1) / tiles * 360.0 - 180.0,
+            latitude_of(tile_y + 1), tile_x / tiles * 360.0 - 180.0)
+
+
+def tiles_in_bounds(ne_lat: float, ne_lon: float, sw_lat: float, sw_lon: float,
+                    zoom: int = MAP_TILE_ZOOM) -> List[Tuple[int, int]]:
+    min_x, min_y = tile_of(ne_lat, sw_lon, zoom)
+    max_x, max_y = tile_of(sw_lat, ne_lon, zoom)
+    return [(tile_x, tile_y) for tile_x in range(min_x, max_x + 1) for tile_y in range(min_y, max_y + 1)]
+
+
+def tile_key(tile: Tuple[int, int]) -> str:
+    return "{}_{}".format(tile[0], tile[1])
+
+
+def parse_tile_cursors(tiles: Optional[str], cursor: Optional[str] = None) -> Dict[Tuple[int, int], int]:
+    """
+    Parses the tiles known to a client, e.g. "4281_2780,4282_2780" known at the revision passed as cursor.
+    A tile may carry a cursor of its own, e.g. "4281_2780:1600000000000000".
+    """
+    cursors = {}
+    if not tiles:
+        return cursors
+    try:
+        default_cursor = int(cursor) if cursor else 0
+    except ValueError:
+        default_cursor = 0
+    for entry in tiles.split(","):
+        try:
+            key, _, tile_cursor = entry.partition(":")
+            tile_x, tile_y = key.split("_")
+            cursors[(int(tile_x), int(tile_y))] = int(tile_cursor) if tile_cursor else default_cursor
+        except ValueError:
+            continue
+    return cursors
+
+
+def to_columns(objects: Iterable[dict]) -> Tuple[List[str], List[list]]:
+    """
+    Converts objects to a list of column names and one list of values per object
+    """
+    objects = list(objects)
+    columns: Dict[str, None] = {}
+    for obj in objects:
+        for column in obj:
+            columns.setdefault(column)
+    column_names = list(columns)
+    return column_names, [[obj.get(column) for column in column_names] for obj in objects]
+
+
+class MapLayer:
+    """
+    Describes how the objects of a map layer are loaded. fetch receives the bounds and an epoch timestamp to only
+    load objects changed since (None to load all) and returns MapEntry tuples.
+    """
+
+    def __init__(self, name: str, ttl: int, fetch: Callable[..., Iterable[MapEntry]],
+                 expired: Optional[Callable[[dict, float], bool]] = None):
+        self.name: str = name
+        self.ttl: int = ttl
+        self.fetch = fetch
+        self.expired = expired
+
+
+class _CachedTile:
+    __slots__ = ("objects", "revisions", "removed", "synced_at", "loaded_at")
+
+    def __init__(self):
+        self.objects: Dict[object, dict] = {}
+        # revision of the last change per object
+        self.revisions: Dict[object, int] = {}
+        self.removed: Dict[object, int] = {}
+        self.synced_at: float = 0
+        self.loaded_at: float = 0
+
+
+class MapTileService:
+    """
+    Serves the objects of the MADmin map per fixed zoom tile. Tiles are kept in memory and refreshed once their
+    layer's TTL passed, only loading rows modified since the last refresh of the tile. Every change is stamped
+    with a revision, clients pass the revision they know of a tile (the cursor) and only get the changes since.
+    """
+
+    def __init__(self, db, quest_gen, zoom: int = MAP_TILE_ZOOM):
+        self._db = db
+        self._quest_gen = quest_gen
+        self._zoom: int = zoom
+        # revisions are based on the clock, cursors of clients stay valid across restarts
+        self._revision: int = time.time_ns() // 1000
+        self._revision_lock: Lock = Lock()
+        self._layers: Dict[str, MapLayer] = {}
+        self._tiles: Dict[str, OrderedDict] = {}
+        self._locks: Dict[str, Lock] = {}
+        for layer in (
+            MapLayer("gyms", 10, self._fetch_gyms),
+            MapLayer("quests", 30, self._fetch_quests),
+            MapLayer("stops", 30, self._fetch_stops),
+            MapLayer("mons", 5, self._fetch_mons, lambda mon, now: mon["disappear_time"] <= now),
+            MapLayer("cells", 10, self._fetch_cells)
+        ):
+            self.register_layer(layer)
+
+    def register_layer(self, layer: MapLayer):
+        self._layers[layer.name] = layer
+        self._tiles[layer.name] = OrderedDict()
+        self._locks[layer.name] = Lock()
+
+    def get_layer_names(self) -> List[str]:
+        return list(self._layers)
+
+    def get_changes(self, layer_name: str, ne_lat: float, ne_lon: float, sw_lat: float, sw_lon: float,
+                    cursors: Optional[Dict[Tuple[int, int], int]] = None) -> dict:
+        """
+        Collects the objects of all tiles within the bounds changed after the cursor the client passed per tile
+        :return: the columnar objects, keys of removed objects, the served tiles and the cursor of the response
+        """
+        layer = self._layers[layer_name]
+        cursors = cursors or {}
+        tiles = tiles_in_bounds(ne_lat, ne_lon, sw_lat, sw_lon, self._zoom)
+        if len(tiles) > MAX_TILES_PER_REQUEST:
+            logger.debug("Not serving {} tiles of layer {}, zoom in further", len(tiles), layer_name)
+            return {"cursor": self._next_revision(), "tiles": [], "columns": [], "rows": [], "removed": [],
+                    "too_many_tiles": True}
+
+        with self._locks[layer_name]:
+            self._refresh(layer, tiles)
+            cursor = self._next_revision()
+            changed = []
+            removed = []
+            for tile in tiles:
+                cached: _CachedTile = self._tiles[layer_name][tile]
+                since = cursors.get(tile, 0)
+                changed.extend(obj for key, obj in cached.objects.items() if cached.revisions[key] > since)
+                if since:
+                    removed.extend(key for key, revision in cached.removed.items() if revision > since)
+        columns, rows = to_columns(changed)
+        return {"cursor": cursor, "tiles": [tile_key(tile) for tile in tiles], "columns": columns, "rows": rows,
+                "removed": removed}
+
+    def _next_revision(self) -> int:
+        with self._revision_lock:
+            self._revision = max(self._revision + 1, time.time_ns() // 1000)
+            return self._revision
+
+    def _refresh(self, layer: MapLayer, tiles: List[Tuple[int, int]]):
+        cache: OrderedDict = self._tiles[layer.name]
+        now = time.time()
+        full_reload = []
+        outdated = []
+        for tile in tiles:
+            cached: Optional[_CachedTile] = cache.get(tile)
+            if cached is None:
+                cached = cache[tile] = _CachedTile()
+            cache.move_to_end(tile)
+            if now - cached.loaded_at > FULL_RELOAD_INTERVAL:
+                full_reload.append(tile)
+            elif now - cached.synced_at > layer.ttl:
+                outdated.append(tile)
+
+        if full_reload:
+            self._load(layer, full_reload, None, now)
+        if outdated:
+            since = min(cache[tile].synced_at for tile in outdated) - REFRESH_OVERLAP
+            self._load(layer, outdated, since, now)
+        if layer.expired is not None:
+            revision = None
+            for tile in tiles:
+                cached = cache[tile]
+                expired_keys = [key for key, obj in cached.objects.items() if layer.expired(obj, now)]
+                if expired_keys and revision is None:
+                    revision = self._next_revision()
+                for key in expired_keys:
+                    self._remove(cached, key, revision)
+
+        while len(cache) > max(MAX_CACHED_TILES, len(tiles)):
+            cache.popitem(last=False)
+
+    def _load(self, layer: MapLayer, tiles: List[Tuple[int, int]], since: Optional[float], now: float):
+        """
+        Loads the objects of all tiles at once using the bounding box of the tiles
+        """
+        bounds = [tile_bounds(tile_x, tile_y, self._zoom) for tile_x, tile_y in tiles]
+        ne_lat = max(bound[0] for bound in bounds)
+        ne_lon = max(bound[1] for bound in bounds)
+        sw_lat = min(bound[2] for bound in bounds)
+        sw_lon = min(bound[3] for bound in bounds)
+        entries = layer.fetch(ne_lat, ne_lon, sw_lat, sw_lon, since)
+
+        cache: OrderedDict = self._tiles[layer.name]
+        wanted = set(tiles)
+        revision = self._next_revision()
+        seen: Dict[Tuple[int, int], set] = {tile: set() for tile in tiles}
+        for key, latitude, longitude, obj in entries:
+            tile = tile_of(latitude, longitude, self._zoom)
+            # the bounding box of several tiles may cover more tiles than the ones loaded
+            if tile not in wanted:
+                continue
+            seen[tile].add(key)
+            cached: _CachedTile = cache[tile]
+            if cached.objects.get(key) != obj:
+                cached.objects[key] = obj
+                cached.revisions[key] = revision
+                cached.removed.pop(key, None)
+
+        for tile in tiles:
+            cached = cache[tile]
+            cached.synced_at = now
+            if since is None:
+                for key in [key for key in cached.objects if key not in seen[tile]]:
+                    self._remove(cached, key, revision)
+                # forget removals clients had enough time to pick up
+                cached.removed = {key: removed_revision for key, removed_revision in cached.removed.items()
+                                  if removed_revision >= revision - FULL_RELOAD_INTERVAL * 1000000}
+                cached.loaded_at = now
+
+    @staticmethod
+    def _remove(cached: _CachedTile, key, revision: int):
+        cached.objects.pop(key, None)
+        cached.revisions.pop(key, None)
+        cached.removed[key] = revision
+
+    def _fetch_gyms(self, ne_lat, ne_lon, sw_lat, sw_lon, since) -> Iterable[MapEntry]:
+        gyms = self._db.get_gyms_in_rectangle(ne_lat, ne_lon, sw_lat, sw_lon, timestamp=since)
+        return [(gym_id, gym["latitude"], gym["longitude"], gym_to_map_object(gym))
+                for gym_id, gym in gyms.items()]
+
+    def _fetch_quests(self, ne_lat, ne_lon, sw_lat, sw_lon, since) -> Iterable[MapEntry]:
+        quests = self._db.quests_from_db(ne_lat=ne_lat, ne_lon=ne_lon, sw_lat=sw_lat, sw_lon=sw_lon,
+                                         timestamp=since)
+        return [(stop_id, quest["latitude"], quest["longitude"], self._quest_gen.generate_quest(quest))
+                for stop_id, quest in quests.items()]
+
+    def _fetch_stops(self, ne_lat, ne_lon, sw_lat, sw_lon, since) -> Iterable[MapEntry]:
+        stops = self._db.get_stops_in_rectangle(ne_lat, ne_lon, sw_lat, sw_lon, timestamp=since)
+        return [(stop["pokestop_id"], stop["latitude"], stop["longitude"], stop) for stop in stops]
+
+    def _fetch_mons(self, ne_lat, ne_lon, sw_lat, sw_lon, since) -> Iterable[MapEntry]:
+        mons = self._db.get_mons_in_rectangle(ne_lat, ne_lon, sw_lat, sw_lon, timestamp=since)
+        add_mon_names(mons)
+        return [(mon["encounter_id"], mon["latitude"], mon["longitude"], mon) for mon in mons]
+
+    def _fetch_cells(self, ne_lat, ne_lon, sw_lat, sw_lon, since) -> Iterable[MapEntry]:
+        cells = self._db.get_cells_in_rectangle(ne_lat, ne_lon, sw_lat, sw_lon, timestamp=since)
+        return [(str(cell["cell_id"]), cell["center_latitude"], cell["center_longitude"], cell_to_map_object(cell))
+                for cell in cells]
+
+
+def gym_to_map_object(gym: dict) -> dict:
+    return {
+        "id": gym["id"],
+        "name": gym["name"],
+        "img": gym["url"],
+        "lat": gym["latitude"],
+        "lon": gym["longitude"],
+        "team_id": gym["team_id"],
+        "last_updated": gym["last_updated"],
+        "last_scanned": gym["last_scanned"],
+        "raid": gym["raid"]
+    }
+
+
+def cell_to_map_object(cell: dict) -> dict:
+    return {
+        "id": str(cell["cell_id"]),
+        "polygon": S2Helper.coords_of_cell(cell["cell_id"]),
+        "updated": cell["updated"]
+    }
+
+
+def add_mon_names(mons: List[dict]):
+    mon_names = {}
+    for mon in mons:
+        try:
+            mon_id = mon["mon_id"]
+            if mon_id not in mon_names:
+                mon_names[mon_id] = get_mon_name(mon_id)
+            mon["encounter_id"] = str(mon["encounter_id"])
+            mon["name"] = mon_names[mon_id]
+        except Exception:
+            pass
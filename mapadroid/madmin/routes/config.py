@@ -11,7 +11,7 @@ from mapadroid.data_manager.dm_exceptions import ModeNotSpecified, ModeUnknown
 from mapadroid.data_manager.modules.pogoauth import PogoAuth
 from mapadroid.madmin.functions import auth_required
 from mapadroid.utils.adb import ADBConnect
-from mapadroid.utils.language import i8ln, open_json_file
+from mapadroid.utils.language import i8ln, open_json_file, reload_translations
 from mapadroid.utils.logging import LoggerEnums, get_logger
 from mapadroid.utils.MappingManager import MappingManager
 
@@ -449,4 +449,5 @@ class MADminConfig(object):
     @auth_required
     def reload(self):
         self._mapping_mananger.update()
+        reload_translations()
         return redirect(url_for('settings_devices'), code=302)
@@ -2,12 +2,11 @@ import datetime
 import os
 import time
 
-from flask import (flash, jsonify, redirect, render_template, request,
-                   send_file, url_for)
+from flask import (Response, flash, jsonify, redirect, render_template,
+                   request, send_file, url_for)
 from PIL import Image
 from werkzeug.utils import secure_filename
 
-import mapadroid
 from mapadroid.db.DbWrapper import DbWrapper
 from mapadroid.madmin.functions import (allowed_file, auth_required,
                                         generate_device_logcat_zip_path,
@@ -17,9 +16,11 @@ from mapadroid.utils import MappingManager
 from mapadroid.utils.adb import ADBConnect
 from mapadroid.utils.collections import Location
 from mapadroid.utils.functions import (creation_date, generate_path,
-                                       generate_phones, image_resize)
+                                       generate_phones)
 from mapadroid.utils.logging import LoggerEnums, get_logger, get_origin_logger
 from mapadroid.utils.madGlobals import ScreenshotType
+from mapadroid.utils.screenshotservice import (ScreenshotService,
+                                               get_screenshot_service)
 from mapadroid.utils.updater import JobType
 from mapadroid.websocket.WebsocketServer import WebsocketServer
 
@@ -44,11 +45,14 @@ class MADminControl(object):
         self._ws_connected_phones: list = []
         self._logger = logger
         self._app = app
+        self._screenshots: ScreenshotService = get_screenshot_service()
 
     def add_route(self):
         routes = [
             ("/devicecontrol", self.get_phonescreens),
             ("/take_screenshot", self.take_screenshot),
+            ("/device_screenshot/<origin>", self.get_device_screenshot),
+            ("/device_screenshot/<origin>/thumbnail", self.get_device_thumbnail),
             ("/click_screenshot", self.click_screenshot),
             ("/swipe_screenshot", self.swipe_screenshot),
             ("/quit_pogo", self.quit_pogo),
@@ -83,9 +87,6 @@ class MADminControl(object):
     @nocache
     @logger.catch()
     def get_phonescreens(self):
-        if not os.path.exists(os.path.join(mapadroid.MAD_ROOT, self._args.temp_path, "madmin")):
-            os.makedirs(os.path.join(self._args.temp_path, "madmin"))
-
         screens_phone = []
         ws_connected_phones = []
         if self._ws_server is not None:
@@ -96,6 +97,10 @@ class MADminControl(object):
 
         # Sort devices by name.
         phones = sorted(phones)
+        # the thumbnails of changed screenshots are generated in parallel while rendering the page
+        self._screenshots.prepare_thumbnails({phonename: generate_device_screenshot_path(phonename, devicemappings,
+                                                                                         self._args)
+                                              for phonename in phones if phonename in devicemappings})
         for phonename in phones:
             ws_connected_phones.append(phonename)
             add_text = ""
@@ -110,24 +115,23 @@ class MADminControl(object):
                 self._ws_connected_phones.append(adb)
 
             filename = generate_device_screenshot_path(phonename, devicemappings, self._args)
-            try:
-                screenshot_ending: str = ".jpg"
-                image_resize(filename, os.path.join(
-                    self._args.temp_path, "madmin"), width=250)
-                screen = "screenshot/madmin/screenshot_" + str(phonename) + screenshot_ending
+            if self._screenshots.get_thumbnail(phonename, filename) is not None:
                 screens_phone.append(
-                    generate_phones(phonename, add_text, adb_option,
-                                    screen, filename, self._datetimeformat, dummy=False)
+                    generate_phones(phonename, add_text, adb_option, self._get_thumbnail_url(phonename),
+                                    filename, self._datetimeformat, dummy=False)
                 )
-            except IOError:
+            else:
                 screen = "static/dummy.png"
                 screens_phone.append(generate_phones(
                     phonename, add_text, adb_option, screen, filename, self._datetimeformat, dummy=True))
-                try:
-                    os.remove(filename)
-                    origin_logger.info("Screenshot {} was corrupted and has been deleted", filename)
-                except OSError:
-                    pass
+                # a thumbnail not generated in time (e.g. under load) is shown once it is ready
+                if self._screenshots.is_corrupted(phonename):
+                    self._screenshots.remove(phonename)
+                    try:
+                        os.remove(filename)
+                        origin_logger.info("Screenshot {} was corrupted and has been deleted", filename)
+                    except OSError:
+                        pass
 
         for phonename in self._adb_connect.return_adb_devices():
             if phonename.serial not in self._ws_connected_phones:
@@ -137,12 +141,9 @@ class MADminControl(object):
                         adb_option = True
                         add_text = '<b>ADB - no WS <i class="fa fa-exclamation-triangle"></i></b>'
                         filename = generate_device_screenshot_path(pho, devicemappings, self._args)
-                        if os.path.isfile(filename):
-                            image_resize(filename, os.path.join(mapadroid.MAD_ROOT, self._args.temp_path, "madmin"),
-                                         width=250)
-                            screenshot_ending: str = ".jpg"
-                            screen = "screenshot/madmin/screenshot_" + str(pho) + screenshot_ending
-                            screens_phone.append(generate_phones(pho, add_text, adb_option, screen, filename,
+                        if self._screenshots.get_thumbnail(pho, filename) is not None:
+                            screens_phone.append(generate_phones(pho, add_text, adb_option,
+                                                                 self._get_thumbnail_url(pho), filename,
                                                                  self._datetimeformat, dummy=False))
                         else:
                             screen = "static/dummy.png"
@@ -152,6 +153,44 @@ class MADminControl(object):
         return render_template('phonescreens.html', editform=screens_phone, header="Device control",
                                title="Device control")
 
+    @staticmethod
+    def _get_thumbnail_url(origin: str) -> str:
+        return "device_screenshot/{}/thumbnail".format(origin)
+
+    @auth_required
+    def get_device_screenshot(self, origin):
+        return self._send_screenshot(origin, thumbnail=False)
+
+    @auth_required
+    def get_device_thumbnail(self, origin):
+        return self._send_screenshot(origin, thumbnail=True)
+
+    def _send_screenshot(self, origin: str, thumbnail: bool):
+        """
+        Serves the latest screenshot of a device from memory, unchanged frames are answered with 304 Not Modified
+        """
+        devicemappings = self._mapping_manager.get_all_devicemappings()
+        if origin not in devicemappings:
+            return Response(status=404)
+        filename = generate_device_screenshot_path(origin, devicemappings, self._args)
+        if thumbnail:
+            screenshot = self._screenshots.get_thumbnail(origin, filename)
+            if screenshot is None:
+                return Response(status=404)
+            frame, data = screenshot
+            mimetype = "image/jpeg"
+        else:
+            frame = self._screenshots.get_frame(origin, filename)
+            if frame is None:
+                return Response(status=404)
+            data, mimetype = frame.data, frame.mimetype
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(frame.etag + ("-thumbnail" if thumbnail else ""))
+        response.last_modified = datetime.datetime.utcfromtimestamp(int(frame.modified))
+        # the browser revalidates every time, unchanged frames are not sent again
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
     @auth_required
     def take_screenshot(self, origin=None, adb=False):
         origin = request.args.get('origin')
@@ -185,9 +224,6 @@ class MADminControl(object):
         temp_comm.get_screenshot(generate_device_screenshot_path(origin, devicemappings, self._args),
                                  screenshot_quality, screenshot_type)
 
-        filename = generate_device_screenshot_path(origin, devicemappings, self._args)
-        image_resize(filename, os.path.join(mapadroid.MAD_ROOT, self._args.temp_path, "madmin"), width=250)
-
         return
 
     @auth_required
@@ -200,8 +236,11 @@ class MADminControl(object):
         devicemappings = self._mapping_manager.get_all_devicemappings()
 
         filename = generate_device_screenshot_path(origin, devicemappings, self._args)
-        with Image.open(filename) as screenshot:
-            width, height = screenshot.size
+        screen_size = self._screenshots.get_screen_size(origin, filename)
+        if screen_size is None:
+            with Image.open(filename) as screenshot:
+                screen_size = screenshot.size
+        width, height = screen_size
 
         real_click_x = int(width / float(click_x))
         real_click_y = int(height / float(click_y))
@@ -230,8 +269,11 @@ class MADminControl(object):
         devicemappings = self._mapping_manager.get_all_devicemappings()
 
         filename = generate_device_screenshot_path(origin, devicemappings, self._args)
-        with Image.open(filename) as screenshot:
-            width, height = screenshot.size
+        screen_size = self._screenshots.get_screen_size(origin, filename)
+        if screen_size is None:
+            with Image.open(filename) as screenshot:
+                screen_size = screenshot.size
+        width, height = screen_size
 
         real_click_x = int(width / float(click_x))
         real_click_y = int(height / float(click_y))
@@ -10,13 +10,14 @@ from mapadroid.madmin.functions import (auth_required,
                                         generate_coords_from_geofence,
                                         get_bound_params, get_coord_float,
                                         get_geofences)
+from mapadroid.madmin.maptiles import (MapTileService, add_mon_names,
+                                       cell_to_map_object, gym_to_map_object,
+                                       parse_tile_cursors)
 from mapadroid.route.RouteManagerBase import RoutePoolEntry
 from mapadroid.utils import MappingManager
 from mapadroid.utils.collections import Location
-from mapadroid.utils.language import get_mon_name
 from mapadroid.utils.logging import LoggerEnums, get_logger
 from mapadroid.utils.questGen import QuestGen
-from mapadroid.utils.s2Helper import S2Helper
 
 logger = get_logger(LoggerEnums.madmin)
 cache = Cache(config={'CACHE_TYPE': 'simple'})
@@ -35,6 +36,7 @@ class MADminMap:
 
         self._mapping_manager: MappingManager = mapping_manager
         self._data_manager = data_manager
+        self._map_tiles: MapTileService = MapTileService(db, quest_gen)
 
         cache.init_app(self._app)
 
@@ -51,7 +53,8 @@ class MADminMap:
             ("/get_quests", self.get_quests),
             ("/get_map_mons", self.get_map_mons),
             ("/get_cells", self.get_cells),
-            ("/get_stops", self.get_stops)
+            ("/get_stops", self.get_stops),
+            ("/get_map_data", self.get_map_data)
         ]
         for route, view_func in routes:
             self._app.route(route)(view_func)
@@ -255,19 +258,7 @@ class MADminMap:
         )
 
         for gymid in data:
-            gym = data[str(gymid)]
-
-            coords.append({
-                "id": gymid,
-                "name": gym["name"],
-                "img": gym["url"],
-                "lat": gym["latitude"],
-                "lon": gym["longitude"],
-                "team_id": gym["team_id"],
-                "last_updated": gym["last_updated"],
-                "last_scanned": gym["last_scanned"],
-                "raid": gym["raid"]
-            })
+            coords.append(gym_to_map_object(data[str(gymid)]))
 
         return jsonify(coords)
 
@@ -320,21 +311,7 @@ class MADminMap:
             timestamp=timestamp
         )
 
-        mons_raw = {}
-
-        for index, _ in enumerate(data):
-            try:
-                mon_id = data[index]["mon_id"]
-                if str(mon_id) in mons_raw:
-                    mon_raw = mons_raw[str(mon_id)]
-                else:
-                    mon_raw = get_mon_name(mon_id)
-                    mons_raw[str(mon_id)] = mon_raw
-
-                data[index]["encounter_id"] = str(data[index]["encounter_id"])
-                data[index]["name"] = mon_raw
-            except Exception:
-                pass
+        add_mon_names(data)
 
         return jsonify(data)
 
@@ -355,15 +332,7 @@ class MADminMap:
             timestamp=timestamp
         )
 
-        ret = []
-        for cell in data:
-            ret.append({
-                "id": str(cell["cell_id"]),
-                "polygon": S2Helper.coords_of_cell(cell["cell_id"]),
-                "updated": cell["updated"]
-            })
-
-        return jsonify(ret)
+        return jsonify([cell_to_map_object(cell) for cell in data])
 
     @auth_required
     def get_stops(self):
@@ -381,6 +350,23 @@ class MADminMap:
         )
         return jsonify(data)
 
+    @auth_required
+    def get_map_data(self):
+        layer = request.args.get("layer")
+        if layer not in self._map_tiles.get_layer_names():
+            return jsonify({"error": "unknown layer"}), 400
+        try:
+            ne_lat = float(request.args.get("neLat"))
+            ne_lon = float(request.args.get("neLon"))
+            sw_lat = float(request.args.get("swLat"))
+            sw_lon = float(request.args.get("swLon"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "invalid bounds"}), 400
+
+        return jsonify(self._map_tiles.get_changes(layer, ne_lat, ne_lon, sw_lat, sw_lon,
+                                                   parse_tile_cursors(request.args.get("tiles"),
+                                                                      request.args.get("cursor"))))
+
 
 def get_routepool_route(route):
     return {
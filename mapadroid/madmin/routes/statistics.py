@@ -2,7 +2,8 @@ import datetime
 import json
 import time
 
-from flask import flash, jsonify, redirect, render_template, request, url_for
+from flask import (Response, abort, flash, jsonify, redirect, render_template,
+                   request, url_for)
 
 from mapadroid.db.DbStatsReader import DbStatsReader
 from mapadroid.db.DbWrapper import DbWrapper
@@ -13,6 +14,7 @@ from mapadroid.utils.gamemechanicutil import calculate_iv, calculate_mon_level
 from mapadroid.utils.geo import get_distance_of_two_points_in_meters
 from mapadroid.utils.language import get_mon_name
 from mapadroid.utils.logging import LoggerEnums, get_logger
+from mapadroid.utils.metrics import CONTENT_TYPE, REGISTRY
 
 logger = get_logger(LoggerEnums.madmin)
 
@@ -59,6 +61,7 @@ class MADminStatistics(object):
             ("/get_stop_quest_stats", self.get_stop_quest_stats),
             ("/statistics_stop_quest", self.statistics_stop_quest),
             ("/get_noniv_encounters_count", self.get_noniv_encounters_count),
+            ("/metrics", self.metrics),
         ]
         for route, view_func in routes:
             self._app.route(route)(view_func)
@@ -456,6 +459,12 @@ class MADminStatistics(object):
     def get_status(self):
         return jsonify(self._db.download_status())
 
+    @auth_required
+    def metrics(self):
+        if not REGISTRY.enabled:
+            abort(404)
+        return Response(REGISTRY.generate_latest(), content_type=CONTENT_TYPE)
+
     @auth_required
     @logger.catch()
     def get_spawnpoints_stats(self):
@@ -768,7 +777,7 @@ class MADminStatistics(object):
     @auth_required
     def delete_unfenced_spawns(self):
         processed_fences = []
-        spawns = []
+        spawns = set()
         possible_fences = get_geofences(self._mapping_manager, self._data_manager)
         for possible_fence in possible_fences:
             for subfence in possible_fences[possible_fence]['include']:
@@ -781,8 +790,7 @@ class MADminStatistics(object):
                         fence=fence
                     )
                 )
-                for spawnid in data:
-                    spawns.append(spawnid)
+                spawns.update(data)
 
         self._db.delete_spawnpoints([x for x in self._db.get_all_spawnpoints() if x not in spawns])
 
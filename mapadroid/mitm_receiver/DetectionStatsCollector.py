@@ -0,0 +1,123 @@
+import time
+from typing import Dict, List, Optional
+
+from mapadroid.db.DbStatsSubmit import DbStatsSubmit
+from mapadroid.utils.logging import LoggerEnums, get_logger, get_origin_logger
+
+logger = get_logger(LoggerEnums.mitm)
+
+
+class OriginDetections:
+    """
+    Detections of one origin since the last flush: encounter/gym/stop id -> number of times seen
+    """
+    __slots__ = ("mon", "mon_iv", "shiny", "raid", "quest", "since")
+
+    def __init__(self, since: float):
+        self.mon: Dict[str, int] = {}
+        self.mon_iv: Dict[str, int] = {}
+        self.shiny: Dict[str, int] = {}
+        self.raid: Dict[str, int] = {}
+        self.quest: Dict[str, int] = {}
+        self.since: float = since
+
+    def is_empty(self) -> bool:
+        return not (self.mon or self.mon_iv or self.raid or self.quest)
+
+
+class DetectionStatsCollector:
+    """
+    Counts the mons, encounters, raids and quests seen per origin within the MITM data processor owning it.
+    The counters are only touched by the thread processing the data, the aggregated counts of an origin are
+    submitted every game_stats_save_time seconds (and at the start of every hour) like the location statistics
+    collected by the MitmMapper.
+    """
+
+    def __init__(self, application_args, db_stats_submit: DbStatsSubmit):
+        self._enabled: bool = application_args.game_stats
+        self._submit_raw: bool = application_args.game_stats_raw
+        self._save_time: int = application_args.game_stats_save_time
+        self._db_stats_submit: DbStatsSubmit = db_stats_submit
+        self._origins: Dict[str, OriginDetections] = {}
+
+    def _detections_of(self, origin: str) -> Optional[OriginDetections]:
+        if not self._enabled:
+            return None
+        detections = self._origins.get(origin)
+        if detections is None:
+            detections = self._origins[origin] = OriginDetections(time.time())
+        return detections
+
+    def collect_mon(self, origin: str, encounter_id: str):
+        detections = self._detections_of(origin)
+        if detections is not None:
+            detections.mon[encounter_id] = detections.mon.get(encounter_id, 0) + 1
+
+    def collect_mon_iv(self, origin: str, encounter_id: str, shiny: int):
+        detections = self._detections_of(origin)
+        if detections is not None:
+            detections.mon_iv[encounter_id] = detections.mon_iv.get(encounter_id, 0) + 1
+            detections.shiny.setdefault(encounter_id, shiny)
+
+    def collect_raid(self, origin: str, gym_id: str):
+        detections = self._detections_of(origin)
+        if detections is not None:
+            detections.raid[gym_id] = detections.raid.get(gym_id, 0) + 1
+
+    def collect_quest(self, origin: str, stop_id: str):
+        detections = self._detections_of(origin)
+        if detections is not None:
+            detections.quest[stop_id] = detections.quest.get(stop_id, 0) + 1
+
+    def flush_due(self, origin: str):
+        """
+        Submits the detections of the origin if they have been collected for game_stats_save_time seconds or the
+        hour changed since
+        """
+        detections = self._origins.get(origin)
+        if detections is None:
+            return
+        now = time.time()
+        if now - detections.since < self._save_time and \
+                time.localtime(now).tm_hour == time.localtime(detections.since).tm_hour:
+            return
+        self._flush(origin, now)
+
+    def flush_all(self):
+        now = time.time()
+        for origin in list(self._origins.keys()):
+            self._flush(origin, now)
+
+    def _flush(self, origin: str, period: float):
+        detections = self._origins.pop(origin)
+        if detections.is_empty():
+            return
+        origin_logger = get_origin_logger(logger, origin=origin)
+        stats_data = self.stats_complete_rows(origin, detections, period)
+        origin_logger.debug('Submit complete stats - Period: {}: {}', period, stats_data)
+        try:
+            self._db_stats_submit.submit_stats_complete(stats_data)
+            if self._submit_raw:
+                detections_raw = self.stats_detection_raw_rows(origin, detections, period)
+                origin_logger.debug('Submit raw detection stats for Period: {} - Count: {}', period,
+                                    len(detections_raw))
+                self._db_stats_submit.submit_stats_detections_raw(detections_raw)
+        except Exception as e:
+            origin_logger.error("Failed submitting detection stats: {}", e)
+
+    @staticmethod
+    def stats_complete_rows(origin: str, detections: OriginDetections, period: float) -> List[tuple]:
+        return [(str(origin), str(int(period)), str(len(detections.raid)), str(len(detections.mon)),
+                 str(len(detections.mon_iv)), str(len(detections.quest)))]
+
+    @staticmethod
+    def stats_detection_raw_rows(origin: str, detections: OriginDetections, period: float) -> List[tuple]:
+        period = str(int(period))
+        rows = []
+        for detection_type, counts in (("mon", detections.mon), ("raid", detections.raid),
+                                       ("quest", detections.quest)):
+            rows += [(str(origin), str(type_id), detection_type, str(count), 0, period)
+                     for type_id, count in counts.items()]
+        rows += [(str(origin), str(encounter_id), "mon_iv", str(count), int(detections.shiny[encounter_id]), period)
+                 for encounter_id, count in detections.mon_iv.items()]
+        return rows
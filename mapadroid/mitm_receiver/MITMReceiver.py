@@ -5,7 +5,7 @@ import socket
 import sys
 import time
 from functools import wraps
-from multiprocessing import JoinableQueue, Process
+from multiprocessing import Process
 from threading import RLock
 from typing import Any, Dict, Optional, Union
 
@@ -13,9 +13,14 @@ from flask import Flask, Response, request, send_file
 from gevent.pywsgi import WSGIServer
 
 from mapadroid.data_manager.dm_exceptions import UpdateIssue
-from mapadroid.mad_apk import (APKType, lookup_package_info, parse_frontend,
-                               stream_package, supported_pogo_version)
+from mapadroid.mad_apk import (APKType, get_package_cache, lookup_package_info,
+                               parse_frontend, stream_package,
+                               supported_pogo_version)
+from mapadroid.mitm_receiver.MitmDataDispatcher import MitmDataDispatcher
 from mapadroid.mitm_receiver.MitmMapper import MitmMapper
+from mapadroid.mitm_receiver.MitmProtoCodec import (PROCESSED_PROTO_TYPES,
+                                                    encode_queue_item, loads,
+                                                    slim_proto)
 from mapadroid.utils import MappingManager
 from mapadroid.utils.authHelper import check_auth
 from mapadroid.utils.autoconfig import PDConfig, RGCConfig, origin_generator
@@ -137,13 +142,13 @@ class EndpointAction(object):
                     # https://stackoverflow.com/questions/28304515/receiving-gzip-with-flask
                     compressed_data = io.BytesIO(request.data)
                     text_data = gzip.GzipFile(fileobj=compressed_data, mode='r')
-                    request_data = json.loads(text_data.read())
+                    request_data = loads(text_data.read())
                 else:
                     request_data = request.data
 
                 content_type = request.headers.get('Content-Type', None)
                 if content_type and content_type == "application/json":
-                    request_data = json.loads(request_data)
+                    request_data = loads(request_data)
                 else:
                     request_data = request_data
                 response_payload = self.action(origin, request_data, *args, **kwargs)
@@ -162,9 +167,10 @@ class EndpointAction(object):
 
 class MITMReceiver(Process):
     def __init__(self, listen_ip, listen_port, mitm_mapper, args_passed, mapping_manager: MappingManager,
-                 db_wrapper, data_manager, storage_obj, data_queue: JoinableQueue,
-                 name=None, enable_configmode: Optional[bool] = False):
+                 db_wrapper, data_manager, storage_obj, dispatcher: MitmDataDispatcher,
+                 name=None, enable_configmode: Optional[bool] = False, reuse_port: bool = False):
         Process.__init__(self, name=name)
+        self.__reuse_port: bool = reuse_port
         self.__application_args = args_passed
         self.__mapping_manager = mapping_manager
         self.__listen_ip = listen_ip
@@ -174,7 +180,7 @@ class MITMReceiver(Process):
         self.__hopper_mutex = RLock()
         self._db_wrapper = db_wrapper
         self.__storage_obj = storage_obj
-        self._data_queue: JoinableQueue = data_queue
+        self._dispatcher: MitmDataDispatcher = dispatcher
         self.app = Flask("MITMReceiver")
         self.add_endpoint(endpoint='/get_addresses', endpoint_name='get_addresses',
                           handler=self.get_addresses,
@@ -224,18 +230,39 @@ class MITMReceiver(Process):
 
     def shutdown(self):
         logger.info("MITMReceiver stop called...")
-        for _ in range(self.__application_args.mitmreceiver_data_workers):
-            self._add_to_queue(None)
+        if self._dispatcher is not None:
+            unsignalled = self._dispatcher.stop_processors()
+            if unsignalled:
+                logger.warning("Could not signal the MITM data processors {} to stop, their queues are full. They "
+                               "will be terminated", unsignalled)
 
     def run(self):
-        httpsrv = WSGIServer((self.__listen_ip, int(
-            self.__listen_port)), self.app.wsgi_app, log=LogLevelChanger)
+        listener = (self.__listen_ip, int(self.__listen_port))
+        if self.__reuse_port:
+            listener = self.__create_shared_listener()
+        httpsrv = WSGIServer(listener, self.app.wsgi_app, log=LogLevelChanger)
         try:
             httpsrv.serve_forever()
         except KeyboardInterrupt:
             httpsrv.close()
             logger.info("Received STOP signal in MITMReceiver")
 
+    def __create_shared_listener(self) -> socket.socket:
+        """
+        Listening socket bound with SO_REUSEPORT, the kernel spreads the connections across all receiver processes
+        bound to the port
+        """
+        family, socktype, proto, _, address = socket.getaddrinfo(self.__listen_ip, int(self.__listen_port),
+                                                                 type=socket.SOCK_STREAM,
+                                                                 flags=socket.AI_PASSIVE)[0]
+        listener = socket.socket(family, socktype, proto)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        listener.bind(address)
+        listener.listen(socket.SOMAXCONN)
+        listener.setblocking(False)
+        return listener
+
     def add_endpoint(self, endpoint=None, endpoint_name=None, handler=None, methods_passed=None):
         if methods_passed is None:
             logger.error("Invalid REST method specified")
@@ -269,7 +296,7 @@ class MITMReceiver(Process):
             origin_logger.warning("Could not read method ID. Stopping processing of proto")
             return
 
-        if proto_type not in (106, 102, 101, 104, 4, 156, 145):
+        if proto_type not in PROCESSED_PROTO_TYPES:
             # trash protos - ignoring
             return
 
@@ -285,11 +312,12 @@ class MITMReceiver(Process):
                                          timestamp_received_receiver=time.time(), key=proto_type, values_dict=data,
                                          location=location_of_data)
         origin_logger.debug2("Placing data received to data_queue")
-        self._add_to_queue((timestamp, data, origin))
+        self._add_to_queue(origin, encode_queue_item(timestamp, slim_proto(data), origin))
 
-    def _add_to_queue(self, data):
-        if self._data_queue:
-            self._data_queue.put(data)
+    def _add_to_queue(self, origin: str, data):
+        if self._dispatcher is not None and not self._dispatcher.put(origin, data):
+            get_origin_logger(logger, origin=origin).warning("Dropped data received, the queue of its MITM data "
+                                                             "processor is full")
 
     def get_latest(self, origin, data):
         injected_settings = self.__mitm_mapper.request_latest(
@@ -360,7 +388,8 @@ class MITMReceiver(Process):
         if type(parsed) == Response:
             return parsed
         apk_type, apk_arch = parsed
-        return stream_package(self._db_wrapper, self.__storage_obj, apk_type, apk_arch)
+        return stream_package(self._db_wrapper, self.__storage_obj, apk_type, apk_arch,
+                              get_package_cache(self.__application_args))
 
     def mad_apk_info(self, *args, **kwargs) -> Response:
         parsed = parse_frontend(**kwargs)
@@ -0,0 +1,325 @@
+import bisect
+import time
+import zlib
+from collections import deque
+from multiprocessing import Array, JoinableQueue, Lock, Value
+from queue import Empty, Full
+from typing import Any, Deque, List, Optional, Tuple
+
+from mapadroid.utils.logging import LoggerEnums, get_logger
+
+logger = get_logger(LoggerEnums.mitm)
+
+# points of every processor queue on the hash ring
+VIRTUAL_NODES = 64
+# seconds a receiver waits between its attempts to queue data while the queue of the origin is full
+PUT_RETRY_INTERVAL = 0.01
+# seconds a processor waits between its checks whether the data of its new devices has been handed over
+HANDOVER_POLL_INTERVAL = 0.05
+# seconds a processor waits at most for the data of its new devices before taking their new data anyway
+HANDOVER_TIMEOUT = 60
+# seconds to wait for data still being written to the queue of a dead processor
+DRAIN_TIMEOUT = 0.1
+
+# state of the handover of the devices moved to a queue
+HANDOVER_DONE = 0
+# the queues the devices moved from still hold data queued before the move
+HANDOVER_FINISHING = 1
+# data moved over from other queues has not arrived yet
+HANDOVER_MOVING = 2
+
+# (time.time() of the put, origin, item, whether the item has been moved from another queue)
+QueuedItem = Tuple[float, str, Any, bool]
+
+
+def _ring_hash(key: str) -> int:
+    # stable across processes unlike hash()
+    return zlib.crc32(key.encode("utf-8"))
+
+
+class MitmDataDispatcher(object):
+    """
+    Routes the data of a device to the queue of one data processor, selected by a consistent hash of the origin.
+    The data of a device is thus processed in order and devices do not compete for the rows of the same area in
+    parallel. The queues are bounded, a receiver blocks up to put_timeout seconds on a full queue before dropping
+    the data.
+
+    Queues can be taken out of the ring (e.g. while their processor is overloaded or dead) and put back in, only the
+    origins of such a queue move. The data of a moved origin still queued at its old queue is moved over to its new
+    queue, either by the processor of the old queue when it takes the data or by move_items if that processor is
+    dead. The new queue only takes the new data of the origin once all of that data arrived, so the data of an origin
+    is never processed by two processors at the same time. The data held back meanwhile is bounded by the queue size,
+    further data is dropped.
+
+    The state is shared with the receiver and processor processes through shared memory, the dispatcher has to be
+    passed to them when they are created. Each queue is read by a single processor.
+    """
+
+    def __init__(self, queue_count: int, queue_size: int = 0, put_timeout: float = 5):
+        self.queues: List[JoinableQueue] = [JoinableQueue(maxsize=queue_size) for _ in range(queue_count)]
+        self._queue_size: int = queue_size
+        self._put_timeout: float = put_timeout
+        # held while picking the queue of an origin and putting to it, the ring does not change in between
+        self._routing_lock = Lock()
+        self._enabled = Array('b', [1] * queue_count)
+        self._generation = Value('i', 0)
+        # time.time() the last item taken from a queue has been put and when it has been taken
+        self._last_enqueued = Array('d', queue_count)
+        self._last_dequeued = Array('d', queue_count)
+        self._dropped = Array('i', queue_count)
+        # items put to a queue and items of a queue processed or moved to another queue
+        self._queued = Array('q', queue_count)
+        self._finished = Array('q', queue_count)
+        # _handover[target * queue_count + source]: number of items of the source queue to be finished before the
+        # target queue takes the new data of the origins moved from the source queue
+        self._handover = Array('q', queue_count * queue_count)
+        # items moved to a queue from other queues
+        self._moved_in = Array('q', queue_count)
+        # built per process
+        self._ring: Optional[Tuple[List[int], List[int]]] = None
+        self._ring_generation: int = -1
+        # state of the processors reading the queues, per process
+        self._moved_received: List[int] = [0] * queue_count
+        self._deferred_moved: List[Deque[QueuedItem]] = [deque() for _ in range(queue_count)]
+        self._deferred: List[Deque[QueuedItem]] = [deque() for _ in range(queue_count)]
+        self._handover_since: List[Optional[float]] = [None] * queue_count
+        self._stopping: List[bool] = [False] * queue_count
+
+    def __len__(self):
+        return len(self.queues)
+
+    def _get_ring_indexes(self) -> List[int]:
+        enabled = [index for index in range(len(self.queues)) if self._enabled[index]]
+        # never leave the data without a queue
+        return enabled if enabled else list(range(len(self.queues)))
+
+    def _build_ring(self) -> Tuple[List[int], List[int]]:
+        points = sorted((_ring_hash("{}-{}".format(index, node)), index)
+                        for index in self._get_ring_indexes() for node in range(VIRTUAL_NODES))
+        return [point for point, _ in points], [index for _, index in points]
+
+    def get_queue_index(self, origin: str) -> int:
+        generation = self._generation.value
+        if self._ring is None or self._ring_generation != generation:
+            self._ring = self._build_ring()
+            self._ring_generation = generation
+        hashes, indexes = self._ring
+        position = bisect.bisect(hashes, _ring_hash(origin)) % len(hashes)
+        return indexes[position]
+
+    def put(self, origin: str, item: Any) -> bool:
+        """
+        Queue an item of the origin, blocking while the queue of the origin is full
+        :return: False if the item has been dropped
+        """
+        return self._put((time.time(), origin, item, False))
+
+    def _put(self, queued: QueuedItem) -> bool:
+        deadline = time.time() + self._put_timeout
+        while True:
+            with self._routing_lock:
+                index = self.get_queue_index(queued[1])
+                try:
+                    self.queues[index].put_nowait(queued)
+                except Full:
+                    pass
+                else:
+                    self._queued[index] += 1
+                    if queued[3]:
+                        with self._moved_in.get_lock():
+                            self._moved_in[index] += 1
+                    return True
+            if time.time() >= deadline:
+                with self._dropped.get_lock():
+                    self._dropped[index] += 1
+                return False
+            time.sleep(PUT_RETRY_INTERVAL)
+
+    def stop_processors(self, processors_per_queue: int = 1, timeout: float = 5) -> List[int]:
+        """
+        Signal the processors to stop once they took the data queued before
+        :return: the indexes of the queues whose processors could not be signalled within timeout seconds as their
+        queue stayed full
+        """
+        deadline = time.time() + timeout
+        unsignalled = []
+        for index, data_queue in enumerate(self.queues):
+            try:
+                for _ in range(processors_per_queue):
+                    data_queue.put(None, timeout=max(0.0, deadline - time.time()))
+            except Full:
+                unsignalled.append(index)
+        return unsignalled
+
+    def get(self, index: int, timeout: Optional[float] = None) -> Any:
+        """
+        Take the next item of a queue, raises queue.Empty if the timeout passed. Items of origins moved to another
+        queue are moved over instead of being returned
+        :return: the item or None if the processor is to stop
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            queued = self._take_deferred(index)
+            if queued is None:
+                state = self._get_handover_state(index)
+                if self._stopping[index] and state == HANDOVER_DONE and not self._deferred[index]:
+                    return None
+                wait = None if deadline is None else max(0.0, deadline - time.time())
+                if state != HANDOVER_DONE or self._stopping[index]:
+                    wait = HANDOVER_POLL_INTERVAL if wait is None else min(wait, HANDOVER_POLL_INTERVAL)
+                try:
+                    queued = self.queues[index].get(timeout=wait)
+                except Empty:
+                    if deadline is not None and time.time() >= deadline:
+                        raise
+                    continue
+                if queued is None:
+                    # stop once the data handed over has been taken
+                    self._stopping[index] = True
+                    continue
+                self._defer(index, queued)
+                continue
+            enqueued, origin, item, _ = queued
+            if self.get_queue_index(origin) != index:
+                self._move(index, queued)
+                continue
+            self._last_enqueued[index] = enqueued
+            self._last_dequeued[index] = time.time()
+            return item
+
+    def _defer(self, index: int, queued: QueuedItem):
+        """
+        Hold back an item taken from a queue, everything passes the deferred items so that new data does not
+        overtake the data handed over. The deferred items are bounded by the queue size, the data handed over
+        replaces the newest new data
+        """
+        if queued[3]:
+            self._moved_received[index] += 1
+            if self._deferred_full(index) and self._deferred[index]:
+                self._deferred[index].pop()
+                self._drop(index)
+            self._deferred_moved[index].append(queued)
+        elif self._deferred_full(index):
+            self._drop(index)
+        else:
+            self._deferred[index].append(queued)
+
+    def _deferred_full(self, index: int) -> bool:
+        return 0 < self._queue_size <= len(self._deferred_moved[index]) + len(self._deferred[index])
+
+    def _drop(self, index: int):
+        with self._dropped.get_lock():
+            self._dropped[index] += 1
+        self.task_done(index)
+
+    def _take_deferred(self, index: int) -> Optional[QueuedItem]:
+        if not self._deferred_moved[index] and not self._deferred[index]:
+            return None
+        state = self._get_handover_state(index)
+        if state == HANDOVER_FINISHING:
+            return None
+        if self._deferred_moved[index]:
+            return self._deferred_moved[index].popleft()
+        if state == HANDOVER_MOVING:
+            return None
+        return self._deferred[index].popleft()
+
+    def _get_handover_state(self, index: int) -> int:
+        count = len(self.queues)
+        if any(self._finished[source] < self._handover[index * count + source]
+               for source in range(count) if source != index):
+            state = HANDOVER_FINISHING
+        elif self._moved_received[index] < self._moved_in[index]:
+            state = HANDOVER_MOVING
+        else:
+            self._handover_since[index] = None
+            return HANDOVER_DONE
+        if self._handover_since[index] is None:
+            self._handover_since[index] = time.time()
+        elif time.time() - self._handover_since[index] > HANDOVER_TIMEOUT:
+            logger.warning("MITM data processor {} waited {}s for the data of its new devices to be handed over, "
+                           "taking their new data anyway", index, HANDOVER_TIMEOUT)
+            with self._routing_lock:
+                for source in range(count):
+                    self._handover[index * count + source] = 0
+                self._moved_received[index] = self._moved_in[index]
+            self._handover_since[index] = None
+            return HANDOVER_DONE
+        return state
+
+    def _move(self, index: int, queued: QueuedItem) -> bool:
+        """
+        Move an item taken from a queue to the queue now owning its origin, blocking while that queue is full
+        :return: False if the item has been dropped
+        """
+        enqueued, origin, item, _ = queued
+        moved = self._put((enqueued, origin, item, True))
+        self.task_done(index)
+        return moved
+
+    def move_items(self, index: int) -> int:
+        """
+        Move the items of a queue whose processor died to the queues now owning their origins. The items the
+        processor had taken already are lost, the other queues do not wait for them
+        :return: number of items moved, the items dropped as the target queue is full are counted as dropped
+        """
+        items = []
+        while True:
+            try:
+                queued = self.queues[index].get(timeout=DRAIN_TIMEOUT)
+            except Empty:
+                break
+            if queued is not None:
+                items.append(queued)
+        moved = sum(1 for queued in items if self._move(index, queued))
+        with self._routing_lock:
+            with self._finished.get_lock():
+                self._finished[index] = max(self._finished[index], self._queued[index])
+        return moved
+
+    def task_done(self, index: int):
+        self.queues[index].task_done()
+        with self._finished.get_lock():
+            self._finished[index] += 1
+
+    def set_enabled(self, index: int, enabled: bool):
+        with self._routing_lock:
+            if bool(self._enabled[index]) == enabled:
+                return
+            before = set(self._get_ring_indexes())
+            self._enabled[index] = int(enabled)
+            after = set(self._get_ring_indexes())
+            # origins only move from removed queues or to added ones, their new queue waits for the items queued at
+            # the old one until now
+            count = len(self.queues)
+            for target in range(count):
+                for source in range(count):
+                    if target != source and (source in before - after or target in after - before):
+                        self._handover[target * count + source] = self._queued[source]
+            self._generation.value += 1
+
+    def is_enabled(self, index: int) -> bool:
+        return bool(self._enabled[index])
+
+    def get_depth(self, index: int) -> int:
+        # there's no implementation of qsize() on MacOS
+        try:
+            return self.queues[index].qsize()
+        except NotImplementedError:
+            return 0
+
+    def get_lag(self, index: int) -> float:
+        """
+        Seconds the last item taken from the queue has waited. Grows while a processor does not take items from a
+        non-empty queue
+        """
+        last_dequeued = self._last_dequeued[index]
+        lag = last_dequeued - self._last_enqueued[index] if last_dequeued else 0.0
+        if self.get_depth(index) > 0 and last_dequeued:
+            lag = max(lag, time.time() - last_dequeued)
+        return lag
+
+    def pop_dropped(self, index: int) -> int:
+        with self._dropped.get_lock():
+            dropped, self._dropped[index] = self._dropped[index], 0
+        return dropped
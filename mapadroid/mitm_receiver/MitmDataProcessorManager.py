@@ -1,22 +1,40 @@
 import threading
 import time
-from multiprocessing import JoinableQueue
+from typing import List
 
 from mapadroid.db.DbWrapper import DbWrapper
+from mapadroid.mitm_receiver.MitmDataDispatcher import MitmDataDispatcher
 from mapadroid.mitm_receiver.MitmMapper import MitmMapper
 from mapadroid.mitm_receiver.SerializedMitmDataProcessor import \
     SerializedMitmDataProcessor
 from mapadroid.utils.logging import LoggerEnums, get_logger
+from mapadroid.utils.metrics import Counter, Gauge
 from mapadroid.utils.questGen import QuestGen
 
 logger = get_logger(LoggerEnums.mitm)
 
+# share of the queue size at which a queue is taken out of the hash ring and put back in
+QUEUE_HIGH_WATERMARK = 0.75
+QUEUE_LOW_WATERMARK = 0.25
+# seconds an item may wait in a queue before a processor is considered falling behind
+QUEUE_LAG_WARNING = 10
+# seconds the processors get to take the data queued before the signal to stop before they are terminated
+PROCESSOR_STOP_TIMEOUT = 10
+
+MITM_QUEUE_DEPTH = Gauge("mad_mitm_queue_depth", "Items waiting in the queue of a MITM data processor", ["processor"])
+MITM_QUEUE_LAG_SECONDS = Gauge("mad_mitm_queue_lag_seconds",
+                               "Age of the oldest item waiting in the queue of a MITM data processor", ["processor"])
+MITM_DROPPED_ITEMS = Counter("mad_mitm_dropped_items_total",
+                             "Items of MITM data dropped because the queue of the processor was full", ["processor"])
+
 
 class MitmDataProcessorManager():
     def __init__(self, args, mitm_mapper: MitmMapper, db_wrapper: DbWrapper, quest_gen: QuestGen):
-        self._worker_threads = []
+        self._worker_threads: List[SerializedMitmDataProcessor] = []
         self._args = args
-        self._mitm_data_queue: JoinableQueue = JoinableQueue()
+        self._dispatcher: MitmDataDispatcher = MitmDataDispatcher(args.mitmreceiver_data_workers,
+                                                                  queue_size=args.mitm_queue_size,
+                                                                  put_timeout=args.mitm_queue_timeout)
         self._mitm_mapper: MitmMapper = mitm_mapper
         self._db_wrapper: DbWrapper = db_wrapper
         self._queue_check_thread = None
@@ -27,32 +45,72 @@ class MitmDataProcessorManager():
         self._queue_check_thread.start()
         self._quest_gen = quest_gen
 
-    def get_queue(self):
-        return self._mitm_data_queue
+    def get_dispatcher(self) -> MitmDataDispatcher:
+        return self._dispatcher
 
     def get_queue_size(self):
-        # for whatever reason, there's no actual implementation of qsize()
-        # on MacOS. There are better solutions for this but c'mon, who is
-        # running MAD on MacOS anyway?
-        try:
-            item_count = self._mitm_data_queue.qsize()
-        except NotImplementedError:
-            item_count = 0
-
-        return item_count
+        return sum(self._dispatcher.get_depth(index) for index in range(len(self._dispatcher)))
 
     def _queue_size_check(self):
         while not self._stop_queue_check_thread:
-            item_count = self.get_queue_size()
-            if item_count > 50:
-                logger.warning("MITM data processing workers are falling behind! Queue length: {}", item_count)
-
+            for index in range(len(self._dispatcher)):
+                self._check_queue(index)
             time.sleep(3)
 
+    def _check_queue(self, index: int):
+        depth = self._dispatcher.get_depth(index)
+        lag = self._dispatcher.get_lag(index)
+        dropped = self._dispatcher.pop_dropped(index)
+        MITM_QUEUE_DEPTH.labels(index).set(depth)
+        MITM_QUEUE_LAG_SECONDS.labels(index).set(lag)
+        if dropped:
+            MITM_DROPPED_ITEMS.labels(index).inc(dropped)
+            logger.error("Dropped {} items of MITM data of processor {}, its queue is full", dropped, index)
+        if depth > self._high_watermark() or lag > QUEUE_LAG_WARNING:
+            logger.warning("MITM data processor {} is falling behind! Queue length: {}, lag: {:.1f}s",
+                           index, depth, lag)
+        self._rebalance(index, depth)
+
+    def _high_watermark(self) -> int:
+        return int(self._args.mitm_queue_size * QUEUE_HIGH_WATERMARK) if self._args.mitm_queue_size > 0 else 50
+
+    def _low_watermark(self) -> int:
+        return int(self._args.mitm_queue_size * QUEUE_LOW_WATERMARK) if self._args.mitm_queue_size > 0 else 10
+
+    def _rebalance(self, index: int, depth: int):
+        """
+        Moves the devices of a dead or overloaded processor to the other processors until its queue drained.
+        Only devices of the processor move. Their data queued already is moved over by the processor, or here if
+        the processor died, and the data of a device is still processed by a single processor at a time
+        """
+        if index < len(self._worker_threads) and not self._worker_threads[index].is_alive():
+            if self._dispatcher.is_enabled(index):
+                logger.error("MITM data processor {} died, moving its devices to the other processors", index)
+                self._dispatcher.set_enabled(index, False)
+            moved = self._dispatcher.move_items(index)
+            if moved:
+                logger.warning("Moved {} items of MITM data of the dead processor {} to the other processors",
+                               moved, index)
+            return
+        if self._dispatcher.is_enabled(index):
+            others_available = any(self._dispatcher.is_enabled(other)
+                                   and self._dispatcher.get_depth(other) < self._low_watermark()
+                                   for other in range(len(self._dispatcher)) if other != index)
+            if depth > self._high_watermark() and others_available:
+                logger.warning("Moving the devices of MITM data processor {} to the other processors until its "
+                               "queue drained", index)
+                self._dispatcher.set_enabled(index, False)
+        elif depth <= self._low_watermark():
+            logger.info("MITM data processor {} caught up, moving its devices back", index)
+            self._dispatcher.set_enabled(index, True)
+
     def launch_processors(self):
+        # warm the spawnpoint cache once, the processors inherit a copy of it
+        self._db_wrapper.proto_submit.warm_spawnpoint_cache()
         for i in range(self._args.mitmreceiver_data_workers):
             data_processor: SerializedMitmDataProcessor = SerializedMitmDataProcessor(
-                self._mitm_data_queue,
+                self._dispatcher,
+                i,
                 self._args,
                 self._mitm_mapper,
                 self._db_wrapper,
@@ -66,10 +124,14 @@ class MitmDataProcessorManager():
         self._stop_queue_check_thread = True
 
         logger.info("Stopping {} MITM data processors", len(self._worker_threads))
+        deadline = time.time() + PROCESSOR_STOP_TIMEOUT
         for worker_thread in self._worker_threads:
-            worker_thread.terminate()
-            worker_thread.join()
+            worker_thread.join(max(0.0, deadline - time.time()))
+            if worker_thread.is_alive():
+                logger.warning("MITM data processor {} did not stop in time, terminating it", worker_thread.name)
+                worker_thread.terminate()
+                worker_thread.join()
         logger.info("Stopped MITM data processors")
 
-        if self._mitm_data_queue is not None:
-            self._mitm_data_queue.close()
+        for data_queue in self._dispatcher.queues:
+            data_queue.close()
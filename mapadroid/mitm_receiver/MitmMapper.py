@@ -1,9 +1,10 @@
 import time
+import zlib
 from multiprocessing import Lock, Queue
 from multiprocessing.managers import SyncManager
 from queue import Empty
-from threading import Event, Thread
-from typing import Dict
+from threading import Condition, Event, Thread
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from mapadroid.db.DbStatsSubmit import DbStatsSubmit
 from mapadroid.mitm_receiver.PlayerStats import PlayerStats
@@ -13,25 +14,41 @@ from mapadroid.utils.MappingManager import MappingManager
 
 logger = get_logger(LoggerEnums.mitm)
 
+# passed as seen_update to wait_for_proto to accept protos received before the call as well
+NO_UPDATE_SEEN = -1
+
 
 class MitmMapperManager(SyncManager):
     pass
 
 
+def get_mitm_mapper_shard(origin: str, shard_count: int) -> int:
+    # stable across processes unlike hash()
+    return zlib.crc32(origin.encode("utf-8")) % shard_count
+
+
 class MitmMapper(object):
-    def __init__(self, args, mapping_manager: MappingManager, db_stats_submit: DbStatsSubmit):
+    def __init__(self, args, mapping_manager: MappingManager, db_stats_submit: DbStatsSubmit,
+                 shard_index: int = 0, shard_count: int = 1):
         self.__mapping = {}
         self.__playerstats: Dict[str, PlayerStats] = {}
-        self.__mapping_mutex = Lock()
+        self.__shard_index: int = shard_index
+        self.__shard_count: int = shard_count
+        # guards adding devices, the data of a device is guarded by the lock of its condition
+        self.__devices_mutex = Lock()
         self.__mapping_manager: MappingManager = mapping_manager
         self.__injected = {}
         self.__last_cellsid = {}
         self.__last_possibly_moved = {}
+        # per origin: condition notified by update_latest, number of the latest update and
+        # proto key -> (number of the update, timestamp received)
+        self.__origin_conditions: Dict[str, Condition] = {}
+        self.__update_counts: Dict[str, int] = {}
+        self.__proto_updates: Dict[str, Dict[object, Tuple[int, float]]] = {}
         self.__application_args = args
         self._db_stats_submit: DbStatsSubmit = db_stats_submit
         self.__playerstats_db_update_stop: Event = Event()
         self.__playerstats_db_update_queue: Queue = Queue()
-        self.__playerstats_db_update_mutex: Lock = Lock()
         pstat_args = {
             'name': 'system',
             'target': self.__internal_playerstats_db_update_consumer
@@ -39,7 +56,8 @@ class MitmMapper(object):
         self.__playerstats_db_update_consumer: Thread = Thread(**pstat_args)
         if self.__mapping_manager is not None:
             for origin in self.__mapping_manager.get_all_devicemappings().keys():
-                self.__add_new_device(origin)
+                if get_mitm_mapper_shard(origin, self.__shard_count) == self.__shard_index:
+                    self.__add_new_device(origin)
         self.__playerstats_db_update_consumer.daemon = True
         self.__playerstats_db_update_consumer.start()
 
@@ -50,8 +68,7 @@ class MitmMapper(object):
 
     def add_stats_to_process(self, client_id, stats, last_processed_timestamp):
         if self.__application_args.game_stats:
-            with self.__playerstats_db_update_mutex:
-                self.__playerstats_db_update_queue.put((client_id, stats, last_processed_timestamp))
+            self.__playerstats_db_update_queue.put((client_id, stats, last_processed_timestamp))
 
     def __internal_playerstats_db_update_consumer(self):
         try:
@@ -60,10 +77,8 @@ class MitmMapper(object):
                     logger.info("Playerstats are disabled")
                     break
                 try:
-                    with self.__playerstats_db_update_mutex:
-                        next_item = self.__playerstats_db_update_queue.get_nowait()
+                    next_item = self.__playerstats_db_update_queue.get(timeout=0.5)
                 except Empty:
-                    time.sleep(0.5)
                     continue
                 if next_item is not None:
                     client_id, stats, last_processed_timestamp = next_item
@@ -76,25 +91,13 @@ class MitmMapper(object):
     def __process_stats(self, stats, client_id: str, last_processed_timestamp: float):
         origin_logger = get_origin_logger(logger, origin=client_id)
         origin_logger.debug('Submitting stats')
-        data_send_stats = []
-        data_send_location = []
-
-        data_send_stats.append(PlayerStats.stats_complete_parser(client_id, stats, last_processed_timestamp))
-        data_send_location.append(
-            PlayerStats.stats_location_parser(client_id, stats, last_processed_timestamp))
-
-        self._db_stats_submit.submit_stats_complete(data_send_stats)
+        # the detections are submitted by the DetectionStatsCollector of the MITM data processors
+        data_send_location = [PlayerStats.stats_location_parser(client_id, stats, last_processed_timestamp)]
         self._db_stats_submit.submit_stats_locations(data_send_location)
         if self.__application_args.game_stats_raw:
             data_send_location_raw = PlayerStats.stats_location_raw_parser(client_id, stats,
                                                                            last_processed_timestamp)
-            data_send_detection_raw = PlayerStats.stats_detection_raw_parser(client_id, stats,
-                                                                             last_processed_timestamp)
             self._db_stats_submit.submit_stats_locations_raw(data_send_location_raw)
-            self._db_stats_submit.submit_stats_detections_raw(data_send_detection_raw)
-
-        data_send_stats.clear()
-        data_send_location.clear()
 
         self._db_stats_submit.cleanup_statistics()
 
@@ -128,7 +131,7 @@ class MitmMapper(object):
     def request_latest(self, origin, key=None):
         origin_logger = get_origin_logger(logger, origin=origin)
         origin_logger.debug2("Request latest called")
-        with self.__mapping_mutex:
+        with self.__get_origin_condition(origin):
             result = None
             retrieved = self.__mapping.get(origin, None)
             if retrieved is not None:
@@ -153,12 +156,16 @@ class MitmMapper(object):
             timestamp_received_receiver = time.time()
 
         updated = False
+        if origin not in self.__mapping:
+            with self.__devices_mutex:
+                if origin not in self.__mapping and \
+                        origin in self.__mapping_manager.get_all_devicemappings().keys():
+                    origin_logger.info("New device detected.  Setting up the device configuration")
+                    self.__add_new_device(origin)
         origin_logger.debug2("Trying to acquire lock and update proto {}", key)
-        with self.__mapping_mutex:
-            if origin not in self.__mapping.keys() and origin in self.__mapping_manager.get_all_devicemappings().keys():
-                origin_logger.info("New device detected.  Setting up the device configuration")
-                self.__add_new_device(origin)
-            if origin in self.__mapping.keys():
+        condition = self.__get_origin_condition(origin)
+        with condition:
+            if origin in self.__mapping:
                 origin_logger.debug2("Updating timestamp at {} with method {} to {}", location, key,
                                      timestamp_received_raw)
                 if self.__mapping.get(origin) is not None and self.__mapping[origin].get(key) is not None:
@@ -172,12 +179,56 @@ class MitmMapper(object):
                 if timestamp_received_receiver is not None:
                     self.__mapping[origin]["timestamp_receiver"] = timestamp_received_receiver
                 self.__mapping[origin][key]["values"] = values_dict
+                self.__update_counts[origin] += 1
+                self.__proto_updates[origin][key] = (self.__update_counts[origin], timestamp_received_raw)
+                condition.notify_all()
                 updated = True
             else:
                 origin_logger.warning("Not updating timestamp since origin is unknown")
         origin_logger.debug2("Done updating proto {}", key)
         return updated
 
+    def __get_origin_condition(self, origin: str) -> Condition:
+        # the condition's lock guards the data of the origin
+        condition = self.__origin_conditions.get(origin, None)
+        if condition is not None:
+            return condition
+        with self.__devices_mutex:
+            condition = self.__origin_conditions.get(origin, None)
+            if condition is None:
+                self.__update_counts[origin] = 0
+                self.__proto_updates[origin] = {}
+                condition = Condition()
+                self.__origin_conditions[origin] = condition
+            return condition
+
+    def wait_for_proto(self, origin: str, proto_id: int, after_ts: float, timeout: float,
+                       also_accepted: Optional[Iterable[int]] = None,
+                       seen_update: int = NO_UPDATE_SEEN) -> Tuple[Optional[dict], int]:
+        """
+        Block until the proto (or any of also_accepted) with a timestamp of at least after_ts has been received
+        by update_latest after the update numbered seen_update or the timeout (seconds) passed.
+        :return: the latest data of the origin (see request_latest) and the number of the latest update to be
+        passed as seen_update to wait for the next arrival
+        """
+        proto_ids = {proto_id}
+        if also_accepted:
+            proto_ids.update(also_accepted)
+        condition = self.__get_origin_condition(origin)
+
+        def arrived() -> bool:
+            proto_updates = self.__proto_updates[origin]
+            for key in proto_ids:
+                update_number, timestamp = proto_updates.get(key, (NO_UPDATE_SEEN, 0))
+                if update_number > seen_update and timestamp >= after_ts:
+                    return True
+            return False
+
+        with condition:
+            condition.wait_for(arrived, timeout=max(0.0, timeout))
+            latest = self.__mapping.get(origin, None)
+            return latest.copy() if latest is not None else None, self.__update_counts[origin]
+
     def set_injection_status(self, origin, status=True):
         origin_logger = get_origin_logger(logger, origin=origin)
         if origin not in self.__injected or not self.__injected[origin] and status is True:
@@ -187,15 +238,6 @@ class MitmMapper(object):
     def get_injection_status(self, origin):
         return self.__injected.get(origin, False)
 
-    def run_stats_collector(self, origin: str):
-        if not self.__application_args.game_stats:
-            pass
-
-        origin_logger = get_origin_logger(logger, origin=origin)
-        origin_logger.debug2("Running stats collector")
-        if self.__playerstats.get(origin, None) is not None:
-            self.__playerstats.get(origin).stats_collector()
-
     def collect_location_stats(self, origin: str, location: Location, datarec, start_timestamp: float, positiontype,
                                rec_timestamp: float, walker, transporttype):
         if self.__playerstats.get(origin, None) is not None and location is not None:
@@ -215,22 +257,6 @@ class MitmMapper(object):
         else:
             return -1
 
-    def collect_raid_stats(self, origin: str, gym_id: str):
-        if self.__playerstats.get(origin, None) is not None:
-            self.__playerstats.get(origin).stats_collect_raid(gym_id)
-
-    def collect_mon_stats(self, origin: str, encounter_id: str):
-        if self.__playerstats.get(origin, None) is not None:
-            self.__playerstats.get(origin).stats_collect_mon(encounter_id)
-
-    def collect_mon_iv_stats(self, origin: str, encounter_id: str, shiny: int):
-        if self.__playerstats.get(origin, None) is not None:
-            self.__playerstats.get(origin).stats_collect_mon_iv(encounter_id, shiny)
-
-    def collect_quest_stats(self, origin: str, stop_id: str):
-        if self.__playerstats.get(origin, None) is not None:
-            self.__playerstats.get(origin).stats_collect_quest(stop_id)
-
     def generate_player_stats(self, origin: str, inventory_proto: dict):
         if self.__playerstats.get(origin, None) is not None:
             self.__playerstats.get(origin).gen_player_stats(inventory_proto)
@@ -255,3 +281,71 @@ class MitmMapper(object):
 
     def get_last_timestamp_possible_moved(self, origin):
         return self.__last_possibly_moved.get(origin, None)
+
+
+class ShardedMitmMapper(object):
+    """
+    Spreads the origins across several MitmMapper instances (usually proxies of MitmMapperManager processes)
+    selected by get_mitm_mapper_shard. Offers the same methods as MitmMapper.
+    """
+
+    def __init__(self, shards: List[MitmMapper]):
+        self.__shards: List[MitmMapper] = shards
+
+    def __shard(self, origin: str) -> MitmMapper:
+        return self.__shards[get_mitm_mapper_shard(origin, len(self.__shards))]
+
+    def add_stats_to_process(self, client_id, stats, last_processed_timestamp):
+        self.__shard(client_id).add_stats_to_process(client_id, stats, last_processed_timestamp)
+
+    def shutdown(self):
+        for shard in self.__shards:
+            shard.shutdown()
+
+    def get_levelmode(self, origin):
+        return self.__shard(origin).get_levelmode(origin)
+
+    def get_safe_items(self, origin):
+        return self.__shard(origin).get_safe_items(origin)
+
+    def request_latest(self, origin, key=None):
+        return self.__shard(origin).request_latest(origin, key)
+
+    def update_latest(self, origin: str, key: str, values_dict, timestamp_received_raw: float = None,
+                      timestamp_received_receiver: float = None, location: Location = None):
+        return self.__shard(origin).update_latest(origin, key, values_dict,
+                                                  timestamp_received_raw=timestamp_received_raw,
+                                                  timestamp_received_receiver=timestamp_received_receiver,
+                                                  location=location)
+
+    def wait_for_proto(self, origin: str, proto_id: int, after_ts: float, timeout: float,
+                       also_accepted: Optional[Iterable[int]] = None,
+                       seen_update: int = NO_UPDATE_SEEN) -> Tuple[Optional[dict], int]:
+        return self.__shard(origin).wait_for_proto(origin, proto_id, after_ts, timeout,
+                                                   also_accepted=also_accepted, seen_update=seen_update)
+
+    def set_injection_status(self, origin, status=True):
+        self.__shard(origin).set_injection_status(origin, status)
+
+    def get_injection_status(self, origin):
+        return self.__shard(origin).get_injection_status(origin)
+
+    def collect_location_stats(self, origin: str, location: Location, datarec, start_timestamp: float, positiontype,
+                               rec_timestamp: float, walker, transporttype):
+        self.__shard(origin).collect_location_stats(origin, location, datarec, start_timestamp, positiontype,
+                                                    rec_timestamp, walker, transporttype)
+
+    def get_playerlevel(self, origin: str):
+        return self.__shard(origin).get_playerlevel(origin)
+
+    def get_poke_stop_visits(self, origin: str) -> int:
+        return self.__shard(origin).get_poke_stop_visits(origin)
+
+    def generate_player_stats(self, origin: str, inventory_proto: dict):
+        self.__shard(origin).generate_player_stats(origin, inventory_proto)
+
+    def submit_gmo_for_location(self, origin, payload):
+        self.__shard(origin).submit_gmo_for_location(origin, payload)
+
+    def get_last_timestamp_possible_moved(self, origin):
+        return self.__shard(origin).get_last_timestamp_possible_moved(origin)
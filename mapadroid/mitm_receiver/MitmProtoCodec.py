@@ -0,0 +1,83 @@
+import json
+import pickle
+from typing import Any, Optional, Tuple, Union
+
+from mapadroid.utils.logging import LoggerEnums, get_logger
+
+logger = get_logger(LoggerEnums.mitm)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# the protos processed by the data processors
+PROCESSED_PROTO_TYPES = (106, 102, 101, 104, 4, 156, 145)
+
+# fields of a GMO used by DbPogoProtoSubmit and MitmMapper.submit_gmo_for_location
+GMO_PAYLOAD_FIELDS = ("cells", "client_weather", "time_of_day_value")
+GMO_CELL_FIELDS = ("id", "current_timestamp", "forts", "wild_pokemon", "nearby_pokemon")
+
+FORMAT_MSGPACK = b"m"
+FORMAT_PICKLE = b"p"
+
+QueueItem = Tuple[float, dict, str]
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """ Decode JSON, using orjson if it is installed """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def slim_proto(proto: dict) -> dict:
+    """
+    Copy of a proto received from PogoDroid holding only the fields the data processors read. The GMO is reduced
+    to the cells and weather, the other protos processed are small and kept as they are.
+    """
+    proto_type = proto.get("type")
+    payload = proto.get("payload")
+    if proto_type == 106 and isinstance(payload, dict):
+        slim_payload = {field: payload[field] for field in GMO_PAYLOAD_FIELDS if field in payload}
+        cells = payload.get("cells")
+        if cells is not None:
+            slim_payload["cells"] = [{field: cell[field] for field in GMO_CELL_FIELDS if field in cell}
+                                     for cell in cells]
+        payload = slim_payload
+    slim = {"type": proto_type, "payload": payload}
+    if "raw" in proto:
+        slim["raw"] = proto["raw"]
+    return slim
+
+
+def encode_queue_item(timestamp: float, proto: dict, origin: str) -> bytes:
+    """
+    Serialize a queue item once in the receiver. Passing the bytes through the queue only copies them instead of
+    pickling the nested dicts of the proto. Uses msgpack if it is installed.
+    """
+    item = (timestamp, proto, origin)
+    if msgpack is not None:
+        try:
+            return FORMAT_MSGPACK + msgpack.packb(item, use_bin_type=True)
+        except (OverflowError, TypeError, ValueError) as e:
+            # e.g. integers beyond 64 bits
+            logger.debug("Unable to serialize the proto using msgpack, falling back to pickle: {}", e)
+    return FORMAT_PICKLE + pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_queue_item(item: Union[bytes, QueueItem, None]) -> Optional[QueueItem]:
+    """
+    Restore an item of the data queue, items put as tuples are returned as they are
+    """
+    if not isinstance(item, bytes):
+        return item
+    if item[:1] == FORMAT_MSGPACK:
+        timestamp, proto, origin = msgpack.unpackb(item[1:], raw=False, strict_map_key=False)
+        return timestamp, proto, origin
+    return pickle.loads(item[1:])
@@ -107,84 +107,6 @@ class PlayerStats(object):
                 self._stats_collector_start = False
                 self._last_processed_timestamp = time.time()
 
-    def stats_collect_mon(self, encounter_id: str):
-        if not self._generate_stats:
-            return
-        with self.__mapping_mutex:
-            if 106 not in self.__stats_collected:
-                self.__stats_collected[106] = {}
-
-            if 'mon' not in self.__stats_collected[106]:
-                self.__stats_collected[106]['mon'] = {}
-
-            if 'mon_count' not in self.__stats_collected[106]:
-                self.__stats_collected[106]['mon_count'] = 0
-
-            if encounter_id not in self.__stats_collected[106]['mon']:
-                self.__stats_collected[106]['mon'][encounter_id] = 1
-                self.__stats_collected[106]['mon_count'] += 1
-            else:
-                self.__stats_collected[106]['mon'][encounter_id] += 1
-
-    def stats_collect_mon_iv(self, encounter_id: str, shiny: int):
-        if not self._generate_stats:
-            return
-        with self.__mapping_mutex:
-            if 102 not in self.__stats_collected:
-                self.__stats_collected[102] = {}
-
-            if 'mon_iv' not in self.__stats_collected[102]:
-                self.__stats_collected[102]['mon_iv'] = {}
-
-            if 'mon_iv_count' not in self.__stats_collected[102]:
-                self.__stats_collected[102]['mon_iv_count'] = 0
-
-            if encounter_id not in self.__stats_collected[102]['mon_iv']:
-                self.__stats_collected[102]['mon_iv'][encounter_id] = {}
-                self.__stats_collected[102]['mon_iv'][encounter_id]['count'] = 1
-                self.__stats_collected[102]['mon_iv'][encounter_id]['shiny'] = shiny
-                self.__stats_collected[102]['mon_iv_count'] += 1
-            else:
-                self.__stats_collected[102]['mon_iv'][encounter_id]['count'] += 1
-
-    def stats_collect_raid(self, gym_id: str):
-        if not self._generate_stats:
-            return
-        with self.__mapping_mutex:
-            if 106 not in self.__stats_collected:
-                self.__stats_collected[106] = {}
-
-            if 'raid' not in self.__stats_collected[106]:
-                self.__stats_collected[106]['raid'] = {}
-
-            if 'raid_count' not in self.__stats_collected[106]:
-                self.__stats_collected[106]['raid_count'] = 0
-
-            if gym_id not in self.__stats_collected[106]['raid']:
-                self.__stats_collected[106]['raid'][gym_id] = 1
-                self.__stats_collected[106]['raid_count'] += 1
-            else:
-                self.__stats_collected[106]['raid'][gym_id] += 1
-
-    def stats_collect_quest(self, stop_id):
-        if not self._generate_stats:
-            return
-        with self.__mapping_mutex:
-            if 106 not in self.__stats_collected:
-                self.__stats_collected[106] = {}
-
-            if 'quest' not in self.__stats_collected[106]:
-                self.__stats_collected[106]['quest'] = {}
-
-            if 'quest_count' not in self.__stats_collected[106]:
-                self.__stats_collected[106]['quest_count'] = 0
-
-            if stop_id not in self.__stats_collected[106]['quest']:
-                self.__stats_collected[106]['quest'][stop_id] = 1
-                self.__stats_collected[106]['quest_count'] += 1
-            else:
-                self.__stats_collected[106]['quest'][stop_id] += 1
-
     def stats_collect_location_data(self, location, datarec, start_timestamp, positiontype, rec_timestamp, walker,
                                     transporttype):
         if not self._generate_stats:
@@ -220,32 +142,7 @@ class PlayerStats(object):
                     self.__stats_collected['location_ok'] += 1
                 else:
                     self.__stats_collected['location_nok'] += 1
-
-    @staticmethod
-    def stats_complete_parser(client_id: str, data, period):
-        raid_count = 0
-        mon_count = 0
-        mon_iv_count = 0
-        quest_count = 0
-        origin_logger = get_origin_logger(logger, client_id)
-        if 106 in data:
-            raid_count = data[106].get('raid_count', 0)
-            mon_count = data[106].get('mon_count', 0)
-            quest_count = data[106].get('quest_count', 0)
-
-        if 102 in data:
-            mon_iv_count = data[102].get('mon_iv_count', 0)
-        stats_data = (str(client_id),
-                      str(int(period)),
-                      str(raid_count),
-                      str(mon_count),
-                      str(mon_iv_count),
-                      str(quest_count)
-                      )
-
-        origin_logger.debug('Submit complete stats - Period: {}: {}', period, stats_data)
-
-        return stats_data
+        self.stats_collector()
 
     @staticmethod
     def stats_location_parser(client_id: str, data, period):
@@ -276,65 +173,3 @@ class PlayerStats(object):
         origin_logger.debug4('Submit raw location stats - Period: {} - Count: {}', period, len(data_location_raw))
 
         return data_location_raw
-
-    @staticmethod
-    def stats_detection_raw_parser(client_id: str, data, period):
-        origin_logger = get_origin_logger(logger, client_id)
-        data_location_raw = []
-        if 106 in data:
-            if 'mon' in data[106]:
-                for mon_id in data[106]['mon']:
-                    type_id = str(mon_id)
-                    type_count = int(data[106]['mon'][mon_id])
-
-                    data_location_raw.append((str(client_id),
-                                              str(type_id),
-                                              'mon',
-                                              str(type_count),
-                                              0,
-                                              str(int(period))
-                                              ))
-
-            if 'raid' in data[106]:
-                for gym_id in data[106]['raid']:
-                    type_id = str(gym_id)
-                    type_count = int(data[106]['raid'][gym_id])
-
-                    data_location_raw.append((str(client_id),
-                                              str(type_id),
-                                              'raid',
-                                              str(type_count),
-                                              0,
-                                              str(int(period))
-                                              ))
-
-            if 'quest' in data[106]:
-                for stop_id in data[106]['quest']:
-                    type_id = str(stop_id)
-                    type_count = int(data[106]['quest'][stop_id])
-
-                    data_location_raw.append((str(client_id),
-                                              str(type_id),
-                                              'quest',
-                                              str(type_count),
-                                              0,
-                                              str(int(period))
-                                              ))
-
-        if 102 in data:
-            if 'mon_iv' in data[102]:
-                for mon_id in data[102]['mon_iv']:
-                    type_id = str(mon_id)
-                    type_count = int(data[102]['mon_iv'][mon_id]['count'])
-                    shiny = int(data[102]['mon_iv'][mon_id]["shiny"])
-
-                    data_location_raw.append((str(client_id),
-                                              str(type_id),
-                                              'mon_iv',
-                                              str(type_count),
-                                              shiny,
-                                              str(int(period))
-                                              ))
-
-        origin_logger.debug('Submit raw detection stats for Period: {} - Count: {}', period, len(data_location_raw))
-        return data_location_raw
@@ -1,44 +1,158 @@
 import time
 from datetime import datetime
-from multiprocessing import Process, Queue
+from multiprocessing import Process
+from queue import Empty
 
 from mapadroid.db.DbPogoProtoSubmit import DbPogoProtoSubmit
 from mapadroid.db.DbWrapper import DbWrapper
+from mapadroid.mitm_receiver.DetectionStatsCollector import \
+    DetectionStatsCollector
+from mapadroid.mitm_receiver.MitmDataDispatcher import MitmDataDispatcher
 from mapadroid.mitm_receiver.MitmMapper import MitmMapper
+from mapadroid.mitm_receiver.MitmProtoCodec import decode_queue_item
 from mapadroid.utils.logging import LoggerEnums, get_logger, get_origin_logger
+from mapadroid.utils.metrics import Histogram
 from mapadroid.utils.questGen import QuestGen
 
 logger = get_logger(LoggerEnums.mitm)
 
+PROTO_PROCESSING_SECONDS = Histogram("mad_proto_processing_seconds",
+                                     "Time to process the MITM data of a proto, by proto type", ["type"])
+
+
+class BatchStatistics:
+    """
+    Aggregates the sizes and flush times of the batches written by a data processor and logs them periodically
+    """
+    def __init__(self, name, log_interval: int = 60):
+        self._name = name
+        self._log_interval: int = log_interval
+        self._last_log: float = time.time()
+        self._reset()
+
+    def _reset(self):
+        self.batches: int = 0
+        self.items: int = 0
+        self.rows: int = 0
+        self.max_size: int = 0
+        self.flush_time_ms: int = 0
+        self.max_flush_time_ms: int = 0
+
+    def record(self, size: int, rows: int, flush_time_ms: int):
+        self.batches += 1
+        self.items += size
+        self.rows += rows
+        self.max_size = max(self.max_size, size)
+        self.flush_time_ms += flush_time_ms
+        self.max_flush_time_ms = max(self.max_flush_time_ms, flush_time_ms)
+        if time.time() - self._last_log >= self._log_interval:
+            self.log()
+
+    def log(self):
+        if self.batches > 0:
+            logger.info("MITM data processor {}: {} batches with {} items in the last {}s (avg size {:.1f}, max size "
+                        "{}, {} rows written, avg flush {:.1f}ms, max flush {}ms)",
+                        self._name, self.batches, self.items, self._log_interval, self.items / self.batches,
+                        self.max_size, self.rows, self.flush_time_ms / self.batches, self.max_flush_time_ms)
+        self._last_log = time.time()
+        self._reset()
+
 
 class SerializedMitmDataProcessor(Process):
-    def __init__(self, multi_proc_queue: Queue, application_args, mitm_mapper: MitmMapper,
+    def __init__(self, dispatcher: MitmDataDispatcher, queue_index: int, application_args, mitm_mapper: MitmMapper,
                  db_wrapper: DbWrapper, quest_gen: QuestGen, name=None):
         Process.__init__(self, name=name)
-        self.__queue: Queue = multi_proc_queue
+        self.__dispatcher: MitmDataDispatcher = dispatcher
+        self.__queue_index: int = queue_index
         self.__db_submit: DbPogoProtoSubmit = db_wrapper.proto_submit
+        # only touched by the process running the data processor
+        self.__stats_collector: DetectionStatsCollector = DetectionStatsCollector(application_args,
+                                                                                  db_wrapper.stats_submit)
         self.__application_args = application_args
         self.__mitm_mapper: MitmMapper = mitm_mapper
         self._quest_gen: QuestGen = quest_gen
         self.__name = name
+        self._last_cache_stats_log: float = time.time()
 
     def run(self):
         logger.info("Starting serialized MITM data processor")
+        if self.__application_args.mitm_batch_size > 1:
+            self._run_batched()
+            return
         while True:
             try:
                 start_time = self.get_time_ms()
-                item = self.__queue.get()
+                item = decode_queue_item(self.__dispatcher.get(self.__queue_index))
                 if item is None:
                     logger.info("Received signal to stop MITM data processor")
+                    self.__stats_collector.flush_all()
                     break
                 self.process_data(item[0], item[1], item[2])
-                self.__queue.task_done()
+                self.__dispatcher.task_done(self.__queue_index)
                 end_time = self.get_time_ms() - start_time
                 logger.debug("MITM data processor {} finished queue item in {}ms", self.__name, end_time)
+                self._log_cache_statistics()
+            except KeyboardInterrupt:
+                logger.info("Received keyboard interrupt, stopping MITM data processor")
+                break
+
+    def _run_batched(self):
+        batch_size: int = self.__application_args.mitm_batch_size
+        max_latency: float = self.__application_args.mitm_batch_latency / 1000
+        statistics = BatchStatistics(self.__name)
+        logger.info("MITM data processor {} combines up to {} items or {}ms of data per DB transaction",
+                    self.__name, batch_size, self.__application_args.mitm_batch_latency)
+        stop_received = False
+        while not stop_received:
+            try:
+                items = []
+                item = decode_queue_item(self.__dispatcher.get(self.__queue_index))
+                deadline = time.time() + max_latency
+                while True:
+                    if item is None:
+                        logger.info("Received signal to stop MITM data processor")
+                        self.__stats_collector.flush_all()
+                        stop_received = True
+                        break
+                    items.append(item)
+                    remaining = deadline - time.time()
+                    if len(items) >= batch_size or remaining <= 0:
+                        break
+                    try:
+                        item = decode_queue_item(self.__dispatcher.get(self.__queue_index, timeout=remaining))
+                    except Empty:
+                        break
+                if items:
+                    self.process_batch(items, statistics)
+                self._log_cache_statistics()
             except KeyboardInterrupt:
                 logger.info("Received keyboard interrupt, stopping MITM data processor")
                 break
 
+    def process_batch(self, items: list, statistics: BatchStatistics):
+        start_time = self.get_time_ms()
+        self.__db_submit.start_write_batch()
+        try:
+            for item in items:
+                self.process_data(item[0], item[1], item[2])
+        finally:
+            flush_start = self.get_time_ms()
+            rows = self.__db_submit.flush_write_batch()
+            flush_time = self.get_time_ms() - flush_start
+            for _ in items:
+                self.__dispatcher.task_done(self.__queue_index)
+        logger.debug("MITM data processor {} finished batch of {} items ({} rows) in {}ms, flush took {}ms",
+                     self.__name, len(items), rows, self.get_time_ms() - start_time, flush_time)
+        statistics.record(len(items), rows, flush_time)
+
+    def _log_cache_statistics(self, interval: int = 300):
+        if time.time() - self._last_cache_stats_log < interval:
+            return
+        self._last_cache_stats_log = time.time()
+        stats = self.__db_submit.get_spawnpoint_cache_stats()
+        logger.info("MITM data processor {} spawnpoint cache: {} of {} entries, {} hits, {} misses ({:.1%} hit ratio)",
+                    self.__name, stats["size"], stats["maxsize"], stats["hits"], stats["misses"], stats["hit_ratio"])
+
     @logger.catch
     def process_data(self, received_timestamp, data, origin):
         origin_logger = get_origin_logger(logger, origin=origin)
@@ -47,7 +161,7 @@ class SerializedMitmDataProcessor(Process):
         processed_timestamp = datetime.fromtimestamp(received_timestamp)
 
         if data_type and not data.get("raw", False):
-            self.__mitm_mapper.run_stats_collector(origin)
+            self.__stats_collector.flush_due(origin)
 
             origin_logger.debug4("Received data: {}", data)
             start_time = self.get_time_ms()
@@ -77,7 +191,7 @@ class SerializedMitmDataProcessor(Process):
                 gyms_time = self.get_time_ms() - gyms_time_start
 
                 raids_time_start = self.get_time_ms()
-                self.__db_submit.raids(origin, data["payload"], self.__mitm_mapper)
+                self.__db_submit.raids(origin, data["payload"], self.__stats_collector)
                 raids_time = self.get_time_ms() - raids_time_start
 
                 spawnpoints_time_start = self.get_time_ms()
@@ -86,7 +200,7 @@ class SerializedMitmDataProcessor(Process):
 
                 mons_time_start = self.get_time_ms()
                 wild_encounters = self.__db_submit.mons(
-                    origin, received_timestamp, data["payload"], self.__mitm_mapper)
+                    origin, received_timestamp, data["payload"], self.__stats_collector)
                 mons_time = self.get_time_ms() - mons_time_start
 
                 cells_time_start = self.get_time_ms()
@@ -134,7 +248,7 @@ class SerializedMitmDataProcessor(Process):
                 if playerlevel >= 30:
                     origin_logger.debug("Processing encounter received at {}", processed_timestamp)
                     encounter = self.__db_submit.mon_iv(
-                        origin, received_timestamp, data["payload"], self.__mitm_mapper)
+                        origin, received_timestamp, data["payload"], self.__stats_collector)
 
                     if self.__application_args.game_stats:
                         self.__db_submit.update_seen_type_stats(
@@ -165,7 +279,7 @@ class SerializedMitmDataProcessor(Process):
 
             elif data_type == 101:
                 origin_logger.debug("Processing proto 101 (FORT_SEARCH)")
-                self.__db_submit.quest(origin, data["payload"], self.__mitm_mapper, self._quest_gen)
+                self.__db_submit.quest(origin, data["payload"], self._quest_gen, self.__stats_collector)
                 end_time = self.get_time_ms() - start_time
                 origin_logger.debug("Done processing proto 101 in {}ms", end_time)
             elif data_type == 104:
@@ -184,6 +298,8 @@ class SerializedMitmDataProcessor(Process):
                 end_time = self.get_time_ms() - start_time
                 origin_logger.debug("Done processing proto 156 in {}ms", end_time)
 
+            PROTO_PROCESSING_SECONDS.labels(data_type).observe((self.get_time_ms() - start_time) / 1000)
+
     @staticmethod
     def get_time_ms():
         return int(time.time() * 1000)
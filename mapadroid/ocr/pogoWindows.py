@@ -7,9 +7,7 @@ from typing import List, Optional, Tuple
 
 import cv2
 import numpy as np
-import pytesseract
 from PIL import Image
-from pytesseract import Output
 
 from mapadroid.ocr.matching_trash import trash_image_matching
 from mapadroid.ocr.screen_type import ScreenType
@@ -18,6 +16,12 @@ from mapadroid.utils.logging import LoggerEnums, get_logger, get_origin_logger
 logger = get_logger(LoggerEnums.ocr)
 
 
+def get_pytesseract():
+    # imported on the first use, pytesseract imports pandas which slows down the startup of MAD considerably
+    import pytesseract
+    return pytesseract
+
+
 class PogoWindows:
     def __init__(self, temp_dir_path, thread_count: int):
         if not os.path.exists(temp_dir_path):
@@ -440,7 +444,7 @@ class PogoWindows:
         try:
             with Image.open(temp_path_item) as im:
                 try:
-                    text = pytesseract.image_to_string(im)
+                    text = get_pytesseract().image_to_string(im)
                 except Exception as e:
                     origin_logger.error("Error running tesseract on inventory text: {}", e)
                     return None
@@ -512,7 +516,8 @@ class PogoWindows:
             with Image.open(screenpath) as frame:
                 frame = frame.convert('LA')
                 try:
-                    returning_dict = pytesseract.image_to_data(frame, output_type=Output.DICT, timeout=40,
+                    pytesseract = get_pytesseract()
+                    returning_dict = pytesseract.image_to_data(frame, output_type=pytesseract.Output.DICT, timeout=40,
                                                                config='--dpi 70')
                 except Exception as e:
                     origin_logger.error("Tesseract Error: {}. Exception: {}", returning_dict, e)
@@ -590,7 +595,8 @@ class PogoWindows:
                     texts.append(frame)
                 for text in texts:
                     try:
-                        globaldict = pytesseract.image_to_data(text, output_type=Output.DICT, timeout=40,
+                        pytesseract = get_pytesseract()
+                        globaldict = pytesseract.image_to_data(text, output_type=pytesseract.Output.DICT, timeout=40,
                                                                config='--dpi 70')
                     except Exception as e:
                         origin_logger.error("Tesseract Error: {}. Exception: {}", globaldict, e)
@@ -0,0 +1,65 @@
+from ._patch_base import PatchBase
+
+
+class Patch(PatchBase):
+    name = 'Add hourly and daily rollup tables for the worker statistics'
+    descr = (
+        "- create trs_stats_detect_hourly/_daily, trs_stats_location_hourly/_daily and "
+        "trs_stats_location_raw_hourly/_daily. "
+        "- create trs_stats_rollup tracking the hours folded into the rollups. "
+        "The rollups are built from the raw statistics by a background job once MAD runs."
+    )
+
+    def _execute(self):
+        rollup_columns = {
+            "trs_stats_detect": (
+                "`mon` int(11) NOT NULL DEFAULT 0, "
+                "`mon_iv` int(11) NOT NULL DEFAULT 0, "
+                "`raid` int(11) NOT NULL DEFAULT 0, "
+                "`quest` int(11) NOT NULL DEFAULT 0, "
+            ),
+            "trs_stats_location": (
+                "`location_count` int(11) NOT NULL DEFAULT 0, "
+                "`location_ok` int(11) NOT NULL DEFAULT 0, "
+                "`location_nok` int(11) NOT NULL DEFAULT 0, "
+            ),
+            "trs_stats_location_raw": (
+                "`walker` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL, "
+                "`type` tinyint(1) NOT NULL, "
+                "`success` tinyint(1) NOT NULL, "
+                "`transporttype` tinyint(1) NOT NULL, "
+                "`locations` int(11) NOT NULL DEFAULT 0, "
+                "`data_time` bigint(20) NOT NULL DEFAULT 0, "
+            )
+        }
+        # one row per bucket and group, folding a bucket again updates its row
+        rollup_keys = {
+            "trs_stats_detect": "`period`, `worker`",
+            "trs_stats_location": "`period`, `worker`",
+            "trs_stats_location_raw": "`period`, `worker`, `walker`, `type`, `success`, `transporttype`"
+        }
+        queries = []
+        for source, columns in rollup_columns.items():
+            for suffix in ("hourly", "daily"):
+                queries.append(
+                    "CREATE TABLE IF NOT EXISTS `{}_{}` ("
+                    "`period` int(11) NOT NULL, "
+                    "`worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL, "
+                    "{}"
+                    "PRIMARY KEY ({})"
+                    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci".format(
+                        source, suffix, columns, rollup_keys[source])
+                )
+        queries.append(
+            "CREATE TABLE IF NOT EXISTS `trs_stats_rollup` ("
+            "`rollup` varchar(50) COLLATE utf8mb4_unicode_ci NOT NULL, "
+            "`folded_until` int(11) NOT NULL, "
+            "PRIMARY KEY (`rollup`)"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci"
+        )
+        try:
+            for query in queries:
+                self._db.execute(query, commit=True, raise_exc=True)
+        except Exception as e:
+            self._logger.exception("Unexpected error: {}", e)
+            self.issues = True
@@ -1,10 +1,8 @@
 import collections
 import heapq
-import math
 import time
 from abc import ABC, abstractmethod
 from datetime import datetime
-from operator import itemgetter
 from threading import Event, RLock, Thread
 from typing import Dict, List, Optional, Set, Tuple
 
@@ -17,16 +15,23 @@ from mapadroid.data_manager.modules.routecalc import RouteCalc
 from mapadroid.db.DbWrapper import DbWrapper
 from mapadroid.geofence.geofenceHelper import GeofenceHelper
 from mapadroid.route.routecalc.ClusteringHelper import ClusteringHelper
+from mapadroid.route.routepool import (get_queue_position, get_route_index,
+                                       get_subroute_ranges)
 from mapadroid.utils.collections import Location
 from mapadroid.utils.geo import get_distance_of_two_points_in_meters
 from mapadroid.utils.logging import (LoggerEnums, get_logger,
+                                     is_log_level_enabled,
                                      routelogger_set_origin)
+from mapadroid.utils.metrics import Histogram
 from mapadroid.utils.walkerArgs import parse_args
 from mapadroid.worker.WorkerType import WorkerType
 
 logger = get_logger(LoggerEnums.routemanager)
 args = parse_args()
 
+NEXT_LOCATION_SECONDS = Histogram("mad_route_next_location_seconds",
+                                  "Time to get the next location of a worker, by route manager", ["route"])
+
 Relation = collections.namedtuple(
     'Relation', ['other_event', 'distance', 'timedelta'])
 
@@ -74,6 +79,8 @@ class RouteManagerBase(ABC):
         self._is_started: bool = False
         self._first_started = False
         self._current_route_round_coords: List[Location] = []
+        # index of the coords in _current_route_round_coords, built when needed
+        self._current_route_round_index: Optional[Dict[Location, int]] = None
         self._start_calc: bool = False
         self._positiontyp = {}
         self._coords_to_be_ignored = set()
@@ -178,6 +185,7 @@ class RouteManagerBase(ABC):
         with self._manager_mutex:
             if len(self._route) > 0:
                 self._current_route_round_coords.clear()
+                self._current_route_round_index = None
                 self.logger.debug("Creating queue for coords")
                 for latlng in self._route:
                     self._current_route_round_coords.append(latlng)
@@ -315,6 +323,7 @@ class RouteManagerBase(ABC):
             for coord in new_route:
                 self._route.append(Location(coord["lat"], coord["lng"]))
             self._current_route_round_coords = self._route.copy()
+            self._current_route_round_index = None
         return new_route
 
     def recalc_route_adhoc(self, max_radius: float, max_coords_within_radius: int, num_procs: int = 1,
@@ -372,7 +381,8 @@ class RouteManagerBase(ABC):
                 heapq.heapify(merged)
                 self._prio_queue = merged
             self.logger.info("Finalized new priority queue with {} entries", len(merged))
-            self.logger.debug2("Priority queue entries: {}", str(merged))
+            if is_log_level_enabled("DEBUG2"):
+                self.logger.debug2("Priority queue entries: {}", str(merged))
 
     def date_diff_in_seconds(self, dt2, dt1):
         timedelta = dt2 - dt1
@@ -557,17 +567,21 @@ class RouteManagerBase(ABC):
         return False
 
     def get_next_location(self, origin: str) -> Optional[Location]:
-        if not self._is_started:
-            route_logger = routelogger_set_origin(self.logger, origin=origin)
-            route_logger.info("Starting routemanager in get_next_location")
-            if not self._start_routemanager():
-                route_logger.info('No coords available - quit worker')
-                return None
-        while self._is_started:
-            (loc, try_again) = self._get_next_location(origin)
-            if loc or not try_again:
-                return loc
-        return None
+        start = time.perf_counter()
+        try:
+            if not self._is_started:
+                route_logger = routelogger_set_origin(self.logger, origin=origin)
+                route_logger.info("Starting routemanager in get_next_location")
+                if not self._start_routemanager():
+                    route_logger.info('No coords available - quit worker')
+                    return None
+            while self._is_started:
+                (loc, try_again) = self._get_next_location(origin)
+                if loc or not try_again:
+                    return loc
+            return None
+        finally:
+            NEXT_LOCATION_SECONDS.labels(self.name).observe(time.perf_counter() - start)
 
     def _get_next_location(self, origin: str) -> (Optional[Location], bool):
         route_logger = routelogger_set_origin(self.logger, origin=origin)
@@ -737,6 +751,7 @@ class RouteManagerBase(ABC):
                 if self._delete_coord_after_fetch() and next_coord in self._current_route_round_coords \
                         and not self.init:
                     self._current_route_round_coords.remove(next_coord)
+                    self._current_route_round_index = None
                 route_logger.info("Moving on with location {}, {} [{} coords left (Workerpool)]", next_coord.lat,
                                   next_coord.lng, len(self._routepool[origin].queue) + 1)
                 self._last_round_prio[origin] = False
@@ -754,6 +769,7 @@ class RouteManagerBase(ABC):
             if self._delete_coord_after_fetch() and next_coord in self._current_route_round_coords \
                     and not self.init:
                 self._current_route_round_coords.remove(next_coord)
+                self._current_route_round_index = None
 
             self.__set_routepool_entry_location(origin, next_coord)
 
@@ -842,9 +858,12 @@ class RouteManagerBase(ABC):
                 if origin in self._routepool:
                     self._routepool[origin].worker_sleeping = sleep_duration
 
+    def _get_route_index(self) -> Dict[Location, int]:
+        if self._current_route_round_index is None:
+            self._current_route_round_index = get_route_index(self._current_route_round_coords)
+        return self._current_route_round_index
+
     def _worker_changed_update_routepools(self):
-        less_coords: bool = False
-        workers: int = 0
         if not self._is_started:
             return True
         if self.mode not in ("iv_mitm", "idle") and len(self._current_route_round_coords) == 0:
@@ -860,215 +879,22 @@ class RouteManagerBase(ABC):
                 self.logger.info("No registered workers, aborting __worker_changed_update_routepools...")
                 return False
 
-            self.logger.debug("Current route for all workers: {}", self._current_route_round_coords)
-            self.logger.info("Current route for all workers length: {}", len(self._current_route_round_coords))
-
-            if workers > len(self._current_route_round_coords):
-                less_coords = True
-                new_subroute_length = len(self._current_route_round_coords)
-                extra_length_workers = 0
-            else:
-                try:
-                    new_subroute_length = math.floor(len(self._current_route_round_coords) /
-                                                     workers)
-                    if new_subroute_length == 0:
-                        return False
-                    extra_length_workers = len(self._current_route_round_coords) % workers
-                except Exception:
-                    self.logger.info('Something happens with the worker - breakup')
-                    return False
-            i: int = 0
-            temp_total_round: collections.deque = collections.deque(self._current_route_round_coords)
-
+            route = self._current_route_round_coords
+            self.logger.info("Current route for all workers length: {}", len(route))
             self.logger.debug("Workers in route: {}", workers)
-            if extra_length_workers > 0:
-                self.logger.debug("New subroute length: {}-{}", new_subroute_length, new_subroute_length + 1)
-            else:
-                self.logger.debug("New subroute length: {}", new_subroute_length)
-
-            # we want to order the dict by the time's we added the workers to the areas
-            # we first need to build a list of tuples with only origin, time_added
-            self.logger.debug("Checking routepool: {}", self._routepool)
-            with self._workers_registered_mutex:
-                reduced_routepools = [(origin, self._routepool[origin].time_added) for origin in
-                                      self._routepool]
-                sorted_routepools = sorted(reduced_routepools, key=itemgetter(1))
-
-                self.logger.debug("Checking routepools in the following order: {}", sorted_routepools)
-                compare = lambda x, y: collections.Counter(x) == collections.Counter(y)  # noqa: E731
-                for origin, _time_added in sorted_routepools:
-                    if origin not in self._routepool:
-                        # TODO probably should restart this job or something
-                        self.logger.info('{} must have unregistered when we weren\'t looking.. skip it', origin)
-                        continue
-                    entry: RoutePoolEntry = self._routepool[origin]
-                    self.logger.debug("Checking subroute of {}", origin)
-                    # let's assume a worker has already been removed or added to the dict (keys)...
-
-                    new_subroute: List[Location] = []
-                    subroute_index: int = 0
-                    new_subroute_actual_length = new_subroute_length
-                    if i < extra_length_workers:
-                        new_subroute_actual_length += 1
-                    while len(temp_total_round) > 0 and subroute_index < new_subroute_actual_length:
-                        subroute_index += 1
-                        new_subroute.append(temp_total_round.popleft())
-
-                    self.logger.debug("New Subroute for worker {}: {}", origin, new_subroute)
-                    self.logger.debug("Old Subroute for worker {}: {}", origin, entry.subroute)
-
-                    i += 1
-                    if len(entry.subroute) == 0:
-                        self.logger.debug("{}'s subroute is empty, assuming he has freshly registered and desperately "
-                                          "needs a queue", origin)
-                        # worker is freshly registering, pass him his fair share
-                        entry.subroute = new_subroute
-                        # let's clean the queue just to make sure
-                        entry.queue.clear()
-                    elif len(new_subroute) == len(entry.subroute):
-                        self.logger.debug("{}'s subroute is as long as the old one, we will assume it hasn't changed "
-                                          "(for now)", origin)
-                        # apparently nothing changed
-                        if compare(new_subroute, entry.subroute):
-                            self.logger.info("Apparently no changes in subroutes...")
-                        else:
-                            self.logger.info("Subroute of {} has changed. Replacing entirely", origin)
-                            # TODO: what now?
-                            self.logger.debug('new_subroute: {}', new_subroute)
-                            self.logger.debug('entry.subroute: {}', entry.subroute)
-                            self.logger.debug('new_subroute == entry.subroute: {}', new_subroute == entry.subroute)
-                            entry.subroute = new_subroute
-                            entry.queue.clear()
-                            entry.queue = collections.deque()
-                            for location in new_subroute:
-                                entry.queue.append(location)
-                    elif len(new_subroute) == 0:
-                        self.logger.info("New subroute of {} is empty...", origin)
-                        entry.subroute = new_subroute
-                        entry.queue.clear()
-                        entry.queue = collections.deque()
-                        for location in new_subroute:
-                            entry.queue.append(location)
-                    elif len(entry.subroute) > len(new_subroute) > 0:
-                        self.logger.debug("{}'s subroute is longer than it should be now (maybe a worker has been "
-                                          "added)", origin)
-                        # we apparently have added at least a worker...
-                        #   1) reduce the start of the current queue to start of new route
-                        #   2) append the coords missing (check end of old routelength,
-                        #      add/remove from there on compared to new)
-                        old_queue: collections.deque = collections.deque(entry.queue)
-                        while len(old_queue) > 0 and len(new_subroute) > 0 and old_queue.popleft() != \
-                                new_subroute[0]:
-                            pass
-
-                        if len(old_queue) == 0:
-                            self.logger.debug("{}'s queue is empty, we can just pass him the new subroute", origin)
-                            # just set new route...
-                            entry.queue = collections.deque()
-                            for location in new_subroute:
-                                entry.queue.append(location)
-                        else:
-                            # we now are at a point where we need to also check the end of the old queue and
-                            # append possibly missing coords to it
-                            self.logger.debug("Checking if the last element of the old queue is present in new "
-                                              "subroute")
-                            last_el_old_q: Location = old_queue[len(old_queue) - 1]
-                            if last_el_old_q in new_subroute:
-                                # we have the last element in the old subroute, we can actually append stuff with the
-                                # diff to the new route
-                                self.logger.debug("Last element of old queue is present in new subroute, appending the "
-                                                  "rest of the new subroute to the queue")
-                                new_subroute_copy = collections.deque(new_subroute)
-                                while len(new_subroute_copy) > 0 and new_subroute_copy.popleft() != last_el_old_q:
-                                    pass
-                                self.logger.debug("Length of subroute to be extended by {}", len(new_subroute_copy))
-                                # replace queue with old_queue
-                                entry.queue.clear()
-                                entry.queue = old_queue
-                                while len(new_subroute_copy) > 0:
-                                    entry.queue.append(new_subroute_copy.popleft())
-                            else:
-                                # clear old route and replace with new_subroute
-                                # maybe the worker jumps a wider distance
-                                self.logger.debug("Subroute of {} has changed. Replacing entirely", origin)
-                                entry.queue.clear()
-                                new_subroute_copy = collections.deque(new_subroute)
-                                while len(new_subroute_copy) > 0:
-                                    entry.queue.append(new_subroute_copy.popleft())
-
-                    elif len(new_subroute) > len(entry.subroute) > 0:
-                        #   old routelength < new len(route)/n:
-                        #   we have likely removed a worker and need to redistribute
-                        #   1) fetch start and end of old queue
-                        #   2) we sorta ignore start/what's been visited so far
-                        #   3) if the end is not part of the new route, check for the last coord of the current route
-                        #   still in the new route, remove the old rest of it (or just fetch the first coord of the
-                        #   next subroute and remove the coords of that coord onward)
-                        self.logger.debug("A worker has apparently been removed from the routepool")
-                        last_el_old_route: Location = entry.subroute[len(entry.subroute) - 1]
-                        old_queue_list: List[Location] = list(entry.queue)
-                        old_queue: collections.deque = collections.deque(entry.queue)
-
-                        last_el_new_route: Location = new_subroute[len(new_subroute) - 1]
-                        # check last element of new subroute:
-                        if last_el_new_route is not None and last_el_new_route in old_queue_list:
-                            # if in current queue, remove from end of new subroute to end of old queue
-                            self.logger.debug("Last element of new subroute is in old queue, removing everything after "
-                                              "that element")
-                            del old_queue_list[old_queue.index(last_el_new_route): len(old_queue_list) - 1]
-                        elif last_el_old_route in new_subroute:
-                            # append from end of queue (compared to new subroute) to end of new subroute
-                            self.logger.debug("Last element of old queue in new subroute, appending everything "
-                                              "afterwards")
-                            missing_new_route_part: List[Location] = new_subroute.copy()
-                            del missing_new_route_part[0: new_subroute.index(last_el_old_route)]
-                            old_queue_list.extend(missing_new_route_part)
-
-                        else:
-                            self.logger.debug("Worker {} getting a completely new route - replace it", origin)
-                            new_subroute_copy = collections.deque(new_subroute)
-                            old_queue_list.clear()
-                            while len(new_subroute_copy) > 0:
-                                entry.queue.append(new_subroute_copy.popleft())
-
-                        entry.queue = collections.deque()
-                        [entry.queue.append(i) for i in old_queue_list]
-
-                    if len(entry.queue) == 0:
-                        [entry.queue.append(i) for i in new_subroute]
-                    # don't forget to update the subroute ;)
-                    entry.subroute = new_subroute
-
-                    if less_coords:
-                        new_subroute_length = 0
-
-            self.logger.debug("Current routepool: {}", self._routepool)
+            # the subroutes are consecutive index ranges of the route, assigned in the order the workers have
+            # been added. A worker keeps its position if it lies within its new subroute, otherwise it starts
+            # at the beginning of the new subroute
+            route_index = self._get_route_index()
+            sorted_routepools = sorted(self._routepool.items(), key=lambda item: item[1].time_added)
+            for (origin, entry), (start, end) in zip(sorted_routepools,
+                                                     get_subroute_ranges(len(route), workers)):
+                position = get_queue_position(route_index, entry.queue, start, end)
+                self.logger.debug("New subroute of {}: {} - {} (position {})", origin, start, end, position)
+                entry.subroute = route[start:end]
+                entry.queue = collections.deque(route[start if position is None else position:end])
             self.logger.debug("Done updating subroutes")
             return True
-            # TODO: A worker has been removed or added, we need to update the individual workerpools/queues
-            #
-            # First: Split the original route by the remaining workers => we have a list of new subroutes of
-            # len(route)/n coordinates
-            #
-            # Iterate over all remaining routepools
-            # Possible situations now:
-            #
-            #   Routelengths == new len(route)/n:
-            #   Apparently nothing has changed...
-            #
-            #   old routelength > new len(route)/n:
-            #   we have likely added a worker and need to redistribute
-            #   1) reduce the start of the current queue to start after the end of the previous pool
-            #   2) append the coords missing (check end of old routelength, add/remove from there on compared to new)
-
-            #
-            #   old routelength < new len(route)/n:
-            #   we have likely removed a worker and need to redistribute
-            #   1) fetch start and end of old queue
-            #   2) we sorta ignore start/what's been visited so far
-            #   3) if the end is not part of the new route, check for the last coord of the current route still in
-            #   the new route, remove the old rest of it (or just fetch the first coord of the next subroute and
-            #   remove the coords of that coord onward)
 
     def _change_init_mapping(self):
         area = self._data_manager.get_resource('area', self.area_id)
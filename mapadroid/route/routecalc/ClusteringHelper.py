@@ -1,3 +1,7 @@
+import heapq
+import math
+from collections import defaultdict
+
 import s2sphere
 
 from mapadroid.utils.collections import Relation
@@ -5,8 +9,114 @@ from mapadroid.utils.geo import (get_distance_of_two_points_in_meters,
                                  get_middle_of_coord_list)
 from mapadroid.utils.s2Helper import S2Helper
 
+# radius used by get_distance_of_two_points_in_meters
+EARTH_RADIUS_METERS = 6373000.0
+# widen every bounding box a little to stay on the safe side of floating point rounding
+BOUNDING_BOX_MARGIN = 1.0001
+
+
+def latitude_span(distance: float) -> float:
+    """
+    Largest difference in latitude (degrees) two points that are `distance` meters apart can have
+    """
+    return math.degrees(distance / EARTH_RADIUS_METERS) * BOUNDING_BOX_MARGIN + 1e-9
+
+
+def longitude_span(distance: float, max_abs_lat: float) -> float:
+    """
+    Largest difference in longitude (degrees) two points that are `distance` meters apart can have if neither
+    of them is further away from the equator than `max_abs_lat`
+    """
+    cos_lat = math.cos(math.radians(min(90.0, max_abs_lat)))
+    if cos_lat <= 0:
+        return 360.0
+    ratio = math.sin(min(math.pi / 2, distance / (2 * EARTH_RADIUS_METERS))) / cos_lat
+    if ratio >= 1:
+        return 360.0
+    return math.degrees(2 * math.asin(ratio)) * BOUNDING_BOX_MARGIN + 1e-9
+
+
+class EventGrid:
+    """
+    Buckets the positions of events into cells of (at least) cell_distance meters in order to look up candidates
+    around a location without inspecting every single event.
+    Lookups return indices of events, the caller is expected to check the exact distance.
+    """
+
+    def __init__(self, events, cell_distance: float):
+        self._events = events
+        self._cell_distance = cell_distance
+        self._cells = defaultdict(list)
+        self._lat_size = latitude_span(cell_distance)
+        max_abs_lat = max((abs(event[1].lat) for event in events), default=0.0)
+        self._lng_size = longitude_span(cell_distance, max_abs_lat + self._lat_size)
+        for index, event in enumerate(events):
+            self._cells[self._cell_of(event[1].lat, event[1].lng)].append(index)
+
+    def _cell_of(self, lat, lng):
+        return math.floor(lat / self._lat_size), math.floor(lng / self._lng_size)
+
+    def neighbourhoods(self):
+        """
+        Yields the events of every occupied cell along with the sorted events of the cell and its direct
+        neighbours, i.e. every event that may be within cell_distance of the events of the cell
+        """
+        for (lat_cell, lng_cell), indices in self._cells.items():
+            neighbours = []
+            for neighbour_lat_cell in range(lat_cell - 1, lat_cell + 2):
+                for neighbour_lng_cell in range(lng_cell - 1, lng_cell + 2):
+                    neighbours.extend(self._cells.get((neighbour_lat_cell, neighbour_lng_cell), ()))
+            if (lng_cell - 1) * self._lng_size > -180 and (lng_cell + 2) * self._lng_size < 180:
+                yield indices, sorted(neighbours)
+                continue
+            # the neighbourhood reaches across the antimeridian
+            for index in indices:
+                lat, lng = self._events[index][1]
+                candidates = self.around(lat, lng, self._cell_distance)
+                candidates.update(neighbours)
+                yield [index], sorted(candidates)
+
+    def in_box(self, lat_min, lat_max, lng_min, lng_max):
+        if lng_max - lng_min >= 360:
+            lng_min, lng_max = -180.0, 180.0
+        lat_cell_min, lng_cell_min = self._cell_of(lat_min, lng_min)
+        lat_cell_max, lng_cell_max = self._cell_of(lat_max, lng_max)
+        cells_in_box = (lat_cell_max - lat_cell_min + 1) * (lng_cell_max - lng_cell_min + 1)
+        if cells_in_box > len(self._cells):
+            # the box is large compared to the data, checking the occupied cells is cheaper
+            for (lat_cell, lng_cell), indices in self._cells.items():
+                if lat_cell_min <= lat_cell <= lat_cell_max and lng_cell_min <= lng_cell <= lng_cell_max:
+                    yield from indices
+            return
+        for lat_cell in range(lat_cell_min, lat_cell_max + 1):
+            for lng_cell in range(lng_cell_min, lng_cell_max + 1):
+                yield from self._cells.get((lat_cell, lng_cell), ())
+
+    def around(self, lat, lng, distance):
+        """
+        Indices of the events that may be within `distance` meters of the given location, without duplicates
+        """
+        lat_span = latitude_span(distance)
+        lng_span = longitude_span(distance, abs(lat) + lat_span)
+        if lng_span >= 180:
+            return set(self.in_box(lat - lat_span, lat + lat_span, -180.0, 180.0))
+        candidates = set(self.in_box(lat - lat_span, lat + lat_span, lng - lng_span, lng + lng_span))
+        # the circle may reach across the antimeridian
+        if lng - lng_span < -180:
+            candidates.update(self.in_box(lat - lat_span, lat + lat_span, lng - lng_span + 360, 180.0))
+        if lng + lng_span > 180:
+            candidates.update(self.in_box(lat - lat_span, lat + lat_span, -180.0, lng + lng_span - 360))
+        return candidates
+
 
 class ClusteringHelper:
+    """
+    Merges events of a priority queue that are close to each other in space and time.
+    Events are kept in a grid of cells with the size of a circle to only compare neighbouring events instead of
+    every event with every other event. The events are still inspected in the order of the queue, so the result
+    is the same as comparing every event with each other.
+    """
+
     def __init__(self, max_radius, max_count_per_circle, max_timedelta_seconds, use_s2: bool = False,
                  s2_level: int = 30):
         self.max_radius = max_radius
@@ -15,39 +125,29 @@ class ClusteringHelper:
         self.useS2 = use_s2
         self.S2level = s2_level
 
-    def _get_relations_in_range_within_time(self, queue, max_radius):
-        relations = {}
-        for event in queue:
-            for other_event in queue:
-                if event[1].lat == other_event[1].lat and event[1].lng == other_event[1].lng and \
-                   event not in relations.keys():
-                    relations[event] = []
-                distance = get_distance_of_two_points_in_meters(event[1].lat, event[1].lng,
-                                                                other_event[1].lat, other_event[1].lng)
-                # we will always build relations from the event at hand subtracted by the event inspected
-                timedelta = event[0] - other_event[0]
-                if 0 <= distance <= max_radius * 2 and 0 <= timedelta <= self.max_timedelta_seconds:
-                    if event not in relations.keys():
-                        relations[event] = []
-                    # avoid duplicates
-                    already_present = False
-                    for relation in relations[event]:
-                        if relation[0][1].lat == other_event[1].lat and \
-                           relation[0][1].lng == other_event[1].lng:
-                            already_present = True
-                    if not already_present:
-                        relations[event].append(
-                            Relation(other_event, distance, timedelta))
-        return relations
-
-    def _get_most_west_amongst_relations(self, relations):
-        selected = list(relations.keys())[0]
-        for event in relations.keys():
-            if event[1].lng < selected[1].lng:
-                selected = event
-            elif event[1].lng == selected[1].lng and event[1].lat > selected[1].lat:
-                selected = event
-        return selected
+    def _get_relations_in_range_within_time(self, events, grid, max_radius):
+        # relations of every event to the events within range and an earlier (or the same) time, in order of the
+        # queue and only one relation per location
+        relations = [None] * len(events)
+        for indices, neighbours in grid.neighbourhoods():
+            for index in indices:
+                event = events[index]
+                relations[index] = relations_of_event = []
+                locations_present = set()
+                for other_index in neighbours:
+                    other_event = events[other_index]
+                    if other_event[1] in locations_present:
+                        continue
+                    # we will always build relations from the event at hand subtracted by the event inspected
+                    timedelta = event[0] - other_event[0]
+                    if not 0 <= timedelta <= self.max_timedelta_seconds:
+                        continue
+                    distance = get_distance_of_two_points_in_meters(event[1].lat, event[1].lng,
+                                                                    other_event[1].lat, other_event[1].lng)
+                    if 0 <= distance <= max_radius * 2:
+                        locations_present.add(other_event[1])
+                        relations_of_event.append(Relation(other_event, distance, timedelta))
+        return dict(enumerate(relations))
 
     def _get_farthest_in_relation(self, to_be_inspected):
         # retrieve the relation farthest within the given timedelta, do not bother about maximizing the timedelta
@@ -62,138 +162,158 @@ class ClusteringHelper:
                 farthest = relation
         return farthest.other_event, distance
 
-    def _get_count_and_coords_in_circle_within_timedelta(self, middle, relations, earliest_timestamp,
-                                                         latest_timestamp, max_radius):
+    def _get_candidates_in_circle(self, middle, grid, max_radius):
+        if not self.useS2:
+            return None, grid.around(middle.lat, middle.lng, max_radius)
+        region = s2sphere.CellUnion(
+            S2Helper.get_s2cells_from_circle(middle.lat, middle.lng, self.max_radius, self.S2level))
+        if not region.cell_ids():
+            return region, ()
+        bounds = [s2sphere.Cell(cell_id).get_rect_bound() for cell_id in region.cell_ids()]
+        margin = latitude_span(0)
+        lat_min = min(bound.lat_lo().degrees for bound in bounds) - margin
+        lat_max = max(bound.lat_hi().degrees for bound in bounds) + margin
+        if any(bound.lng().is_inverted() for bound in bounds):
+            # the cells cross the antimeridian
+            return region, set(grid.in_box(lat_min, lat_max, -180.0, 180.0))
+        return region, set(grid.in_box(lat_min, lat_max,
+                                       min(bound.lng_lo().degrees for bound in bounds) - margin,
+                                       max(bound.lng_hi().degrees for bound in bounds) + margin))
+
+    def _get_count_and_coords_in_circle_within_timedelta(self, middle, events, remaining, clustered_remaining,
+                                                         grid, earliest_timestamp, latest_timestamp, max_radius):
         inside_circle = []
         highest_timedelta = 0
-        if self.useS2:
-            region = s2sphere.CellUnion(
-                S2Helper.get_s2cells_from_circle(middle.lat, middle.lng, self.max_radius, self.S2level))
-
-        for event_relations in relations:
+        region, candidates = self._get_candidates_in_circle(middle, grid, max_radius)
+        # events outside of the circle do not change the timestamps, so only the candidates need to be inspected
+        # in the order of the queue
+        to_be_checked = {index for index in candidates if index in remaining}
+        to_be_checked.update(index for index in clustered_remaining if index in remaining)
+        for index in sorted(to_be_checked):
+            event = events[index]
             # exclude previously clustered events...
-            if len(event_relations) == 4 and event_relations[3]:
-                inside_circle.append(event_relations)
+            if len(event) == 4 and event[3]:
+                inside_circle.append(index)
                 continue
-            distance = get_distance_of_two_points_in_meters(middle.lat, middle.lng,
-                                                            event_relations[1].lat,
-                                                            event_relations[1].lng)
-            event_in_range = 0 <= distance <= max_radius
             if self.useS2:
-                event_in_range = region.contains(s2sphere.LatLng.from_degrees(event_relations[1].lat,
-                                                                              event_relations[1].lng).to_point())
+                event_in_range = region.contains(s2sphere.LatLng.from_degrees(event[1].lat,
+                                                                              event[1].lng).to_point())
+            else:
+                distance = get_distance_of_two_points_in_meters(middle.lat, middle.lng,
+                                                                event[1].lat, event[1].lng)
+                event_in_range = 0 <= distance <= max_radius
+            if not event_in_range:
+                continue
             # timedelta of event being inspected to the earliest timestamp
-            timedelta_end = latest_timestamp - event_relations[0]
-            timedelta_start = event_relations[0] - earliest_timestamp
-            if timedelta_end < 0 and event_in_range:
+            timedelta_end = latest_timestamp - event[0]
+            timedelta_start = event[0] - earliest_timestamp
+            if timedelta_end < 0:
                 # we found an event starting past the current latest timestamp, let's update the latest_timestamp
                 latest_timestamp_temp = latest_timestamp + abs(timedelta_end)
                 if latest_timestamp_temp - earliest_timestamp <= self.max_timedelta_seconds:
                     latest_timestamp = latest_timestamp_temp
                     highest_timedelta = highest_timedelta + abs(timedelta_end)
-                    inside_circle.append(event_relations)
-            elif timedelta_start < 0 and event_in_range:
+                    inside_circle.append(index)
+            elif timedelta_start < 0:
                 # we found an event starting before earliest_timestamp, let's check that...
                 earliest_timestamp_temp = earliest_timestamp - abs(timedelta_start)
                 if latest_timestamp - earliest_timestamp_temp <= self.max_timedelta_seconds:
                     earliest_timestamp = earliest_timestamp_temp
                     highest_timedelta = highest_timedelta + abs(timedelta_start)
-                    inside_circle.append(event_relations)
-            elif timedelta_end >= 0 and timedelta_start >= 0 and event_in_range:
+                    inside_circle.append(index)
+            else:
                 # we found an event within our current timedelta and proximity, just append it to the list
-                inside_circle.append(event_relations)
+                inside_circle.append(index)
 
         return len(inside_circle), inside_circle, highest_timedelta, latest_timestamp
 
-    def _get_earliest_timestamp_in_queue(self, queue):
-        earliest = queue[0][0]
-        for item in queue:
-            if earliest > item[0]:
-                earliest = item[0]
-        return earliest
-
-    def _get_latest_timestamp_in_queue(self, queue):
-        latest = queue[0][0]
-        for item in queue:
-            if latest < item[0]:
-                latest = item[0]
-        return latest
-
-    def _get_circle(self, event, to_be_inspected, relations, max_radius):
-        if len(to_be_inspected) == 0:
-            return event, [event]
-        elif len(to_be_inspected) == 1:
-            # TODO: do relations hold themselves or is there a return missing here?
-            return event, [event]
-        # use the get_farthest... since we have previously moved the middle, we need to check for matching events in
-        # such cases and build new circle events in time
-        if len(event) == 4 and event[3]:
-            # this is a previously clustered event, we will simply check for other events that have not been clustered
-            # to include those in our current circle
-            # all we need to do is update timestamps to keep track as to whether we are still inside the max_timedelta
-            # constraint
-            middle_event = event
-            middle = event[1]
-            earliest_timestamp = event[0] - event[2]
-            latest_timestamp = event[0]
-            farthest_away = event
-            distance_to_farthest = max_radius
-        else:
-            farthest_away, distance_to_farthest = self._get_farthest_in_relation(
-                to_be_inspected)
-            all_events_within_range_and_time = [event, farthest_away]
-            earliest_timestamp = self._get_earliest_timestamp_in_queue(
-                all_events_within_range_and_time)
-            latest_timestamp = self._get_latest_timestamp_in_queue(
-                all_events_within_range_and_time)
-            middle = get_middle_of_coord_list(
-                [event[1], farthest_away[1]]
-            )
-            middle_event = (
-                latest_timestamp, middle, latest_timestamp - earliest_timestamp, True
-            )
-        count_inside, events_in_circle, highest_timedelta, latest_timestamp = \
-            self._get_count_and_coords_in_circle_within_timedelta(middle, relations,
-                                                                  earliest_timestamp, latest_timestamp,
-                                                                  max_radius)
-        middle_event = (latest_timestamp, middle_event[1],
-                        highest_timedelta, middle_event[3])
-        if count_inside <= self.max_count_per_circle and count_inside == len(to_be_inspected):
-            return middle_event, events_in_circle
-        elif count_inside > self.max_count_per_circle:
-            to_be_inspected = [
-                to_keep for to_keep in to_be_inspected if not to_keep.other_event == farthest_away]
-            return self._get_circle(event, to_be_inspected, relations, distance_to_farthest)
-        else:
-            return middle_event, events_in_circle
-
-    def _remove_coords_from_relations(self, relations, events_to_be_removed):
-        for source_event, relations_to_source in list(relations.items()):
-            # iterate relations, remove anything matching events_to_be_removed
-            for event in events_to_be_removed:
-                if event == source_event:
-                    relations.pop(source_event)
-                    break
-                # iterate through the entire distance relations as well...
-                for relation in relations_to_source:
-                    if relation.other_event[1] == event[1]:
-                        relations[source_event].remove(relation)
-        return relations
-
-    def _sum_up_relations(self, relations):
+    def _get_circle(self, index, events, relations, clustered_remaining, grid):
+        event = events[index]
+        to_be_inspected = relations[index]
+        max_radius = self.max_radius
+        while True:
+            if len(to_be_inspected) <= 1:
+                # TODO: do relations hold themselves or is there a return missing here?
+                return event, [index]
+            # use the get_farthest... since we have previously moved the middle, we need to check for matching
+            # events in such cases and build new circle events in time
+            if len(event) == 4 and event[3]:
+                # this is a previously clustered event, we will simply check for other events that have not been
+                # clustered to include those in our current circle
+                # all we need to do is update timestamps to keep track as to whether we are still inside the
+                # max_timedelta constraint
+                middle_event = event
+                middle = event[1]
+                earliest_timestamp = event[0] - event[2]
+                latest_timestamp = event[0]
+                farthest_away = event
+                distance_to_farthest = max_radius
+            else:
+                farthest_away, distance_to_farthest = self._get_farthest_in_relation(to_be_inspected)
+                earliest_timestamp = min(event[0], farthest_away[0])
+                latest_timestamp = max(event[0], farthest_away[0])
+                middle = get_middle_of_coord_list([event[1], farthest_away[1]])
+                middle_event = (
+                    latest_timestamp, middle, latest_timestamp - earliest_timestamp, True
+                )
+            count_inside, events_in_circle, highest_timedelta, latest_timestamp = \
+                self._get_count_and_coords_in_circle_within_timedelta(middle, events, relations,
+                                                                      clustered_remaining, grid,
+                                                                      earliest_timestamp, latest_timestamp,
+                                                                      max_radius)
+            middle_event = (latest_timestamp, middle_event[1],
+                            highest_timedelta, middle_event[3])
+            if count_inside > self.max_count_per_circle:
+                remaining_to_be_inspected = [
+                    to_keep for to_keep in to_be_inspected if not to_keep.other_event == farthest_away]
+                if len(remaining_to_be_inspected) == len(to_be_inspected):
+                    # nothing left to shrink the circle with
+                    return event, [index]
+                to_be_inspected = remaining_to_be_inspected
+                max_radius = distance_to_farthest
+            else:
+                return middle_event, events_in_circle
+
+    def _remove_events_from_relations(self, events, relations, referenced_by, indices_to_be_removed):
+        locations_to_be_removed = set()
+        for index in indices_to_be_removed:
+            relations.pop(index, None)
+            locations_to_be_removed.add(events[index][1])
+        for location in locations_to_be_removed:
+            for source in referenced_by.pop(location, ()):
+                if source in relations:
+                    relations[source] = [relation for relation in relations[source]
+                                         if relation.other_event[1] != location]
+
+    def _sum_up_relations(self, events, relations, grid):
         final_set = []
+        # the most western event is inspected next, ties are broken by the northern most and then queue order
+        west_heap = [(event[1].lng, -event[1].lat, index) for index, event in enumerate(events)]
+        heapq.heapify(west_heap)
+        clustered_remaining = [index for index, event in enumerate(events) if len(event) == 4 and event[3]]
+        referenced_by = defaultdict(set)
+        for source, relations_to_source in relations.items():
+            for relation in relations_to_source:
+                referenced_by[relation.other_event[1]].add(source)
 
         while len(relations) > 0:
-            west_next = self._get_most_west_amongst_relations(relations)
-            middle_event, events_to_be_removed = self._get_circle(west_next, relations[west_next], relations,
-                                                                  self.max_radius)
+            west_next = heapq.heappop(west_heap)[2]
+            if west_next not in relations:
+                continue
+            middle_event, events_to_be_removed = self._get_circle(west_next, events, relations,
+                                                                  clustered_remaining, grid)
             final_set.append(middle_event)
-            relations = self._remove_coords_from_relations(
-                relations, events_to_be_removed)
+            self._remove_events_from_relations(events, relations, referenced_by, events_to_be_removed)
+            if west_next in relations:
+                # the event is still to be clustered, keep it as a candidate
+                heapq.heappush(west_heap, (events[west_next][1].lng, -events[west_next][1].lat, west_next))
+            if clustered_remaining:
+                clustered_remaining = [index for index in clustered_remaining if index in relations]
         return final_set
 
     def get_clustered(self, queue):
-        relations = self._get_relations_in_range_within_time(
-            queue, max_radius=self.max_radius)
-        summed_up = self._sum_up_relations(relations)
-        return summed_up
+        # duplicates of events are treated like a single event
+        events = list(dict.fromkeys(queue))
+        grid = EventGrid(events, self.max_radius * 2)
+        relations = self._get_relations_in_range_within_time(events, grid, max_radius=self.max_radius)
+        return self._sum_up_relations(events, relations, grid)
@@ -1,4 +1,7 @@
 import math
+from concurrent.futures import Executor
+from threading import Lock
+from typing import Optional
 
 from mapadroid.utils.logging import get_origin_logger, logger
 
@@ -8,6 +11,21 @@ except Exception:
     pass
 
 
+# processes calculating routes while it is set, e.g. during the initialization of the areas
+_route_calc_executor: Optional[Executor] = None
+_route_calc_executor_lock = Lock()
+
+
+def set_route_calc_executor(executor: Optional[Executor]):
+    """
+    Calculate the routes in the given executor (a process pool) instead of the calling thread, None to stop.
+    Routes submitted before the executor is replaced are still calculated by it.
+    """
+    global _route_calc_executor
+    with _route_calc_executor_lock:
+        _route_calc_executor = executor
+
+
 def create_data_model(less_coordinates):
     """Stores the data for the problem."""
 
@@ -88,6 +106,17 @@ def route_calc_ortools(less_coordinates, route_name):
 
 
 def route_calc_all(less_coordinates, route_name, num_processes, algorithm):
+    with _route_calc_executor_lock:
+        future = None
+        if _route_calc_executor is not None:
+            future = _route_calc_executor.submit(_route_calc_all, less_coordinates, route_name, num_processes,
+                                                 algorithm)
+    if future is not None:
+        return future.result()
+    return _route_calc_all(less_coordinates, route_name, num_processes, algorithm)
+
+
+def _route_calc_all(less_coordinates, route_name, num_processes, algorithm):
     route_logger = get_origin_logger(logger, origin=route_name)
     # check to see if we can use OR-Tools to perform our routecalc
     import platform
@@ -103,5 +132,5 @@ def route_calc_all(less_coordinates, route_name, num_processes, algorithm):
             return route_calc_ortools(less_coordinates, route_name)
 
     route_logger.debug("Using MAD quick routecalc")
-    from mapadroid.route.routecalc.calculate_route_quick import route_calc_impl
+    from mapadroid.route.routecalc.calculate_route_fast import route_calc_impl
     return route_calc_impl(less_coordinates, route_name, num_processes)
@@ -0,0 +1,375 @@
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+from mapadroid.utils.logging import LoggerEnums, get_logger
+
+logger = get_logger(LoggerEnums.routemanager)
+
+# amount of nearest neighbours considered as candidate edges per point
+CANDIDATE_NEIGHBOURS = 10
+# time in seconds the local search may spend improving a route
+IMPROVEMENT_TIME_LIMIT = 120
+# epsilon for gains to be accepted in the local search
+MIN_GAIN = 1e-10
+
+
+def route_calc_impl(coords, route_name, num_processes=1):
+    """
+    num_processes is only taken for the signature shared with calculate_route_quick and is ignored: the local
+    search changes a single tour move by move and runs in the calling process
+    """
+    with logger.contextualize(origin=route_name):
+        points = np.asarray(coords, dtype=np.float64)[:, :2]
+        length, path = tsp(points)
+        logger.info("Found {} long solution: ", length)
+
+    return path
+
+
+def tsp(points: np.ndarray, time_limit: float = IMPROVEMENT_TIME_LIMIT):
+    """
+    Christofides-like construction on a sparse candidate graph followed by a 2-opt/Or-opt local search
+    :param points: Nx2 array of lat, lng
+    :param time_limit: seconds the local search may take at most
+    :return: length of the tour in projected degrees and the list of indices to visit
+    """
+    amount = len(points)
+    if amount < 4:
+        return 0.0, list(range(amount))
+    xy = project(points)
+    logger.info("Finding the nearest neighbours of {} points", amount)
+    neighbours = nearest_neighbours(xy, min(CANDIDATE_NEIGHBOURS, amount - 1))
+
+    logger.info("Building a min span tree..")
+    tree_edges = minimum_spanning_tree(xy, neighbours)
+
+    logger.info("Adding minimum weight matching edges to MST...")
+    degree = np.bincount(tree_edges.ravel(), minlength=amount)
+    odd_vertexes = np.flatnonzero(degree % 2 == 1)
+    matching_edges = greedy_matching(xy, odd_vertexes)
+
+    logger.info("Finding and Eulerian tour...")
+    tour = shortcut_eulerian_tour(amount, np.concatenate((tree_edges, matching_edges)))
+
+    logger.info("Improving the route with 2-opt and Or-opt moves")
+    tour = improve_tour(xy, tour, neighbours, time_limit)
+
+    logger.info("Done making a route!")
+    return tour_length(xy, tour), tour.tolist()
+
+
+def project(points: np.ndarray) -> np.ndarray:
+    """
+    Equirectangular projection of lat, lng to have distances in a plane be comparable in all directions
+    """
+    scale = math.cos(math.radians(float(np.mean(points[:, 0]))))
+    return np.column_stack((points[:, 1] * scale, points[:, 0]))
+
+
+def tour_length(xy: np.ndarray, tour) -> float:
+    ordered = xy[np.asarray(tour)]
+    return float(np.sum(np.hypot(*(ordered - np.roll(ordered, -1, axis=0)).T)))
+
+
+def nearest_neighbours(xy: np.ndarray, amount_neighbours: int) -> np.ndarray:
+    """
+    Approximate nearest neighbours of all points using a uniform grid. Each cell holds about amount_neighbours
+    points; the neighbours of the points of a cell are searched in the surrounding rings of cells until more than
+    amount_neighbours candidates were found plus one more ring. That is exact for evenly spread points and good
+    enough for candidate lists otherwise.
+    :return: NxK array of indices sorted by distance
+    """
+    amount = len(xy)
+    mins = xy.min(axis=0)
+    extent = np.maximum(xy.max(axis=0) - mins, 1e-12)
+    cells_per_axis = max(1, int(math.sqrt(amount / max(amount_neighbours, 1))))
+    cell_size = extent / cells_per_axis
+    cell_coords = np.minimum(((xy - mins) / cell_size).astype(np.int64), cells_per_axis - 1)
+    cell_ids = cell_coords[:, 0] * cells_per_axis + cell_coords[:, 1]
+    order = np.argsort(cell_ids, kind="stable")
+    sorted_ids = cell_ids[order]
+    starts = np.searchsorted(sorted_ids, np.arange(cells_per_axis * cells_per_axis))
+    ends = np.searchsorted(sorted_ids, np.arange(cells_per_axis * cells_per_axis), side="right")
+
+    def points_around(cell_x: int, cell_y: int, ring: int):
+        x_from, x_to = max(0, cell_x - ring), min(cells_per_axis - 1, cell_x + ring)
+        y_from, y_to = max(0, cell_y - ring), min(cells_per_axis - 1, cell_y + ring)
+        covers_all = x_from == 0 and y_from == 0 and x_to == y_to == cells_per_axis - 1
+        return np.concatenate([order[starts[x * cells_per_axis + y_from]:ends[x * cells_per_axis + y_to]]
+                               for x in range(x_from, x_to + 1)]), covers_all
+
+    result = np.empty((amount, amount_neighbours), dtype=np.int64)
+    for cell in np.unique(cell_ids):
+        members = order[starts[cell]:ends[cell]]
+        cell_x, cell_y = divmod(int(cell), cells_per_axis)
+        ring = 1
+        candidates, covers_all = points_around(cell_x, cell_y, ring)
+        while len(candidates) <= amount_neighbours and not covers_all:
+            ring += 1
+            candidates, covers_all = points_around(cell_x, cell_y, ring)
+        if not covers_all:
+            # the closest points may lie in the next ring even if enough candidates were found
+            candidates, _ = points_around(cell_x, cell_y, ring + 1)
+        distances = np.hypot(xy[members, 0][:, None] - xy[candidates, 0][None, :],
+                             xy[members, 1][:, None] - xy[candidates, 1][None, :])
+        distances[members[:, None] == candidates[None, :]] = np.inf
+        nearest = np.argsort(distances, axis=1)[:, :amount_neighbours]
+        result[members] = candidates[nearest]
+    return result
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parents = list(range(size))
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while self.parents[item] != root:
+            self.parents[item], item = root, self.parents[item]
+        return root
+
+    def union(self, first: int, second: int) -> bool:
+        first_root, second_root = self.find(first), self.find(second)
+        if first_root == second_root:
+            return False
+        self.parents[first_root] = second_root
+        return True
+
+
+def minimum_spanning_tree(xy: np.ndarray, neighbours: np.ndarray) -> np.ndarray:
+    """
+    Kruskal on the candidate graph. Components of the candidate graph that are not connected are joined by the
+    spanning tree of their representatives.
+    :return: Mx2 array of edges
+    """
+    amount = len(xy)
+    sources = np.repeat(np.arange(amount), neighbours.shape[1])
+    targets = neighbours.ravel()
+    weights = np.hypot(*(xy[sources] - xy[targets]).T)
+    edge_order = np.argsort(weights, kind="stable")
+
+    subtrees = UnionFind(amount)
+    tree = []
+    for source, target in zip(sources[edge_order].tolist(), targets[edge_order].tolist()):
+        if subtrees.union(source, target):
+            tree.append((source, target))
+            if len(tree) == amount - 1:
+                break
+
+    if len(tree) < amount - 1:
+        roots = np.array([subtrees.find(point) for point in range(amount)])
+        by_component = np.argsort(roots, kind="stable")
+        boundaries = np.flatnonzero(np.diff(roots[by_component])) + 1
+        components = np.split(by_component, boundaries)
+        logger.debug("Joining {} unconnected components of the candidate graph", len(components))
+        representatives = []
+        for members in components:
+            center = xy[members].mean(axis=0)
+            representatives.append(members[np.argmin(np.hypot(*(xy[members] - center).T))])
+        representatives = np.array(representatives)
+        rep_xy = xy[representatives]
+        # Prim on the (small) complete graph of representatives
+        in_tree = np.zeros(len(representatives), dtype=bool)
+        in_tree[0] = True
+        best = np.hypot(*(rep_xy - rep_xy[0]).T)
+        best_from = np.zeros(len(representatives), dtype=np.int64)
+        for _ in range(len(representatives) - 1):
+            candidate = int(np.argmin(np.where(in_tree, np.inf, best)))
+            tree.append((int(representatives[best_from[candidate]]), int(representatives[candidate])))
+            in_tree[candidate] = True
+            distances = np.hypot(*(rep_xy - rep_xy[candidate]).T)
+            closer = distances < best
+            best = np.where(closer, distances, best)
+            best_from = np.where(closer, candidate, best_from)
+    return np.array(tree, dtype=np.int64).reshape(-1, 2)
+
+
+def greedy_matching(xy: np.ndarray, odd_vertexes: np.ndarray) -> np.ndarray:
+    """
+    Greedy approximation of a minimum weight perfect matching of the given vertexes
+    :return: Mx2 array of edges
+    """
+    if len(odd_vertexes) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    odd_xy = xy[odd_vertexes]
+    matched = np.zeros(len(odd_vertexes), dtype=bool)
+    edges = []
+    if len(odd_vertexes) > 2:
+        amount_neighbours = min(CANDIDATE_NEIGHBOURS, len(odd_vertexes) - 1)
+        odd_neighbours = nearest_neighbours(odd_xy, amount_neighbours)
+        sources = np.repeat(np.arange(len(odd_vertexes)), amount_neighbours)
+        targets = odd_neighbours.ravel()
+        weights = np.hypot(*(odd_xy[sources] - odd_xy[targets]).T)
+        for index in np.argsort(weights, kind="stable").tolist():
+            source, target = sources[index], targets[index]
+            if not matched[source] and not matched[target]:
+                matched[source] = matched[target] = True
+                edges.append((odd_vertexes[source], odd_vertexes[target]))
+    # match the remaining vertexes with their nearest unmatched vertex
+    remaining = np.flatnonzero(~matched).tolist()
+    while remaining:
+        source = remaining.pop()
+        others = np.array(remaining)
+        nearest = int(np.argmin(np.hypot(*(odd_xy[others] - odd_xy[source]).T)))
+        edges.append((odd_vertexes[source], odd_vertexes[others[nearest]]))
+        remaining.remove(int(others[nearest]))
+    return np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+
+def shortcut_eulerian_tour(amount: int, edges: np.ndarray) -> np.ndarray:
+    """
+    Hierholzer's algorithm on the multigraph of the given edges, skipping vertexes already visited
+    """
+    adjacency = [[] for _ in range(amount)]
+    for edge_id, (source, target) in enumerate(edges.tolist()):
+        adjacency[source].append((target, edge_id))
+        adjacency[target].append((source, edge_id))
+    used = [False] * len(edges)
+    visited = [False] * amount
+    tour = []
+    stack = [int(edges[0][0])]
+    while stack:
+        vertex = stack[-1]
+        edges_of_vertex = adjacency[vertex]
+        while edges_of_vertex and used[edges_of_vertex[-1][1]]:
+            edges_of_vertex.pop()
+        if edges_of_vertex:
+            target, edge_id = edges_of_vertex.pop()
+            used[edge_id] = True
+            stack.append(target)
+        else:
+            stack.pop()
+            if not visited[vertex]:
+                visited[vertex] = True
+                tour.append(vertex)
+    return np.array(tour, dtype=np.int64)
+
+
+def improve_tour(xy: np.ndarray, tour: np.ndarray, neighbours: np.ndarray, time_limit: float) -> np.ndarray:
+    """
+    2-opt and Or-opt local search restricted to the candidate neighbours using don't look bits
+    """
+    amount = len(tour)
+    if amount < 5:
+        return tour
+    tour = tour.copy()
+    position = np.empty(amount, dtype=np.int64)
+    position[tour] = np.arange(amount)
+    xs = xy[:, 0].tolist()
+    ys = xy[:, 1].tolist()
+    neighbour_lists = neighbours.tolist()
+    hypot = math.hypot
+
+    def dist(first: int, second: int) -> float:
+        return hypot(xs[first] - xs[second], ys[first] - ys[second])
+
+    def reverse(start: int, end: int):
+        if start >= end:
+            return
+        segment = tour[start:end + 1][::-1].copy()
+        tour[start:end + 1] = segment
+        position[segment] = np.arange(start, end + 1)
+
+    def two_opt(node: int) -> bool:
+        index = int(position[node])
+        for direction in (1, -1):
+            other = int(tour[(index + direction) % amount])
+            current_length = dist(node, other)
+            for candidate in neighbour_lists[node]:
+                candidate_length = dist(node, candidate)
+                if candidate_length >= current_length:
+                    break
+                candidate_index = int(position[candidate])
+                candidate_other = int(tour[(candidate_index + direction) % amount])
+                if candidate_other == node or candidate == other:
+                    continue
+                gain = current_length + dist(candidate, candidate_other) - candidate_length \
+                    - dist(other, candidate_other)
+                if gain > MIN_GAIN:
+                    if direction == 1:
+                        if index < candidate_index:
+                            reverse(index + 1, candidate_index)
+                        else:
+                            reverse(candidate_index + 1, index)
+                    else:
+                        if index < candidate_index:
+                            reverse(index, candidate_index - 1)
+                        else:
+                            reverse(candidate_index, index - 1)
+                    enqueue(node, other, candidate, candidate_other)
+                    return True
+        return False
+
+    def or_opt(node: int) -> bool:
+        start = int(position[node])
+        for segment_length in (1, 2, 3):
+            end = start + segment_length - 1
+            if start < 1 or end > amount - 2:
+                continue
+            first, last = int(tour[start]), int(tour[end])
+            previous, following = int(tour[start - 1]), int(tour[end + 1])
+            removal_gain = dist(previous, first) + dist(last, following) - dist(previous, following)
+            if removal_gain <= MIN_GAIN:
+                continue
+            for segment_end in (first, last):
+                for candidate in neighbour_lists[segment_end]:
+                    if dist(segment_end, candidate) >= removal_gain:
+                        break
+                    insert_at = int(position[candidate])
+                    if start - 1 <= insert_at <= end or insert_at >= amount - 1:
+                        continue
+                    candidate_next = int(tour[insert_at + 1])
+                    removed_edge = dist(candidate, candidate_next)
+                    added_reversed = dist(candidate, last) + dist(first, candidate_next) - removed_edge
+                    added_forward = dist(candidate, first) + dist(last, candidate_next) - removed_edge
+                    added = min(added_reversed, added_forward)
+                    if removal_gain - added <= MIN_GAIN:
+                        continue
+                    if insert_at > end:
+                        reverse(start, insert_at)
+                        reverse(start, insert_at - segment_length)
+                        segment_start = insert_at - segment_length + 1
+                    else:
+                        reverse(insert_at + 1, end)
+                        reverse(insert_at + segment_length + 1, end)
+                        segment_start = insert_at + 1
+                    if added_forward < added_reversed:
+                        reverse(segment_start, segment_start + segment_length - 1)
+                    enqueue(previous, following, first, last, candidate, candidate_next)
+                    return True
+        return False
+
+    def enqueue(*nodes):
+        for queued_node in nodes:
+            if not in_queue[queued_node]:
+                in_queue[queued_node] = True
+                queue.append(queued_node)
+
+    # don't look bits: only nodes next to a changed edge are inspected again
+    queue = deque(tour.tolist())
+    in_queue = [True] * amount
+    deadline = time.time() + time_limit
+    moves = 0
+    inspected = 0
+    timed_out = False
+    # the clock is read every 256 moves and every 256 inspected nodes
+    while queue and not timed_out:
+        node = queue.popleft()
+        in_queue[node] = False
+        inspected += 1
+        while two_opt(node) or or_opt(node):
+            moves += 1
+            if moves & 255 == 0 and time.time() > deadline:
+                timed_out = True
+                break
+        if inspected & 255 == 0 and time.time() > deadline:
+            timed_out = True
+    if timed_out:
+        logger.info("Stopping route improvement after {} moves due to the time limit", moves)
+    logger.debug("Improved route with {} moves", moves)
+    return tour
@@ -0,0 +1,42 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mapadroid.utils.collections import Location
+
+
+def get_subroute_ranges(route_length: int, workers: int) -> List[Tuple[int, int]]:
+    """
+    Split a route into consecutive subroutes, one per worker
+    :return: start and end (exclusive) index of the subroute of every worker. The first route_length % workers
+        subroutes are one coord longer. If there are more workers than coords, the first worker gets the whole
+        route and the others nothing.
+    """
+    if workers <= 0:
+        return []
+    if workers > route_length:
+        return [(0, route_length)] + [(route_length, route_length)] * (workers - 1)
+    length, extra = divmod(route_length, workers)
+    return [(index * length + min(index, extra), (index + 1) * length + min(index + 1, extra))
+            for index in range(workers)]
+
+
+def get_route_index(route: List[Location]) -> Dict[Location, int]:
+    """ Index of every coord in the route, the first one for duplicate coords """
+    route_index: Dict[Location, int] = {}
+    for index, location in enumerate(route):
+        route_index.setdefault(location, index)
+    return route_index
+
+
+def get_queue_position(route_index: Dict[Location, int], queue: Iterable[Location], start: int,
+                       end: int) -> Optional[int]:
+    """
+    Index in the route of the next coord of a queue still part of the route
+    :return: None if the queue is empty or its next coord lies outside of the subroute start - end
+    """
+    for location in queue:
+        position = route_index.get(location)
+        if position is None:
+            # visited and removed from the route meanwhile
+            continue
+        return position if start <= position < end else None
+    return None
@@ -1,5 +1,6 @@
 import copy
 import time
+from concurrent.futures import ProcessPoolExecutor
 from multiprocessing import Event, Lock
 from multiprocessing.managers import SyncManager
 from multiprocessing.pool import ThreadPool
@@ -10,6 +11,8 @@ from typing import Dict, List, Optional, Set, Tuple
 from mapadroid.db.DbWrapper import DbWrapper
 from mapadroid.geofence.geofenceHelper import GeofenceHelper
 from mapadroid.route import RouteManagerBase, RouteManagerIV
+from mapadroid.route.routecalc.calculate_route_all import \
+    set_route_calc_executor
 from mapadroid.route.RouteManagerFactory import RouteManagerFactory
 from mapadroid.utils.collections import Location
 from mapadroid.utils.language import get_mon_ids
@@ -95,6 +98,9 @@ class MappingManager:
         self.__shutdown_event: Event = Event()
         self.join_routes_queue = JoinQueue(self.__shutdown_event, self)
         self.__mappings_mutex: Lock = Lock()
+        # areas which are not yet added to the routemanagers during a fast startup
+        self.__areas_initializing: Set[str] = set()
+        self.__routemanagers_ready: Event = Event()
 
         self.update(full_lock=True)
 
@@ -153,7 +159,15 @@ class MappingManager:
             return []
 
     def get_all_routemanager_names(self):
-        return self._routemanagers.keys()
+        with self.__mappings_mutex:
+            return list(self._routemanagers.keys())
+
+    def routemanager_initializing(self, routemanager_name: str) -> bool:
+        """
+        Whether the area is still being initialized in the background, see --fast_startup
+        """
+        with self.__mappings_mutex:
+            return routemanager_name in self.__areas_initializing
 
     def __fetch_routemanager(self, routemanager_name: str) -> Optional[RouteManagerBase.RouteManagerBase]:
         with self.__mappings_mutex:
@@ -334,7 +348,6 @@ class MappingManager:
         return inheritsettings
 
     def __get_latest_routemanagers(self) -> Optional[Dict[str, dict]]:
-        global mode_mapping
         areas: Optional[Dict[str, dict]] = {}
 
         if self.__configmode:
@@ -346,107 +359,8 @@ class MappingManager:
 
         areas_procs = {}
         for area_id, area_true in raw_areas.items():
-            area = area_true.get_resource()
-            if area["geofence_included"] is None:
-                raise RuntimeError("Cannot work without geofence_included")
-
-            try:
-                geofence_included = self.__data_manager.get_resource('geofence', identifier=area["geofence_included"])
-            except Exception:
-                raise RuntimeError("geofence_included for area '{}' is specified but does not exist ('{}').".format(
-                                   area["name"], geofence_included))
-
-            geofence_excluded_raw_path = area.get("geofence_excluded", None)
-            try:
-                if geofence_excluded_raw_path is not None:
-                    geofence_excluded = self.__data_manager.get_resource('geofence',
-                                                                         identifier=geofence_excluded_raw_path)
-                else:
-                    geofence_excluded = None
-            except Exception:
-                raise RuntimeError(
-                    "geofence_excluded for area '{}' is specified but file does not exist ('{}').".format(
-                        area["name"], geofence_excluded_raw_path
-                    )
-                )
-
-            area_dict = {"mode": area_true.area_type,
-                         "geofence_included": geofence_included,
-                         "geofence_excluded": geofence_excluded,
-                         "routecalc": area["routecalc"],
-                         "name": area['name']}
-            # also build a routemanager for each area...
-
-            # grab coords
-            # first check if init is false, if so, grab the coords from DB
-            geofence_helper = GeofenceHelper(geofence_included, geofence_excluded)
-            mode = area_true.area_type
-            # build routemanagers
-
-            # map iv list to ids
-            if area.get('settings', None) is not None and 'mon_ids_iv' in area['settings']:
-                # replace list name
-                area['settings']['mon_ids_iv_raw'] = \
-                    self.get_monlist(area_id)
-            route_resource = self.__data_manager.get_resource('routecalc', identifier=area["routecalc"])
-
-            calc_type: str = area.get("route_calc_algorithm", "route")
-            route_manager = RouteManagerFactory.get_routemanager(self.__db_wrapper, self.__data_manager,
-                                                                 area_id, None,
-                                                                 mode_mapping.get(mode, {}).get("range", 0),
-                                                                 mode_mapping.get(mode, {}).get("max_count",
-                                                                                                99999999),
-                                                                 geofence_included,
-                                                                 path_to_exclude_geofence=geofence_excluded,
-                                                                 mode=mode,
-                                                                 settings=area.get("settings", None),
-                                                                 init=area.get("init", False),
-                                                                 name=area.get("name", "unknown"),
-                                                                 level=area.get("level", False),
-                                                                 coords_spawns_known=area.get(
-                                                                     "coords_spawns_known", True),
-                                                                 routefile=route_resource,
-                                                                 calctype=calc_type,
-                                                                 joinqueue=self.join_routes_queue,
-                                                                 s2_level=mode_mapping.get(mode, {}).get(
-                                                                     "s2_cell_level", 30),
-                                                                 include_event_id=area.get(
-                                                                     "settings", {}).get("include_event_id", None)
-                                                                 )
-            logger.info("Initializing area {}", area["name"])
-            if mode not in ("iv_mitm", "idle") and calc_type != "routefree":
-                coords = self.__fetch_coords(mode, geofence_helper,
-                                             coords_spawns_known=area.get("coords_spawns_known", True),
-                                             init=area.get("init", False),
-                                             range_init=mode_mapping.get(mode, {}).get("range_init", 630),
-                                             including_stops=area.get("including_stops", False),
-                                             include_event_id=area.get("settings", {}).get("include_event_id", None))
-
-                route_manager.add_coords_list(coords)
-                max_radius = mode_mapping[mode]["range"]
-                max_count_in_radius = mode_mapping[mode]["max_count"]
-                if not area.get("init", False):
-
-                    proc = thread_pool.apply_async(route_manager.initial_calculation,
-                                                   args=(max_radius, max_count_in_radius,
-                                                         0, False))
-                    areas_procs[area_id] = proc
-                else:
-                    logger.info("Init mode enabled. Going row-based for {}", area.get("name", "unknown"))
-                    # we are in init, let's write the init route to file to make it visible in madmin
-                    calc_coords = []
-                    if area["routecalc"] is not None:
-                        for loc in coords:
-                            calc_coord = '%s,%s' % (str(loc.lat), str(loc.lng))
-                            calc_coords.append(calc_coord)
-                        route_resource['routefile'] = calc_coords
-                        route_resource.save()
-                    # gotta feed the route to routemanager... TODO: without recalc...
-                    proc = thread_pool.apply_async(route_manager.recalc_route, args=(1, 99999999,
-                                                                                     0, False))
-                    areas_procs[area_id] = proc
-
-            area_dict["routemanager"] = route_manager
+            area, area_dict = self.__create_routemanager(area_id, area_true)
+            areas_procs[area_id] = thread_pool.apply_async(self.__initialize_route, args=(area, area_dict))
             areas[area_id] = area_dict
 
         for area in areas_procs.keys():
@@ -457,6 +371,163 @@ class MappingManager:
         thread_pool.join()
         return areas
 
+    def __create_routemanager(self, area_id, area_true) -> Tuple[dict, dict]:
+        area = area_true.get_resource()
+        if area["geofence_included"] is None:
+            raise RuntimeError("Cannot work without geofence_included")
+
+        try:
+            geofence_included = self.__data_manager.get_resource('geofence', identifier=area["geofence_included"])
+        except Exception:
+            raise RuntimeError("geofence_included for area '{}' is specified but does not exist ('{}').".format(
+                               area["name"], area["geofence_included"]))
+
+        geofence_excluded_raw_path = area.get("geofence_excluded", None)
+        try:
+            if geofence_excluded_raw_path is not None:
+                geofence_excluded = self.__data_manager.get_resource('geofence',
+                                                                     identifier=geofence_excluded_raw_path)
+            else:
+                geofence_excluded = None
+        except Exception:
+            raise RuntimeError(
+                "geofence_excluded for area '{}' is specified but file does not exist ('{}').".format(
+                    area["name"], geofence_excluded_raw_path
+                )
+            )
+
+        area_dict = {"mode": area_true.area_type,
+                     "geofence_included": geofence_included,
+                     "geofence_excluded": geofence_excluded,
+                     "routecalc": area["routecalc"],
+                     "name": area['name']}
+        mode = area_true.area_type
+        # build routemanagers
+
+        # map iv list to ids
+        if area.get('settings', None) is not None and 'mon_ids_iv' in area['settings']:
+            # replace list name
+            area['settings']['mon_ids_iv_raw'] = \
+                self.get_monlist(area_id)
+        route_resource = self.__data_manager.get_resource('routecalc', identifier=area["routecalc"])
+
+        calc_type: str = area.get("route_calc_algorithm", "route")
+        route_manager = RouteManagerFactory.get_routemanager(self.__db_wrapper, self.__data_manager,
+                                                             area_id, None,
+                                                             mode_mapping.get(mode, {}).get("range", 0),
+                                                             mode_mapping.get(mode, {}).get("max_count",
+                                                                                            99999999),
+                                                             geofence_included,
+                                                             path_to_exclude_geofence=geofence_excluded,
+                                                             mode=mode,
+                                                             settings=area.get("settings", None),
+                                                             init=area.get("init", False),
+                                                             name=area.get("name", "unknown"),
+                                                             level=area.get("level", False),
+                                                             coords_spawns_known=area.get(
+                                                                 "coords_spawns_known", True),
+                                                             routefile=route_resource,
+                                                             calctype=calc_type,
+                                                             joinqueue=self.join_routes_queue,
+                                                             s2_level=mode_mapping.get(mode, {}).get(
+                                                                 "s2_cell_level", 30),
+                                                             include_event_id=area.get(
+                                                                 "settings", {}).get("include_event_id", None)
+                                                             )
+        area_dict["routemanager"] = route_manager
+        return area, area_dict
+
+    def __initialize_route(self, area: dict, area_dict: dict):
+        """
+        Grabs the coords of the area and calculates (or loads) its route
+        """
+        mode = area_dict["mode"]
+        route_manager = area_dict["routemanager"]
+        logger.info("Initializing area {}", area["name"])
+        if mode in ("iv_mitm", "idle") or area.get("route_calc_algorithm", "route") == "routefree":
+            return
+        # grab coords
+        # first check if init is false, if so, grab the coords from DB
+        geofence_helper = GeofenceHelper(area_dict["geofence_included"], area_dict["geofence_excluded"])
+        coords = self.__fetch_coords(mode, geofence_helper,
+                                     coords_spawns_known=area.get("coords_spawns_known", True),
+                                     init=area.get("init", False),
+                                     range_init=mode_mapping.get(mode, {}).get("range_init", 630),
+                                     including_stops=area.get("including_stops", False),
+                                     include_event_id=area.get("settings", {}).get("include_event_id", None))
+
+        route_manager.add_coords_list(coords)
+        max_radius = mode_mapping[mode]["range"]
+        max_count_in_radius = mode_mapping[mode]["max_count"]
+        if not area.get("init", False):
+            route_manager.initial_calculation(max_radius, max_count_in_radius, 0, False)
+        else:
+            logger.info("Init mode enabled. Going row-based for {}", area.get("name", "unknown"))
+            # we are in init, let's write the init route to file to make it visible in madmin
+            calc_coords = []
+            if area["routecalc"] is not None:
+                for loc in coords:
+                    calc_coord = '%s,%s' % (str(loc.lat), str(loc.lng))
+                    calc_coords.append(calc_coord)
+                route_resource = route_manager._route_resource
+                route_resource['routefile'] = calc_coords
+                route_resource.save()
+            # gotta feed the route to routemanager... TODO: without recalc...
+            route_manager.recalc_route(1, 99999999, 0, False)
+
+    def __initialize_routemanagers_in_background(self):
+        """
+        Initializes the areas in parallel, each area is added to the routemanagers once its route is ready.
+        Devices of an area still initializing are rejected until it is ready.
+        """
+        started = time.time()
+        processes = max(1, self.__args.route_init_processes)
+        raw_areas = self.__data_manager.get_root_resource('area')
+        logger.info("Initializing {} areas in the background using {} processes", len(raw_areas), processes)
+        durations: Dict[str, float] = {}
+        failed: List[str] = []
+        executor = ProcessPoolExecutor(max_workers=processes)
+        set_route_calc_executor(executor)
+        thread_pool = ThreadPool(processes=processes)
+
+        def initialize_area(area_id, area_true):
+            area_started = time.time()
+            area_name = str(area_id)
+            try:
+                area, area_dict = self.__create_routemanager(area_id, area_true)
+                area_name = area["name"]
+                self.__initialize_route(area, area_dict)
+            except Exception:
+                logger.opt(exception=True).error("Failed initializing area {}, it is not going to be used",
+                                                 area_name)
+                failed.append(area_name)
+                with self.__mappings_mutex:
+                    self.__areas_initializing.discard(area_id)
+                return
+            durations[area_name] = time.time() - area_started
+            with self.__mappings_mutex:
+                self._routemanagers[area_id] = area_dict
+                self.__areas_initializing.discard(area_id)
+                remaining = len(self.__areas_initializing)
+            logger.info("Area {} is ready after {:.1f}s, {} areas left", area_name, durations[area_name],
+                        remaining)
+
+        try:
+            for area_id, area_true in raw_areas.items():
+                thread_pool.apply_async(initialize_area, args=(area_id, area_true))
+            thread_pool.close()
+            thread_pool.join()
+        finally:
+            set_route_calc_executor(None)
+            executor.shutdown(wait=True)
+            with self.__mappings_mutex:
+                self.__areas_initializing.clear()
+            self.__routemanagers_ready.set()
+        slowest = sorted(durations.items(), key=lambda duration: duration[1], reverse=True)[:5]
+        logger.info("Initialized {} areas in {:.1f}s (slowest: {}){}", len(durations), time.time() - started,
+                    ", ".join("{} {:.1f}s".format(name, duration) for name, duration in slowest) or "-",
+                    ", failed: {}".format(", ".join(failed)) if failed else "")
+
     def __get_latest_devicemappings(self) -> dict:
         # returns mapping of devises to areas
         devices = {}
@@ -616,6 +687,9 @@ class MappingManager:
         :return:
         """
         if not full_lock:
+            if not self.__routemanagers_ready.is_set():
+                logger.info("Waiting for the areas to be initialized before updating the mappings")
+                self.__routemanagers_ready.wait()
             self._monlists = self.__get_latest_monlists()
             areas_tmp = self.__get_latest_areas()
             self.__areamons = self.__get_latest_areamons(areas_tmp)
@@ -651,14 +725,25 @@ class MappingManager:
                 self._auths = auths_tmp
 
         else:
+            # --only_routes exits once no route is being calculated, which has to include the initial routes
+            initialize_in_background: bool = (self.__args.fast_startup and not self.__configmode
+                                              and not self.__args.only_routes)
             logger.debug("Acquiring lock to update mappings,full")
             with self.__mappings_mutex:
                 self._monlists = self.__get_latest_monlists()
                 self._areas = self.__get_latest_areas()
                 self.__areamons = self.__get_latest_areamons(self._areas)
-                self._routemanagers = self.__get_latest_routemanagers()
+                if initialize_in_background:
+                    self._routemanagers = {}
+                    self.__areas_initializing = set(self._areas.keys())
+                else:
+                    self._routemanagers = self.__get_latest_routemanagers()
                 self._devicemappings = self.__get_latest_devicemappings()
                 self._auths = self.__get_latest_auths()
+            if initialize_in_background:
+                Thread(name='system', target=self.__initialize_routemanagers_in_background, daemon=True).start()
+            else:
+                self.__routemanagers_ready.set()
 
         logger.info("Mappings have been updated")
 
@@ -1,41 +1,122 @@
 import json
 import os
+from threading import Lock
+from typing import Callable, Dict, List, Optional
 
+LOCALE_DIR = 'locale'
+DEFAULT_LANGUAGE = 'en'
 
-def open_json_file(jsonfile):
-    try:
-        with open('locale/' + os.environ['LANGUAGE'] + '/' + jsonfile + '.json', encoding='utf8') as f:
-            file_open = json.load(f)
-    except (OSError, json.decoder.JSONDecodeError):
-        with open('locale/en/' + jsonfile + '.json') as f:
-            file_open = json.load(f)
 
-    return file_open
+class Translations(object):
+    """ The locale files of a language, each file is read once and the lookup tables are built on first use.
+        The loaded files are shared, callers must not modify them
 
+    Args:
+        language (str): Language of the locale files
+    """
+
+    def __init__(self, language: str):
+        self.language: str = language
+        self._files: Dict[str, dict] = {}
+        self._words: Optional[Dict[str, str]] = None
+        self._mon_names: Optional[Dict[str, str]] = None
+        self._mon_ids: Optional[List[str]] = None
+        self._lock: Lock = Lock()
+
+    def get_file(self, jsonfile: str) -> dict:
+        """ Content of locale/<language>/<jsonfile>.json, falls back to the english file """
+        loaded = self._files.get(jsonfile)
+        if loaded is None:
+            with self._lock:
+                loaded = self._files.get(jsonfile)
+                if loaded is None:
+                    loaded = self._read_file(jsonfile)
+                    self._files[jsonfile] = loaded
+        return loaded
+
+    def _read_file(self, jsonfile: str) -> dict:
+        try:
+            with open(os.path.join(LOCALE_DIR, self.language, jsonfile + '.json'), encoding='utf8') as f:
+                return json.load(f)
+        except (OSError, json.decoder.JSONDecodeError):
+            with open(os.path.join(LOCALE_DIR, DEFAULT_LANGUAGE, jsonfile + '.json'), encoding='utf8') as f:
+                return json.load(f)
+
+    @property
+    def words(self) -> Dict[str, str]:
+        """ Translations of locale/<language>/mad.json, empty if the language has none """
+        if self._words is None:
+            try:
+                with open(os.path.join(LOCALE_DIR, self.language, 'mad.json'), encoding='utf8') as f:
+                    self._words = json.load(f)
+            except OSError:
+                self._words = {}
+        return self._words
+
+    def translate(self, word: str) -> str:
+        return self.words.get(word, word)
+
+    @property
+    def mon_names(self) -> Dict[str, str]:
+        """ Localized names of the mons by their ID as string """
+        if self._mon_names is None:
+            mons = self.get_file('pokemon')
+            if self.language != DEFAULT_LANGUAGE:
+                self._mon_names = {mon_id: self.translate(mon["name"]) for mon_id, mon in mons.items()}
+            else:
+                self._mon_names = {mon_id: mon["name"] for mon_id, mon in mons.items()}
+        return self._mon_names
+
+    @property
+    def mon_ids(self) -> List[str]:
+        if self._mon_ids is None:
+            self._mon_ids = list(self.get_file('pokemon').keys())
+        return self._mon_ids
+
+
+_translations: Dict[str, Translations] = {}
+_translations_lock = Lock()
+_reload_hooks: List[Callable[[], None]] = []
 
-def i8ln(word):
-    lang_file = 'locale/' + os.environ['LANGUAGE'] + '/mad.json'
-    if os.path.isfile(lang_file):
-        with open(lang_file, encoding='utf8') as f:
-            language_file = json.load(f)
-        if word in language_file:
-            return language_file[word]
 
-    return word
+def get_translations(language: Optional[str] = None) -> Translations:
+    """ Translations of the given language, defaults to the configured language of MAD """
+    if language is None:
+        language = os.environ['LANGUAGE']
+    translations = _translations.get(language)
+    if translations is None:
+        with _translations_lock:
+            translations = _translations.get(language)
+            if translations is None:
+                translations = Translations(language)
+                _translations[language] = translations
+    return translations
+
+
+def add_reload_hook(hook: Callable[[], None]):
+    """ Register a callable run after the locale files have been reloaded, e.g. to drop derived caches """
+    _reload_hooks.append(hook)
+
+
+def reload_translations():
+    """ Drop the loaded locale files of all languages of the process, they are read again on their next use """
+    with _translations_lock:
+        _translations.clear()
+    for hook in list(_reload_hooks):
+        hook()
+
+
+def open_json_file(jsonfile):
+    return get_translations().get_file(jsonfile)
+
+
+def i8ln(word):
+    return get_translations().translate(word)
 
 
 def get_mon_name(mon_id):
-    mons_file = open_json_file('pokemon')
-    str_id = str(mon_id)
-    if str_id in mons_file:
-        if os.environ['LANGUAGE'] != "en":
-            return i8ln(mons_file[str_id]["name"])
-        else:
-            return mons_file[str_id]["name"]
-    else:
-        return "No-name-in-pokemon-json"
+    return get_translations().mon_names.get(str(mon_id), "No-name-in-pokemon-json")
 
 
 def get_mon_ids():
-    mons_file = open_json_file('pokemon')
-    return list(mons_file.keys())
+    return list(get_translations().mon_ids)
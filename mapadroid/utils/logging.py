@@ -1,12 +1,45 @@
+import atexit
+import json
 import logging
 import os
 import sys
+import threading
+from datetime import datetime
 from enum import IntEnum
 from functools import wraps
-from typing import Union
+from multiprocessing import Process, Queue
+from queue import Empty
+from typing import Dict, Optional, Tuple, Union
 
+from cachetools import LRUCache
 from loguru import logger
 
+# List has an order, dict doesn't. We need the guaranteed order to
+# determine debug level based on arg_debug_level.
+VERBOSITY_LEVELS = [
+    ("TRACE", 5),
+    ("DEBUG5", 6),
+    ("DEBUG4", 7),
+    ("DEBUG3", 8),
+    ("DEBUG2", 9),
+    ("DEBUG", 10),
+    ("INFO", 20),
+    ("SUCCESS", 25),
+    ("WARNING", 30),
+    ("ERROR", 40),
+    ("CRITICAL", 50)
+]
+LEVEL_NOS: Dict[str, int] = dict(VERBOSITY_LEVELS)
+
+# the handlers of all loggers, shared by the bound loggers. loguru keeps the lowest level of the handlers in it
+_logger_core = getattr(logger, "_core", None)
+# amount of origin loggers kept, the loggers of devices not logging anymore are dropped
+ORIGIN_LOGGER_CACHE_SIZE = 1024
+# origin loggers by origin, see get_origin_logger
+_origin_loggers: LRUCache = LRUCache(maxsize=ORIGIN_LOGGER_CACHE_SIZE)
+_origin_loggers_lock = threading.Lock()
+_json_log_writer: Optional["JsonLinesLogWriter"] = None
+
 
 class LoggerEnums(IntEnum):
     unknown: int = 0
@@ -32,7 +65,7 @@ class LoggerEnums(IntEnum):
 # ==================================
 
 def init_logging(args):
-    global logger
+    global logger, _json_log_writer
     log_level_label, log_level_val = log_level(args.log_level, args.verbose)
     _, log_file_level = log_level(args.log_file_level, args.verbose)
     log_trace = log_level_val <= 10
@@ -103,6 +136,16 @@ def init_logging(args):
         if str(args.log_file_rotation) != "0":
             file_logs["rotation"] = str(args.log_file_rotation)
         logconfig["handlers"].append(file_logs)
+    if getattr(args, "log_json_file", None):
+        if _json_log_writer is None:
+            _json_log_writer = JsonLinesLogWriter(args.log_json_file)
+            _json_log_writer.start()
+            atexit.register(_json_log_writer.stop)
+        logconfig["handlers"].append({
+            "sink": _json_log_writer.write,
+            "format": "{message}",
+            "level": log_file_level
+        })
     try:
         logger.configure(**logconfig)
         init_custom(logger)
@@ -113,25 +156,11 @@ def init_logging(args):
 
 
 def log_level(arg_log_level, arg_debug_level):
-    # List has an order, dict doesn't. We need the guaranteed order to
-    # determine debug level based on arg_debug_level.
-    verbosity_levels = [
-        ("TRACE", 5),
-        ("DEBUG5", 6),
-        ("DEBUG4", 7),
-        ("DEBUG3", 8),
-        ("DEBUG2", 9),
-        ("DEBUG", 10),
-        ("INFO", 20),
-        ("SUCCESS", 25),
-        ("WARNING", 30),
-        ("ERROR", 40),
-        ("CRITICAL", 50)
-    ]
+    verbosity_levels = VERBOSITY_LEVELS
     # Case insensitive.
     arg_log_level = arg_log_level.upper() if arg_log_level else None
     # Easy label->level lookup.
-    verbosity_map = {k.upper(): v for k, v in verbosity_levels}
+    verbosity_map = LEVEL_NOS
 
     # Log level by label.
     forced_log_level = verbosity_map.get(arg_log_level, None)
@@ -179,15 +208,41 @@ def apply_custom(func):
     return decorated
 
 
+def _get_min_level() -> int:
+    # min_level is internal to loguru, every level is passed on to loguru if it is missing
+    return getattr(_logger_core, "min_level", 0)
+
+
+def is_log_level_enabled(level: Union[str, int]) -> bool:
+    """ Whether any handler takes messages of the level. Allows skipping the arguments of a message expensive to
+        build
+    """
+    level_no = LEVEL_NOS.get(level, 0) if isinstance(level, str) else level
+    return level_no >= _get_min_level()
+
+
+def _get_level_method(log_out, level: str):
+    """ Logs at the level, returns right away if no handler takes the level (e.g. debug messages at info level)
+        instead of collecting the details of the call like loguru does first
+    """
+    level_no = LEVEL_NOS[level]
+
+    def log(message, *args, **kwargs):
+        if level_no >= _get_min_level():
+            log_out.opt(depth=1).log(level, message, *args, **kwargs)
+    return log
+
+
 def init_custom(log_out):
     log_out.level("DEBUG2", no=9)
     log_out.level("DEBUG3", no=8)
     log_out.level("DEBUG4", no=7)
     log_out.level("DEBUG5", no=6)
-    log_out.debug2 = lambda message, *args, **kwargs: log_out.opt(depth=1).log("DEBUG2", message, *args, **kwargs)
-    log_out.debug3 = lambda message, *args, **kwargs: log_out.opt(depth=1).log("DEBUG3", message, *args, **kwargs)
-    log_out.debug4 = lambda message, *args, **kwargs: log_out.opt(depth=1).log("DEBUG4", message, *args, **kwargs)
-    log_out.debug5 = lambda message, *args, **kwargs: log_out.opt(depth=1).log("DEBUG5", message, *args, **kwargs)
+    log_out.debug = _get_level_method(log_out, "DEBUG")
+    log_out.debug2 = _get_level_method(log_out, "DEBUG2")
+    log_out.debug3 = _get_level_method(log_out, "DEBUG3")
+    log_out.debug4 = _get_level_method(log_out, "DEBUG4")
+    log_out.debug5 = _get_level_method(log_out, "DEBUG5")
 
 # ==================================
 # ========== Filter Funcs ==========
@@ -257,19 +312,34 @@ def get_logger(logger_type: Union[LoggerEnums, int], identifier: str = None, fil
 
 def get_origin_logger(existing_logger, origin=None) -> logger:
     """ Returns an origin logger.  Could be updated later to use ContextVar to allow for easier tracking of log
-        messages
+        messages. The logger of an origin is created once and reused
     """
     if not any([origin]):
         return existing_logger
-    if origin:
-        return get_logger(LoggerEnums.system, identifier=origin)
+    with _origin_loggers_lock:
+        origin_logger = _origin_loggers.get(origin)
+        if origin_logger is None:
+            origin_logger = _origin_loggers[origin] = get_logger(LoggerEnums.system, identifier=origin)
+    return origin_logger
 
 
 @apply_custom
+def _create_route_logger(existing, origin) -> logger:
+    return existing.bind(origin=origin).patch(filter_route_with_origin)
+
+
 def routelogger_set_origin(existing, origin=None) -> logger:
+    """ Logger of the route with the origin, created once per route logger and origin """
     if origin is None:
         return existing
-    return existing.bind(origin=origin).patch(filter_route_with_origin)
+    try:
+        route_loggers: Dict[str, logger] = existing.route_loggers
+    except AttributeError:
+        route_loggers = existing.route_loggers = {}
+    route_logger = route_loggers.get(origin)
+    if route_logger is None:
+        route_logger = route_loggers.setdefault(origin, _create_route_logger(existing, origin))
+    return route_logger
 
 
 # ==================================
@@ -277,6 +347,64 @@ def routelogger_set_origin(existing, origin=None) -> logger:
 # ==================================
 
 
+def _write_json_lines(path: str, records: Queue):
+    """ Writes the records of the queue to the file until None is received """
+    with open(path, "a", encoding="UTF-8") as log_file:
+        while True:
+            # write what is queued before flushing
+            batch = [records.get()]
+            try:
+                while len(batch) < 1000:
+                    batch.append(records.get_nowait())
+            except Empty:
+                pass
+            for record in batch:
+                if record is None:
+                    return
+                timestamp, level, identifier, name, function, line, process, message, exception = record
+                log_file.write(json.dumps({
+                    "time": datetime.fromtimestamp(timestamp).isoformat(), "level": level,
+                    "identifier": identifier, "module": name, "function": function, "line": line,
+                    "process": process, "message": message, "exception": exception
+                }, ensure_ascii=False))
+                log_file.write("\n")
+            log_file.flush()
+
+
+class JsonLinesLogWriter:
+    """ Sink writing the log records as JSON lines to a file. The records of all processes are handed to a
+        separate process writing them, the logging process only queues the fields of the record
+    """
+
+    def __init__(self, path: str):
+        self._path: str = path
+        self._records: Queue = Queue()
+        self._process: Optional[Process] = None
+
+    def start(self):
+        self._process = Process(name="JSON log writer", target=_write_json_lines, args=(self._path, self._records))
+        self._process.daemon = True
+        self._process.start()
+
+    def stop(self, timeout: float = 5):
+        if self._process is None:
+            return
+        self._records.put(None)
+        self._process.join(timeout)
+        self._process = None
+
+    def write(self, message):
+        record = message.record
+        extra = record["extra"]
+        exception: Optional[str] = None
+        if record["exception"] is not None:
+            exception = "{}: {}".format(record["exception"].type.__name__, record["exception"].value)
+        fields: Tuple = (record["time"].timestamp(), record["level"].name,
+                         extra.get("origin", extra.get("identifier")), record["name"], record["function"],
+                         record["line"], record["process"].name, record["message"], exception)
+        self._records.put(fields)
+
+
 # this is being used to intercept standard python logging to loguru
 class InterceptHandler(logging.Handler):
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,291 @@
+"""
+Counters, gauges and histograms exposed in the Prometheus text format.
+
+Every process records into its own values. Processes forked after init_metrics send the values recorded since
+their last flush to the main process every FLUSH_INTERVAL seconds, where they are aggregated: counters and
+histograms are summed up, gauges report the value set last. Recording is a no-op unless metrics are enabled.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from multiprocessing import Queue
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from mapadroid.utils.logging import LoggerEnums, get_logger
+
+logger = get_logger(LoggerEnums.system)
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# seconds between the flushes of the values recorded by forked processes
+FLUSH_INTERVAL = 5
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (metric name, label values)
+ValueKey = Tuple[str, Tuple[str, ...]]
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics and their values of a process. In the main process the values include the ones received from
+    the forked processes.
+    """
+
+    def __init__(self):
+        self.enabled: bool = False
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._values: Dict[ValueKey, object] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._queue: Optional[Queue] = None
+        self._pid: int = os.getpid()
+        self._flusher: Optional[threading.Thread] = None
+        self._aggregator: Optional[threading.Thread] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def register(self, metric: "_Metric"):
+        if metric.name in self._metrics:
+            raise ValueError("Metric {} is registered already".format(metric.name))
+        self._metrics[metric.name] = metric
+
+    def enable(self, queue: Optional[Queue] = None):
+        """
+        Start recording. Processes forked afterwards send their values to the given queue, which is read by a thread
+        of the calling process.
+        """
+        self.enabled = True
+        if queue is None or self._aggregator is not None:
+            return
+        self._queue = queue
+        self._aggregator = threading.Thread(name="metrics", target=self._aggregate)
+        self._aggregator.daemon = True
+        self._aggregator.start()
+
+    def disable(self):
+        self.enabled = False
+        if self._aggregator is not None:
+            self._queue.put(None)
+            self._aggregator.join()
+            self._aggregator = None
+        self._queue = None
+        with self._lock:
+            self._values.clear()
+
+    def record(self, metric: "_Metric", key: Tuple[str, ...], value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            metric.update(self._values, (metric.name, key), value)
+        if self._flusher is None and self._queue is not None and os.getpid() != self._pid:
+            self._start_flusher()
+
+    def _after_fork_in_child(self):
+        # the values belong to the parent and the lock may have been held by one of its threads
+        self._lock = threading.Lock()
+        self._values = {}
+        self._flusher = None
+        self._aggregator = None
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(name="metrics flusher", target=self._flush_periodically)
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """
+        Send the values recorded since the last flush to the main process
+        """
+        if self._queue is None or os.getpid() == self._pid:
+            return
+        with self._lock:
+            values, self._values = self._values, {}
+        if values:
+            self._queue.put(values)
+
+    def _aggregate(self):
+        while True:
+            values = self._queue.get()
+            if values is None:
+                break
+            self.merge(values)
+
+    def merge(self, values: Dict[ValueKey, object]):
+        with self._lock:
+            for value_key, value in values.items():
+                metric = self._metrics.get(value_key[0])
+                if metric is not None:
+                    metric.merge(self._values, value_key, value)
+
+    def get_values(self) -> Dict[ValueKey, object]:
+        with self._lock:
+            return {value_key: list(value) if isinstance(value, list) else value
+                    for value_key, value in self._values.items()}
+
+    def generate_latest(self) -> str:
+        """
+        :return: the metrics and their values in the Prometheus text format
+        """
+        values = self.get_values()
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            lines.append("# HELP {} {}".format(name, metric.documentation.replace("\\", "\\\\").replace("\n", "\\n")))
+            lines.append("# TYPE {} {}".format(name, metric.kind))
+            for (value_name, labelvalues), value in sorted(values.items()):
+                if value_name == name:
+                    lines.extend(metric.expose(labelvalues, value))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def init_metrics(args, registry: MetricsRegistry = REGISTRY):
+    """
+    Enable the metrics if configured. Has to be called by the main process before starting any other process.
+    """
+    if not getattr(args, "metrics", False):
+        return
+    registry.enable(Queue())
+    logger.info("Collecting metrics, exposed at /metrics of MADmin")
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_sample(name: str, labelnames: Sequence[str], labelvalues: Sequence[str], value: float) -> str:
+    if labelnames:
+        labels = ",".join("{}=\"{}\"".format(labelname, _escape_label_value(labelvalue))
+                          for labelname, labelvalue in zip(labelnames, labelvalues))
+        name = "{}{{{}}}".format(name, labels)
+    return "{} {}".format(name, _format_value(value))
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: MetricsRegistry = REGISTRY):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._registry: MetricsRegistry = registry
+        self._children: Dict[tuple, "_MetricChild"] = {}
+        registry.register(self)
+
+    def labels(self, *labelvalues) -> "_MetricChild":
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError("Metric {} expects the labels {}".format(self.name, self.labelnames))
+            child = self._children.setdefault(labelvalues,
+                                              _MetricChild(self, tuple(str(value) for value in labelvalues)))
+        return child
+
+    def update(self, values: dict, value_key: ValueKey, value: float):
+        raise NotImplementedError
+
+    def merge(self, values: dict, value_key: ValueKey, value):
+        raise NotImplementedError
+
+    def expose(self, labelvalues: Tuple[str, ...], value) -> List[str]:
+        return [_format_sample(self.name, self.labelnames, labelvalues, value)]
+
+
+class _MetricChild:
+    """ A metric with its label values, see _Metric.labels """
+
+    def __init__(self, metric: _Metric, labelvalues: Tuple[str, ...]):
+        self._metric: _Metric = metric
+        self._labelvalues: Tuple[str, ...] = labelvalues
+
+    def inc(self, amount: float = 1):
+        self._metric._registry.record(self._metric, self._labelvalues, amount)
+
+    def set(self, value: float):
+        self._metric._registry.record(self._metric, self._labelvalues, value)
+
+    def observe(self, value: float):
+        self._metric._registry.record(self._metric, self._labelvalues, value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def update(self, values: dict, value_key: ValueKey, value: float):
+        values[value_key] = values.get(value_key, 0.0) + value
+
+    merge = update
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def update(self, values: dict, value_key: ValueKey, value: float):
+        values[value_key] = value
+
+    merge = update
+
+
+class Histogram(_Metric):
+    """
+    Counts the observed values per bucket. The values are kept as the count per bucket (the last one being +Inf)
+    followed by the sum of the values observed.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: MetricsRegistry = REGISTRY, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def update(self, values: dict, value_key: ValueKey, value: float):
+        counts = values.get(value_key)
+        if counts is None:
+            counts = values[value_key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def merge(self, values: dict, value_key: ValueKey, value: list):
+        counts = values.get(value_key)
+        if counts is None:
+            values[value_key] = list(value)
+            return
+        for index, count in enumerate(value):
+            counts[index] += count
+
+    def expose(self, labelvalues: Tuple[str, ...], value: list) -> List[str]:
+        labelnames = self.labelnames + ("le",)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), value):
+            cumulative += count
+            lines.append(_format_sample(self.name + "_bucket", labelnames, labelvalues + (_format_value(bound),),
+                                        cumulative))
+        lines.append(_format_sample(self.name + "_sum", self.labelnames, labelvalues, value[-1]))
+        lines.append(_format_sample(self.name + "_count", self.labelnames, labelvalues, cumulative))
+        return lines
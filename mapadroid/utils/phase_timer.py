@@ -0,0 +1,35 @@
+import time
+from typing import List, Optional, Tuple
+
+
+class PhaseTimer(object):
+    """
+    Measures the durations of consecutive phases, e.g. of the startup of MAD
+
+    Args:
+        name (str): Name of the measured process used in the report
+        start (float): time.time() the first phase started at, defaults to now
+    """
+
+    def __init__(self, name: str, start: Optional[float] = None):
+        self.name: str = name
+        self._start: float = start if start is not None else time.time()
+        self._last: float = self._start
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str) -> float:
+        """ Ends the current phase, the next one starts now
+        :return: duration of the phase in seconds
+        """
+        now = time.time()
+        duration = now - self._last
+        self.phases.append((phase, duration))
+        self._last = now
+        return duration
+
+    def get_total(self) -> float:
+        return self._last - self._start
+
+    def get_report(self) -> str:
+        phases = ", ".join("{} {:.2f}s".format(phase, duration) for phase, duration in self.phases)
+        return "{} took {:.2f}s ({})".format(self.name, self.get_total(), phases or "-")
@@ -6,7 +6,7 @@ from typing import Dict
 import requests
 
 from mapadroid.utils.gamemechanicutil import form_mapper
-from mapadroid.utils.language import i8ln, open_json_file
+from mapadroid.utils.language import add_reload_hook, i8ln, open_json_file
 from mapadroid.utils.logging import LoggerEnums, get_logger
 
 QUEST_LANGUAGES: Dict[str, str] = {
@@ -17,6 +17,9 @@ QUEST_LANGUAGES: Dict[str, str] = {
 
 logger = get_logger(LoggerEnums.utils)
 
+# amount of generated quest tasks to keep, quests of a day share few distinct tasks
+QUEST_TASK_CACHE_SIZE = 10000
+
 
 class QuestGen:
     def __init__(self, args):
@@ -24,11 +27,9 @@ class QuestGen:
         self.lang = gettext.translation('quest', localedir='locale', fallback=True)
         self.lang.install()
 
-        self.pokemon_types = open_json_file('pokemonTypes')
-        self.items = open_json_file('items')
-        self.quest_type_file = open_json_file('types')
-        self.quest_templates = open_json_file('quest_templates')
-        self.pokemen_file = open_json_file('pokemon')
+        self._quest_tasks: Dict[tuple, str] = {}
+        self.load_locale()
+        add_reload_hook(self.load_locale)
 
         self.quest_rewards = {
             1: _("Experience"),
@@ -58,6 +59,15 @@ class QuestGen:
             self.locale_resources = {**apk_locale, **remote_locale}
         else: self.locale_resources = None
 
+    def load_locale(self):
+        """ (Re)load the locale files and drop the quest tasks generated from them """
+        self.pokemon_types = open_json_file('pokemonTypes')
+        self.items = open_json_file('items')
+        self.quest_type_file = open_json_file('types')
+        self.quest_templates = open_json_file('quest_templates')
+        self.pokemen_file = open_json_file('pokemon')
+        self._quest_tasks = {}
+
     @staticmethod
     def __gen_assets_locale(url):
         try:
@@ -166,9 +176,8 @@ class QuestGen:
         return "Unknown quest type placeholder: {0}"
 
     def rewarditem(self, itemid):
-        file = open_json_file('items')
-        if str(itemid) in file:
-            return (file[str(itemid)]['name'])
+        if str(itemid) in self.items:
+            return (self.items[str(itemid)]['name'])
         return "Item " + str(itemid)
 
     def pokemonname(self, id):
@@ -178,13 +187,22 @@ class QuestGen:
         return self.pokemon_types[str(pt)].title() + _('-type')
 
     def questtask(self, typeid, condition, target, quest_template, quest_title):
+        key = (typeid, condition, target, quest_template, quest_title)
+        task = self._quest_tasks.get(key)
+        if task is None:
+            task = self.__gen_questtask(typeid, condition, target, quest_template, quest_title)
+            if len(self._quest_tasks) >= QUEST_TASK_CACHE_SIZE:
+                self._quest_tasks = {}
+            self._quest_tasks[key] = task
+        return task
+
+    def __gen_questtask(self, typeid, condition, target, quest_template, quest_title):
         if quest_title is not None and self.locale_resources is not None and quest_title in self.locale_resources:
             qt = self.locale_resources[quest_title]
             if '{0}' in qt:
                 return qt.format(target)
             return qt
 
-        gettext.find('quest', 'locales', all=True)
         throw_types = {"10": _("Nice"), "11": _("Great"),
                        "12": _("Excellent"), "13": _("Curveball")}
         buddyLevels = {2: _("Good"), 3: _("Great"), 4: _("Ultra"), 5: _("Best")}
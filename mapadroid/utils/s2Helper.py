@@ -1,6 +1,7 @@
 import math
 import multiprocessing
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
 
 import gpxdata
 import s2sphere
@@ -13,6 +14,8 @@ from mapadroid.utils.logging import LoggerEnums, get_logger
 
 logger = get_logger(LoggerEnums.utils)
 
+SPAWNPOINT_POSITION_CACHE_SIZE = 200000
+
 
 class S2Helper:
     @staticmethod
@@ -49,6 +52,15 @@ class S2Helper:
         cell = s2sphere.CellId(id_=int(cell_id)).to_lat_lng()
         return s2sphere.math.degrees(cell.lat().radians), s2sphere.math.degrees(cell.lng().radians), 0
 
+    @staticmethod
+    @lru_cache(maxsize=SPAWNPOINT_POSITION_CACHE_SIZE)
+    def get_position_from_spawnpoint(spawnpoint_id: str) -> Tuple[float, float]:
+        """
+        Position of a spawnpoint by its hex ID as sent by the game, the spawnpoints do not move
+        """
+        lat, lng, _ = S2Helper.get_position_from_cell(int(spawnpoint_id + "00000", 16))
+        return lat, lng
+
     @staticmethod
     def _generate_star_locs(center, distance, ring):
         results = []
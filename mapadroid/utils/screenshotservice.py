@@ -0,0 +1,161 @@
+import os
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from io import BytesIO
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from mapadroid.utils.logging import LoggerEnums, get_logger
+
+logger = get_logger(LoggerEnums.system)
+
+THUMBNAIL_WIDTH = 250
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_WORKERS = 4
+# seconds to wait for a thumbnail before answering without it
+THUMBNAIL_TIMEOUT = 10
+
+
+class ScreenshotFrame:
+    """
+    The latest screenshot of a device. The thumbnail is generated once per frame in the worker pool.
+    """
+    __slots__ = ("data", "mimetype", "modified", "etag", "thumbnail")
+
+    def __init__(self, data: bytes, mimetype: str, modified: float):
+        self.data: bytes = data
+        self.mimetype: str = mimetype
+        self.modified: float = modified
+        self.etag: str = "{:x}-{:x}".format(int(modified * 1000), zlib.crc32(data))
+        self.thumbnail: Optional[Future] = None
+
+
+def generate_thumbnail(data: bytes, width: int = THUMBNAIL_WIDTH) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    :return: the JPEG encoded thumbnail of the screenshot and the size of the screenshot
+    """
+    with Image.open(BytesIO(data)) as img:
+        size = img.size
+        height = max(1, int(size[1] * width / float(size[0])))
+        # decode JPEGs scaled down already, the thumbnail is a fraction of the screen
+        img.draft("RGB", (width * 2, height * 2))
+        thumbnail = img.convert("RGB").resize((width, height), Image.LANCZOS)
+    encoded = BytesIO()
+    thumbnail.save(encoded, format="JPEG", quality=THUMBNAIL_QUALITY)
+    return encoded.getvalue(), size
+
+
+class ScreenshotService:
+    """
+    Keeps the latest screenshot of every device in memory. Screenshots received through the websocket are
+    published directly, screenshots written by other means (e.g. ADB) are read once per change of the file.
+    """
+
+    def __init__(self, workers: int = THUMBNAIL_WORKERS):
+        self._frames: Dict[str, ScreenshotFrame] = {}
+        self._lock: Lock = Lock()
+        self._pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers,
+                                                            thread_name_prefix="screenshots")
+
+    def publish(self, origin: str, data: bytes, path: Optional[str] = None) -> ScreenshotFrame:
+        """
+        Stores a new frame of the device
+        :param path: file the frame has been written to, its modification time becomes the one of the frame
+        """
+        modified = time.time()
+        if path is not None:
+            try:
+                modified = os.path.getmtime(path)
+            except OSError:
+                pass
+        mimetype = "image/png" if data[:4] == b"\x89PNG" else "image/jpeg"
+        frame = ScreenshotFrame(data, mimetype, modified)
+        frame.thumbnail = self._pool.submit(generate_thumbnail, data)
+        with self._lock:
+            self._frames[origin] = frame
+        return frame
+
+    def get_frame(self, origin: str, path: Optional[str] = None) -> Optional[ScreenshotFrame]:
+        """
+        :param path: screenshot file of the device, read if it changed after the latest frame
+        :return: the latest frame of the device or None if there is none
+        """
+        with self._lock:
+            frame = self._frames.get(origin)
+        if path is None:
+            return frame
+        try:
+            modified = os.path.getmtime(path)
+        except OSError:
+            return frame
+        if frame is not None and modified <= frame.modified:
+            return frame
+        try:
+            with open(path, "rb") as screenshot:
+                data = screenshot.read()
+        except OSError:
+            return frame
+        return self.publish(origin, data, path)
+
+    def get_thumbnail(self, origin: str, path: Optional[str] = None) -> Optional[Tuple[ScreenshotFrame, bytes]]:
+        """
+        :return: the latest frame of the device and its thumbnail or None if there is no usable frame
+        """
+        frame = self.get_frame(origin, path)
+        if frame is None:
+            return None
+        try:
+            thumbnail, _ = frame.thumbnail.result(timeout=THUMBNAIL_TIMEOUT)
+        except TimeoutError:
+            logger.warning("The thumbnail of the screenshot of {} is not ready after {}s", origin, THUMBNAIL_TIMEOUT)
+            return None
+        except Exception as e:
+            logger.warning("Unable to generate the thumbnail of the screenshot of {}: {}", origin, e)
+            return None
+        return frame, thumbnail
+
+    def is_corrupted(self, origin: str) -> bool:
+        """
+        :return: True if the latest frame of the device could not be decoded, False if it could or is still being
+            decoded
+        """
+        with self._lock:
+            frame = self._frames.get(origin)
+        return frame is not None and frame.thumbnail.done() and frame.thumbnail.exception() is not None
+
+    def get_screen_size(self, origin: str, path: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        frame = self.get_frame(origin, path)
+        if frame is None:
+            return None
+        try:
+            _, size = frame.thumbnail.result(timeout=THUMBNAIL_TIMEOUT)
+        except Exception:
+            return None
+        return size
+
+    def prepare_thumbnails(self, paths: Dict[str, str]):
+        """
+        Picks up the changed screenshot files of the devices, their thumbnails are generated in parallel
+        :param paths: origin -> screenshot file
+        """
+        for origin, path in paths.items():
+            self.get_frame(origin, path)
+
+    def remove(self, origin: str):
+        with self._lock:
+            self._frames.pop(origin, None)
+
+
+_screenshot_service: Optional[ScreenshotService] = None
+_screenshot_service_lock = Lock()
+
+
+def get_screenshot_service() -> ScreenshotService:
+    global _screenshot_service
+    with _screenshot_service_lock:
+        if _screenshot_service is None:
+            _screenshot_service = ScreenshotService()
+        return _screenshot_service
@@ -37,6 +37,9 @@ def parse_args():
     parser.add_argument('-cf', '--config',
                         is_config_file=True, help='Set configuration file')
     parser.add_argument('-asi', '--apk_storage_interface', default='fs', help='APK Storage Interface')
+    parser.add_argument('-acs', '--apk_cache_size', default=512, type=int,
+                        help='MB of packages stored in the database kept in memory per process serving downloads. '
+                             '0 disables the cache (Default: 512)')
 
     # MySQL
     # TODO - Depercate this
@@ -54,6 +57,10 @@ def parse_args():
                         help='Name of MySQL Database')
     parser.add_argument('-dbps', '--db_poolsize', type=int, default=2,
                         help='Size of MySQL pool (open connections to DB). Default: 2')
+    parser.add_argument('-dbsc', '--db_statement_cache_size', type=int, default=0,
+                        help='Amount of prepared statements kept per connection of the MySQL pool for repeated '
+                             'writes. Connections are not reset when returned to the pool while prepared statements '
+                             'are enabled. Default: 0 (disabled)')
 
     # Websocket Settings (RGC receiver)
     parser.add_argument('-wsip', '--ws_ip', required=False, default="0.0.0.0", type=str,
@@ -70,6 +77,15 @@ def parse_args():
                         help='Port to listen on for proto data (MITM data). Default: 8000')
     parser.add_argument('-mrdw', '--mitmreceiver_data_workers', type=int, default=2,
                         help='Amount of workers to work off the data that queues up. Default: 2')
+    parser.add_argument('-mqs', '--mitm_queue_size', type=int, default=500,
+                        help='Maximum amount of MITM data items queued per data worker. The data of a device is always '
+                             'queued to the same worker. Default: 500')
+    parser.add_argument('-mqt', '--mitm_queue_timeout', type=float, default=5,
+                        help='Seconds to wait for space in the queue of a data worker before dropping the data '
+                             'received. Default: 5')
+    parser.add_argument('-mrp', '--mitmreceiver_processes', type=int, default=1,
+                        help='Amount of processes receiving the proto data on the same port. More than one requires '
+                             'SO_REUSEPORT (Linux, BSD). Default: 1')
     parser.add_argument('-miptt', '--mitm_ignore_proc_time_thresh', type=int, default=0,
                         help='Ignore MITM data having a timestamp too far in the past.'
                              'Specify in seconds. Default: 0 (off)')
@@ -77,6 +93,15 @@ def parse_args():
                         help='Ignore MITM data having a timestamp pre MAD\'s startup time')
     parser.add_argument('-mspass', '--mitm_status_password', default='',
                         help='Header Authorization password for MITM /status/ page')
+    parser.add_argument('-mbs', '--mitm_batch_size', type=int, default=1,
+                        help='Maximum amount of queued MITM data items a data worker combines to write them to the '
+                             'DB in one transaction. Default: 1 (batching disabled)')
+    parser.add_argument('-mbl', '--mitm_batch_latency', type=int, default=250,
+                        help='Maximum time in milliseconds a data worker waits for further items to fill a batch. '
+                             'Default: 250')
+    parser.add_argument('-mms', '--mitm_mapper_shards', type=int, default=1,
+                        help='Amount of processes the state of the devices (latest data received) is spread across. '
+                             'Default: 1')
 
     # Walk Settings
     parser.add_argument('--enable_worker_specific_extra_start_stop_handling', default=False,
@@ -109,6 +134,13 @@ def parse_args():
                         help='Only calculate routes, then exit the program. No scanning.')
     parser.add_argument('-cm', '--config_mode', action='store_true', default=False,
                         help='Run in ConfigMode')
+    parser.add_argument('-fst', '--fast_startup', action='store_true', default=False,
+                        help='Initialize the routes of the areas in the background. Devices start working on the '
+                             'areas ready while the others are still being initialized. Ignored with '
+                             '--only_routes. Default: False')
+    parser.add_argument('-rip', '--route_init_processes', type=int, default=4,
+                        help='Amount of areas initialized in parallel during a fast startup, the routes are '
+                             'calculated in as many processes. Default: 4')
     parser.add_argument('-nm', '--scan_nearby_mons', action='store_true', default=False,
                         help='Enable scanning of nearby mons')
     parser.add_argument('-dnc', '--disable_nearby_cell', action='store_true', default=False,
@@ -119,6 +151,16 @@ def parse_args():
                         help='The default despawn time left in minutes for Nearby Mons. Default: 15')
     parser.add_argument('-dut', '--default_unknown_timeleft', type=int, default=3,
                         help='The default despawn time left in minutes for Mons at unknown Spawnpoints. Default: 3')
+    parser.add_argument('-spcs', '--spawnpoint_cache_size', type=int, default=100000,
+                        help='Amount of spawnpoints each MITM data worker keeps the despawn time of in memory. '
+                             'Default: 100000 (0 disables the cache)')
+    parser.add_argument('-sii', '--stop_index_interval', type=int, default=30,
+                        help='Seconds between updates of the in-memory index of the stops used to look up the '
+                             'nearest stops (e.g. in leveling mode) with the stops changed in the DB. '
+                             'Default: 30 (0 disables the index)')
+    parser.add_argument('-sti', '--spawn_timetable_interval', type=int, default=60,
+                        help='Seconds between updates of the in-memory spawn timetables of the mon areas with the '
+                             'spawnpoints changed in the DB. Default: 60 (0 disables the timetables)')
     parser.add_argument("-sn", "--status-name", default="mad",
                         help=("Enable status page database update using"
                               " STATUS_NAME as main worker name."))
@@ -189,6 +231,9 @@ def parse_args():
                         help='Store collected objects (garbage collector) (Default: False)')
     parser.add_argument('-stiv', '--statistic_interval', default=60, type=int,
                         help='Store new local stats every N seconds (Default: 60)')
+    parser.add_argument('-met', '--metrics', action='store_true', default=False,
+                        help='Collect timings and queue depths of all processes of MAD and expose them in the '
+                             'Prometheus text format at /metrics of MADmin (Default: False)')
 
     # Game Stats
     parser.add_argument('-ggs', '--game_stats', action='store_true', default=False,
@@ -197,6 +242,9 @@ def parse_args():
                         help='Generate worker raw stats (only with --game_stats)')
     parser.add_argument('-gsst', '--game_stats_save_time', default=300, type=int,
                         help='Number of seconds until worker information is saved to database')
+    parser.add_argument('-gsri', '--game_stats_rollup_interval', default=300, type=int,
+                        help='Number of seconds between folding the worker stats into the hourly and daily rollups '
+                             'read by MADmin. 0 disables the rollup job (Default: 300)')
     parser.add_argument('-rds', '--raw_delete_shiny', default=0,
                         help='Delete shiny mon in raw stats older then x days (0 =  Disable (Default))')
 
@@ -226,6 +274,24 @@ def parse_args():
                         help='Debug: Set initial timestamp to fetch changed elements from the DB to send via WH.')
     parser.add_argument('-whmps', '--webhook_max_payload_size', default=0, type=int,
                         help='Split up the payload into chunks and send multiple requests. Default: 0 (unlimited)')
+    parser.add_argument('-whrt', '--webhook_retries', default=2, type=int,
+                        help='Amount of retries of a payload a webhook could not receive. Default: 2')
+    parser.add_argument('-whrb', '--webhook_retry_backoff', default=1.0, type=float,
+                        help='Seconds to wait before retrying to send a payload, doubled with every further retry. '
+                             'Default: 1.0')
+    parser.add_argument('-whmb', '--webhook_max_backlog', default=50, type=int,
+                        help='Maximum amount of payloads waiting to be sent per webhook. Default: 50')
+    parser.add_argument('-whbp', '--webhook_backlog_policy', choices=['drop', 'queue'], default='drop',
+                        help='What to do with new payloads once the backlog of a webhook is full: drop the oldest '
+                             'payload or queue the new one as soon as there is room again (delaying every webhook). '
+                             'Default: drop')
+    parser.add_argument('-whpl', '--webhook_polling', action='store_true', default=False,
+                        help='Query the data changed since the last run of the webhook worker by timestamp instead of '
+                             'reading the changes written by the MITM data processors. Use it if other processes '
+                             'write to the database MAD sends webhooks for. Default: False')
+    parser.add_argument('-whcfs', '--webhook_change_feed_size', default=10000, type=int,
+                        help='Maximum amount of written batches waiting to be sent as webhooks. If exceeded, the '
+                             'webhook worker queries by timestamp once. Default: 10000')
 
     # Dynamic Rarity
     parser.add_argument('-rh', '--rarity_hours', type=int, default=72,
@@ -266,6 +332,9 @@ def parse_args():
                               " keep them forever (Default: 10)"))
     parser.add_argument('--no_log_colors', action="store_true", default=False,
                         help=("Disable colored logs."))
+    parser.add_argument('--log_json_file', default=None,
+                        help=("Write the log records as JSON lines to this file as well (at the file logging level)."
+                              " The file is written by a separate process. Default: None (disabled)"))
     parser.set_defaults(DEBUG=False)
 
     # MADAPKs
@@ -0,0 +1,54 @@
+from multiprocessing import Event, Queue
+from queue import Empty, Full
+from typing import Dict, Iterable, Set, Tuple
+
+from mapadroid.utils.logging import LoggerEnums, get_logger
+
+logger = get_logger(LoggerEnums.webhook)
+
+CHANGE_KINDS = ("pokemon", "raid", "gym", "pokestop", "quest", "weather")
+# seconds to wait for changes still on their way through the pipe of the queue
+COLLECT_TIMEOUT = 0.05
+
+
+class WebhookChangeFeed:
+    """
+    Carries the primary keys of the rows written by the MITM data processors to the webhook worker.
+    The queue is bounded, publishers never block. If a change had to be dropped, the next collect reports the
+    feed as incomplete and the webhook worker falls back to querying by timestamp once.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self._queue: Queue = Queue(maxsize=max(1, maxsize))
+        self._overflowed = Event()
+
+    def publish(self, changes: Dict[str, Iterable]) -> bool:
+        changes = {kind: list(keys) for kind, keys in changes.items() if keys}
+        if not changes:
+            return True
+        try:
+            self._queue.put_nowait(changes)
+        except Full:
+            if not self._overflowed.is_set():
+                logger.warning("Webhook change feed is full, the webhook worker will query the changes by time")
+            self._overflowed.set()
+            return False
+        return True
+
+    def collect(self) -> Tuple[Dict[str, Set], bool]:
+        """
+        Drain all changes published so far
+        :return: the keys of changed rows per kind and whether no change has been dropped since the last collect
+        """
+        # reset the flag before draining, an overflow while draining is reported on the next collect
+        complete = not self._overflowed.is_set()
+        self._overflowed.clear()
+        collected: Dict[str, Set] = {kind: set() for kind in CHANGE_KINDS}
+        while True:
+            try:
+                changes = self._queue.get(timeout=COLLECT_TIMEOUT)
+            except Empty:
+                break
+            for kind, keys in changes.items():
+                collected.setdefault(kind, set()).update(keys)
+        return collected, complete
@@ -0,0 +1,158 @@
+import json
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import Deque, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from mapadroid.utils.logging import LoggerEnums, get_logger
+from mapadroid.utils.metrics import Counter, Histogram
+
+logger = get_logger(LoggerEnums.webhook)
+
+BACKLOG_POLICY_DROP = "drop"
+BACKLOG_POLICY_QUEUE = "queue"
+REQUEST_TIMEOUT = 5
+STATS_LOG_INTERVAL = 60
+
+WEBHOOK_SEND_SECONDS = Histogram("mad_webhook_send_seconds", "Time to send a payload to a webhook receiver, by host",
+                                 ["host"])
+WEBHOOK_FAILED_PAYLOADS = Counter("mad_webhook_failed_payloads_total",
+                                  "Payloads not delivered to a webhook receiver, by host", ["host"])
+
+
+class WebhookDestination:
+    """
+    Delivers payload chunks to one webhook receiver in a thread of its own, reusing the HTTP connection.
+    Chunks are queued up to max_backlog. Once the backlog is full, the oldest chunk is dropped (drop policy) or
+    enqueue blocks until there is room again (queue policy).
+    """
+
+    def __init__(self, url: str, types: Optional[List[str]], retries: int = 2, retry_backoff: float = 1.0,
+                 max_backlog: int = 50, backlog_policy: str = BACKLOG_POLICY_DROP):
+        self.url: str = url
+        self.types: Optional[List[str]] = types
+        self._retries: int = max(0, retries)
+        self._retry_backoff: float = retry_backoff
+        self._max_backlog: int = max(1, max_backlog)
+        self._backlog_policy: str = backlog_policy
+        self._backlog: Deque[list] = deque()
+        self._condition: Condition = Condition()
+        self._stopped: bool = False
+        self._session: requests.Session = requests.Session()
+        self._session.headers.update({"Content-Type": "application/json"})
+        self._thread: Optional[Thread] = None
+        self.sent: int = 0
+        self.failed: int = 0
+        self.dropped: int = 0
+        self.retried: int = 0
+        self._latency_sum: float = 0.0
+        self._latency_max: float = 0.0
+        self._last_stats_log: float = time.time()
+        # the path of webhook URLs often holds a token, the metrics are labeled by host only
+        self._host: str = urlparse(url).hostname or url
+
+    def start(self):
+        self._thread = Thread(name="webhook " + self.url, target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._session.close()
+
+    def enqueue(self, chunks: List[list]):
+        with self._condition:
+            for chunk in chunks:
+                if len(self._backlog) >= self._max_backlog:
+                    if self._backlog_policy == BACKLOG_POLICY_QUEUE:
+                        self._condition.wait_for(lambda: len(self._backlog) < self._max_backlog or self._stopped)
+                        if self._stopped:
+                            return
+                    else:
+                        self._backlog.popleft()
+                        self.dropped += 1
+                        logger.warning("Backlog of webhook {} is full, dropping the oldest payload", self.url)
+                self._backlog.append(chunk)
+                # wake the sender right away, a producer waiting for room would block it otherwise
+                self._condition.notify_all()
+
+    def get_backlog_size(self) -> int:
+        with self._condition:
+            return len(self._backlog)
+
+    def get_statistics(self) -> dict:
+        return {
+            "url": self.url,
+            "backlog": self.get_backlog_size(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retried": self.retried,
+            "latency_avg_ms": round(self._latency_sum / self.sent * 1000, 1) if self.sent else 0.0,
+            "latency_max_ms": round(self._latency_max * 1000, 1)
+        }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._backlog or self._stopped, timeout=STATS_LOG_INTERVAL)
+                if self._stopped:
+                    break
+                chunk = self._backlog.popleft() if self._backlog else None
+                # room for producers waiting with the queue policy
+                self._condition.notify_all()
+            if chunk is not None:
+                self._deliver(chunk)
+            self._log_statistics()
+
+    def _deliver(self, chunk: list) -> bool:
+        data = json.dumps(chunk)
+        for attempt in range(self._retries + 1):
+            if attempt > 0:
+                self.retried += 1
+                time.sleep(self._retry_backoff * 2 ** (attempt - 1))
+                if self._stopped:
+                    return False
+            start = time.time()
+            try:
+                response = self._session.post(self.url, data=data, timeout=REQUEST_TIMEOUT)
+            except Exception as e:
+                logger.warning("Exception occured while sending webhook to {}: {}", self.url, e)
+                continue
+            latency = time.time() - start
+            WEBHOOK_SEND_SECONDS.labels(self._host).observe(latency)
+            if response.status_code == 200:
+                self.sent += 1
+                self._latency_sum += latency
+                self._latency_max = max(self._latency_max, latency)
+                logger.success("Successfully sent payload to webhook {} in {}ms. Stats: {}", self.url,
+                               int(latency * 1000), json.dumps(payload_type_count(chunk)))
+                return True
+            logger.warning("Webhook destination {} returned status code other than 200 OK: {}",
+                           self.url, response.status_code)
+            if response.status_code < 500 and response.status_code != 429:
+                # the receiver does not accept the payload, trying again will not help
+                break
+        self.failed += 1
+        WEBHOOK_FAILED_PAYLOADS.labels(self._host).inc()
+        return False
+
+    def _log_statistics(self):
+        if time.time() - self._last_stats_log < STATS_LOG_INTERVAL:
+            return
+        self._last_stats_log = time.time()
+        logger.info("Webhook {}: {}", self.url, self.get_statistics())
+
+
+def payload_type_count(payload) -> dict:
+    count = {}
+    for elem in payload:
+        count[elem["type"]] = count.get(elem["type"], 0) + 1
+    return count
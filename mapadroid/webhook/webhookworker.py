@@ -1,8 +1,8 @@
 import json
 import time
-from typing import List
+from typing import Dict, List, Optional, Set
 
-import requests
+import numpy as np
 
 from mapadroid.db.DbWebhookReader import DbWebhookReader
 from mapadroid.geofence.geofenceHelper import GeofenceHelper
@@ -12,6 +12,8 @@ from mapadroid.utils.logging import LoggerEnums, get_logger
 from mapadroid.utils.madGlobals import terminate_mad
 from mapadroid.utils.questGen import QuestGen
 from mapadroid.utils.s2Helper import S2Helper
+from mapadroid.webhook.webhookchangefeed import WebhookChangeFeed
+from mapadroid.webhook.webhookdelivery import WebhookDestination
 
 logger = get_logger(LoggerEnums.webhook)
 
@@ -21,7 +23,8 @@ class WebhookWorker:
     __excluded_areas = {}
 
     def __init__(self, args, data_manager, mapping_manager: MappingManager, rarity,
-                 db_webhook_reader: DbWebhookReader, quest_gen: QuestGen):
+                 db_webhook_reader: DbWebhookReader, quest_gen: QuestGen,
+                 change_feed: Optional[WebhookChangeFeed] = None):
         self._quest_gen = quest_gen
         self.__worker_interval_sec = 10
         self.__args = args
@@ -30,7 +33,10 @@ class WebhookWorker:
         self._db_reader = db_webhook_reader
         self.__rarity = rarity
         self.__last_check = int(time.time())
-        self.__webhook_receivers = []
+        self.__change_feed: Optional[WebhookChangeFeed] = change_feed
+        # query by timestamp instead of reading the change feed in the next iteration
+        self.__poll_next = False
+        self.__webhook_receivers: List[WebhookDestination] = []
         self.__webhook_types = set()
         self.__pokemon_types = set()
         self.__valid_types = [
@@ -41,18 +47,14 @@ class WebhookWorker:
         ]
 
         self.__build_webhook_receivers()
+        for webhook in self.__webhook_receivers:
+            webhook.start()
         self.__build_excluded_areas(mapping_manager)
 
         if self.__args.webhook_start_time != 0:
             self.__last_check = int(self.__args.webhook_start_time)
-
-    def __payload_type_count(self, payload):
-        count = {}
-
-        for elem in payload:
-            count[elem["type"]] = count.get(elem["type"], 0) + 1
-
-        return count
+            # data older than the change feed has to be queried by time
+            self.__poll_next = True
 
     def __payload_chunk(self, payload, size):
         if size == 0:
@@ -60,22 +62,24 @@ class WebhookWorker:
 
         return [payload[x: x + size] for x in range(0, len(payload), size)]
 
-    def __is_in_excluded_area(self, coordinate):
+    def __get_excluded_mask(self, entries) -> List[bool]:
+        # check all entries against the excluded areas at once
+        if not self.__excluded_areas or not entries:
+            return [False] * len(entries)
+        coordinates = [(entry["latitude"], entry["longitude"]) for entry in entries]
+        excluded = np.zeros(len(coordinates), dtype=bool)
         for gfh in self.__excluded_areas:
-            if gfh.is_coord_inside_include_geofence(coordinate):
-                return True
-
-        return False
+            excluded |= gfh.get_geofenced_mask(coordinates)
+        return excluded.tolist()
 
     def __send_webhook(self, payloads):
         if len(payloads) == 0:
             logger.debug2("Payload empty. Skip sending to webhook.")
             return
 
-        current_wh_num = 1
         for webhook in self.__webhook_receivers:
             payload_to_send = []
-            sub_types = webhook.get('types')
+            sub_types = webhook.types
 
             if sub_types is not None:
                 for payload in payloads:
@@ -86,56 +90,26 @@ class WebhookWorker:
                 payload_to_send = payloads
 
             if len(payload_to_send) == 0:
-                logger.debug2("Payload empty. Skip sending to: {} (Filter: {})", webhook.get('url'), sub_types)
+                logger.debug2("Payload empty. Skip sending to: {} (Filter: {})", webhook.url, sub_types)
                 continue
             else:
-                logger.debug2("Sending to webhook: {} (Filter: {})", webhook.get('url'), sub_types)
+                logger.debug2("Queueing for webhook: {} (Filter: {}, Backlog: {})", webhook.url, sub_types,
+                              webhook.get_backlog_size())
 
             payload_list = self.__payload_chunk(
                 payload_to_send, self.__args.webhook_max_payload_size
             )
+            logger.debug4("Python data for payload: {}", payload_list)
+            webhook.enqueue(payload_list)
 
-            current_pl_num = 1
-            for payload_chunk in payload_list:
-                logger.debug4("Python data for payload: {}", payload_chunk)
-                logger.debug4("Payload: {}", json.dumps(payload_chunk))
-
-                try:
-                    response = requests.post(
-                        webhook.get('url'),
-                        data=json.dumps(payload_chunk),
-                        headers={"Content-Type": "application/json"},
-                        timeout=5,
-                    )
-
-                    if response.status_code != 200:
-                        logger.warning("Webhook destination {} returned status code other than 200 OK: {}",
-                                       webhook.get('url'), response.status_code)
-                    else:
-                        if len(self.__webhook_receivers) > 1:
-                            whcount_text = " [wh {}/{}]".format(current_wh_num, len(self.__webhook_receivers))
-                        else:
-                            whcount_text = ""
-
-                        if len(payload_list) > 1:
-                            whchunk_text = " [pl {}/{}]".format(current_pl_num, len(payload_list))
-                        else:
-                            whchunk_text = ""
-
-                        logger.success("Successfully sent payload to webhook{}{}. Stats: {}", whchunk_text,
-                                       whcount_text, json.dumps(self.__payload_type_count(payload_chunk)))
-                except Exception as e:
-                    logger.warning("Exception occured while sending webhook: {}", e)
-
-                current_pl_num += 1
-            current_wh_num += 1
+    def get_webhook_statistics(self) -> List[dict]:
+        return [webhook.get_statistics() for webhook in self.__webhook_receivers]
 
     def __prepare_quest_data(self, quest_data):
         ret = []
-        for stopid in quest_data:
-            stop = quest_data[str(stopid)]
-
-            if self.__is_in_excluded_area([stop["latitude"], stop["longitude"]]):
+        stops = [quest_data[str(stopid)] for stopid in quest_data]
+        for stopid, excluded in zip(quest_data, self.__get_excluded_mask(stops)):
+            if excluded:
                 continue
 
             try:
@@ -367,8 +341,8 @@ class WebhookWorker:
     def __prepare_raid_data(self, raid_data):
         ret = []
 
-        for raid in raid_data:
-            if self.__is_in_excluded_area([raid["latitude"], raid["longitude"]]):
+        for raid, excluded in zip(raid_data, self.__get_excluded_mask(raid_data)):
+            if excluded:
                 continue
 
             # skip ex raid mon if disabled
@@ -434,8 +408,8 @@ class WebhookWorker:
     def __prepare_mon_data(self, mon_data):
         ret = []
 
-        for mon in mon_data:
-            if self.__is_in_excluded_area([mon["latitude"], mon["longitude"]]):
+        for mon, excluded in zip(mon_data, self.__get_excluded_mask(mon_data)):
+            if excluded:
                 continue
 
             mon_payload = {
@@ -536,8 +510,8 @@ class WebhookWorker:
     def __prepare_gyms_data(self, gym_data):
         ret = []
 
-        for gym in gym_data:
-            if self.__is_in_excluded_area([gym["latitude"], gym["longitude"]]):
+        for gym, excluded in zip(gym_data, self.__get_excluded_mask(gym_data)):
+            if excluded:
                 continue
 
             gym_payload = {
@@ -568,8 +542,8 @@ class WebhookWorker:
     def __prepare_stops_data(self, pokestop_data):
         ret = []
 
-        for pokestop in pokestop_data:
-            if self.__is_in_excluded_area([pokestop["latitude"], pokestop["longitude"]]):
+        for pokestop, excluded in zip(pokestop_data, self.__get_excluded_mask(pokestop_data)):
+            if excluded:
                 continue
 
             pokestop_payload = {
@@ -631,10 +605,10 @@ class WebhookWorker:
                 self.__pokemon_types = set(self.__valid_mon_types)
                 sub_types = self.__valid_mon_types + self.__valid_types
 
-            self.__webhook_receivers.append({
-                "url": url.replace(" ", ""),
-                "types": sub_types
-            })
+            self.__webhook_receivers.append(WebhookDestination(
+                url.replace(" ", ""), sub_types, retries=self.__args.webhook_retries,
+                retry_backoff=self.__args.webhook_retry_backoff, max_backlog=self.__args.webhook_max_backlog,
+                backlog_policy=self.__args.webhook_backlog_policy))
 
     def __build_excluded_areas(self, mapping_manager: MappingManager):
         self.__excluded_areas: List[GeofenceHelper] = []
@@ -660,8 +634,24 @@ class WebhookWorker:
         if len(self.__excluded_areas) > 0:
             logger.info("Excluding {} areas from webhooks", len(self.__excluded_areas))
 
-    def __create_payload(self):
-        logger.debug("Fetching data changed since {}", self.__last_check)
+    def __collect_changes(self) -> Optional[Dict[str, Set]]:
+        """
+        Read the keys of the rows written since the last iteration from the change feed
+        :return: the keys per kind or None if the changes have to be queried by timestamp
+        """
+        if self.__change_feed is None:
+            return None
+        changes, complete = self.__change_feed.collect()
+        if self.__poll_next or not complete:
+            self.__poll_next = False
+            return None
+        return changes
+
+    def __create_payload(self, changes: Optional[Dict[str, Set]] = None):
+        if changes is None:
+            logger.debug("Fetching data changed since {}", self.__last_check)
+        else:
+            logger.debug("Fetching data of changes: {}", {kind: len(keys) for kind, keys in changes.items()})
 
         # the payload that is about to be sent
         full_payload = []
@@ -669,47 +659,51 @@ class WebhookWorker:
         try:
             # raids
             if 'raid' in self.__webhook_types:
-                raids = self.__prepare_raid_data(
-                    self._db_reader.get_raids_changed_since(self.__last_check)
-                )
-                full_payload += raids
+                if changes is None:
+                    raids = self._db_reader.get_raids_changed_since(self.__last_check)
+                else:
+                    raids = self._db_reader.get_raids_by_gym_ids(changes["raid"])
+                full_payload += self.__prepare_raid_data(raids)
 
             # quests
             if 'quest' in self.__webhook_types:
-                quest = self.__prepare_quest_data(
-                    self._db_reader.get_quests_changed_since(self.__last_check)
-                )
-                full_payload += quest
+                if changes is None:
+                    quests = self._db_reader.get_quests_changed_since(self.__last_check)
+                else:
+                    quests = self._db_reader.get_quests_by_pokestop_ids(changes["quest"])
+                full_payload += self.__prepare_quest_data(quests)
 
             # weather
             if 'weather' in self.__webhook_types:
-                weather = self.__prepare_weather_data(
-                    self._db_reader.get_weather_changed_since(self.__last_check)
-                )
-                full_payload += weather
+                if changes is None:
+                    weather = self._db_reader.get_weather_changed_since(self.__last_check)
+                else:
+                    weather = self._db_reader.get_weather_by_cell_ids(changes["weather"])
+                full_payload += self.__prepare_weather_data(weather)
 
             # gyms
             if 'gym' in self.__webhook_types:
-                gyms = self.__prepare_gyms_data(
-                    self._db_reader.get_gyms_changed_since(self.__last_check)
-                )
-                full_payload += gyms
+                if changes is None:
+                    gyms = self._db_reader.get_gyms_changed_since(self.__last_check)
+                else:
+                    gyms = self._db_reader.get_gyms_by_ids(changes["gym"])
+                full_payload += self.__prepare_gyms_data(gyms)
 
             # stops
             if 'pokestop' in self.__webhook_types:
-                pokestops = self.__prepare_stops_data(
-                    self._db_reader.get_stops_changed_since(self.__last_check)
-                )
-                full_payload += pokestops
+                if changes is None:
+                    pokestops = self._db_reader.get_stops_changed_since(self.__last_check)
+                else:
+                    pokestops = self._db_reader.get_stops_by_ids(changes["pokestop"])
+                full_payload += self.__prepare_stops_data(pokestops)
 
             # mon
             if len(self.__pokemon_types) > 0:
-                mon = self.__prepare_mon_data(
-                    self._db_reader.get_mon_changed_since(
-                        self.__last_check, self.__pokemon_types
-                    )
-                )
-                full_payload += mon
+                if changes is None:
+                    mon = self._db_reader.get_mon_changed_since(self.__last_check, self.__pokemon_types)
+                else:
+                    mon = self._db_reader.get_mon_by_encounter_ids(changes["pokemon"], self.__pokemon_types)
+                full_payload += self.__prepare_mon_data(mon)
         except Exception:
             logger.exception("Error while creating webhook payload")
 
@@ -724,7 +718,7 @@ class WebhookWorker:
             preparing_timestamp = int(time.time())
 
             # fetch data and create payload
-            full_payload = self.__create_payload()
+            full_payload = self.__create_payload(self.__collect_changes())
 
             # send our payload
             self.__send_webhook(full_payload)
@@ -732,4 +726,6 @@ class WebhookWorker:
             self.__last_check = preparing_timestamp
             time.sleep(self.__worker_interval_sec)
 
+        for webhook in self.__webhook_receivers:
+            webhook.stop()
         logger.info("Stopping webhook worker thread")
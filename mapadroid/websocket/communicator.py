@@ -8,6 +8,7 @@ from mapadroid.utils.logging import LoggerEnums, get_logger, get_origin_logger
 from mapadroid.utils.madGlobals import (
     ScreenshotType, WebsocketWorkerConnectionClosedException,
     WebsocketWorkerTimeoutException)
+from mapadroid.utils.screenshotservice import get_screenshot_service
 from mapadroid.websocket.AbstractCommunicator import AbstractCommunicator
 from mapadroid.websocket.WebsocketConnectedClientEntry import \
     WebsocketConnectedClientEntry
@@ -24,6 +25,7 @@ class Communicator(AbstractCommunicator):
         # Throws ValueError if unable to connect!
         # catch in code using this class
         self.logger = get_origin_logger(get_logger(LoggerEnums.websocket), origin=worker_id)
+        self.worker_id: str = worker_id
         self.worker_instance_ref: Optional[AbstractWorker] = worker_instance_ref
         self.websocket_client_entry = websocket_client_entry
         self.__command_timeout: float = command_timeout
@@ -146,6 +148,8 @@ class Communicator(AbstractCommunicator):
             self.logger.debug("Storing screenshot...")
             with open(path, "wb") as fh:
                 fh.write(encoded)
+            # MADmin serves the frame and its thumbnail from memory
+            get_screenshot_service().publish(self.worker_id, encoded, path)
             self.logger.debug2("Done storing, returning")
             return True
 
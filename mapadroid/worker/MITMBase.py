@@ -4,9 +4,9 @@ import time
 from abc import abstractmethod
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Tuple, Union
+from typing import List, Optional, Tuple, Union
 
-from mapadroid.mitm_receiver.MitmMapper import MitmMapper
+from mapadroid.mitm_receiver.MitmMapper import NO_UPDATE_SEEN, MitmMapper
 from mapadroid.ocr.pogoWindows import PogoWindows
 from mapadroid.utils import MappingManager
 from mapadroid.utils.geo import (get_distance_of_two_points_in_meters,
@@ -20,7 +20,8 @@ from mapadroid.worker.WorkerBase import FortSearchResultTypes, WorkerBase
 WALK_AFTER_TELEPORT_SPEED = 11
 FALLBACK_MITM_WAIT_TIMEOUT = 45
 TIMESTAMP_NEVER = 0
-WAIT_FOR_DATA_NEXT_ROUND_SLEEP = 1
+# Longest time to block in the MitmMapper at once while waiting for data. Arriving data ends the wait right away.
+WAIT_FOR_DATA_MAX_BLOCK = 5
 # Distance in meters that are to be allowed to consider a GMO as within a valid range
 # Some modes calculate with extremely strict distances (0.0001m for example), thus not allowing
 # direct use of routemanager radius as a distance (which would allow long distances for raid scans as well)
@@ -133,19 +134,28 @@ class MITMBase(WorkerBase):
                           "Last received timestamp of that type was: {}",
                           proto_to_wait_for, datetime.fromtimestamp(timestamp), timeout,
                           datetime.fromtimestamp(timestamp) if last_time_received != TIMESTAMP_NEVER else "never")
+        earliest_acceptable_timestamp = self._get_earliest_acceptable_timestamp(proto_to_wait_for, timestamp)
+        also_accepted = [proto.value for proto in self._get_protos_ending_wait(proto_to_wait_for)]
+        seen_update = NO_UPDATE_SEEN
         while type_of_data_returned == LatestReceivedType.UNDEFINED and \
                 (int(timestamp + timeout) >= int(time.time()) or last_time_received >= timestamp) \
                 and not self._stop_worker_event.is_set():
-            latest = self._mitm_mapper.request_latest(self._origin)
+            # blocks until a matching proto arrives, data received earlier is returned right away on the first call
+            wait_time = min(WAIT_FOR_DATA_MAX_BLOCK, timestamp + timeout - time.time())
+            latest, seen_update = self._mitm_mapper.wait_for_proto(self._origin, proto_to_wait_for.value,
+                                                                   earliest_acceptable_timestamp, wait_time,
+                                                                   also_accepted=also_accepted,
+                                                                   seen_update=seen_update)
+            # In case last_time_received was set, we reset it after the first
+            # iteration to not run into trouble (endless loop)
+            last_time_received = TIMESTAMP_NEVER
 
             if latest is None:
                 self.logger.info("Nothing received from worker since MAD started")
-                time.sleep(WAIT_FOR_DATA_NEXT_ROUND_SLEEP)
                 continue
             latest_proto_entry = latest.get(proto_to_wait_for.value, None)
-            if not latest_proto_entry:
+            if not latest_proto_entry and not also_accepted:
                 self.logger.info("No data linked to the requested proto since MAD started.")
-                time.sleep(WAIT_FOR_DATA_NEXT_ROUND_SLEEP)
                 continue
             # Not checking the timestamp against the proto awaited in here since custom handling may be adequate.
             # E.g. Questscan may yield errors like clicking mons instead of stops - which we need to detect as well
@@ -166,12 +176,6 @@ class MITMBase(WorkerBase):
                     latest, proto_to_wait_for, timestamp)
 
             self.raise_stop_worker_if_applicable()
-            if type_of_data_returned == LatestReceivedType.UNDEFINED:
-                # We don't want to sleep if we have received something that may be useful to us...
-                time.sleep(WAIT_FOR_DATA_NEXT_ROUND_SLEEP)
-            # In case last_time_received was set, we reset it after the first
-            # iteration to not run into trouble (endless loop)
-            last_time_received = TIMESTAMP_NEVER
 
         if type_of_data_returned != LatestReceivedType.UNDEFINED:
             self._reset_restart_count_and_collect_stats(position_type)
@@ -181,6 +185,19 @@ class MITMBase(WorkerBase):
         self.worker_stats()
         return type_of_data_returned, data
 
+    def _get_earliest_acceptable_timestamp(self, proto_to_wait_for: ProtoIdentifier, timestamp: float) -> float:
+        """
+        Protos received before the returned timestamp do not end the wait for data
+        """
+        return timestamp
+
+    def _get_protos_ending_wait(self, proto_to_wait_for: ProtoIdentifier) -> List[ProtoIdentifier]:
+        """
+        Protos other than the one waited for that are to be inspected by _check_for_data_content as soon as they
+        arrive
+        """
+        return []
+
     def _handle_proto_timeout(self, position_type, proto_to_wait_for: ProtoIdentifier, type_of_data_returned):
         self.logger.info("Timeout waiting for useful data. Type requested was {}, received {}",
                          proto_to_wait_for, type_of_data_returned)
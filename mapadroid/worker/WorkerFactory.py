@@ -119,6 +119,9 @@ class WorkerFactory:
             # logging is done in __get_walker_settings...
             return None
 
+        if self.__mapping_manager.routemanager_initializing(walker_configuration.walker_area_name):
+            origin_logger.info("The area of the walker is still being initialized, retrying later")
+            return None
         if walker_configuration.walker_area_name not in self.__mapping_manager.get_all_routemanager_names():
             raise WrongAreaInWalker()
 
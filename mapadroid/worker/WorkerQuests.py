@@ -773,6 +773,30 @@ class WorkerQuests(MITMBase):
 
         self.set_devicesettings_value('last_action_time', time.time())
 
+    def _get_earliest_acceptable_timestamp(self, proto_to_wait_for: ProtoIdentifier, timestamp: float) -> float:
+        # when waiting for stop or spin data, it is enough to make sure
+        # our data is newer than the latest of last quest received, last
+        # successful bag clear or last successful quest clear. This eliminates
+        # the need to add arbitrary timedeltas for possible small delays,
+        # which we don't do in other workers either
+        if proto_to_wait_for not in [ProtoIdentifier.FORT_SEARCH, ProtoIdentifier.FORT_DETAILS]:
+            return timestamp
+        potential_replacements = [
+            self._latest_quest,
+            self.get_devicesettings_value('last_cleanup_time', 0),
+            self.get_devicesettings_value('last_questclear_time', 0)
+        ]
+        replacement = max(x for x in potential_replacements if isinstance(x, int) or isinstance(x, float))
+        self.logger.debug("timestamp {} being replaced with {} because we're waiting for proto {}",
+                          datetime.fromtimestamp(timestamp).strftime('%H:%M:%S'),
+                          datetime.fromtimestamp(replacement).strftime('%H:%M:%S'),
+                          proto_to_wait_for)
+        return replacement
+
+    def _get_protos_ending_wait(self, proto_to_wait_for: ProtoIdentifier) -> List[ProtoIdentifier]:
+        # clicking a gym or mon instead of a stop is detected by _check_for_data_content
+        return [ProtoIdentifier.GYM_INFO, ProtoIdentifier.ENCOUNTER]
+
     def _check_for_data_content(self, latest, proto_to_wait_for: ProtoIdentifier, timestamp: float) \
             -> Tuple[LatestReceivedType, Optional[Union[dict, FortSearchResultTypes]]]:
         type_of_data_found: LatestReceivedType = LatestReceivedType.UNDEFINED
@@ -790,23 +814,7 @@ class WorkerQuests(MITMBase):
             self.logger.debug("No data linked to the requested proto since MAD started.")
             return type_of_data_found, data_found
 
-        # when waiting for stop or spin data, it is enough to make sure
-        # our data is newer than the latest of last quest received, last
-        # successful bag clear or last successful quest clear. This eliminates
-        # the need to add arbitrary timedeltas for possible small delays,
-        # which we don't do in other workers either
-        if proto_to_wait_for in [ProtoIdentifier.FORT_SEARCH, ProtoIdentifier.FORT_DETAILS]:
-            potential_replacements = [
-                self._latest_quest,
-                self.get_devicesettings_value('last_cleanup_time', 0),
-                self.get_devicesettings_value('last_questclear_time', 0)
-            ]
-            replacement = max(x for x in potential_replacements if isinstance(x, int) or isinstance(x, float))
-            self.logger.debug("timestamp {} being replaced with {} because we're waiting for proto {}",
-                              datetime.fromtimestamp(timestamp).strftime('%H:%M:%S'),
-                              datetime.fromtimestamp(replacement).strftime('%H:%M:%S'),
-                              proto_to_wait_for)
-            timestamp = replacement
+        timestamp = self._get_earliest_acceptable_timestamp(proto_to_wait_for, timestamp)
         # proto has previously been received, let's check the timestamp...
         latest_proto_entry = latest.get(proto_to_wait_for.value, None)
         if not latest_proto_entry:
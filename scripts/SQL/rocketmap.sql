@@ -619,6 +619,26 @@ CREATE TABLE `trs_stats_detect` (
     KEY `worker` (`worker`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+CREATE TABLE `trs_stats_detect_daily` (
+    `period` int(11) NOT NULL,
+    `worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `mon` int(11) NOT NULL DEFAULT 0,
+    `mon_iv` int(11) NOT NULL DEFAULT 0,
+    `raid` int(11) NOT NULL DEFAULT 0,
+    `quest` int(11) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`period`,`worker`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `trs_stats_detect_hourly` (
+    `period` int(11) NOT NULL,
+    `worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `mon` int(11) NOT NULL DEFAULT 0,
+    `mon_iv` int(11) NOT NULL DEFAULT 0,
+    `raid` int(11) NOT NULL DEFAULT 0,
+    `quest` int(11) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`period`,`worker`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 CREATE TABLE `trs_stats_detect_raw` (
     `id` int(11) NOT NULL AUTO_INCREMENT,
     `worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
@@ -655,6 +675,24 @@ CREATE TABLE `trs_stats_location` (
     KEY `worker` (`worker`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+CREATE TABLE `trs_stats_location_daily` (
+    `period` int(11) NOT NULL,
+    `worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `location_count` int(11) NOT NULL DEFAULT 0,
+    `location_ok` int(11) NOT NULL DEFAULT 0,
+    `location_nok` int(11) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`period`,`worker`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `trs_stats_location_hourly` (
+    `period` int(11) NOT NULL,
+    `worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `location_count` int(11) NOT NULL DEFAULT 0,
+    `location_ok` int(11) NOT NULL DEFAULT 0,
+    `location_nok` int(11) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`period`,`worker`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 CREATE TABLE `trs_stats_location_raw` (
     `id` int(11) NOT NULL AUTO_INCREMENT,
     `worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
@@ -673,6 +711,36 @@ CREATE TABLE `trs_stats_location_raw` (
     KEY `latlng` (`lat`,`lng`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+CREATE TABLE `trs_stats_location_raw_daily` (
+    `period` int(11) NOT NULL,
+    `worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `walker` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `type` tinyint(1) NOT NULL,
+    `success` tinyint(1) NOT NULL,
+    `transporttype` tinyint(1) NOT NULL,
+    `locations` int(11) NOT NULL DEFAULT 0,
+    `data_time` bigint(20) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`period`,`worker`,`walker`,`type`,`success`,`transporttype`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `trs_stats_location_raw_hourly` (
+    `period` int(11) NOT NULL,
+    `worker` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `walker` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `type` tinyint(1) NOT NULL,
+    `success` tinyint(1) NOT NULL,
+    `transporttype` tinyint(1) NOT NULL,
+    `locations` int(11) NOT NULL DEFAULT 0,
+    `data_time` bigint(20) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`period`,`worker`,`walker`,`type`,`success`,`transporttype`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `trs_stats_rollup` (
+    `rollup` varchar(50) COLLATE utf8mb4_unicode_ci NOT NULL,
+    `folded_until` int(11) NOT NULL,
+    PRIMARY KEY (`rollup`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 CREATE TABLE `trs_status` (
     `instance_id` int(10) unsigned NOT NULL,
     `device_id` int(10) unsigned NOT NULL,
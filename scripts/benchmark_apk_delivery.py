@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Measures how long many parallel downloads of a package stored in the database take.
+
+The database is simulated: every query takes --query-latency ms plus the time to transfer its rows and at most
+--pool-size queries run at once, like the connections of the PooledQueryExecutor. Compared are the former
+delivery (one query per chunk), streaming the chunks through one query per download and the package cache.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_apk_delivery.py --downloads 50,200 --size 100
+"""
+import argparse
+import os
+import sys
+import time
+from threading import Semaphore, Thread
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mapadroid.mad_apk.apk_enums import APKArch, APKType  # noqa: E402
+from mapadroid.mad_apk.delivery import PackageCache  # noqa: E402
+from mapadroid.mad_apk.utils import generator_from_db  # noqa: E402
+from mapadroid.utils.global_variables import CHUNK_MAX_SIZE  # noqa: E402
+
+
+class SimulatedDb:
+    def __init__(self, size_mb: int, pool_size: int, query_latency: float, bandwidth_mb: float):
+        chunk = b"\0" * CHUNK_MAX_SIZE
+        self.chunks = [chunk] * max(1, size_mb * 1024 * 1024 // CHUNK_MAX_SIZE)
+        self.queries = 0
+        self._pool = Semaphore(pool_size)
+        self._query_latency = query_latency
+        self._transfer_time = CHUNK_MAX_SIZE / (bandwidth_mb * 1024 * 1024)
+
+    def _query(self, chunks: int = 0):
+        self.queries += 1
+        time.sleep(self._query_latency + chunks * self._transfer_time)
+
+    def autofetch_value(self, sql, args=()):
+        with self._pool:
+            self._query(1 if "`data`" in sql else 0)
+        return self.chunks[args] if "`data`" in sql else 1
+
+    def autofetch_column(self, sql, args=None):
+        with self._pool:
+            self._query()
+        return list(range(len(self.chunks)))
+
+    def execute(self, sql, args=None):
+        with self._pool:
+            self._query()
+        return [(chunk_id, len(chunk)) for chunk_id, chunk in enumerate(self.chunks)]
+
+    def execute_stream(self, sql, args=None, chunk_size=1000):
+        # the connection is held until the stream is exhausted
+        with self._pool:
+            self._query()
+            for chunk in self.chunks[args[1]:]:
+                time.sleep(self._transfer_time)
+                yield [(chunk,)]
+
+
+def legacy_generator_from_db(dbc):
+    """ Delivery before streaming, one query per chunk """
+    filestore_id = dbc.autofetch_value("SELECT `filestore_id` FROM `mad_apks`")
+    for chunk_id in dbc.autofetch_column("SELECT `chunk_id` FROM `filestore_chunks`", args=(filestore_id,)):
+        yield dbc.autofetch_value("SELECT `data` FROM `filestore_chunks`", args=chunk_id)
+
+
+def run(mode: str, downloads: int, benchmark_args) -> dict:
+    dbc = SimulatedDb(benchmark_args.size, benchmark_args.pool_size, benchmark_args.query_latency / 1000,
+                      benchmark_args.bandwidth)
+    package_cache = PackageCache(benchmark_args.size * 2 * 1024 * 1024)
+    size = len(dbc.chunks) * CHUNK_MAX_SIZE
+    durations = []
+
+    def download():
+        start = time.time()
+        if mode == "legacy":
+            chunks = legacy_generator_from_db(dbc)
+        elif mode == "stream":
+            chunks = generator_from_db(dbc, APKType.pogo, APKArch.arm64_v8a)
+        else:
+            chunks = package_cache.get((APKType.pogo.value, APKArch.arm64_v8a.value, "1.0", size),
+                                       lambda: generator_from_db(dbc, APKType.pogo, APKArch.arm64_v8a)).iter_chunks()
+        received = sum(len(chunk) for chunk in chunks)
+        assert received == size
+        durations.append(time.time() - start)
+
+    threads = [Thread(target=download) for _ in range(downloads)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    durations.sort()
+    return {
+        "total": time.time() - start,
+        "median": durations[len(durations) // 2],
+        "max": durations[-1],
+        "queries": dbc.queries
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel APK downloads from the database storage")
+    parser.add_argument("--downloads", default="10,50,200", help="Comma separated amounts of parallel downloads")
+    parser.add_argument("--size", type=int, default=100, help="Size of the package in MB")
+    parser.add_argument("--pool-size", type=int, default=10, help="Amount of database connections")
+    parser.add_argument("--query-latency", type=float, default=2, help="Latency of a query in ms")
+    parser.add_argument("--bandwidth", type=float, default=500, help="MB/s transferred per database connection")
+    parser.add_argument("--modes", default="legacy,stream,cache", help="Comma separated delivery modes")
+    benchmark_args = parser.parse_args()
+
+    from loguru import logger
+    logger.remove()
+
+    print("{:>9} | {:>6} | {:>8} | {:>9} | {:>8} | {:>7}".format("downloads", "mode", "total s", "median s",
+                                                                  "max s", "queries"))
+    for downloads in [int(amount) for amount in benchmark_args.downloads.split(",")]:
+        for mode in benchmark_args.modes.split(","):
+            result = run(mode, downloads, benchmark_args)
+            print("{:>9} | {:>6} | {:>8.2f} | {:>9.2f} | {:>8.2f} | {:>7}".format(
+                downloads, mode, result["total"], result["median"], result["max"], result["queries"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Measures the wall time of clustering priority queues of different sizes.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_clustering.py --sizes 1000,5000,50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mapadroid.route.routecalc.ClusteringHelper import ClusteringHelper  # noqa: E402
+from mapadroid.utils.collections import Location  # noqa: E402
+
+
+def random_queue(amount: int, seed: int):
+    # spawns of a large city within the next 30 minutes
+    rng = random.Random(seed)
+    return [(1600000000 + rng.randint(0, 1800), Location(50.85 + rng.random() * 0.2, 6.85 + rng.random() * 0.3))
+            for _ in range(amount)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the clustering of priority queues")
+    parser.add_argument("--sizes", default="1000,5000,50000", help="Comma separated amounts of events")
+    parser.add_argument("--radius", type=int, default=70)
+    parser.add_argument("--max-count", type=int, default=5)
+    parser.add_argument("--max-timedelta", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print("{:>8} | {:>10} | {:>10}".format("events", "clustered", "seconds"))
+    for size in [int(size) for size in args.sizes.split(",")]:
+        queue = random_queue(size, args.seed)
+        helper = ClusteringHelper(args.radius, args.max_count, args.max_timedelta)
+        start = time.perf_counter()
+        clustered = helper.get_clustered(queue)
+        print("{:>8} | {:>10} | {:>10.2f}".format(size, len(clustered), time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Measures the logging cost per proto at info level: the logging calls of the handling of a GMO (origin loggers
+fetched by the receiver, the data processor and the DB submits, debug messages including the whole GMO) where
+all messages are below the level logged.
+
+Compared are the former origin loggers (created on every call) and debug methods (loguru collects the details of
+the call before checking the level) to the current ones. Additionally the cost of an info message written to a
+file by loguru and by the JSON lines sink is reported.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_logging.py --protos 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from loguru import logger  # noqa: E402
+
+from mapadroid.utils.logging import (JsonLinesLogWriter,  # noqa: E402
+                                     LoggerEnums, get_logger,
+                                     get_origin_logger)
+
+# get_origin_logger calls and debug messages of the handling of a GMO
+ORIGIN_LOGGERS_PER_PROTO = 12
+DEBUG_MESSAGES_PER_PROTO = 30
+
+
+def former_get_origin_logger(existing_logger, origin):
+    return get_logger(LoggerEnums.system, identifier=origin)
+
+
+def log_proto(get_origin, debug, proto: dict):
+    for _ in range(ORIGIN_LOGGERS_PER_PROTO):
+        origin_logger = get_origin(logger, "device1")
+    debug(origin_logger, "DEBUG4", "Received data: {}", proto)
+    for index in range(DEBUG_MESSAGES_PER_PROTO - 1):
+        debug(origin_logger, "DEBUG3", "Processing {} of {}", index, "GMO")
+
+
+def former_debug(origin_logger, level: str, message: str, *args):
+    origin_logger.opt(depth=1).log(level, message, *args)
+
+
+def current_debug(origin_logger, level: str, message: str, *args):
+    getattr(origin_logger, level.lower())(message, *args)
+
+
+def measure(protos: int, function, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(protos):
+        function(*args)
+    return (time.perf_counter() - start) / protos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the logging cost per proto")
+    parser.add_argument("--protos", type=int, default=2000, help="Amount of protos to log")
+    parser.add_argument("--messages", type=int, default=20000, help="Amount of info messages written to files")
+    benchmark_args = parser.parse_args()
+
+    proto = {"cells": [{"id": cell, "wild_pokemon": [{"encounter_id": mon} for mon in range(5)]}
+                       for cell in range(20)]}
+    logger.remove()
+    logger.level("DEBUG2", no=9)
+    logger.level("DEBUG3", no=8)
+    logger.level("DEBUG4", no=7)
+    logger.level("DEBUG5", no=6)
+    logger.add(lambda message: None, level="INFO")
+
+    former = measure(benchmark_args.protos, log_proto, former_get_origin_logger, former_debug, proto)
+    current = measure(benchmark_args.protos, log_proto, get_origin_logger, current_debug, proto)
+    print("logging per proto at info level: former {:.1f} us, current {:.1f} us".format(former * 1e6,
+                                                                                        current * 1e6))
+
+    logger.remove()
+    with tempfile.TemporaryDirectory() as directory:
+        origin_logger = get_origin_logger(logger, "device1")
+        handler_id = logger.add(os.path.join(directory, "mad.log"), level="INFO", enqueue=True)
+        file_sink = measure(benchmark_args.messages, origin_logger.info, "Processed {} protos", 3)
+        logger.remove(handler_id)
+        writer = JsonLinesLogWriter(os.path.join(directory, "mad.jsonl"))
+        writer.start()
+        handler_id = logger.add(writer.write, level="INFO", format="{message}")
+        json_sink = measure(benchmark_args.messages, origin_logger.info, "Processed {} protos", 3)
+        logger.remove(handler_id)
+        writer.stop()
+    print("info message: file sink {:.1f} us, JSON lines sink {:.1f} us".format(file_sink * 1e6, json_sink * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Measures the throughput of MitmMapper.update_latest/request_latest with many simulated devices.
+
+Every simulated origin is a thread storing a GMO sized proto and reading the latest data of its origin in a loop,
+the threads are spread across several client processes like the MITM receiver, data processors and workers are.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_mitm_mapper.py --origins 50,200,500 --shards 1,4
+"""
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Process, Queue
+from threading import Thread
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+PAYLOAD = {"payload": {"cells": [{"id": cell, "forts": [{"id": str(fort)} for fort in range(10)]}
+                                 for cell in range(20)]}}
+
+
+class StaticMappingManager:
+    def __init__(self, origins):
+        self._origins = {origin: {} for origin in origins}
+
+    def get_all_devicemappings(self):
+        return self._origins
+
+
+def simulate_origins(mitm_mapper, origins, duration, results: Queue):
+    operations = [0] * len(origins)
+
+    def simulate(index, origin):
+        end = time.time() + duration
+        while time.time() < end:
+            mitm_mapper.update_latest(origin, 106, PAYLOAD, timestamp_received_raw=time.time())
+            mitm_mapper.request_latest(origin)
+            operations[index] += 2
+
+    threads = [Thread(target=simulate, args=(index, origin)) for index, origin in enumerate(origins)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(sum(operations))
+
+
+def run(args, origin_count, shard_count, duration, client_processes):
+    from mapadroid.mitm_receiver.MitmMapper import MitmMapper, MitmMapperManager
+    origins = ["origin{}".format(index) for index in range(origin_count)]
+    mapping_manager = StaticMappingManager(origins)
+    MitmMapperManager.register('MitmMapper', MitmMapper)
+    managers = []
+    shards = []
+    for shard_index in range(shard_count):
+        manager = MitmMapperManager()
+        manager.start()
+        managers.append(manager)
+        if shard_count == 1:
+            shards.append(manager.MitmMapper(args, mapping_manager, None))
+        else:
+            shards.append(manager.MitmMapper(args, mapping_manager, None, shard_index, shard_count))
+    if shard_count == 1:
+        mitm_mapper = shards[0]
+    else:
+        from mapadroid.mitm_receiver.MitmMapper import ShardedMitmMapper
+        mitm_mapper = ShardedMitmMapper(shards)
+
+    results = Queue()
+    clients = [Process(target=simulate_origins,
+                       args=(mitm_mapper, origins[index::client_processes], duration, results))
+               for index in range(client_processes)]
+    for client in clients:
+        client.start()
+    operations = sum(results.get() for _ in clients)
+    for client in clients:
+        client.join()
+    for manager in managers:
+        manager.shutdown()
+    return operations / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MitmMapper")
+    parser.add_argument("--origins", default="50,200,500", help="Comma separated amounts of simulated devices")
+    parser.add_argument("--shards", default="1,4", help="Comma separated amounts of MitmMapper processes")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run each combination for")
+    parser.add_argument("--clients", type=int, default=4, help="Amount of client processes")
+    benchmark_args = parser.parse_args()
+
+    # the MitmMapper reads its settings from the regular MAD arguments
+    sys.argv = sys.argv[:1]
+    from mapadroid.utils.walkerArgs import parse_args
+    args = parse_args()
+    args.game_stats = False
+    from loguru import logger
+    logger.remove()
+
+    print("{:>8} | {:>6} | {:>12}".format("origins", "shards", "ops/s"))
+    for origin_count in [int(amount) for amount in benchmark_args.origins.split(",")]:
+        for shard_count in [int(amount) for amount in benchmark_args.shards.split(",")]:
+            throughput = run(args, origin_count, shard_count, benchmark_args.duration, benchmark_args.clients)
+            print("{:>8} | {:>6} | {:>12.0f}".format(origin_count, shard_count, throughput))
+
+
+if __name__ == "__main__":
+    main()
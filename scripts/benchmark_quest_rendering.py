@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Measures how long rendering the quests of many stops takes, e.g. for the quest list of MADmin or the webhook.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_quest_rendering.py --stops 5000 --language de
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mapadroid.utils.language import reload_translations  # noqa: E402
+from mapadroid.utils.questGen import QuestGen  # noqa: E402
+
+QUESTS = [
+    (7, 7, 3, '[{"type": 9}]'),
+    (4, 2, 10, '[{"type": 1, "with_pokemon_type": {"pokemon_type": [10, 12]}}]'),
+    (16, 3, 5, '[{"type": 15}, {"type": 8, "with_throw_type": {"throw_type": 11}}]'),
+    (5, 2, 10, '[]'),
+    (6, 4, 2, '[]'),
+    (8, 7, 1, '[{"type": 7, "with_raid_level": {"raid_level": [3, 4, 5]}}]'),
+]
+
+
+def stop_quests(amount: int):
+    for stop in range(amount):
+        quest_type, reward_type, target, condition = random.choice(QUESTS)
+        yield {
+            'pokestop_id': str(stop), 'name': 'Stop {}'.format(stop), 'image': None, 'latitude': 0.0,
+            'longitude': 0.0, 'quest_timestamp': 0, 'quest_type': quest_type, 'quest_reward_type': reward_type,
+            'quest_target': target, 'quest_condition': condition, 'quest_template': None, 'quest_title': None,
+            'task': None, 'quest_item_id': random.choice([1, 2, 701, 705]), 'quest_item_amount': 3,
+            'quest_stardust': 500, 'quest_pokemon_id': random.randint(1, 500), 'quest_pokemon_form_id': '00',
+            'quest_pokemon_costume_id': '00', 'quest_reward': '[]', 'is_ar_scan_eligible': False
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rendering of quests")
+    parser.add_argument("--stops", type=int, default=5000, help="Amount of stops with a quest")
+    parser.add_argument("--language", default="en", help="Language to render the quests in")
+    parser.add_argument("--rounds", type=int, default=3, help="Amount of renderings of the quest list")
+    benchmark_args = parser.parse_args()
+    os.environ['LANGUAGE'] = benchmark_args.language
+
+    quests = list(stop_quests(benchmark_args.stops))
+    start = time.time()
+    reload_translations()
+    quest_gen = QuestGen(MagicMock(no_quest_titles=True, language=benchmark_args.language))
+    print("Loading the locale: {:.1f} ms".format((time.time() - start) * 1000))
+    for rendering in range(benchmark_args.rounds):
+        start = time.time()
+        for quest in quests:
+            quest_gen.generate_quest(quest)
+        print("Rendering {} quests (round {}): {:.1f} ms".format(len(quests), rendering + 1,
+                                                                 (time.time() - start) * 1000))
+
+
+if __name__ == "__main__":
+    main()
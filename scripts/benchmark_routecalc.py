@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compares tour length and wall time of the quick route calculation implementations.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_routecalc.py --sizes 500,2000,10000,50000
+
+The legacy implementation keeps a full distance dict of n² Python floats and is therefore skipped above
+--legacy-max points.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mapadroid.route.routecalc import calculate_route_fast  # noqa: E402
+from mapadroid.route.routecalc import calculate_route_quick  # noqa: E402
+
+
+def random_points(amount: int, seed: int) -> np.ndarray:
+    # roughly the size of a large city, with a few dense spots like a real quest area
+    rng = np.random.default_rng(seed)
+    uniform = amount // 2
+    points = np.column_stack((50.85 + rng.random(uniform) * 0.2, 6.85 + rng.random(uniform) * 0.3))
+    centers = np.column_stack((50.85 + rng.random(20) * 0.2, 6.85 + rng.random(20) * 0.3))
+    clustered = centers[rng.integers(0, len(centers), amount - uniform)] + rng.normal(0, 0.005, (amount - uniform, 2))
+    return np.concatenate((points, clustered))
+
+
+def run(name, function, points, xy):
+    start = time.perf_counter()
+    _, path = function(points)
+    duration = time.perf_counter() - start
+    if sorted(path) != list(range(len(points))):
+        raise RuntimeError("{} did not return a valid tour".format(name))
+    return calculate_route_fast.tour_length(xy, path), duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the quick route calculation")
+    parser.add_argument("--sizes", default="500,2000,10000,50000", help="Comma separated amounts of points")
+    parser.add_argument("--legacy-max", type=int, default=2000, help="Largest size to run the legacy solver for")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from loguru import logger
+    logger.remove()
+
+    print("{:>8} | {:>14} {:>10} | {:>14} {:>10} | {:>8}".format("points", "legacy length", "legacy s",
+                                                                  "fast length", "fast s", "ratio"))
+    for size in [int(size) for size in args.sizes.split(",")]:
+        points = random_points(size, args.seed)
+        xy = calculate_route_fast.project(points)
+        fast_length, fast_time = run("fast", calculate_route_fast.tsp, points, xy)
+        if size <= args.legacy_max:
+            legacy_length, legacy_time = run("legacy", lambda data: calculate_route_quick.tsp(data.tolist()),
+                                             points, xy)
+            print("{:>8} | {:>14.5f} {:>10.2f} | {:>14.5f} {:>10.2f} | {:>8.3f}".format(
+                size, legacy_length, legacy_time, fast_length, fast_time, fast_length / legacy_length))
+        else:
+            print("{:>8} | {:>14} {:>10} | {:>14.5f} {:>10.2f} | {:>8}".format(
+                size, "skipped", "-", fast_length, fast_time, "-"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Measures the routepool of a route manager under worker churn: several workers fetch their next locations in
+threads while workers leave and join again. Every join rebalances the subroutes of all workers while holding the
+lock of the route manager, blocking the get_next_location calls of the other workers.
+
+Reported are the durations of the rebalancing and the latency of get_next_location.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_routepool.py --coords 5000 --workers 20 --duration 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from threading import Event, Thread
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def percentile(values, share: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the routepool under worker churn")
+    parser.add_argument("--coords", type=int, default=5000, help="Coords of the route")
+    parser.add_argument("--workers", type=int, default=20, help="Workers of the route")
+    parser.add_argument("--duration", type=float, default=10, help="Duration of the test in seconds")
+    parser.add_argument("--churn", type=float, default=0.05, help="Seconds between workers leaving")
+    benchmark_args = parser.parse_args()
+    # the route managers parse the arguments of MAD on import
+    sys.argv = sys.argv[:1]
+
+    from loguru import logger
+    logger.remove()
+
+    from mapadroid.route.RouteManagerMon import RouteManagerMon
+    from mapadroid.utils.collections import Location
+
+    class MeasuredRouteManager(RouteManagerMon):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.rebalance_durations = []
+
+        def _worker_changed_update_routepools(self):
+            start = time.perf_counter()
+            updated = super()._worker_changed_update_routepools()
+            self.rebalance_durations.append(time.perf_counter() - start)
+            return updated
+
+    route_manager = MeasuredRouteManager(MagicMock(), MagicMock(), 1, None, 70, 1, None, None, MagicMock(),
+                                         mode="mon_mitm", name="benchmark")
+    rng = random.Random(1)
+    route_manager._route = [Location(50.0 + rng.random() * 0.2, 7.0 + rng.random() * 0.2)
+                            for _ in range(benchmark_args.coords)]
+    route_manager._init_route_queue()
+    route_manager._is_started = True
+    origins = ["worker{}".format(index) for index in range(benchmark_args.workers)]
+    latencies = {origin: [] for origin in origins}
+    stop = Event()
+
+    def worker(origin: str):
+        while not stop.is_set():
+            start = time.perf_counter()
+            route_manager.get_next_location(origin)
+            latencies[origin].append(time.perf_counter() - start)
+            # the time a device needs to scan a location, shortened
+            time.sleep(0.001)
+
+    def churn():
+        while not stop.wait(benchmark_args.churn):
+            route_manager.unregister_worker(rng.choice(origins))
+
+    threads = [Thread(target=worker, args=(origin,)) for origin in origins] + [Thread(target=churn)]
+    for thread in threads:
+        thread.start()
+    time.sleep(benchmark_args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    all_latencies = [latency for origin_latencies in latencies.values() for latency in origin_latencies]
+    rebalances = route_manager.rebalance_durations
+    print("{} coords, {} workers: {} locations, {} rebalances".format(
+        benchmark_args.coords, benchmark_args.workers, len(all_latencies), len(rebalances)))
+    print("rebalancing: mean {:.3f} ms, max {:.3f} ms".format(
+        sum(rebalances) * 1000 / max(len(rebalances), 1), max(rebalances, default=0) * 1000))
+    print("get_next_location: p50 {:.3f} ms, p99 {:.3f} ms, max {:.3f} ms".format(
+        percentile(all_latencies, 0.5) * 1000, percentile(all_latencies, 0.99) * 1000,
+        max(all_latencies, default=0) * 1000))
+
+
+if __name__ == "__main__":
+    main()
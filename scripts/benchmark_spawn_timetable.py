@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Measures the lookup of the spawns of the next hour of a mon area (the priority queue of RouteManagerMon) on an
+area of many spawnpoints.
+
+Compared are the former lookup, which computes the spawn time of every row of the bounding box in Python
+(without the time of the query itself), and the spawn timetable: the time to load it from the rows, to apply an
+incremental update and of a lookup.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_spawn_timetable.py --spawnpoints 100000 --lookups 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mapadroid.cache.spawntimetable import SpawnTimetable  # noqa: E402
+from mapadroid.geofence.geofenceHelper import GeofenceHelper  # noqa: E402
+from mapadroid.utils.collections import Location  # noqa: E402
+
+
+def former_next_spawns(rows, geofence_helper):
+    """ The loop of DbWrapper.retrieve_next_spawns without the timetable """
+    current_time_of_day = datetime.now().replace(microsecond=0)
+    next_up = []
+    current_time = time.time()
+    for (_, latitude, longitude, spawndef, calc_endminsec) in rows:
+        if geofence_helper and not geofence_helper.is_coord_inside_include_geofence([latitude, longitude]):
+            continue
+        endminsec_split = calc_endminsec.split(":")
+        minutes = int(endminsec_split[0])
+        seconds = int(endminsec_split[1])
+        temp_date = current_time_of_day.replace(minute=minutes, second=seconds)
+        if minutes < datetime.now().minute:
+            temp_date = temp_date + timedelta(hours=1)
+        if temp_date < current_time_of_day:
+            continue
+        spawn_duration_minutes = 60 if spawndef == 15 else 30
+        timestamp = time.mktime(temp_date.timetuple()) - spawn_duration_minutes * 60
+        timestamp = timestamp + 60 * 60 if timestamp < current_time else timestamp
+        next_up.append((timestamp, Location(latitude, longitude)))
+    return next_up
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the spawn lookups of mon areas")
+    parser.add_argument("--spawnpoints", type=int, default=100000, help="Spawnpoints in the bounding box of the area")
+    parser.add_argument("--lookups", type=int, default=20, help="Amount of lookups measured")
+    parser.add_argument("--updates", type=int, default=1000, help="Spawnpoints changed per incremental update")
+    benchmark_args = parser.parse_args()
+
+    from loguru import logger
+    logger.remove()
+
+    rng = random.Random(1)
+    rows = [(spawnpoint, 50.0 + rng.random() * 0.3, 7.0 + rng.random() * 0.3, rng.choice((15, 240, 240)),
+             "{:02}:{:02}".format(rng.randrange(60), rng.randrange(60)))
+            for spawnpoint in range(benchmark_args.spawnpoints)]
+    fence = {"fence_data": ["[area]", "50.0,7.0", "50.0,7.3", "50.3,7.15", "50.3,7.0"]}
+    geofence_helper = GeofenceHelper(fence, None)
+
+    start = time.time()
+    for _ in range(benchmark_args.lookups):
+        former = former_next_spawns(rows, geofence_helper)
+    former_duration = (time.time() - start) / benchmark_args.lookups
+
+    start = time.time()
+    spawn_timetable = SpawnTimetable()
+    inside = geofence_helper.get_geofenced_mask([(row[1], row[2]) for row in rows]).tolist()
+    spawn_timetable.update(row for row, keep in zip(rows, inside) if keep)
+    spawn_timetable.get_next_spawns()
+    load_duration = time.time() - start
+
+    changed = rng.sample(rows, min(benchmark_args.updates, len(rows)))
+    start = time.time()
+    inside = geofence_helper.get_geofenced_mask([(row[1], row[2]) for row in changed]).tolist()
+    spawn_timetable.update(row for row, keep in zip(changed, inside) if keep)
+    spawn_timetable.get_next_spawns()
+    update_duration = time.time() - start
+
+    start = time.time()
+    for _ in range(benchmark_args.lookups):
+        current = spawn_timetable.get_next_spawns()
+    current_duration = (time.time() - start) / benchmark_args.lookups
+    start = time.time()
+    for _ in range(benchmark_args.lookups):
+        due = spawn_timetable.get_next_spawns(within=300)
+    due_duration = (time.time() - start) / benchmark_args.lookups
+
+    print("{} spawnpoints in the bounding box, {} in the geofence".format(len(rows), len(spawn_timetable)))
+    print("former lookup: {:.1f} ms ({} spawns)".format(former_duration * 1000, len(former)))
+    print("timetable: loaded in {:.1f} ms, {} spawnpoints updated and looked up in {:.1f} ms".format(
+        load_duration * 1000, len(changed), update_duration * 1000))
+    print("timetable lookup: {:.1f} ms ({} spawns), next 300s: {:.2f} ms ({} spawns)".format(
+        current_duration * 1000, len(current), due_duration * 1000, len(due)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Measures the time spent in DbPogoProtoSubmit.spawnpoints per GMO and the queries sent to the database.
+The database is replaced by a mock, so only the processing within MAD is measured.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_spawnpoints.py --gmos 2000 --mons 30
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mapadroid.db.DbPogoProtoSubmit import DbPogoProtoSubmit  # noqa: E402
+from mapadroid.utils.walkerArgs import parse_args  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the spawnpoint ingestion of GMOs")
+    parser.add_argument("--gmos", type=int, default=2000, help="Amount of GMOs to process")
+    parser.add_argument("--mons", type=int, default=30, help="Wild mons per GMO")
+    parser.add_argument("--spawnpoints", type=int, default=20000, help="Amount of distinct spawnpoints")
+    benchmark_args = parser.parse_args()
+    sys.argv = sys.argv[:1]
+    args = parse_args()
+
+    from loguru import logger
+    logger.remove()
+
+    spawnpoints = ["{:x}".format(0x89c25000 + spawnpoint * 7) for spawnpoint in range(benchmark_args.spawnpoints)]
+    gmos = [{"cells": [{"wild_pokemon": [{"spawnpoint_id": random.choice(spawnpoints),
+                                          "time_till_hidden": random.choice([-1, random.randint(0, 3600000)])}
+                                         for _ in range(benchmark_args.mons)]}]}
+            for _ in range(benchmark_args.gmos)]
+
+    db_exec = MagicMock()
+    # the active event, unknown spawnpoints
+    db_exec.execute.side_effect = lambda sql, args=None: [(1,)] if "trs_event" in sql else []
+    proto_submit = DbPogoProtoSubmit(db_exec, args)
+    start = time.time()
+    for gmo in gmos:
+        proto_submit.spawnpoints("benchmark", gmo, datetime.now())
+    duration = time.time() - start
+    print("{} GMOs with {} mons: {:.3f} ms per GMO".format(benchmark_args.gmos, benchmark_args.mons,
+                                                          duration * 1000 / benchmark_args.gmos))
+    print("Queries: {} lookups, {} upserts".format(db_exec.execute.call_count, db_exec.executemany.call_count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Measures the nearest stop lookups of leveling mode (30 nearest unvisited stops inside a geofence) on a table of
+many stops.
+
+The database is simulated with numpy: a query without a usable index examines every row of the table, the
+bounding box query of the fallback only the rows within the range of latitudes of its box (index on latitude,
+longitude). Reported are the rows examined per lookup by the former query (one scan per radius tried), by the
+bounding box query and the time of a lookup in the stop index.
+
+Usage (from the root of MAD):
+    python3 scripts/benchmark_stop_index.py --stops 200000 --lookups 2000
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mapadroid.cache.stopindex import StopIndex  # noqa: E402
+from mapadroid.geofence.geofenceHelper import GeofenceHelper  # noqa: E402
+
+MILES_PER_DEGREE = 69.1
+
+
+def former_rows_examined(coords: np.ndarray, visited: np.ndarray, fence_mask: np.ndarray, lat: float, lng: float,
+                         limit: int) -> int:
+    """ The former query scanned the table once per radius until it found enough stops (at most 10 times) """
+    distances = np.hypot(coords[:, 0] - lat, coords[:, 1] - lng) * MILES_PER_DEGREE
+    max_distance = 5
+    for scan in range(1, 10):
+        if np.count_nonzero((distances <= max_distance) & ~visited & fence_mask) >= limit:
+            return scan * len(coords)
+        max_distance += 2
+    return 9 * len(coords)
+
+
+def bbox_rows_examined(sorted_lats: np.ndarray, coords: np.ndarray, visited: np.ndarray, fence_mask: np.ndarray,
+                       fence_box, lat: float, lng: float, limit: int) -> int:
+    """ Rows of the latitude range of the boxes queried by the fallback, doubling the box until enough are found """
+    min_lat, min_lng, max_lat, max_lng = fence_box
+    radius = 5 / MILES_PER_DEGREE
+    examined = 0
+    while True:
+        box = (max(lat - radius, min_lat), min(lat + radius, max_lat), max(lng - radius, min_lng),
+               min(lng + radius, max_lng))
+        examined += int(np.searchsorted(sorted_lats, box[1], side="right") - np.searchsorted(sorted_lats, box[0]))
+        distances = np.hypot(coords[:, 0] - lat, coords[:, 1] - lng)
+        found = np.count_nonzero((distances <= radius) & ~visited & fence_mask)
+        covers_fence = box == (min_lat, max_lat, min_lng, max_lng)
+        if found >= limit or covers_fence:
+            return examined
+        radius *= 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nearest stop lookups")
+    parser.add_argument("--stops", type=int, default=200000, help="Amount of stops in the table")
+    parser.add_argument("--lookups", type=int, default=2000, help="Amount of lookups measured")
+    parser.add_argument("--visited", type=float, default=0.5, help="Share of the stops visited by the device")
+    parser.add_argument("--limit", type=int, default=30, help="Stops returned per lookup")
+    parser.add_argument("--compare", type=int, default=50, help="Lookups to count the examined rows of")
+    benchmark_args = parser.parse_args()
+
+    from loguru import logger
+    logger.remove()
+
+    rng = np.random.default_rng(1)
+    # a country of stops, denser in a few cities
+    centers = rng.uniform((47.5, 6.0), (54.5, 14.5), size=(40, 2))
+    coords = np.concatenate([
+        rng.uniform((47.5, 6.0), (54.5, 14.5), size=(benchmark_args.stops // 2, 2)),
+        centers[rng.integers(0, len(centers), benchmark_args.stops - benchmark_args.stops // 2)]
+        + rng.normal(0, 0.05, size=(benchmark_args.stops - benchmark_args.stops // 2, 2))
+    ])
+    stop_ids = ["{:032x}.16".format(index) for index in range(len(coords))]
+    visited = rng.random(len(coords)) < benchmark_args.visited
+    visited_ids = {stop_id for stop_id, stop_visited in zip(stop_ids, visited) if stop_visited}
+    city_lat, city_lng = centers[0]
+    fence = {"fence_data": ["[city]", "{},{}".format(city_lat - 0.15, city_lng - 0.2),
+                            "{},{}".format(city_lat - 0.15, city_lng + 0.2),
+                            "{},{}".format(city_lat + 0.15, city_lng + 0.2),
+                            "{},{}".format(city_lat + 0.15, city_lng - 0.2)]}
+    geofence_helper = GeofenceHelper(fence, None)
+    fence_mask = geofence_helper.get_geofenced_mask(coords)
+
+    start = time.time()
+    stop_index = StopIndex()
+    stop_index.update(zip(stop_ids, coords[:, 0].tolist(), coords[:, 1].tolist()))
+    load_duration = time.time() - start
+    start = time.time()
+    fenced_index = stop_index.get_fenced_index(geofence_helper)
+    fence_duration = time.time() - start
+    print("{} stops indexed in {:.2f}s, {} stops of the geofence in {:.3f}s".format(
+        len(stop_index), load_duration, len(fenced_index), fence_duration))
+
+    positions = np.column_stack((city_lat + rng.uniform(-0.15, 0.15, benchmark_args.lookups),
+                                 city_lng + rng.uniform(-0.2, 0.2, benchmark_args.lookups)))
+    start = time.time()
+    for lat, lng in positions.tolist():
+        fenced_index.nearest(lat, lng, benchmark_args.limit, exclude=visited_ids)
+    duration = time.time() - start
+    print("stop index: {:.1f} us per lookup".format(duration * 1e6 / len(positions)))
+
+    sorted_lats = np.sort(coords[:, 0])
+    fence_box = geofence_helper.get_polygon_from_fence()
+    compared = positions[:benchmark_args.compare].tolist()
+    former = sum(former_rows_examined(coords, visited, fence_mask, lat, lng, benchmark_args.limit)
+                 for lat, lng in compared)
+    bbox = sum(bbox_rows_examined(sorted_lats, coords, visited, fence_mask, fence_box, lat, lng,
+                                  benchmark_args.limit) for lat, lng in compared)
+    print("rows examined per lookup: former query {}, bounding box query {}".format(
+        math.ceil(former / len(compared)), math.ceil(bbox / len(compared))))
+
+
+if __name__ == "__main__":
+    main()
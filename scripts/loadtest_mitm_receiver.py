@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Load test of the MITM data ingestion, reports the protos handled per second.
+
+Two modes:
+    offline  Runs the work a receiver does per request (JSON decoding, queueing to a data processor process)
+             without HTTP, comparing the former path (json + the complete proto pickled by the queue) to the
+             current one (fast JSON decoder if installed, slimmed proto serialized once).
+    http     Posts synthetic GMOs to a running MITMReceiver with several concurrent clients. The origin has to be
+             a configured device, pass the credentials of the auth settings if any.
+
+Usage (from the root of MAD):
+    python3 scripts/loadtest_mitm_receiver.py offline --protos 2000
+    python3 scripts/loadtest_mitm_receiver.py http --url http://127.0.0.1:8000/ --origin device1 \
+        --auth user:pass --clients 16 --duration 30
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from multiprocessing import JoinableQueue, Process
+from threading import Thread
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mapadroid.mitm_receiver.MitmProtoCodec import (decode_queue_item,  # noqa: E402
+                                                    encode_queue_item,
+                                                    loads, msgpack, orjson,
+                                                    slim_proto)
+
+
+def generate_gmo(cells: int = 20, mons: int = 3, forts: int = 4) -> dict:
+    """ GMO shaped like the ones sent by PogoDroid, including fields MAD does not read """
+    def wild_mon():
+        return {
+            "encounter_id": random.getrandbits(63), "spawnpoint_id": "{:x}".format(random.getrandbits(32)),
+            "latitude": random.uniform(-60, 60), "longitude": random.uniform(-180, 180),
+            "time_till_hidden": random.randint(-1, 3600000), "last_modified_timestamp_ms": int(time.time() * 1000),
+            "pokemon_data": {"id": random.randint(1, 800), "display": {"form_value": 0, "costume_value": 0,
+                                                                        "gender_value": 1, "weather_boosted_value": 0},
+                             "move_1": 0, "move_2": 0, "cp": 0, "height": 0.0, "weight": 0.0}
+        }
+
+    def fort():
+        return {
+            "id": "{:032x}.16".format(random.getrandbits(128)), "latitude": random.uniform(-60, 60),
+            "longitude": random.uniform(-180, 180), "enabled": True, "type": random.choice([0, 1]),
+            "last_modified_timestamp_ms": int(time.time() * 1000), "image_url": "https://example.com/" + "x" * 80,
+            "active_fort_modifier": [], "lure_info": {}, "pokestop_displays": [], "is_ar_scan_eligible": True,
+            "sponsor": 0, "rendering_type": 0, "partner_id": "", "visited": False, "closed_until_ms": 0
+        }
+
+    return {
+        "cells": [{
+            "id": random.getrandbits(63), "current_timestamp": int(time.time() * 1000),
+            "wild_pokemon": [wild_mon() for _ in range(mons)],
+            "catchable_pokemon": [{"encounter_id": random.getrandbits(63)} for _ in range(mons)],
+            "nearby_pokemon": [{"pokedex_number": random.randint(1, 800), "encounter_id": random.getrandbits(63),
+                                "fort_id": "", "display": {}} for _ in range(mons)],
+            "forts": [fort() for _ in range(forts)],
+            "fort_summaries": [], "decimated_spawn_points": [], "spawn_points": [{"latitude": 0.0, "longitude": 0.0}]
+        } for _ in range(cells)],
+        "client_weather": [{"s2_cell_id": random.getrandbits(63), "gameplay_weather": {"gameplay_condition": 1},
+                            "display_weather": {}, "alerts": []}],
+        "time_of_day_value": 1,
+        "status": 1
+    }
+
+
+def generate_request(protos: int) -> list:
+    return [{"type": 106, "timestamp": time.time(), "lat": 0.0, "lng": 0.0, "payload": generate_gmo(),
+             "raw": False} for _ in range(protos)]
+
+
+def consume(queue: JoinableQueue, decode: bool):
+    while True:
+        item = queue.get()
+        if decode:
+            item = decode_queue_item(item)
+        queue.task_done()
+        if item is None:
+            break
+
+
+def run_offline(protos: int, legacy: bool) -> float:
+    bodies = [json.dumps(generate_request(1)).encode() for _ in range(protos)]
+    queue = JoinableQueue()
+    consumer = Process(target=consume, args=(queue, not legacy))
+    consumer.start()
+    start = time.time()
+    for body in bodies:
+        for proto in (json.loads(body) if legacy else loads(body)):
+            if legacy:
+                queue.put((proto["timestamp"], proto, "loadtest"))
+            else:
+                queue.put(encode_queue_item(proto["timestamp"], slim_proto(proto), "loadtest"))
+    queue.put(None)
+    queue.join()
+    duration = time.time() - start
+    consumer.join()
+    return protos / duration
+
+
+def run_http(benchmark_args):
+    headers = {"Origin": benchmark_args.origin, "Content-Type": "application/json"}
+    if benchmark_args.auth:
+        headers["Authorization"] = "Basic " + base64.b64encode(benchmark_args.auth.encode()).decode()
+    if benchmark_args.gzip:
+        headers["Content-Encoding"] = "gzip"
+    bodies = []
+    for _ in range(20):
+        body = json.dumps(generate_request(benchmark_args.protos_per_request)).encode()
+        bodies.append(gzip.compress(body) if benchmark_args.gzip else body)
+    results = {"requests": 0, "failed": 0}
+    deadline = time.time() + benchmark_args.duration
+
+    def client():
+        session = requests.Session()
+        while time.time() < deadline:
+            try:
+                response = session.post(benchmark_args.url, data=random.choice(bodies), headers=headers, timeout=30)
+                failed = response.status_code != 200
+            except requests.exceptions.RequestException:
+                failed = True
+            results["requests"] += 1
+            results["failed"] += int(failed)
+
+    threads = [Thread(target=client) for _ in range(benchmark_args.clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+    succeeded = results["requests"] - results["failed"]
+    print("{} requests in {:.1f}s, {} failed".format(results["requests"], duration, results["failed"]))
+    print("{:.1f} protos/s".format(succeeded * benchmark_args.protos_per_request / duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the MITM data ingestion")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    offline = subparsers.add_parser("offline", help="Measure decoding and queueing without HTTP")
+    offline.add_argument("--protos", type=int, default=2000, help="Amount of GMOs to queue")
+    http = subparsers.add_parser("http", help="Post GMOs to a running MITMReceiver")
+    http.add_argument("--url", default="http://127.0.0.1:8000/", help="URL of the MITMReceiver")
+    http.add_argument("--origin", required=True, help="Origin of a configured device")
+    http.add_argument("--auth", default=None, help="Credentials as user:password")
+    http.add_argument("--clients", type=int, default=8, help="Amount of concurrent clients")
+    http.add_argument("--duration", type=int, default=30, help="Duration of the test in seconds")
+    http.add_argument("--protos-per-request", type=int, default=1, help="Protos sent per request")
+    http.add_argument("--gzip", action="store_true", help="Compress the requests")
+    benchmark_args = parser.parse_args()
+
+    if benchmark_args.mode == "http":
+        run_http(benchmark_args)
+        return
+    print("orjson: {}, msgpack: {}".format("installed" if orjson else "missing",
+                                           "installed" if msgpack else "missing"))
+    print("former path:  {:.1f} protos/s".format(run_offline(benchmark_args.protos, legacy=True)))
+    print("current path: {:.1f} protos/s".format(run_offline(benchmark_args.protos, legacy=False)))
+
+
+if __name__ == "__main__":
+    main()
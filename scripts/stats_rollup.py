@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Builds the hourly and daily rollups of the worker statistics and checks them against the raw statistics.
+
+The rollups are updated by MAD itself while running with --game_stats, backfilling is only needed after
+importing raw statistics or to repair the rollups reported by the check.
+
+Usage (from the root of MAD, reads the database settings of configs/config.ini):
+    python3 scripts/stats_rollup.py backfill [--since EPOCH]
+    python3 scripts/stats_rollup.py check [--since EPOCH]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the rollups of the worker statistics")
+    parser.add_argument("command", choices=["backfill", "check"],
+                        help="backfill: fold all raw statistics again, check: compare the rollups with the raw "
+                             "statistics")
+    parser.add_argument("--since", type=int, default=None,
+                        help="Epoch to start at. Defaults to the oldest raw statistics")
+    rollup_args = parser.parse_args()
+
+    # the database settings are read from the regular MAD arguments
+    sys.argv = sys.argv[:1]
+    from mapadroid.utils.walkerArgs import parse_args
+    args = parse_args()
+    from mapadroid.db.DbFactory import DbFactory
+    db_wrapper, db_pool_manager = DbFactory.get_wrapper(args)
+    try:
+        if rollup_args.command == "backfill":
+            db_wrapper.stats_rollup.backfill(rollup_args.since)
+            print("Statistics rollups have been built")
+            return 0
+        mismatches = db_wrapper.stats_rollup.check_consistency(rollup_args.since)
+        for mismatch in mismatches:
+            print("{rollup} {table} {period} {group}: expected {expected}, got {actual}".format(**mismatch))
+        if mismatches:
+            print("{} groups of the rollups do not match, run the backfill to rebuild them".format(len(mismatches)))
+            return 1
+        print("Statistics rollups match the raw statistics")
+        return 0
+    finally:
+        db_pool_manager.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
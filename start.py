@@ -2,12 +2,13 @@ import calendar
 import datetime
 import gc
 import os
+import socket
 import sys
 import time
 import unittest
 from multiprocessing import Process
 from threading import Thread, active_count
-from typing import Optional
+from typing import List, Optional, Union
 
 import pkg_resources
 import psutil
@@ -16,10 +17,10 @@ from mapadroid.data_manager import DataManager
 from mapadroid.db.DbFactory import DbFactory
 from mapadroid.mad_apk import (AbstractAPKStorage, StorageSyncManager,
                                get_storage_obj)
-from mapadroid.madmin.madmin import MADmin
 from mapadroid.mitm_receiver.MitmDataProcessorManager import \
     MitmDataProcessorManager
-from mapadroid.mitm_receiver.MitmMapper import MitmMapper, MitmMapperManager
+from mapadroid.mitm_receiver.MitmMapper import (MitmMapper, MitmMapperManager,
+                                                ShardedMitmMapper)
 from mapadroid.mitm_receiver.MITMReceiver import MITMReceiver
 from mapadroid.ocr.pogoWindows import PogoWindows
 from mapadroid.patcher import MADPatcher
@@ -28,11 +29,14 @@ from mapadroid.utils.logging import LoggerEnums, get_logger, init_logging
 from mapadroid.utils.madGlobals import terminate_mad
 from mapadroid.utils.MappingManager import (MappingManager,
                                             MappingManagerManager)
+from mapadroid.utils.metrics import init_metrics
+from mapadroid.utils.phase_timer import PhaseTimer
 from mapadroid.utils.pluginBase import PluginCollection
 from mapadroid.utils.questGen import QuestGen
 from mapadroid.utils.rarity import Rarity
 from mapadroid.utils.updater import DeviceUpdater
 from mapadroid.utils.walkerArgs import parse_args
+from mapadroid.webhook.webhookchangefeed import WebhookChangeFeed
 from mapadroid.webhook.webhookworker import WebhookWorker
 from mapadroid.websocket.WebsocketServer import WebsocketServer
 
@@ -154,8 +158,12 @@ def check_dependencies():
 
 
 if __name__ == "__main__":
+    # the imports are measured from the start of the process
+    startup_timer = PhaseTimer("Startup", start=psutil.Process(os.getpid()).create_time())
     init_logging(args)
     logger = get_logger(LoggerEnums.system)
+    # before starting any process, the processes send their metrics to this one
+    init_metrics(args)
 
     data_manager: Optional[DataManager] = None
     device_updater: DeviceUpdater = None
@@ -164,14 +172,16 @@ if __name__ == "__main__":
     mapping_manager_manager: MappingManagerManager = None
     mapping_manager: Optional[MappingManager] = None
     mitm_receiver_process: MITMReceiver = None
-    mitm_mapper_manager: Optional[MitmMapperManager] = None
-    mitm_mapper: Optional[MitmMapper] = None
+    mitm_receiver_processes: List[MITMReceiver] = []
+    mitm_mapper_managers: List[MitmMapperManager] = []
+    mitm_mapper: Optional[Union[MitmMapper, ShardedMitmMapper]] = None
     pogo_win_manager: Optional[PogoWindows] = None
     storage_elem: Optional[AbstractAPKStorage] = None
     storage_manager: Optional[StorageSyncManager] = None
     t_whw: Thread = None  # Thread for WebHooks
     t_ws: Thread = None  # Thread - WebSocket Server
     webhook_worker: Optional[WebhookWorker] = None
+    webhook_change_feed: Optional[WebhookChangeFeed] = None
     ws_server: WebsocketServer = None
 
     if args.config_mode:
@@ -184,6 +194,7 @@ if __name__ == "__main__":
     create_folder(args.file_path)
     create_folder(args.upload_path)
     create_folder(args.temp_path)
+    startup_timer.mark("imports and checks")
     if args.config_mode and args.only_routes:
         logger.error('Unable to run with config_mode and only_routes.  Only use one option')
         sys.exit(1)
@@ -199,11 +210,13 @@ if __name__ == "__main__":
     except Exception:
         instance_id = None
     data_manager = DataManager(db_wrapper, instance_id)
+    startup_timer.mark("database")
     MADPatcher(args, data_manager)
     data_manager.clear_on_boot()
     data_manager.fix_routecalc_on_boot()
     event = Event(args, db_wrapper)
     event.start_event_checker()
+    startup_timer.mark("patcher")
     # Do not remove this sleep unless you have solved the race condition on boot with the logger
     time.sleep(.1)
     MappingManagerManager.register('MappingManager', MappingManager)
@@ -213,6 +226,7 @@ if __name__ == "__main__":
                                                                              args,
                                                                              data_manager,
                                                                              configmode=args.config_mode)
+    startup_timer.mark("mappings")
     quest_gen: QuestGen = QuestGen(args)
     if args.only_routes:
         logger.info('Running in route recalculation mode. MAD will exit once complete')
@@ -228,21 +242,45 @@ if __name__ == "__main__":
     if not args.config_mode:
         pogo_win_manager = PogoWindows(args.temp_path, args.ocr_thread_count)
         MitmMapperManager.register('MitmMapper', MitmMapper)
-        mitm_mapper_manager = MitmMapperManager()
-        mitm_mapper_manager.start()
-        mitm_mapper = mitm_mapper_manager.MitmMapper(args, mapping_manager, db_wrapper.stats_submit)
+        shard_count = max(1, args.mitm_mapper_shards)
+        mitm_mapper_shards = []
+        for shard_index in range(shard_count):
+            mitm_mapper_manager = MitmMapperManager()
+            mitm_mapper_manager.start()
+            mitm_mapper_managers.append(mitm_mapper_manager)
+            mitm_mapper_shards.append(mitm_mapper_manager.MitmMapper(args, mapping_manager, db_wrapper.stats_submit,
+                                                                     shard_index, shard_count))
+        if shard_count == 1:
+            mitm_mapper = mitm_mapper_shards[0]
+        else:
+            logger.info("Spreading the devices across {} MitmMapper processes", shard_count)
+            mitm_mapper = ShardedMitmMapper(mitm_mapper_shards)
+        if args.webhook and not args.webhook_polling:
+            # has to be set before the data processors are launched, they inherit the feed
+            webhook_change_feed = WebhookChangeFeed(args.webhook_change_feed_size)
+            db_wrapper.proto_submit.set_change_feed(webhook_change_feed)
+    startup_timer.mark("mitm mapper")
 
     logger.info('Starting PogoDroid Receiver server on port {}'.format(str(args.mitmreceiver_port)))
 
     mitm_data_processor_manager = MitmDataProcessorManager(args, mitm_mapper, db_wrapper, quest_gen)
     mitm_data_processor_manager.launch_processors()
 
-    mitm_receiver_process = MITMReceiver(args.mitmreceiver_ip, int(args.mitmreceiver_port),
-                                         mitm_mapper, args, mapping_manager, db_wrapper,
-                                         data_manager, storage_elem,
-                                         mitm_data_processor_manager.get_queue(),
-                                         enable_configmode=args.config_mode)
-    mitm_receiver_process.start()
+    receiver_count = max(1, args.mitmreceiver_processes)
+    if receiver_count > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        logger.warning("SO_REUSEPORT is not supported on this system, starting a single MITMReceiver process")
+        receiver_count = 1
+    for receiver_id in range(receiver_count):
+        mitm_receiver_processes.append(MITMReceiver(args.mitmreceiver_ip, int(args.mitmreceiver_port),
+                                                    mitm_mapper, args, mapping_manager, db_wrapper,
+                                                    data_manager, storage_elem,
+                                                    mitm_data_processor_manager.get_dispatcher(),
+                                                    name="MITMReceiver-{}".format(receiver_id),
+                                                    enable_configmode=args.config_mode,
+                                                    reuse_port=receiver_count > 1))
+        mitm_receiver_processes[-1].start()
+    mitm_receiver_process = mitm_receiver_processes[0]
+    startup_timer.mark("mitm processors and receivers")
 
     logger.info('Starting websocket server on port {}'.format(str(args.ws_port)))
     ws_server = WebsocketServer(args=args,
@@ -256,13 +294,14 @@ if __name__ == "__main__":
     t_ws = Thread(name='system', target=ws_server.start_server)
     t_ws.daemon = False
     t_ws.start()
+    startup_timer.mark("websocket")
     device_updater = DeviceUpdater(ws_server, args, jobstatus, db_wrapper, storage_elem)
     if not args.config_mode:
         if args.webhook:
             rarity = Rarity(args, db_wrapper)
             rarity.start_dynamic_rarity()
             webhook_worker = WebhookWorker(args, data_manager, mapping_manager, rarity, db_wrapper.webhook_reader,
-                                           quest_gen)
+                                           quest_gen, change_feed=webhook_change_feed)
             t_whw = Thread(name="system",
                            target=webhook_worker.run_worker)
             t_whw.daemon = True
@@ -273,7 +312,12 @@ if __name__ == "__main__":
                              target=get_system_infos, args=(db_wrapper,))
             t_usage.daemon = True
             t_usage.start()
+        if args.game_stats and args.game_stats_rollup_interval > 0:
+            logger.info("Starting statistics rollup job")
+            db_wrapper.stats_rollup.start_rollup_job(args.game_stats_rollup_interval)
 
+    startup_timer.mark("webhook and statistics")
+    from mapadroid.madmin.madmin import MADmin
     madmin = MADmin(args, db_wrapper, ws_server, mapping_manager, data_manager, device_updater, jobstatus, storage_elem,
                     quest_gen)
 
@@ -297,6 +341,7 @@ if __name__ == "__main__":
     }
     mad_plugins = PluginCollection('plugins', plugin_parts)
     mad_plugins.apply_all_plugins_on_value()
+    startup_timer.mark("madmin and plugins")
 
     if not args.disable_madmin or args.config_mode:
         logger.info("Starting Madmin on port {}", str(args.madmin_port))
@@ -305,6 +350,9 @@ if __name__ == "__main__":
         t_madmin.start()
 
     logger.info("MAD is now running.....")
+    logger.info(startup_timer.get_report())
+    if args.fast_startup and not args.config_mode:
+        logger.info("The areas are still being initialized, devices start once their area is ready")
     exit_code = 0
     device_creator = None
     try:
@@ -357,9 +405,10 @@ if __name__ == "__main__":
                 logger.info("Trying to stop receiver")
                 mitm_receiver_process.shutdown()
                 logger.debug("MITM child threads successfully shutdown. Terminating parent thread")
-                mitm_receiver_process.terminate()
-                logger.debug("Trying to join MITMReceiver")
-                mitm_receiver_process.join()
+            for receiver in mitm_receiver_processes:
+                receiver.terminate()
+                logger.debug("Trying to join {}", receiver.name)
+                receiver.join()
                 logger.debug("MITMReceiver joined")
             if mitm_data_processor_manager is not None:
                 mitm_data_processor_manager.shutdown()
@@ -375,7 +424,7 @@ if __name__ == "__main__":
                 t_ws.join()
             if mapping_manager_manager is not None:
                 mapping_manager_manager.shutdown()
-            if mitm_mapper_manager is not None:
+            for mitm_mapper_manager in mitm_mapper_managers:
                 logger.debug("Calling mitm_mapper shutdown")
                 mitm_mapper_manager.shutdown()
             if storage_manager is not None:
@@ -179,6 +179,7 @@ new Vue({
         spawns: {},
         cellupdates: {},
         fetchers: {},
+        tileCursors: {},
         layers: {
             stat: {
                 gyms: false,
@@ -259,7 +260,7 @@ new Vue({
     watch: {
         "layers.stat.gyms": function (newVal, oldVal) {
             if (newVal && !init) {
-                this.map_fetch_gyms(this.buildUrlFilter(true));
+                this.map_fetch_gyms();
             }
 
             this.changeStaticLayer("gyms", oldVal, newVal, layerOrders.gyms.bringTo);
@@ -274,28 +275,28 @@ new Vue({
         },
         "layers.stat.quests": function (newVal, oldVal) {
             if (newVal && !init) {
-                this.map_fetch_quests(this.buildUrlFilter(true));
+                this.map_fetch_quests();
             }
 
             this.changeStaticLayer("quests", oldVal, newVal, layerOrders.quests.bringTo);
         },
         "layers.stat.stops": function (newVal, oldVal) {
             if (newVal && !init) {
-                this.map_fetch_stops(this.buildUrlFilter(true));
+                this.map_fetch_stops();
             }
 
             this.changeStaticLayer("stops", oldVal, newVal, layerOrders.stops.bringTo);
         },
         "layers.stat.mons": function (newVal, oldVal) {
             if (newVal && !init) {
-                this.map_fetch_mons(this.buildUrlFilter(true));
+                this.map_fetch_mons();
             }
 
             this.changeStaticLayer("mons", oldVal, newVal, layerOrders.mons.bringTo);
         },
         "layers.stat.cellupdates": function (newVal, oldVal) {
             if (newVal && !init) {
-                this.map_fetch_cells(this.buildUrlFilter(true));
+                this.map_fetch_cells();
             }
 
             this.changeStaticLayer("cellupdates", oldVal, newVal, layerOrders.cells.bringTo);
@@ -384,16 +385,16 @@ new Vue({
             const urlFilter = this.buildUrlFilter();
 
             this.map_fetch_workers();
-            this.map_fetch_gyms(urlFilter);
+            this.map_fetch_gyms();
             this.map_fetch_routes();
             this.map_fetch_geofences();
             this.map_fetch_areas();
             this.map_fetch_spawns(urlFilter);
-            this.map_fetch_quests(urlFilter);
-            this.map_fetch_stops(urlFilter);
-            this.map_fetch_mons(urlFilter);
+            this.map_fetch_quests();
+            this.map_fetch_stops();
+            this.map_fetch_mons();
             this.map_fetch_prioroutes();
-            this.map_fetch_cells(urlFilter);
+            this.map_fetch_cells();
 
             this.updateBounds(true);
         },
@@ -428,101 +429,98 @@ new Vue({
                 }, this);
             });
         },
-        map_fetch_gyms(urlFilter) {
+        map_fetch_gyms() {
             if (!this.layers.stat.gyms) {
                 return;
             }
 
-            this.mapGuardedFetch("gyms", "get_gymcoords" + urlFilter, function (res) {
-                res.data.forEach(function (gym) {
-
-                    let color;
-                    switch (gym["team_id"]) {
-                        default:
-                            color = "#888";
-                            break;
-                        case 1:
-                            color = "#0C6DFF";
-                            break;
-                        case 2:
-                            color = "#FC0016";
-                            break;
-                        case 3:
-                            color = "#FD830E";
-                            break;
-                    }
+            this.mapFetchTiles("gyms", "gyms", function (gym) {
+                let color;
+                switch (gym["team_id"]) {
+                    default:
+                        color = "#888";
+                        break;
+                    case 1:
+                        color = "#0C6DFF";
+                        break;
+                    case 2:
+                        color = "#FC0016";
+                        break;
+                    case 3:
+                        color = "#FD830E";
+                        break;
+                }
 
-                    const id = gym["id"];
-                    let skip = true;
+                const id = gym["id"];
+                let skip = true;
 
-                    if (this.gyms[id]) {
-                        // check if we should update an existing gym
-                        if (this.gyms[id]["team_id"] !== gym["team_id"]) {
-                            map.removeLayer(leaflet_data.gyms[id]);
-                            delete leaflet_data.gyms[id];
-                        }
-                        else {
-                            skip = false;
-                        }
+                if (this.gyms[id]) {
+                    // check if we should update an existing gym
+                    if (this.gyms[id]["team_id"] !== gym["team_id"]) {
+                        map.removeLayer(leaflet_data.gyms[id]);
+                        delete leaflet_data.gyms[id];
+                    }
+                    else {
+                        skip = false;
                     }
+                }
 
-                    if (skip) {
-                        // store gym meta data
-                        this.gyms[id] = gym;
+                if (skip) {
+                    // store gym meta data
+                    this.gyms[id] = gym;
 
-                        leaflet_data.gyms[id] = L.circle([gym["lat"], gym["lon"]], {
-                            id: id,
-                            radius: Math.pow((20 - map.getZoom()), 2.5),
-                            color: color,
-                            fillColor: color,
-                            weight: 2,
-                            opacity: 0.7,
-                            fillOpacity: 0.7,
-                            pane: layerOrders.gyms.pane,
-                            pmIgnore: true
-                        }).bindPopup(this.build_gym_popup, { "className": "gympopup", autoPan: false });
-
-                        this.addMouseEventPopup(leaflet_data.gyms[id]);
-
-                        // only add them if they're set to visible
-                        if (this.layers.stat.gyms) {
-                            this.mapAddLayer(leaflet_data.gyms[id], layerOrders.gyms.bringTo);
-                        }
+                    leaflet_data.gyms[id] = L.circle([gym["lat"], gym["lon"]], {
+                        id: id,
+                        radius: Math.pow((20 - map.getZoom()), 2.5),
+                        color: color,
+                        fillColor: color,
+                        weight: 2,
+                        opacity: 0.7,
+                        fillOpacity: 0.7,
+                        pane: layerOrders.gyms.pane,
+                        pmIgnore: true
+                    }).bindPopup(this.build_gym_popup, { "className": "gympopup", autoPan: false });
+
+                    this.addMouseEventPopup(leaflet_data.gyms[id]);
+
+                    // only add them if they're set to visible
+                    if (this.layers.stat.gyms) {
+                        this.mapAddLayer(leaflet_data.gyms[id], layerOrders.gyms.bringTo);
                     }
+                }
 
-                    if (this["raids"][id]) {
-                        /// TODO remove past raids
-                        // end time is different -> new raid
-                        if (this.raids[id]["end"] !== gym["raid"]["end"] || gym["raid"]["end"] > (new Date().getTime() / 1000)) {
-                            map.removeLayer(leaflet_data.raids[id]);
-                            delete leaflet_data.raids[id];
-                        }
+                if (this["raids"][id]) {
+                    /// TODO remove past raids
+                    // end time is different -> new raid
+                    if (!gym["raid"] || this.raids[id]["end"] !== gym["raid"]["end"] || gym["raid"]["end"] > (new Date().getTime() / 1000)) {
+                        map.removeLayer(leaflet_data.raids[id]);
+                        delete leaflet_data.raids[id];
                     }
+                }
 
-                    if (gym["raid"] && gym["raid"]["end"] > (new Date().getTime() / 1000)) {
-                        if (map.hasLayer(leaflet_data.raids[id])) {
-                            return;
-                        }
+                if (gym["raid"] && gym["raid"]["end"] > (new Date().getTime() / 1000)) {
+                    if (map.hasLayer(leaflet_data.raids[id])) {
+                        return;
+                    }
 
-                        this.raids[id] = gym["raid"];
+                    this.raids[id] = gym["raid"];
 
-                        const icon = L.divIcon({
-                            html: gym["raid"]["level"],
-                            className: "raidIcon",
-                            iconAnchor: [-1 * (18 - map.getZoom()), -1 * (18 - map.getZoom())]
-                        });
+                    const icon = L.divIcon({
+                        html: gym["raid"]["level"],
+                        className: "raidIcon",
+                        iconAnchor: [-1 * (18 - map.getZoom()), -1 * (18 - map.getZoom())]
+                    });
 
-                        leaflet_data.raids[id] = L.marker([gym["lat"], gym["lon"]], {
-                            id: id,
-                            icon: icon,
-                            interactive: false,
-                            pane: layerOrders.raids.pane,
-                            pmIgnore: true
-                        });
+                    leaflet_data.raids[id] = L.marker([gym["lat"], gym["lon"]], {
+                        id: id,
+                        icon: icon,
+                        interactive: false,
+                        pane: layerOrders.raids.pane,
+                        pmIgnore: true
+                    });
 
-                        this.mapAddLayer(leaflet_data.raids[id], layerOrders.raids.bringTo);
-                    }
-                }, this);
+                    this.mapAddLayer(leaflet_data.raids[id], layerOrders.raids.bringTo);
+                }
             });
         },
         map_fetch_routes() {
@@ -741,77 +739,81 @@ new Vue({
                 }, this);
             });
         },
-        map_fetch_quests(urlFilter) {
+        map_fetch_quests() {
             if (!this.layers.stat.quests) {
                 return;
             }
 
-            this.mapGuardedFetch("quests", "get_quests" + urlFilter, function (res) {
-                res.data.forEach(function (quest) {
-                    const id = quest["pokestop_id"];
+            this.mapFetchTiles("quests", "quests", function (quest) {
+                const id = quest["pokestop_id"];
 
-                    if (this.quests[id]) {
+                if (this.quests[id]) {
+                    if (this.quests[id]["timestamp"] === quest["timestamp"]) {
                         return;
                     }
 
-                    this.quests[id] = quest;
-
-                    leaflet_data.quests[id] = L.marker([quest["latitude"], quest["longitude"]], {
-                        id: id,
-                        virtual: true,
-                        icon: this.build_quest_small(
-                            quest["quest_reward_type_raw"],
-                            quest["item_id"],
-                            quest["pokemon_id"],
-                            quest["pokemon_form"],
-                            quest["pokemon_asset_bundle_id"],
-                            quest["pokemon_costume"]),
-                        pane: layerOrders.quests.pane,
-                        pmIgnore: true
-                    }).bindPopup(this.build_quest_popup, { "className": "questpopup" });
-
-                    this.addMouseEventPopup(leaflet_data.quests[id]);
-
-                    if (this.layers.stat.quests) {
-                        this.mapAddLayer(leaflet_data.quests[id], layerOrders.quests.bringTo);
-                    }
+                    map.removeLayer(leaflet_data.quests[id]);
+                    delete leaflet_data.quests[id];
+                }
 
-                }, this);
+                this.quests[id] = quest;
+
+                leaflet_data.quests[id] = L.marker([quest["latitude"], quest["longitude"]], {
+                    id: id,
+                    virtual: true,
+                    icon: this.build_quest_small(
+                        quest["quest_reward_type_raw"],
+                        quest["item_id"],
+                        quest["pokemon_id"],
+                        quest["pokemon_form"],
+                        quest["pokemon_asset_bundle_id"],
+                        quest["pokemon_costume"]),
+                    pane: layerOrders.quests.pane,
+                    pmIgnore: true
+                }).bindPopup(this.build_quest_popup, { "className": "questpopup" });
+
+                this.addMouseEventPopup(leaflet_data.quests[id]);
+
+                if (this.layers.stat.quests) {
+                    this.mapAddLayer(leaflet_data.quests[id], layerOrders.quests.bringTo);
+                }
             });
         },
-        map_fetch_stops(urlFilter) {
+        map_fetch_stops() {
             if (!this.layers.stat.stops) {
                 return;
             }
 
-            this.mapGuardedFetch("stops", "get_stops" + urlFilter, function(res) {
-                res.data.forEach(function(stop) {
-                    const id = stop["pokestop_id"];
+            this.mapFetchTiles("stops", "stops", function (stop) {
+                const id = stop["pokestop_id"];
 
-                    if (this.stops[id]) {
+                if (this.stops[id]) {
+                    if (this.stops[id]["has_quest"] === stop["has_quest"]) {
                         return;
                     }
 
-                    const color = stop["has_quest"] ? "blue" : "red";
-                    this.stops[id] = stop;
-                    leaflet_data.stops[id] = L.circle([stop["latitude"], stop["longitude"]], {
-                        radius: 8,
-                        color: color,
-                        fillColor: color,
-                        weight: 1,
-                        opacity: 0.7,
-                        fillOpacity: 0.5,
-                        pane: layerOrders.stops.pane,
-                        pmIgnore: true,
-                        id: id
-                    }).bindPopup(this.build_stop_popup, { "className": "stoppopup" });
-                    this.addMouseEventPopup(leaflet_data.stops[id]);
-
-                    if (this.layers.stat.stops) {
-                        this.mapAddLayer(leaflet_data.stops[id], layerOrders.stops.bringTo);
-                    }
+                    map.removeLayer(leaflet_data.stops[id]);
+                    delete leaflet_data.stops[id];
+                }
 
-                }, this);
+                const color = stop["has_quest"] ? "blue" : "red";
+                this.stops[id] = stop;
+                leaflet_data.stops[id] = L.circle([stop["latitude"], stop["longitude"]], {
+                    radius: 8,
+                    color: color,
+                    fillColor: color,
+                    weight: 1,
+                    opacity: 0.7,
+                    fillOpacity: 0.5,
+                    pane: layerOrders.stops.pane,
+                    pmIgnore: true,
+                    id: id
+                }).bindPopup(this.build_stop_popup, { "className": "stoppopup" });
+                this.addMouseEventPopup(leaflet_data.stops[id]);
+
+                if (this.layers.stat.stops) {
+                    this.mapAddLayer(leaflet_data.stops[id], layerOrders.stops.bringTo);
+                }
             });
         },
         map_fetch_geofences() {
@@ -848,105 +850,141 @@ new Vue({
                 }, this);
             });
         },
-        map_fetch_mons(urlFilter) {
+        map_fetch_mons() {
             if (!this.layers.stat.mons) {
                 return;
             }
 
-            this.mapGuardedFetch("mons", "get_map_mons" + urlFilter, function (res) {
-                res.data.forEach(function (mon) {
-                    const id = mon["encounter_id"];
+            this.mapFetchTiles("mons", "mons", function (mon) {
+                const id = mon["encounter_id"];
 
-                    if (this.mons[id]) {
-                        if (this.mons[id]["last_modified"] === mon["last_modified"]) {
-                            return;
-                        }
-
-                        map.removeLayer(leaflet_data.mons[id]);
-                        delete leaflet_data.mons[id];
+                if (this.mons[id]) {
+                    if (this.mons[id]["last_modified"] === mon["last_modified"]) {
+                        return;
                     }
 
-                    // store meta data
-                    this.mons[id] = mon;
+                    map.removeLayer(leaflet_data.mons[id]);
+                    delete leaflet_data.mons[id];
+                }
 
-                    const monId = mon["mon_id"];
-                    let icon;
-                    if (leaflet_data.monicons[monId]) {
-                        icon = leaflet_data.monicons[monId];
-                    }
-                    else {
-                        const form = mon["form"] === 0 ? "00" : mon["form"];
-                        const image = `${iconBasePath}/pokemon_icon_${monId.toString().padStart(3, "0")}_${form}.png`;
-                        icon = L.icon({
-                            iconUrl: image,
-                            iconSize: [40, 40]
-                        });
-
-                        leaflet_data.monicons[monId] = icon;
-                    }
+                // store meta data
+                this.mons[id] = mon;
 
-                    leaflet_data.mons[id] = L.marker([mon["latitude"], mon["longitude"]], {
-                        id: id,
-                        virtual: true,
-                        icon: icon,
-                        pane: layerOrders.mons.pane,
-                        pmIgnore: true
-                    }).bindPopup(this.build_mon_popup, {"className": "monpopup"});
+                const monId = mon["mon_id"];
+                let icon;
+                if (leaflet_data.monicons[monId]) {
+                    icon = leaflet_data.monicons[monId];
+                }
+                else {
+                    const form = mon["form"] === 0 ? "00" : mon["form"];
+                    const image = `${iconBasePath}/pokemon_icon_${monId.toString().padStart(3, "0")}_${form}.png`;
+                    icon = L.icon({
+                        iconUrl: image,
+                        iconSize: [40, 40]
+                    });
 
-                    this.addMouseEventPopup(leaflet_data.mons[id]);
+                    leaflet_data.monicons[monId] = icon;
+                }
 
-                    // only add them if they're set to visible
-                    if (this.layers.stat.mons) {
-                        this.mapAddLayer(leaflet_data.mons[id], layerOrders.mons.bringTo);
-                    }
+                leaflet_data.mons[id] = L.marker([mon["latitude"], mon["longitude"]], {
+                    id: id,
+                    virtual: true,
+                    icon: icon,
+                    pane: layerOrders.mons.pane,
+                    pmIgnore: true
+                }).bindPopup(this.build_mon_popup, {"className": "monpopup"});
 
-                }, this);
+                this.addMouseEventPopup(leaflet_data.mons[id]);
+
+                // only add them if they're set to visible
+                if (this.layers.stat.mons) {
+                    this.mapAddLayer(leaflet_data.mons[id], layerOrders.mons.bringTo);
+                }
             });
         },
-        map_fetch_cells(urlFilter) {
+        map_fetch_cells() {
             if (!this.layers.stat.cellupdates) {
                 return;
             }
 
             var $this = this;
 
-            this.mapGuardedFetch("cellupdates", "get_cells" + urlFilter, function (res) {
+            this.mapFetchTiles("cellupdates", "cells", function (cell) {
                 const now = Math.round((new Date()).getTime() / 1000);
-
-                res.data.forEach(function (cell) {
-                    const id = cell["id"];
+                const id = cell["id"];
 
 					var noSkip = true;
-                    var notTooOld = true;
-                    if (this.cellupdates[id]) {
-                        if (this.cellupdates[id]["updated"] === cell["updated"]) {
-                            noSkip = false;
-                        } else {
-                        	map.removeLayer(leaflet_data.cellupdates[id]);
-                        	delete leaflet_data.cellupdates[id];
-                        }
-                    }
-                    if($this.settings.cellUpdateTimeout > 0 && now - cell.updated > $this.settings.cellUpdateTimeout) {
-                        notTooOld = false;
+                var notTooOld = true;
+                if (this.cellupdates[id]) {
+                    if (this.cellupdates[id]["updated"] === cell["updated"]) {
+                        noSkip = false;
+                    } else {
+                    	map.removeLayer(leaflet_data.cellupdates[id]);
+                    	delete leaflet_data.cellupdates[id];
                     }
+                }
+                if($this.settings.cellUpdateTimeout > 0 && now - cell.updated > $this.settings.cellUpdateTimeout) {
+                    notTooOld = false;
+                }
 
-                    if (noSkip && notTooOld) {
-                        $this.cellupdates[id] = cell;
+                if (noSkip && notTooOld) {
+                    $this.cellupdates[id] = cell;
 
-                    	leaflet_data.cellupdates[id] = L.polygon(cell["polygon"], {
-                            id: id,
-                            pane: layerOrders.cells.pane,
-                            pmIgnore: true
-                        })
-                        .setStyle(this.getCellStyle(now, cell["updated"]))
-                        .bindPopup(this.build_cell_popup, { className: "cellpopup" });
+                	leaflet_data.cellupdates[id] = L.polygon(cell["polygon"], {
+                        id: id,
+                        pane: layerOrders.cells.pane,
+                        pmIgnore: true
+                    })
+                    .setStyle(this.getCellStyle(now, cell["updated"]))
+                    .bindPopup(this.build_cell_popup, { className: "cellpopup" });
 
-                    	this.mapAddLayer(leaflet_data.cellupdates[id], layerOrders.cells.bringTo);
-                    }
+                	this.mapAddLayer(leaflet_data.cellupdates[id], layerOrders.cells.bringTo);
+                }
+            });
+        },
+        mapFetchTiles(type, layer, onObject) {
+            const known = this.tileCursors[layer] || { cursor: 0, tiles: [] };
+            const query = new URLSearchParams({
+                "layer": layer,
+                "swLat": this.getStoredSetting("swLat", null),
+                "swLon": this.getStoredSetting("swLon", null),
+                "neLat": this.getStoredSetting("neLat", null),
+                "neLon": this.getStoredSetting("neLon", null),
+                "cursor": known.cursor,
+                "tiles": known.tiles.join(",")
+            }).toString();
+
+            this.mapGuardedFetch(type, "get_map_data?" + query, function (res) {
+                const columns = res.data.columns;
+                res.data.rows.forEach(function (row) {
+                    const obj = {};
+                    columns.forEach(function (column, index) {
+                        obj[column] = row[index];
+                    });
+                    onObject.call(this, obj);
+                }, this);
 
+                res.data.removed.forEach(function (id) {
+                    this.mapRemoveObject(type, id);
                 }, this);
+
+                // only the tiles of the current viewport are remembered to keep the url short
+                this.tileCursors[layer] = { cursor: res.data.cursor, tiles: res.data.tiles };
             });
         },
+        mapRemoveObject(type, id) {
+            if (leaflet_data[type][id]) {
+                map.removeLayer(leaflet_data[type][id]);
+                delete leaflet_data[type][id];
+            }
+            delete this[type][id];
+
+            if (type === "gyms" && leaflet_data.raids[id]) {
+                map.removeLayer(leaflet_data.raids[id]);
+                delete leaflet_data.raids[id];
+                delete this.raids[id];
+            }
+        },
         mapGuardedFetch(guardName, url, onSuccess) {
             if (this.fetchers[guardName]) {
                 return;
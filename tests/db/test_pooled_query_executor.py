@@ -0,0 +1,89 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from mapadroid.db.PooledQueryExecutor import (PooledQueryExecutor,
+                                              StatementStatistics)
+
+INSERT = "INSERT INTO trs_quest (GUID, quest_type) VALUES (%s, %s)"
+
+
+@pytest.fixture
+def connection():
+    # the pooled connection wraps the same actual connection every time
+    conn = MagicMock()
+    conn.cursor.side_effect = lambda **kwargs: MagicMock(rowcount=1)
+    conn.unread_result = False
+    return conn
+
+
+def executor_for(conn, statement_cache_size):
+    with patch("mapadroid.db.PooledQueryExecutor.MySQLConnectionPool") as pool_class:
+        pool_class.return_value.get_connection.return_value = conn
+        executor = PooledQueryExecutor("localhost", 3306, "user", "password", "mad", poolsize=2,
+                                       statement_cache_size=statement_cache_size)
+        assert pool_class.call_args[1]["pool_reset_session"] == (statement_cache_size == 0)
+    return executor
+
+
+def test_committed_statements_are_prepared_once_per_connection(connection):
+    executor = executor_for(connection, 2)
+    assert executor.execute(INSERT, ("stop1", 1), commit=True) == 1
+    assert executor.execute(INSERT, ("stop2", 1), commit=True) == 1
+    connection.cursor.assert_called_once_with(prepared=True)
+    prepared_cursor = executor._get_statement_cache(connection)[INSERT][0]
+    assert prepared_cursor.execute.call_count == 2
+    # the cursor re-prepares unless it gets the identical string object
+    assert prepared_cursor.execute.call_args_list[0][0][0] is prepared_cursor.execute.call_args_list[1][0][0]
+    prepared_cursor.close.assert_not_called()
+    connection.rollback.assert_not_called()
+
+
+def test_statement_cache_evicts_least_recently_used(connection):
+    executor = executor_for(connection, 2)
+    statements = [INSERT + " -- {}".format(index) for index in range(3)]
+    for sql in statements[:2]:
+        executor.execute(sql, ("stop", 1), commit=True)
+    first_cursor = executor._get_statement_cache(connection)[statements[0]][0]
+    executor.execute(statements[2], ("stop", 1), commit=True)
+    assert list(executor._get_statement_cache(connection)) == statements[1:]
+    first_cursor.close.assert_called_once()
+
+
+def test_reads_end_their_transaction_without_session_reset(connection):
+    executor = executor_for(connection, 2)
+    executor.execute("SELECT 1")
+    connection.cursor.assert_called_once_with()
+    connection.rollback.assert_called_once()
+
+    executor = executor_for(connection, 0)
+    connection.rollback.reset_mock()
+    executor.execute(INSERT, ("stop1", 1), commit=True)
+    executor.execute("SELECT 1")
+    connection.rollback.assert_not_called()
+
+
+def test_stream_yields_chunks(connection):
+    cursor = MagicMock()
+    cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+    connection.cursor.side_effect = None
+    connection.cursor.return_value = cursor
+    executor = executor_for(connection, 0)
+    assert list(executor.execute_stream("SELECT spawnpoint FROM trs_spawn", chunk_size=2)) == [[(1,), (2,)], [(3,)]]
+    connection.cursor.assert_called_once_with(buffered=False)
+    cursor.fetchmany.assert_called_with(2)
+    connection.close.assert_called_once()
+    assert executor.get_statement_statistics()[0]["rows"] == 3
+
+
+def test_statement_statistics():
+    statistics = StatementStatistics(max_statements=2)
+    statistics.record("a", 0.001, rows=1)
+    statistics.record("b", 0.010, rows=5)
+    statistics.record("a", 0.003, failed=True)
+    statistics.record("c", 0.002)
+    result = statistics.get()
+    assert [entry["statement"] for entry in result] == ["b", "a", StatementStatistics.OTHER_STATEMENTS]
+    assert result[1] == {"statement": "a", "calls": 2, "rows": 1, "failures": 1, "total_ms": 4.0, "avg_ms": 2.0,
+                         "max_ms": 3.0}
+    assert statistics.get(limit=1)[0]["statement"] == "b"
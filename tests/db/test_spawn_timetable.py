@@ -0,0 +1,137 @@
+import copy
+import pickle
+import random
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from mapadroid.cache.spawntimetable import SpawnTimetable, SpawnTimetables
+from mapadroid.db.DbWrapper import DbWrapper
+from mapadroid.geofence.geofenceHelper import GeofenceHelper
+from tests.conftest import args
+
+FENCE = {"fence_data": ["[area]", "50.0,7.0", "50.0,7.3", "50.3,7.3", "50.3,7.0"]}
+NOW = datetime(2021, 3, 4, 13, 27, 41, 370000).timestamp()
+
+
+def random_spawns(amount: int, seed: int = 1):
+    rng = random.Random(seed)
+    last_scanned = datetime.fromtimestamp(NOW) - timedelta(days=1)
+    spawns = [[spawnpoint, 49.95 + rng.random() * 0.4, 6.95 + rng.random() * 0.4, rng.choice((15, 240, 240)),
+               "{:02}:{:02}".format(rng.randrange(60), rng.randrange(60)), last_scanned, None]
+              for spawnpoint in range(amount)]
+    # despawning around the time looked up
+    spawns[0][4], spawns[1][4], spawns[2][4] = "27:40", "27:41", "27:42"
+    return spawns
+
+
+class FakeDb:
+    def __init__(self, spawns):
+        self.spawns = spawns
+        self.queries = []
+
+    def execute(self, sql, args=None, commit=False, **kwargs):
+        self.queries.append((sql, args))
+        if args is None:
+            return [tuple(spawn[1:5]) for spawn in self.spawns]
+        if "last_scanned >=" in sql:
+            since = args[-1]
+            return [tuple(spawn) for spawn in self.spawns
+                    if any(last_seen is not None and last_seen >= since for last_seen in spawn[5:])]
+        return [tuple(spawn) for spawn in self.spawns]
+
+
+def create_db_wrapper(fake_db):
+    db_exec = MagicMock()
+    db_exec.execute.side_effect = fake_db.execute
+    db_args = copy.copy(args)
+    db_args.spawn_timetable_interval = 60
+    with patch("mapadroid.db.DbWrapper.DbSanityCheck"):
+        return DbWrapper(db_exec, db_args)
+
+
+def next_spawns_at(db_wrapper, geofence_helper, current_time, timetable: bool, within=None):
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(current_time)
+
+    db_wrapper.application_args.spawn_timetable_interval = 60 if timetable else 0
+    with patch("mapadroid.db.DbWrapper.datetime", FixedDatetime), \
+            patch("mapadroid.db.DbWrapper.time.time", return_value=current_time):
+        next_spawns = db_wrapper.retrieve_next_spawns(geofence_helper, within=within)
+    return [(timestamp, location.lat, location.lng) for timestamp, location in next_spawns]
+
+
+def test_timetable_matches_former_spawn_times():
+    fake_db = FakeDb(random_spawns(3000))
+    db_wrapper = create_db_wrapper(fake_db)
+    geofence_helper = GeofenceHelper(FENCE, None)
+    for offset in (0, 0.63, 1, 19, 59, 60, 1234.5, 1938, 3599):
+        current_time = NOW + offset
+        expected = sorted(next_spawns_at(db_wrapper, geofence_helper, current_time, timetable=False))
+        from_timetable = next_spawns_at(db_wrapper, geofence_helper, current_time, timetable=True)
+        # the earliest first
+        assert [timestamp for timestamp, _, _ in from_timetable] == [timestamp for timestamp, _, _ in expected]
+        assert sorted(from_timetable) == expected
+        for within in (0, 300, 1800):
+            from_timetable = next_spawns_at(db_wrapper, geofence_helper, current_time, timetable=True, within=within)
+            assert sorted(from_timetable) == sorted(next_spawns_at(db_wrapper, geofence_helper, current_time,
+                                                                   timetable=False, within=within))
+
+
+def test_timetable_is_refreshed_from_db():
+    spawns = random_spawns(200)
+    fake_db = FakeDb(spawns)
+    db_wrapper = create_db_wrapper(fake_db)
+    geofence_helper = GeofenceHelper(FENCE, None)
+    next_spawns_at(db_wrapper, geofence_helper, NOW, timetable=True)
+    assert len(fake_db.queries) == 1
+
+    # within the interval the timetable is not refreshed
+    next_spawns_at(db_wrapper, geofence_helper, NOW + 30, timetable=True)
+    assert len(fake_db.queries) == 1
+
+    # a despawn time learned and a spawnpoint of an hour
+    learned = datetime.fromtimestamp(NOW + 40)
+    spawns.append([1000, 50.1, 7.1, 240, "12:34", learned, None])
+    spawns[5][3], spawns[5][6] = 15, learned
+    current_time = NOW + 90
+    assert sorted(next_spawns_at(db_wrapper, geofence_helper, current_time, timetable=True)) == \
+        sorted(next_spawns_at(db_wrapper, geofence_helper, current_time, timetable=False))
+    sql, query_args = fake_db.queries[1]
+    assert "last_scanned >=" in sql
+    assert query_args[-1] == datetime.fromtimestamp(NOW) - timedelta(days=1, seconds=300)
+
+    # loaded again once the event changed
+    db_wrapper.set_event_id(5)
+    next_spawns_at(db_wrapper, geofence_helper, current_time + 1, timetable=True)
+    assert "last_scanned >=" not in fake_db.queries[-1][0]
+    assert fake_db.queries[-1][1][-1] == 5
+
+
+def test_timetable_updates():
+    spawn_timetable = SpawnTimetable()
+    assert spawn_timetable.update([(1, 50.0, 7.0, 240, "30:00"), (2, 50.1, 7.1, 240, None),
+                                   (3, 50.2, 7.2, 240, "61:00")]) == 1
+    # despawning 30:00, spawned at 00:00 - due in the next hour
+    current_time = datetime(2021, 3, 4, 13, 15).timestamp()
+    assert [timestamp for timestamp, _ in spawn_timetable.get_next_spawns(current_time=current_time)] == \
+        [datetime(2021, 3, 4, 14, 0).timestamp()]
+    spawn_timetable.update([(1, 50.0, 7.0, 15, "30:00")])
+    assert [timestamp for timestamp, _ in spawn_timetable.get_next_spawns(current_time=current_time)] == \
+        [datetime(2021, 3, 4, 13, 30).timestamp()]
+    assert spawn_timetable.get_next_spawns(within=600, current_time=current_time) == []
+    assert spawn_timetable.remove(1)
+    assert spawn_timetable.get_next_spawns(current_time=current_time) == []
+
+
+def test_timetables_are_not_pickled():
+    spawn_timetables = SpawnTimetables()
+    geofence_helper = GeofenceHelper(FENCE, None)
+    spawn_timetable = spawn_timetables.get(geofence_helper)
+    spawn_timetable.update([(1, 50.0, 7.0, 240, "30:00")])
+    assert spawn_timetables.get(geofence_helper) is spawn_timetable
+    assert len(pickle.loads(pickle.dumps(spawn_timetable))) == 0
+    assert len(pickle.loads(pickle.dumps(spawn_timetables))) == 0
+    del geofence_helper
+    assert len(spawn_timetables) == 0
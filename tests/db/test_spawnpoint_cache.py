@@ -0,0 +1,38 @@
+from unittest.mock import MagicMock
+
+from mapadroid.cache.spawnpointcache import SpawnpointCache
+from mapadroid.db.DbPogoProtoSubmit import DbPogoProtoSubmit
+from tests.conftest import args
+
+
+def test_spawnpoint_cache_lru_and_counters():
+    cache = SpawnpointCache(maxsize=2)
+    cache.set(1, "10:00")
+    cache.set(2, None)
+    cache.set(3, "20:00")
+    found, missing = cache.get_many([1, 2, 3, 3])
+    assert found == {2: None, 3: "20:00"}
+    assert missing == [1]
+    assert cache.get_statistics()["hits"] == 2
+    assert cache.get_statistics()["misses"] == 1
+
+
+def test_spawnpoint_cache_expires_unknown_despawn_times():
+    cache = SpawnpointCache(maxsize=10, unknown_ttl=-1)
+    cache.set(1, None)
+    cache.set(2, "10:00")
+    assert cache.get_many([1, 2])[1] == [1]
+
+
+def test_proto_submit_fetches_missing_spawnpoints_in_bulk():
+    db_exec = MagicMock()
+    db_exec.execute.return_value = [(1, "12:34")]
+    proto_submit = DbPogoProtoSubmit(db_exec, args)
+
+    assert proto_submit._get_detected_endtime(1) == "12:34"
+    assert proto_submit._get_despawn_times([1, 2]) == {1: "12:34", 2: None}
+    assert db_exec.execute.call_count == 2
+    assert db_exec.execute.call_args[0][1] == (2,)
+
+    assert proto_submit._get_detected_endtime(2) is False
+    assert db_exec.execute.call_count == 2
@@ -0,0 +1,49 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from mapadroid.db.DbPogoProtoSubmit import DbPogoProtoSubmit
+from mapadroid.utils.s2Helper import S2Helper
+from tests.conftest import args
+
+
+def gmo(*wild_mons):
+    return {"cells": [{"wild_pokemon": [{"spawnpoint_id": spawnpoint_id, "time_till_hidden": time_till_hidden}
+                                        for spawnpoint_id, time_till_hidden in wild_mons]}]}
+
+
+def test_spawndef_bit_math():
+    proto_submit = DbPogoProtoSubmit(MagicMock(), args)
+    for pos in (4, 5, 6, 7):
+        for spawndef in range(256):
+            # bits counted from the highest one
+            expected = list("{:08b}".format(spawndef))
+            expected[pos - 4] = "0"
+            expected[pos] = "1"
+            assert proto_submit._set_spawn_see_minutesgroup(spawndef, pos) == int("".join(expected), 2)
+    assert proto_submit._set_spawn_see_minutesgroup(240, None) == 240
+
+
+def test_spawnpoints_are_written_with_one_statement():
+    db_exec = MagicMock()
+    # active event
+    db_exec.execute.side_effect = [[(5,)]]
+    proto_submit = DbPogoProtoSubmit(db_exec, args)
+    proto_submit._get_current_spawndef_pos = lambda: 4
+
+    proto_dt = datetime(2021, 1, 1, 12, 0, 0)
+    proto_submit.spawnpoints("origin", gmo(("89c2590b", 60000), ("89c2590d", -1)), proto_dt)
+
+    assert db_exec.executemany.call_count == 1
+    sql, rows = db_exec.executemany.call_args[0][:2]
+    assert "trs_event" not in sql
+    # the bit of the quarter is merged into the spawndef stored, not overwritten by a value read before
+    assert "spawndef=IF(eventid <> 1, (spawndef & {}) | 8, spawndef)".format(255 & ~128) in sql
+    lat, lng = S2Helper.get_position_from_spawnpoint("89c2590b")
+    assert rows[0] == (int("89c2590b", 16), lat, lng, 60000, "2021-01-01 12:00:00", None, (240 & ~128) | 8, "01:00",
+                       5)
+    assert rows[1][3:] == (99999999, None, "2021-01-01 12:00:00", (240 & ~128) | 8, None, 5)
+
+    # the active event is not looked up again, the spawndefs are not read at all
+    proto_submit.spawnpoints("origin", gmo(("89c2590b", 60000)), proto_dt)
+    assert db_exec.execute.call_count == 1
+    assert proto_submit._get_detected_endtime(int("89c2590b", 16)) == "01:00"
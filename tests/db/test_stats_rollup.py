@@ -0,0 +1,129 @@
+from unittest.mock import MagicMock
+
+import mapadroid.db.DbStatsRollup as DbStatsRollupModule
+from mapadroid.db.DbStatsReader import DbStatsReader
+from mapadroid.db.DbStatsRollup import (DAY, HOUR, ROLLUPS, DbStatsRollup,
+                                        split_by_rollup)
+
+NOW = 10 * DAY + 5 * HOUR + 1200
+
+
+def rollup_with_rows(folded_until, rows_by_table):
+    """
+    Rollup reading from a fake database, rows_by_table maps the table queried to its rows grouped by hour or day
+    """
+    db_exec = MagicMock()
+
+    def execute(query, args=None, **kwargs):
+        if query.startswith("SELECT folded_until"):
+            return [(folded_until,)]
+        for table, rows in rows_by_table.items():
+            if "FROM {} ".format(table) in query:
+                return [row for row in rows if args[0] <= row[0] < args[1]]
+        return []
+
+    db_exec.execute.side_effect = execute
+    return DbStatsRollup(db_exec), db_exec
+
+
+def test_split_by_rollup_uses_daily_rollups_for_complete_days():
+    start = 7 * DAY + 3 * HOUR + 600
+    folded_until = 10 * DAY + 4 * HOUR
+    ranges = split_by_rollup(start, folded_until, NOW)
+    assert ranges == [
+        ("raw", start, 7 * DAY + 4 * HOUR),
+        ("hourly", 7 * DAY + 4 * HOUR, 8 * DAY),
+        ("daily", 8 * DAY, 10 * DAY),
+        ("hourly", 10 * DAY, folded_until),
+        ("raw", folded_until, NOW)
+    ]
+    # the ranges cover [start, end) without gaps
+    assert all(previous[2] == following[1] for previous, following in zip(ranges, ranges[1:]))
+
+
+def test_split_by_rollup_hourly_only():
+    start = 10 * DAY
+    assert split_by_rollup(start, 10 * DAY + 4 * HOUR, NOW, use_daily=False) == [
+        ("hourly", start, 10 * DAY + 4 * HOUR),
+        ("raw", 10 * DAY + 4 * HOUR, NOW)
+    ]
+
+
+def test_split_by_rollup_without_rollups_reads_raw():
+    assert split_by_rollup(8 * DAY, 0, NOW) == [("raw", 8 * DAY, NOW)]
+
+
+def test_aggregate_merges_rollups_and_raw(monkeypatch):
+    monkeypatch.setattr(DbStatsRollupModule.time, "time", lambda: NOW)
+    folded_until = 10 * DAY + 4 * HOUR
+    rollup, db_exec = rollup_with_rows(folded_until, {
+        "trs_stats_detect_daily": [(9 * DAY, "worker1", 10, 5, 1, 2)],
+        "trs_stats_detect_hourly": [(10 * DAY + HOUR, "worker1", 1, 1, 0, 0),
+                                    (10 * DAY + HOUR, "worker2", 3, 0, 0, 0)],
+        "trs_stats_detect": [(folded_until, "worker1", 2, 1, 1, None)]
+    })
+    groups = rollup.aggregate("detect", 8 * DAY + HOUR, ["worker"], filters={"worker": ("worker1", "worker2")})
+    assert groups == [
+        {"worker": "worker1", "period": 9 * DAY, "mon": 13, "mon_iv": 7, "raid": 2, "quest": 2},
+        {"worker": "worker2", "period": 10 * DAY + HOUR, "mon": 3, "mon_iv": 0, "raid": 0, "quest": 0}
+    ]
+    for call in db_exec.execute.call_args_list[1:]:
+        assert "worker IN (%s, %s)" in call[0][0]
+        assert call[0][1][-2:] == ("worker1", "worker2")
+
+
+def test_aggregate_by_hour_keeps_hours_apart(monkeypatch):
+    monkeypatch.setattr(DbStatsRollupModule.time, "time", lambda: NOW)
+    folded_until = 10 * DAY + 4 * HOUR
+    rollup, _ = rollup_with_rows(folded_until, {
+        "trs_stats_detect_hourly": [(10 * DAY + HOUR, "worker1", 1, 1, 0, 0)],
+        "trs_stats_detect": [(folded_until, "worker1", 2, 1, 1, 0)]
+    })
+    groups = rollup.aggregate("detect", 10 * DAY, ["worker"], by_hour=True)
+    assert [(group["period"], group["mon"]) for group in groups] == [(10 * DAY + HOUR, 1), (folded_until, 2)]
+
+
+def test_fold_range_replaces_hours_and_days_in_one_batch():
+    db_exec = MagicMock()
+    db_exec.execute_batch.return_value = True
+    rollup = DbStatsRollup(db_exec)
+    assert rollup._fold_range(ROLLUPS["location"], 10 * DAY + HOUR, 10 * DAY + 3 * HOUR)
+    statements = db_exec.execute_batch.call_args[0][0]
+    # folding a range again replaces its rows instead of adding to them
+    assert not any(query.startswith("DELETE") for query, _ in statements)
+    assert statements[0][0].startswith("INSERT INTO trs_stats_location_hourly")
+    assert statements[0][0].endswith("GROUP BY bucket, worker ON DUPLICATE KEY UPDATE "
+                                     "location_count = VALUES(location_count), location_ok = VALUES(location_ok), "
+                                     "location_nok = VALUES(location_nok)")
+    assert statements[0][1] == [(10 * DAY + HOUR, 10 * DAY + 3 * HOUR)]
+    assert statements[1][0].startswith("INSERT INTO trs_stats_location_daily")
+    assert "ON DUPLICATE KEY UPDATE location_count = VALUES(location_count)" in statements[1][0]
+    assert statements[1][1] == [(10 * DAY, 11 * DAY)]
+    assert statements[2][1] == [("location", 10 * DAY + 3 * HOUR)]
+
+
+def test_compare_reports_mismatching_groups():
+    mismatches = DbStatsRollup._compare(ROLLUPS["location"], "hourly",
+                                        [(HOUR, "worker1", 3, 2, 1), (HOUR, "worker2", 1, 1, 0)],
+                                        [(HOUR, "worker1", 3, 2, 1), (HOUR, "worker3", 1, 0, 1)])
+    assert [(mismatch["group"]["worker"], mismatch["expected"]["location_count"],
+             mismatch["actual"]["location_count"]) for mismatch in mismatches] == [("worker2", 1, 0), ("worker3", 0, 1)]
+
+
+def test_reader_keeps_result_shape():
+    stats_rollup_mock = MagicMock()
+    stats_rollup_mock.aggregate.return_value = [
+        {"period": HOUR, "worker": "worker1", "walker": "mon_mitm", "transporttype": 0, "locations": 4,
+         "data_time": 10},
+        {"period": HOUR, "worker": "worker1", "walker": "iv_mitm", "transporttype": 5, "locations": 0,
+         "data_time": 0}
+    ]
+    reader = DbStatsReader(MagicMock(), stats_rollup_mock)
+    assert reader.get_avg_data_time(minutes=60) == [
+        (HOUR, "Teleport", "worker1", 4, 2.5, "mon_mitm"),
+        (HOUR, "other", "worker1", 0, 0, "iv_mitm")
+    ]
+
+    stats_rollup_mock.aggregate.return_value = [{"period": HOUR, "worker": "worker1", "location_count": 4,
+                                                 "location_ok": 3, "location_nok": 1}]
+    assert reader.get_location_info() == [("worker1", 4, 3, 1, 25.0)]
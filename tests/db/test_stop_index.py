@@ -0,0 +1,99 @@
+import copy
+import math
+import pickle
+import random
+from unittest.mock import MagicMock, patch
+
+from mapadroid.cache.stopindex import StopIndex
+from mapadroid.db.DbWrapper import DbWrapper
+from mapadroid.geofence.geofenceHelper import GeofenceHelper
+from tests.conftest import args
+
+FENCE = {"fence_data": ["[area]", "50.0,7.0", "50.0,7.3", "50.3,7.3", "50.3,7.0"]}
+
+
+def random_stops(amount: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [("stop{}".format(index), 49.9 + rng.random() * 0.5, 6.9 + rng.random() * 0.5) for index in range(amount)]
+
+
+def brute_force_nearest(stops, lat, lng, limit, exclude=(), max_distance=None):
+    candidates = sorted((math.hypot(stop_lat - lat, stop_lng - lng), stop_id) for stop_id, stop_lat, stop_lng in stops
+                        if stop_id not in exclude)
+    return [stop_id for distance, stop_id in candidates
+            if max_distance is None or distance <= max_distance][:limit]
+
+
+def test_nearest_matches_brute_force():
+    stops = random_stops(3000)
+    stop_index = StopIndex(cell_size=0.01)
+    stop_index.update(stops)
+    excluded = {stop_id for stop_id, _, _ in stops[::3]}
+    rng = random.Random(2)
+    # positions within, at the edge of and far from the stops
+    positions = [(49.9 + rng.random() * 0.5, 6.9 + rng.random() * 0.5) for _ in range(50)]
+    positions += [(48.0, 5.0), (50.15, 8.0)]
+    for lat, lng in positions:
+        for limit in (1, 5, 30):
+            assert [stop_id for stop_id, _, _ in stop_index.nearest(lat, lng, limit)] == \
+                brute_force_nearest(stops, lat, lng, limit)
+            assert [stop_id for stop_id, _, _ in stop_index.nearest(lat, lng, limit, exclude=excluded)] == \
+                brute_force_nearest(stops, lat, lng, limit, exclude=excluded)
+        assert [stop_id for stop_id, _, _ in stop_index.nearest(lat, lng, 50, max_distance=0.02)] == \
+            brute_force_nearest(stops, lat, lng, 50, max_distance=0.02)
+        assert sorted(stop_id for stop_id, _, _ in stop_index.within(lat, lng, 0.03)) == \
+            sorted(brute_force_nearest(stops, lat, lng, len(stops), max_distance=0.03))
+    assert len(stop_index.nearest(50.0, 7.0, 0)) == len(stops)
+
+
+def test_fenced_index_follows_updates():
+    geofence_helper = GeofenceHelper(FENCE, None)
+    stop_index = StopIndex()
+    stop_index.update([("inside", 50.1, 7.1), ("outside", 50.5, 7.5)])
+    fenced_index = stop_index.get_fenced_index(geofence_helper)
+    assert stop_index.get_fenced_index(geofence_helper) is fenced_index
+    assert [stop_id for stop_id, _, _ in fenced_index.nearest(50.1, 7.1, 10)] == ["inside"]
+
+    # moved into the fence, moved out of it and deleted
+    stop_index.update([("outside", 50.2, 7.2), ("inside", 50.6, 7.6), ("new", 50.05, 7.05)])
+    assert sorted(stop_id for stop_id, _, _ in fenced_index.nearest(50.1, 7.1, 10)) == ["new", "outside"]
+    assert stop_index.remove_at(50.05, 7.05) == ["new"]
+    assert [stop_id for stop_id, _, _ in fenced_index.nearest(50.1, 7.1, 10)] == ["outside"]
+    assert "new" not in stop_index
+
+    # every process loads its own stops
+    assert len(pickle.loads(pickle.dumps(stop_index))) == 0
+
+
+def fake_db_execute(stops, visited):
+    def execute(sql, args=None, commit=False, **kwargs):
+        if "trs_visited WHERE origin" in sql:
+            return [(stop_id,) for stop_id in visited]
+        if "BETWEEN" in sql:
+            _, min_lat, max_lat, min_lng, max_lng = args
+            return [(lat, lng) for stop_id, lat, lng in stops
+                    if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng and stop_id not in visited]
+        return [(stop_id, lat, lng, None) for stop_id, lat, lng in stops]
+    return execute
+
+
+def test_nearest_stops_of_index_and_db_match():
+    stops = random_stops(2000)
+    visited = {stop_id for stop_id, _, _ in stops[::4]}
+    geofence_helper = GeofenceHelper(FENCE, None)
+    fenced = [stop for stop in stops if geofence_helper.is_coord_inside_include_geofence(stop[1:])]
+    db_exec = MagicMock()
+    db_exec.execute.side_effect = fake_db_execute(stops, visited)
+    db_args = copy.copy(args)
+    with patch("mapadroid.db.DbWrapper.DbSanityCheck"):
+        db_wrapper = DbWrapper(db_exec, db_args)
+    locations = {(stop_lat, stop_lng): stop_id for stop_id, stop_lat, stop_lng in stops}
+
+    for lat, lng in ((50.1, 7.1), (50.29, 7.01), (49.5, 6.5)):
+        expected = brute_force_nearest(fenced, lat, lng, 30, exclude=visited)
+        db_args.stop_index_interval = 30
+        from_index = db_wrapper.get_nearest_stops_from_position(geofence_helper, "origin", lat, lng, limit=30)
+        db_args.stop_index_interval = 0
+        from_db = db_wrapper.get_nearest_stops_from_position(geofence_helper, "origin", lat, lng, limit=30)
+        assert [locations[(stop.lat, stop.lng)] for stop in from_index] == expected
+        assert [locations[(stop.lat, stop.lng)] for stop in from_db] == expected
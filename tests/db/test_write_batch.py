@@ -0,0 +1,101 @@
+import copy
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from mapadroid.db.DbPogoProtoSubmit import DbPogoProtoSubmit
+from mapadroid.db.DbWriteBatch import DbWriteBatch
+from tests.conftest import args
+
+
+def test_write_batch_deduplicates_by_key():
+    batch = DbWriteBatch()
+    batch.add("INSERT a", [(2, "old"), (1, "first")])
+    batch.add("INSERT b", [(1, "x")], key_columns=None)
+    batch.add("INSERT a", [(2, "new")])
+    batch.add("INSERT b", [(1, "x")], key_columns=None)
+    assert batch.statements() == [
+        ("INSERT a", [(1, "first"), (2, "new")]),
+        ("INSERT b", [(1, "x"), (1, "x")])
+    ]
+    assert batch.row_count == 5
+    assert batch.unique_row_count() == 4
+
+
+def test_proto_submit_defers_writes_until_flush():
+    db_exec = MagicMock()
+    db_exec.execute_batch.return_value = True
+    proto_submit = DbPogoProtoSubmit(db_exec, args)
+    cells = {"cells": [{"id": 5169891187259080704, "current_timestamp": 1600000000000}]}
+
+    proto_submit.start_write_batch()
+    proto_submit.cells("origin", cells)
+    proto_submit.cells("origin", cells)
+    db_exec.executemany.assert_not_called()
+    assert proto_submit.flush_write_batch() == 1
+    statements = db_exec.execute_batch.call_args[0][0]
+    assert len(statements) == 1
+    assert len(statements[0][1]) == 1
+
+    proto_submit.cells("origin", cells)
+    db_exec.executemany.assert_called_once()
+
+
+def test_proto_submit_falls_back_to_single_statements():
+    db_exec = MagicMock()
+    db_exec.execute_batch.return_value = False
+    proto_submit = DbPogoProtoSubmit(db_exec, args)
+    proto_submit.start_write_batch()
+    proto_submit.cells("origin", {"cells": [{"id": 5169891187259080704, "current_timestamp": 1600000000000}]})
+    proto_submit.flush_write_batch()
+    db_exec.executemany.assert_called_once()
+
+
+def test_changes_are_published_without_deferred_rows():
+    db_exec = MagicMock()
+    proto_submit = DbPogoProtoSubmit(db_exec, args)
+    change_feed = MagicMock()
+    proto_submit.set_change_feed(change_feed)
+    proto_submit.start_write_batch()
+    # e.g. an IV encounter, written directly while the batch holds no rows
+    proto_submit._record_changes("pokemon", [12345])
+    change_feed.publish.assert_not_called()
+    assert proto_submit.flush_write_batch() == 0
+    db_exec.execute_batch.assert_not_called()
+    change_feed.publish.assert_called_once_with({"pokemon": [12345]})
+
+
+def test_write_batch_merges_rows_by_key():
+    batch = DbWriteBatch()
+    batch.add("INSERT a", [(1, 5, None), (2, 1, "x")], merge=lambda previous, row: (row[0], previous[1] + row[1],
+                                                                                    row[2] or previous[2]))
+    batch.add("INSERT a", [(1, 3, "y")], merge=lambda previous, row: (row[0], previous[1] + row[1],
+                                                                      row[2] or previous[2]))
+    assert batch.statements() == [("INSERT a", [(1, 8, "y"), (2, 1, "x")])]
+
+
+def gmo(spawnpoint_id: str, time_till_hidden: int) -> dict:
+    return {"cells": [{"wild_pokemon": [{"spawnpoint_id": spawnpoint_id, "time_till_hidden": time_till_hidden}]}]}
+
+
+def test_spawnpoints_of_several_gmos_in_a_batch():
+    db_exec = MagicMock()
+    db_exec.execute.side_effect = lambda sql, args=None: [(1,)] if "trs_event" in sql else []
+    db_exec.execute_batch.return_value = True
+    batch_args = copy.copy(args)
+    # without a spawnpoint cache the despawn times are only known to the batch until it is flushed
+    batch_args.spawnpoint_cache_size = 0
+    proto_submit = DbPogoProtoSubmit(db_exec, batch_args)
+    proto_submit._get_current_spawndef_pos = lambda: 4
+    spawnpoint = int("89c2590b", 16)
+
+    proto_submit.start_write_batch()
+    proto_submit.spawnpoints("origin", gmo("89c2590b", 60000), datetime(2021, 1, 1, 12, 0, 0))
+    proto_submit.spawnpoints("origin", gmo("89c2590b", -1), datetime(2021, 1, 1, 12, 5, 0))
+    assert proto_submit._get_detected_endtime(spawnpoint) == "01:00"
+    proto_submit.flush_write_batch()
+
+    (_, rows), = db_exec.execute_batch.call_args[0][0]
+    # the spawnpoint has been seen with its despawn time and unseen later on
+    assert rows == [(spawnpoint, rows[0][1], rows[0][2], 60000, "2021-01-01 12:00:00", "2021-01-01 12:05:00",
+                     (240 & ~128) | 8, "01:00", 1)]
+    assert proto_submit._get_detected_endtime(spawnpoint) is False
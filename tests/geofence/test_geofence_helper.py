@@ -0,0 +1,57 @@
+import numpy as np
+
+from mapadroid.geofence.geofenceHelper import GeofenceHelper
+from mapadroid.utils.collections import Location
+
+# a concave area with a notch from the north and an excluded square inside
+INCLUDE = {"fence_data": ["[area]", "50.0,7.0", "50.0,7.4", "50.4,7.4", "50.4,7.25", "50.1,7.2", "50.4,7.15",
+                          "50.4,7.0", "[second]", "51.0,8.0", "51.0,8.1", "51.1,8.1"]}
+EXCLUDE = {"fence_data": ["[excluded]", "50.02,7.02", "50.02,7.08", "50.08,7.08", "50.08,7.02"]}
+
+
+def ray_casting(lat, lon, polygon):
+    # the former per coordinate check
+    inside = False
+    lat1, lon1 = polygon[0]['lat'], polygon[0]['lon']
+    for index in range(1, len(polygon) + 1):
+        lat2, lon2 = polygon[index % len(polygon)]['lat'], polygon[index % len(polygon)]['lon']
+        if min(lon1, lon2) < lon <= max(lon1, lon2) and lat <= max(lat1, lat2):
+            if lon1 != lon2:
+                lat_intersection = (lon - lon1) * (lat2 - lat1) / (lon2 - lon1) + lat1
+            if lat1 == lat2 or lat <= lat_intersection:
+                inside = not inside
+        lat1, lon1 = lat2, lon2
+    return inside
+
+
+def expected_inside(helper, lat, lon):
+    if any(ray_casting(lat, lon, area['polygon']) for area in helper.excluded_areas):
+        return False
+    return any(ray_casting(lat, lon, area['polygon']) for area in helper.geofenced_areas)
+
+
+def test_mask_matches_single_coordinate_checks():
+    helper = GeofenceHelper(INCLUDE, EXCLUDE)
+    rng = np.random.default_rng(1)
+    coordinates = np.column_stack((49.9 + rng.random(5000) * 1.3, 6.9 + rng.random(5000) * 1.3))
+    # vertices and points on edges
+    coordinates = np.concatenate((coordinates, [[50.0, 7.0], [50.4, 7.2], [50.1, 7.2], [50.0, 7.2], [50.05, 7.02]]))
+
+    mask = helper.get_geofenced_mask(coordinates)
+    expected = [expected_inside(helper, lat, lon) for lat, lon in coordinates.tolist()]
+    assert mask.tolist() == expected
+    assert [helper.is_coord_inside_include_geofence(coordinate) for coordinate in coordinates.tolist()] == expected
+    assert 0 < mask.sum() < len(coordinates)
+
+
+def test_geofenced_coordinates_keep_tuples():
+    helper = GeofenceHelper(INCLUDE, EXCLUDE)
+    coordinates = [Location(50.3, 7.05), Location(50.3, 7.2), Location(50.05, 7.05), (51.05, 8.09, "extra")]
+    assert helper.get_geofenced_coordinates(coordinates) == [Location(50.3, 7.05), (51.05, 8.09, "extra")]
+    assert helper.get_geofenced_coordinates([]) == []
+
+
+def test_without_include_geofence_only_excludes():
+    helper = GeofenceHelper(None, EXCLUDE)
+    assert helper.get_geofenced_mask(np.array([[50.05, 7.05], [10.0, 10.0]])).tolist() == [False, True]
+    assert helper.is_coord_inside_include_geofence([10.0, 10.0])
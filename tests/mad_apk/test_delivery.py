@@ -0,0 +1,134 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+
+from mapadroid.mad_apk.apk_enums import APKArch, APKType
+from mapadroid.mad_apk.custom_types import MADPackage, MADPackages
+from mapadroid.mad_apk.delivery import PackageCache, iter_byte_range
+from mapadroid.mad_apk.utils import generator_from_db, stream_package
+
+CHUNKS = [b"abcd", b"efgh", b"ij"]
+CONTENT = b"".join(CHUNKS)
+
+
+class FakeDb:
+    def __init__(self):
+        self.streams = 0
+        self.stream_args = None
+
+    def autofetch_value(self, sql, args=()):
+        return 1
+
+    def execute(self, sql, args=None):
+        return [(chunk_id, len(chunk)) for chunk_id, chunk in enumerate(CHUNKS)]
+
+    def execute_stream(self, sql, args=None, chunk_size=1000):
+        self.streams += 1
+        self.stream_args = args
+        for chunk in CHUNKS[args[1]:args[2] + 1]:
+            yield [(chunk,)]
+
+
+def storage(storage_type="db"):
+    storage_obj = MagicMock()
+    storage_obj.get_storage_type.return_value = storage_type
+    storage_obj.token.return_value = None
+    packages = MADPackages()
+    packages[APKArch.noarch] = MADPackage(APKType.rgc, APKArch.noarch, version="1.0", size=len(CONTENT),
+                                          mimetype="application/vnd.android.package-archive", filename="rgc.apk")
+    storage_obj.get_current_package_info.return_value = packages
+    return storage_obj
+
+
+def download(headers=None, package_cache=None, db=None):
+    app = Flask("test")
+    with app.test_request_context("/mad_apk/rgc/download", headers=headers or {}):
+        response = stream_package(db or FakeDb(), storage(), APKType.rgc, APKArch.noarch, package_cache)
+        return response, b"".join(response.response)
+
+
+def test_iter_byte_range():
+    assert b"".join(iter_byte_range(CHUNKS)) == CONTENT
+    assert b"".join(iter_byte_range(CHUNKS, 3, 9)) == CONTENT[3:9]
+    assert b"".join(iter_byte_range(CHUNKS, 4, 8)) == CONTENT[4:8]
+    assert b"".join(iter_byte_range(CHUNKS, 9)) == CONTENT[9:]
+
+
+def test_generator_from_db_starts_at_the_chunk_of_the_range():
+    assert b"".join(generator_from_db(FakeDb(), APKType.rgc, APKArch.noarch)) == CONTENT
+    db = FakeDb()
+    assert b"".join(generator_from_db(db, APKType.rgc, APKArch.noarch, 5, 9)) == CONTENT[5:9]
+    assert db.stream_args == (1, 1, 2)
+    # the chunks after the range are not fetched
+    assert b"".join(generator_from_db(db, APKType.rgc, APKArch.noarch, 1, 3)) == CONTENT[1:3]
+    assert db.stream_args == (1, 0, 0)
+    assert b"".join(generator_from_db(db, APKType.rgc, APKArch.noarch, 4, 8)) == CONTENT[4:8]
+    assert db.stream_args == (1, 1, 1)
+
+
+def test_full_download():
+    response, body = download()
+    assert response.status_code == 200
+    assert body == CONTENT
+    assert response.headers["Content-Length"] == str(len(CONTENT))
+    assert response.headers["Accept-Ranges"] == "bytes"
+
+
+def test_range_download():
+    response, body = download({"Range": "bytes=3-"})
+    assert response.status_code == 206
+    assert body == CONTENT[3:]
+    assert response.headers["Content-Range"] == "bytes 3-9/10"
+
+    # a range of another version of the package is ignored
+    response, body = download({"Range": "bytes=3-", "If-Range": '"outdated"'})
+    assert response.status_code == 200
+    assert body == CONTENT
+
+    response, _ = download({"Range": "bytes=20-"})
+    assert response.status_code == 416
+
+
+def test_cache_loads_package_once():
+    db = FakeDb()
+    package_cache = PackageCache(1024)
+    results = []
+
+    def request_package(headers):
+        results.append(download(headers, package_cache, db)[1])
+
+    threads = [threading.Thread(target=request_package, args=({"Range": "bytes={}-".format(start)},))
+               for start in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results, key=len, reverse=True) == [CONTENT[start:] for start in range(5)]
+    assert db.streams == 1
+
+
+def test_cache_is_bounded():
+    package_cache = PackageCache(15)
+    first = package_cache.get((1, 0, "1.0", 10), lambda: CHUNKS)
+    assert b"".join(first.iter_chunks()) == CONTENT
+    # packages larger than the cache are not cached
+    assert package_cache.get((2, 0, "1.0", 20), lambda: CHUNKS) is None
+    # a new version replaces the old one
+    second = package_cache.get((1, 0, "1.1", 10), lambda: CHUNKS)
+    assert package_cache.get((1, 0, "1.1", 10), lambda: CHUNKS) is second
+    # the least recently used package is evicted
+    package_cache.get((3, 0, "1.0", 10), lambda: CHUNKS)
+    assert package_cache.get((1, 0, "1.1", 10), lambda: CHUNKS) is not second
+
+
+def test_failed_load_is_not_cached():
+    package_cache = PackageCache(100)
+    # the package is shorter than expected
+    broken = package_cache.get((1, 0, "1.0", 10), lambda: CHUNKS[:1])
+    chunks = broken.iter_chunks()
+    assert next(chunks) == CHUNKS[0]
+    with pytest.raises(IOError):
+        next(chunks)
+    assert package_cache.get((1, 0, "1.0", 10), lambda: CHUNKS) is not broken
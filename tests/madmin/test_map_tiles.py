@@ -0,0 +1,115 @@
+import time
+from unittest.mock import MagicMock
+
+from mapadroid.madmin import maptiles
+from mapadroid.madmin.maptiles import (MapLayer, MapTileService,
+                                       parse_tile_cursors, tile_bounds,
+                                       tile_of, tiles_in_bounds, to_columns)
+
+BOUNDS = (50.95, 6.98, 50.93, 6.95)
+
+
+def stop(stop_id, latitude=50.94, longitude=6.96, has_quest=False):
+    return {"pokestop_id": stop_id, "latitude": latitude, "longitude": longitude, "has_quest": has_quest}
+
+
+def service_with_stops(stops):
+    db = MagicMock()
+    db.get_stops_in_rectangle.side_effect = lambda *args, **kwargs: [dict(entry) for entry in stops]
+    return MapTileService(db, MagicMock()), db
+
+
+def objects_of(response):
+    return [dict(zip(response["columns"], row)) for row in response["rows"]]
+
+
+def test_tile_of_lies_within_its_bounds():
+    tile = tile_of(50.94, 6.96)
+    ne_lat, ne_lon, sw_lat, sw_lon = tile_bounds(*tile)
+    assert sw_lat <= 50.94 <= ne_lat
+    assert sw_lon <= 6.96 <= ne_lon
+    assert tile in tiles_in_bounds(*BOUNDS)
+
+
+def test_tiles_in_bounds_covers_viewport():
+    tiles = tiles_in_bounds(*BOUNDS)
+    columns = {tile[0] for tile in tiles}
+    rows = {tile[1] for tile in tiles}
+    assert len(tiles) == len(columns) * len(rows)
+    assert tile_of(BOUNDS[0], BOUNDS[3]) in tiles
+    assert tile_of(BOUNDS[2], BOUNDS[1]) in tiles
+
+
+def test_parse_tile_cursors():
+    assert parse_tile_cursors("1_2,3_4:7,broken,5_x", "5") == {(1, 2): 5, (3, 4): 7}
+    assert parse_tile_cursors(None, "5") == {}
+
+
+def test_to_columns():
+    columns, rows = to_columns([{"a": 1, "b": 2}, {"b": 3, "c": 4}])
+    assert columns == ["a", "b", "c"]
+    assert rows == [[1, 2, None], [None, 3, 4]]
+
+
+def test_changes_since_cursor():
+    stops = [stop("a"), stop("b")]
+    service, db = service_with_stops(stops)
+
+    first = service.get_changes("stops", *BOUNDS)
+    assert sorted(entry["pokestop_id"] for entry in objects_of(first)) == ["a", "b"]
+    # tiles are loaded with a single query
+    assert db.get_stops_in_rectangle.call_count == 1
+    assert db.get_stops_in_rectangle.call_args[1]["timestamp"] is None
+
+    # nothing changed since the cursor and the tiles are still fresh
+    cursors = parse_tile_cursors(",".join(first["tiles"]), str(first["cursor"]))
+    second = service.get_changes("stops", *BOUNDS, cursors)
+    assert second["rows"] == []
+    assert second["cursor"] > first["cursor"]
+    assert db.get_stops_in_rectangle.call_count == 1
+
+
+def test_outdated_tiles_only_load_changes(monkeypatch):
+    stops = [stop("a"), stop("b")]
+    service, db = service_with_stops(stops)
+    first = service.get_changes("stops", *BOUNDS)
+    cursors = parse_tile_cursors(",".join(first["tiles"]), str(first["cursor"]))
+
+    stops[1] = stop("b", has_quest=True)
+    now = time.time()
+    monkeypatch.setattr(maptiles.time, "time", lambda: now + 31)
+    second = service.get_changes("stops", *BOUNDS, cursors)
+    assert db.get_stops_in_rectangle.call_args[1]["timestamp"] is not None
+    assert objects_of(second) == [stops[1]]
+
+
+def test_full_reload_reports_removed_objects(monkeypatch):
+    stops = [stop("a"), stop("b")]
+    service, db = service_with_stops(stops)
+    first = service.get_changes("stops", *BOUNDS)
+    cursors = parse_tile_cursors(",".join(first["tiles"]), str(first["cursor"]))
+
+    del stops[0]
+    now = time.time()
+    monkeypatch.setattr(maptiles.time, "time", lambda: now + maptiles.FULL_RELOAD_INTERVAL + 1)
+    second = service.get_changes("stops", *BOUNDS, cursors)
+    assert db.get_stops_in_rectangle.call_args[1]["timestamp"] is None
+    assert second["rows"] == []
+    assert second["removed"] == ["a"]
+
+
+def test_expired_objects_are_removed():
+    now = time.time()
+    entries = [("a", 50.94, 6.96, {"id": "a", "end": now + 60}), ("b", 50.94, 6.96, {"id": "b", "end": now - 1})]
+    service = MapTileService(MagicMock(), MagicMock())
+    service.register_layer(MapLayer("test", 60, lambda *args: entries, lambda obj, now: obj["end"] <= now))
+
+    response = service.get_changes("test", *BOUNDS)
+    assert [entry["id"] for entry in objects_of(response)] == ["a"]
+
+
+def test_too_many_tiles_are_refused():
+    service, db = service_with_stops([stop("a")])
+    response = service.get_changes("stops", 60.0, 20.0, 40.0, 0.0)
+    assert response["too_many_tiles"]
+    db.get_stops_in_rectangle.assert_not_called()
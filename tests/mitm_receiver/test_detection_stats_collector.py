@@ -0,0 +1,66 @@
+import time
+from unittest.mock import MagicMock
+
+from mapadroid.mitm_receiver.DetectionStatsCollector import \
+    DetectionStatsCollector
+from tests.conftest import args
+
+
+def get_collector(game_stats=True, game_stats_raw=True):
+    collector_args = MagicMock(game_stats=game_stats, game_stats_raw=game_stats_raw,
+                               game_stats_save_time=args.game_stats_save_time)
+    db_stats_submit = MagicMock()
+    return DetectionStatsCollector(collector_args, db_stats_submit), db_stats_submit
+
+
+def collect_some(collector):
+    collector.collect_mon("origin", "1")
+    collector.collect_mon("origin", "1")
+    collector.collect_mon("origin", "2")
+    collector.collect_mon_iv("origin", "1", 1)
+    collector.collect_raid("origin", "gym")
+    collector.collect_quest("origin", "stop")
+    collector.collect_quest("other", "stop")
+
+
+def test_flush_only_when_due(monkeypatch):
+    collector, db_stats_submit = get_collector()
+    now = time.mktime((2020, 1, 1, 12, 10, 0, 0, 0, -1))
+    monkeypatch.setattr(time, "time", lambda: now)
+    collect_some(collector)
+
+    collector.flush_due("origin")
+    db_stats_submit.submit_stats_complete.assert_not_called()
+
+    monkeypatch.setattr(time, "time", lambda: now + args.game_stats_save_time)
+    collector.flush_due("origin")
+    db_stats_submit.submit_stats_complete.assert_called_once_with(
+        [("origin", str(int(now + args.game_stats_save_time)), "1", "2", "1", "1")])
+    rows = db_stats_submit.submit_stats_detections_raw.call_args[0][0]
+    assert sorted(row[1:5] for row in rows) == [("1", "mon", "2", 0), ("1", "mon_iv", "1", 1),
+                                                ("2", "mon", "1", 0), ("gym", "raid", "1", 0),
+                                                ("stop", "quest", "1", 0)]
+
+    # the counters start over after a flush
+    db_stats_submit.reset_mock()
+    collector.flush_due("origin")
+    db_stats_submit.submit_stats_complete.assert_not_called()
+
+
+def test_flush_at_the_start_of_an_hour(monkeypatch):
+    collector, db_stats_submit = get_collector(game_stats_raw=False)
+    now = time.mktime((2020, 1, 1, 12, 59, 50, 0, 0, -1))
+    monkeypatch.setattr(time, "time", lambda: now)
+    collect_some(collector)
+    monkeypatch.setattr(time, "time", lambda: now + 20)
+    collector.flush_due("other")
+    db_stats_submit.submit_stats_complete.assert_called_once_with(
+        [("other", str(int(now + 20)), "0", "0", "0", "1")])
+    db_stats_submit.submit_stats_detections_raw.assert_not_called()
+
+
+def test_disabled_game_stats_collect_nothing():
+    collector, db_stats_submit = get_collector(game_stats=False)
+    collect_some(collector)
+    collector.flush_all()
+    db_stats_submit.submit_stats_complete.assert_not_called()
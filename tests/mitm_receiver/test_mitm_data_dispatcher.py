@@ -0,0 +1,146 @@
+import time
+from queue import Empty
+from unittest.mock import MagicMock
+
+import pytest
+
+from mapadroid.mitm_receiver.MitmDataDispatcher import MitmDataDispatcher
+from mapadroid.mitm_receiver.MitmDataProcessorManager import \
+    MitmDataProcessorManager
+
+ORIGINS = ["device{}".format(device) for device in range(200)]
+
+
+def test_origins_stick_to_their_queue():
+    dispatcher = MitmDataDispatcher(4, queue_size=10)
+    assignment = {origin: dispatcher.get_queue_index(origin) for origin in ORIGINS}
+    assert all(dispatcher.get_queue_index(origin) == index for origin, index in assignment.items())
+    assert set(assignment.values()) == {0, 1, 2, 3}
+
+    # only the origins of a disabled queue move
+    dispatcher.set_enabled(2, False)
+    moved = {origin: dispatcher.get_queue_index(origin) for origin in ORIGINS}
+    assert 2 not in moved.values()
+    assert all(moved[origin] == index for origin, index in assignment.items() if index != 2)
+
+    dispatcher.set_enabled(2, True)
+    assert {origin: dispatcher.get_queue_index(origin) for origin in ORIGINS} == assignment
+
+
+def test_items_pass_in_order_and_full_queues_drop():
+    dispatcher = MitmDataDispatcher(2, queue_size=2, put_timeout=0.01)
+    index = dispatcher.get_queue_index("device")
+    assert dispatcher.put("device", b"first")
+    assert dispatcher.put("device", b"second")
+    assert not dispatcher.put("device", b"dropped")
+    assert dispatcher.pop_dropped(index) == 1
+    assert dispatcher.pop_dropped(index) == 0
+
+    assert dispatcher.get(index) == b"first"
+    assert dispatcher.get(index) == b"second"
+    assert dispatcher.get_lag(index) >= 0
+    dispatcher.stop_processors()
+    assert dispatcher.get(index) is None
+
+
+def test_stop_signal_does_not_block_on_full_queues():
+    dispatcher = MitmDataDispatcher(2, queue_size=1, put_timeout=0.01)
+    index = dispatcher.get_queue_index("device")
+    assert dispatcher.put("device", b"data")
+    start = time.time()
+    assert dispatcher.stop_processors(timeout=0.1) == [index]
+    assert time.time() - start < 1
+
+
+def origin_of(dispatcher: MitmDataDispatcher, index: int) -> str:
+    return next(origin for origin in ORIGINS if dispatcher.get_queue_index(origin) == index)
+
+
+def test_queued_items_move_with_their_origin():
+    dispatcher = MitmDataDispatcher(2, queue_size=10)
+    origin = origin_of(dispatcher, 0)
+    for data in (b"first", b"second"):
+        dispatcher.put(origin, data)
+
+    dispatcher.set_enabled(0, False)
+    dispatcher.put(origin, b"third")
+    # the new data waits for the data queued at the old queue
+    with pytest.raises(Empty):
+        dispatcher.get(1, timeout=0.2)
+    # which is moved over by the processor of the old queue
+    with pytest.raises(Empty):
+        dispatcher.get(0, timeout=0.2)
+    assert [dispatcher.get(1, timeout=1) for _ in range(3)] == [b"first", b"second", b"third"]
+    for _ in range(3):
+        dispatcher.task_done(1)
+
+    # moving back waits for the data of the origin to be taken from its other queue
+    dispatcher.put(origin, b"fourth")
+    dispatcher.set_enabled(0, True)
+    dispatcher.put(origin, b"fifth")
+    with pytest.raises(Empty):
+        dispatcher.get(0, timeout=0.2)
+    with pytest.raises(Empty):
+        dispatcher.get(1, timeout=0.2)
+    assert [dispatcher.get(0, timeout=1) for _ in range(2)] == [b"fourth", b"fifth"]
+
+
+def test_data_held_back_during_a_handover_is_bounded():
+    dispatcher = MitmDataDispatcher(2, queue_size=2, put_timeout=0.01)
+    origin = origin_of(dispatcher, 0)
+    dispatcher.put(origin, b"first")
+    dispatcher.set_enabled(0, False)
+    for data in (b"second", b"third"):
+        dispatcher.put(origin, data)
+    with pytest.raises(Empty):
+        dispatcher.get(1, timeout=0.2)
+
+    dispatcher.put(origin, b"dropped")
+    with pytest.raises(Empty):
+        dispatcher.get(1, timeout=0.2)
+    assert dispatcher.pop_dropped(1) == 1
+
+    # the data handed over replaces the newest data held back
+    with pytest.raises(Empty):
+        dispatcher.get(0, timeout=0.2)
+    assert [dispatcher.get(1, timeout=1) for _ in range(2)] == [b"first", b"second"]
+    assert dispatcher.pop_dropped(1) == 1
+    with pytest.raises(Empty):
+        dispatcher.get(1, timeout=0.2)
+
+
+def test_overloaded_processor_is_taken_out_until_drained():
+    args = MagicMock(mitmreceiver_data_workers=2, mitm_queue_size=4, mitm_queue_timeout=0.01)
+    manager = MitmDataProcessorManager(args, MagicMock(), MagicMock(), MagicMock())
+    manager._stop_queue_check_thread = True
+    dispatcher = manager.get_dispatcher()
+    origin = origin_of(dispatcher, 0)
+    for _ in range(4):
+        dispatcher.put(origin, b"data")
+
+    manager._rebalance(0, dispatcher.get_depth(0))
+    assert not dispatcher.is_enabled(0)
+    assert dispatcher.get_queue_index(origin) == 1
+
+    with pytest.raises(Empty):
+        dispatcher.get(0, timeout=0.2)
+    assert dispatcher.get_depth(0) == 0
+    manager._rebalance(0, dispatcher.get_depth(0))
+    assert dispatcher.is_enabled(0)
+    assert dispatcher.get_queue_index(origin) == 0
+
+
+def test_items_of_dead_processors_are_moved():
+    args = MagicMock(mitmreceiver_data_workers=2, mitm_queue_size=4, mitm_queue_timeout=0.01)
+    manager = MitmDataProcessorManager(args, MagicMock(), MagicMock(), MagicMock())
+    manager._stop_queue_check_thread = True
+    dispatcher = manager.get_dispatcher()
+    origin = origin_of(dispatcher, 0)
+    for data in (b"first", b"second"):
+        dispatcher.put(origin, data)
+
+    # the devices of dead processors move for good
+    manager._worker_threads = [MagicMock(is_alive=MagicMock(return_value=False))]
+    manager._rebalance(0, dispatcher.get_depth(0))
+    assert not dispatcher.is_enabled(0)
+    assert [dispatcher.get(1, timeout=1) for _ in range(2)] == [b"first", b"second"]
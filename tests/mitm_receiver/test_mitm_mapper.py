@@ -0,0 +1,79 @@
+import time
+from threading import Thread
+from unittest.mock import MagicMock
+
+from mapadroid.mitm_receiver.MitmMapper import (NO_UPDATE_SEEN, MitmMapper,
+                                                ShardedMitmMapper,
+                                                get_mitm_mapper_shard)
+from tests.conftest import args
+
+
+def get_mitm_mapper():
+    mapping_manager = MagicMock()
+    mapping_manager.get_all_devicemappings.return_value = {"origin": {}}
+    return MitmMapper(args, mapping_manager, MagicMock())
+
+
+def test_wait_for_proto_returns_data_received_before():
+    mitm_mapper = get_mitm_mapper()
+    mitm_mapper.update_latest("origin", 106, {"payload": {}}, timestamp_received_raw=100)
+    start = time.time()
+    latest, seen_update = mitm_mapper.wait_for_proto("origin", 106, 100, 5)
+    assert time.time() - start < 1
+    assert latest[106]["timestamp"] == 100
+    assert seen_update == 1
+
+    # already inspected, the next wait has to time out
+    latest, seen_update = mitm_mapper.wait_for_proto("origin", 106, 100, 0.1, seen_update=seen_update)
+    assert seen_update == 1
+    # too old
+    assert mitm_mapper.wait_for_proto("origin", 106, 101, 0.1)[1] == 1
+
+
+def test_wait_for_proto_wakes_up_on_arrival():
+    mitm_mapper = get_mitm_mapper()
+
+    def receive():
+        time.sleep(0.2)
+        mitm_mapper.update_latest("origin", 102, {"payload": {}}, timestamp_received_raw=200)
+        mitm_mapper.update_latest("origin", 101, {"payload": {}}, timestamp_received_raw=200)
+
+    receiver = Thread(target=receive)
+    start = time.time()
+    receiver.start()
+    latest, seen_update = mitm_mapper.wait_for_proto("origin", 101, 150, 10, seen_update=NO_UPDATE_SEEN)
+    receiver.join()
+    assert time.time() - start < 5
+    assert 101 in latest
+    assert seen_update == 2
+
+
+def test_wait_for_proto_also_accepted():
+    mitm_mapper = get_mitm_mapper()
+    mitm_mapper.update_latest("origin", 156, {"payload": {}}, timestamp_received_raw=200)
+    start = time.time()
+    mitm_mapper.wait_for_proto("origin", 101, 150, 0.2)
+    assert time.time() - start >= 0.2
+    start = time.time()
+    latest, _ = mitm_mapper.wait_for_proto("origin", 101, 150, 5, also_accepted=[156])
+    assert time.time() - start < 1
+    assert 156 in latest
+
+
+def test_sharded_mitm_mapper_keeps_origins_on_their_shard():
+    mapping_manager = MagicMock()
+    origins = ["origin{}".format(index) for index in range(20)]
+    mapping_manager.get_all_devicemappings.return_value = {origin: {} for origin in origins}
+    shards = [MitmMapper(args, mapping_manager, MagicMock(), shard_index, 3) for shard_index in range(3)]
+    mitm_mapper = ShardedMitmMapper(shards)
+    for origin in origins:
+        assert mitm_mapper.update_latest(origin, 106, {"origin": origin}, timestamp_received_raw=100)
+
+    for origin in origins:
+        shard_index = get_mitm_mapper_shard(origin, 3)
+        assert mitm_mapper.request_latest(origin, 106)["values"] == {"origin": origin}
+        assert shards[shard_index].request_latest(origin, 106)["values"] == {"origin": origin}
+        for other_shard in range(3):
+            if other_shard != shard_index:
+                assert shards[other_shard].request_latest(origin) is None
+    assert len({get_mitm_mapper_shard(origin, 3) for origin in origins}) == 3
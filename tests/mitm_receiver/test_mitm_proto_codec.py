@@ -0,0 +1,50 @@
+import pytest
+
+from mapadroid.mitm_receiver import MitmProtoCodec
+from mapadroid.mitm_receiver.MitmProtoCodec import (decode_queue_item,
+                                                    encode_queue_item, loads,
+                                                    slim_proto)
+
+
+def gmo():
+    return {
+        "type": 106, "timestamp": 1600000000, "lat": 1.0, "lng": 2.0, "raw": False,
+        "payload": {
+            "cells": [{"id": 1, "current_timestamp": 1600000000000, "forts": [], "nearby_pokemon": [],
+                       "wild_pokemon": [{"spawnpoint_id": "89c2590b", "time_till_hidden": 1000}],
+                       "catchable_pokemon": [{"encounter_id": 1}], "spawn_points": [{"latitude": 0.0}]}],
+            "client_weather": [], "time_of_day_value": 1, "status": 1
+        }
+    }
+
+
+def test_slim_gmo_keeps_the_fields_processed():
+    slim = slim_proto(gmo())
+    assert slim == {
+        "type": 106, "raw": False,
+        "payload": {
+            "cells": [{"id": 1, "current_timestamp": 1600000000000, "forts": [], "nearby_pokemon": [],
+                       "wild_pokemon": [{"spawnpoint_id": "89c2590b", "time_till_hidden": 1000}]}],
+            "client_weather": [], "time_of_day_value": 1
+        }
+    }
+    encounter = {"type": 102, "timestamp": 1, "payload": {"wild_pokemon": {"encounter_id": 1}}}
+    assert slim_proto(encounter) == {"type": 102, "payload": {"wild_pokemon": {"encounter_id": 1}}}
+
+
+@pytest.mark.parametrize("use_msgpack", [True, False])
+def test_queue_item_round_trip(monkeypatch, use_msgpack):
+    if use_msgpack:
+        pytest.importorskip("msgpack")
+    else:
+        monkeypatch.setattr(MitmProtoCodec, "msgpack", None)
+    proto = slim_proto(gmo())
+    encoded = encode_queue_item(1600000000.5, proto, "origin")
+    assert isinstance(encoded, bytes)
+    assert decode_queue_item(encoded) == (1600000000.5, proto, "origin")
+
+
+def test_plain_items_are_passed_on():
+    assert decode_queue_item(None) is None
+    assert decode_queue_item((1, {}, "origin")) == (1, {}, "origin")
+    assert loads(b'[{"type": 106}]') == [{"type": 106}]
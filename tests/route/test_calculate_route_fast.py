@@ -0,0 +1,44 @@
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from mapadroid.route.routecalc import calculate_route_fast, calculate_route_quick
+
+
+def random_points(amount):
+    rng = np.random.default_rng(1)
+    return np.column_stack((50.9 + rng.random(amount) * 0.1, 6.9 + rng.random(amount) * 0.1))
+
+
+def test_route_visits_every_point_once():
+    for amount in (1, 3, 4, 5, 60, 300):
+        route = calculate_route_fast.route_calc_impl(random_points(amount), "test")
+        assert sorted(route) == list(range(amount))
+
+
+def test_route_handles_duplicates_and_clusters():
+    points = np.array([[50.0, 6.0]] * 20 + [[50.5, 6.5]] * 5 + [[51.0, 7.0]] * 5, dtype=float)
+    route = calculate_route_fast.route_calc_impl(points, "test")
+    assert sorted(route) == list(range(len(points)))
+
+
+def test_route_not_longer_than_legacy_implementation():
+    points = random_points(300)
+    xy = calculate_route_fast.project(points)
+    fast_length, _ = calculate_route_fast.tsp(points)
+    _, legacy_route = calculate_route_quick.tsp(points.tolist())
+    assert fast_length <= calculate_route_fast.tour_length(xy, legacy_route)
+
+
+def test_improvement_stops_at_the_time_limit():
+    points = random_points(3000)
+    xy = calculate_route_fast.project(points)
+    full_length, _ = calculate_route_fast.tsp(points)
+    # the clock passes the deadline right after the local search started
+    clock = MagicMock(side_effect=[0.0] + [1000.0] * 100)
+    with patch.object(calculate_route_fast.time, "time", clock):
+        limited_length, route = calculate_route_fast.tsp(points, time_limit=10)
+    assert sorted(route) == list(range(len(points)))
+    assert calculate_route_fast.tour_length(xy, route) == limited_length
+    assert limited_length > full_length
+    assert clock.call_count <= 3
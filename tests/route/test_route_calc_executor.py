@@ -0,0 +1,20 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mapadroid.route.routecalc.calculate_route_all import (
+    route_calc_all, set_route_calc_executor)
+
+
+def test_routes_calculated_in_executor_match_local_ones():
+    points = np.random.default_rng(1).random((50, 2)) * 0.1 + [50.9, 6.9]
+    local_route = route_calc_all(points, "test", 0, "quick")
+    executor = ProcessPoolExecutor(max_workers=2)
+    set_route_calc_executor(executor)
+    try:
+        routes = [route_calc_all(points, "test", 0, "quick") for _ in range(3)]
+    finally:
+        set_route_calc_executor(None)
+        executor.shutdown()
+    assert all(list(route) == list(local_route) for route in routes)
+    assert sorted(local_route) == list(range(len(points)))
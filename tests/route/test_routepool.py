@@ -0,0 +1,67 @@
+from unittest.mock import MagicMock
+
+from mapadroid.route.RouteManagerMon import RouteManagerMon
+from mapadroid.route.routepool import get_subroute_ranges
+from mapadroid.utils.collections import Location
+
+
+def test_subroute_ranges():
+    assert get_subroute_ranges(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert get_subroute_ranges(9, 3) == [(0, 3), (3, 6), (6, 9)]
+    # more workers than coords: the first worker takes the whole route
+    assert get_subroute_ranges(2, 3) == [(0, 2), (2, 2), (2, 2)]
+    assert get_subroute_ranges(5, 0) == []
+
+
+def create_route_manager(route_length: int) -> RouteManagerMon:
+    route_manager = RouteManagerMon(MagicMock(), MagicMock(), 1, None, 70, 1, None, None, MagicMock(),
+                                    mode="mon_mitm", name="test")
+    route_manager._route = [Location(50.0 + index / 1000, 7.0) for index in range(route_length)]
+    route_manager._init_route_queue()
+    route_manager._is_started = True
+    return route_manager
+
+
+def add_worker(route_manager: RouteManagerMon, origin: str) -> Location:
+    return route_manager.get_next_location(origin)
+
+
+def test_workers_keep_their_position():
+    route_manager = create_route_manager(100)
+    route = route_manager._route
+    assert add_worker(route_manager, "first") == route[0]
+    for _ in range(29):
+        route_manager.get_next_location("first")
+    assert route_manager._routepool["first"].queue[0] == route[30]
+
+    # the new worker takes the second half, the first one keeps going
+    assert add_worker(route_manager, "second") == route[50]
+    assert route_manager._routepool["first"].subroute == route[:50]
+    assert list(route_manager._routepool["first"].queue) == route[30:50]
+    assert route_manager.get_next_location("first") == route[30]
+
+    # a third worker shortens the subroute of the first one to 0 - 34, which it has passed
+    assert add_worker(route_manager, "third") == route[67]
+    assert [route_manager._routepool[origin].subroute[0] for origin in ("first", "second", "third")] == \
+        [route[0], route[34], route[67]]
+    assert list(route_manager._routepool["first"].queue) == route[31:34]
+    # the second worker has been at 51, ahead of its new subroute 34 - 67
+    assert list(route_manager._routepool["second"].queue) == route[51:67]
+
+    # the second worker leaves, the others keep their positions and the first one takes over the coords up to 50
+    route_manager.unregister_worker("second")
+    route_manager._worker_changed_update_routepools()
+    assert list(route_manager._routepool["first"].queue) == route[31:50]
+    assert list(route_manager._routepool["third"].queue) == route[68:]
+
+
+def test_worker_restarts_finished_subroute():
+    route_manager = create_route_manager(10)
+    route = route_manager._route
+    add_worker(route_manager, "first")
+    add_worker(route_manager, "second")
+    visited = [route_manager.get_next_location("first") for _ in range(4)]
+    assert visited == route[1:5]
+    # the subroute of the first worker starts over
+    assert route_manager.get_next_location("first") == route[0]
+    assert route_manager._routepool["first"].rounds == 1
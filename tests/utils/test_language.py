@@ -0,0 +1,61 @@
+import json
+from unittest.mock import MagicMock
+
+from mapadroid.utils import language
+from mapadroid.utils.language import (get_mon_ids, get_mon_name, get_translations, i8ln, open_json_file,
+                                      reload_translations)
+from mapadroid.utils.questGen import QuestGen
+
+
+def quest(**changes):
+    quest_data = {
+        'pokestop_id': 'stop', 'name': 'Stop', 'image': None, 'latitude': 1.0, 'longitude': 2.0,
+        'quest_timestamp': 0, 'quest_type': 7, 'quest_reward_type': 7, 'quest_target': 3,
+        'quest_condition': '[{"type": 9}]', 'quest_template': None, 'quest_title': None, 'task': None,
+        'quest_item_id': 0, 'quest_item_amount': 0, 'quest_stardust': 0, 'quest_pokemon_id': 1,
+        'quest_pokemon_form_id': '00', 'quest_pokemon_costume_id': '00', 'quest_reward': '[]',
+        'is_ar_scan_eligible': False
+    }
+    quest_data.update(changes)
+    return quest_data
+
+
+def test_locale_files_are_read_once(monkeypatch):
+    reload_translations()
+    reads = []
+    read_file = language.Translations._read_file
+    monkeypatch.setattr(language.Translations, "_read_file",
+                        lambda self, jsonfile: reads.append(jsonfile) or read_file(self, jsonfile))
+    assert get_mon_name(1) == "Bulbasaur"
+    assert get_mon_name("1") == "Bulbasaur"
+    assert get_mon_name(100000) == "No-name-in-pokemon-json"
+    assert "1" in get_mon_ids()
+    assert open_json_file('items') is open_json_file('items')
+    assert reads == ['pokemon', 'items']
+
+    reload_translations()
+    open_json_file('items')
+    assert reads == ['pokemon', 'items', 'items']
+
+
+def test_translations_of_other_language(monkeypatch):
+    with open("locale/de/mad.json", encoding="utf8") as f:
+        word, translated = next(iter(json.load(f).items()))
+    monkeypatch.setenv("LANGUAGE", "de")
+    assert i8ln(word) == translated
+    assert i8ln("not translated") == "not translated"
+    # files missing for the language fall back to english
+    assert get_translations("de").get_file('pokemon') == get_translations("en").get_file('pokemon')
+
+
+def test_quest_tasks_are_generated_once():
+    quest_gen = QuestGen(MagicMock(no_quest_titles=True))
+    generated = quest_gen.generate_quest(quest())
+    assert generated['quest_task'] == "Win 3 Gym Battles"
+    assert generated['pokemon_name'] == "Bulbasaur"
+    assert quest_gen.generate_quest(quest(pokestop_id='other'))['quest_task'] == "Win 3 Gym Battles"
+    assert len(quest_gen._quest_tasks) == 1
+
+    assert quest_gen.generate_quest(quest(quest_target=1))['quest_task'] == "Win a Gym Battle"
+    reload_translations()
+    assert quest_gen._quest_tasks == {}
@@ -0,0 +1,86 @@
+import json
+import os
+from unittest.mock import patch
+
+from loguru import logger
+
+import mapadroid.utils.logging as mad_logging
+from mapadroid.utils.logging import (JsonLinesLogWriter, LoggerEnums,
+                                     get_logger, get_origin_logger,
+                                     is_log_level_enabled,
+                                     routelogger_set_origin)
+
+
+def test_origin_loggers_are_reused():
+    system_logger = get_logger(LoggerEnums.system)
+    origin_logger = get_origin_logger(system_logger, origin="device1")
+    assert get_origin_logger(system_logger, origin="device1") is origin_logger
+    assert get_origin_logger(system_logger, origin="device2") is not origin_logger
+    assert get_origin_logger(system_logger) is system_logger
+
+    route_logger = get_logger(LoggerEnums.routemanager, identifier="area")
+    device_logger = routelogger_set_origin(route_logger, origin="device1")
+    assert routelogger_set_origin(route_logger, origin="device1") is device_logger
+    assert routelogger_set_origin(get_logger(LoggerEnums.routemanager, identifier="other"),
+                                  origin="device1") is not device_logger
+    assert hasattr(device_logger, "debug4")
+
+
+def test_origin_loggers_are_bounded():
+    with patch.object(mad_logging, "_origin_loggers", mad_logging.LRUCache(maxsize=2)):
+        system_logger = get_logger(LoggerEnums.system)
+        first_logger = get_origin_logger(system_logger, origin="device1")
+        get_origin_logger(system_logger, origin="device2")
+        get_origin_logger(system_logger, origin="device3")
+        assert len(mad_logging._origin_loggers) == 2
+        assert get_origin_logger(system_logger, origin="device1") is not first_logger
+
+
+def test_disabled_levels_return_early():
+    messages = []
+    handler_id = logger.add(messages.append, level="DEBUG3", format="{level} {message}")
+    try:
+        origin_logger = get_origin_logger(logger, origin="device1")
+        assert is_log_level_enabled("DEBUG3")
+        assert not is_log_level_enabled("DEBUG4")
+        with patch.object(origin_logger, "opt", wraps=origin_logger.opt) as opt:
+            origin_logger.debug4("Received data: {}", {"cells": []})
+            assert not opt.called
+            origin_logger.debug3("Processing {}", "GMO")
+            assert opt.called
+        assert [message.strip() for message in messages] == ["DEBUG3 Processing GMO"]
+    finally:
+        logger.remove(handler_id)
+
+
+def test_json_lines_sink(tmp_path):
+    path = os.path.join(str(tmp_path), "mad.jsonl")
+    writer = JsonLinesLogWriter(path)
+    writer.start()
+    handler_id = logger.add(writer.write, level="INFO", format="{message}")
+    try:
+        get_origin_logger(logger, origin="device1").info("Processed {} protos", 3)
+        get_origin_logger(logger, origin="device1").debug("Not written")
+    finally:
+        logger.remove(handler_id)
+        writer.stop()
+    with open(path, encoding="UTF-8") as log_file:
+        records = [json.loads(line) for line in log_file]
+    assert len(records) == 1
+    assert records[0]["message"] == "Processed 3 protos"
+    assert records[0]["level"] == "INFO"
+    assert records[0]["identifier"] == "device1"
+    assert records[0]["function"] == "test_json_lines_sink"
+
+
+def test_levels_are_passed_on_without_the_internal_level_of_loguru():
+    messages = []
+    handler_id = logger.add(messages.append, level="INFO", format="{level} {message}")
+    try:
+        with patch.object(mad_logging, "_logger_core", object()):
+            assert is_log_level_enabled("DEBUG5")
+            get_origin_logger(logger, origin="device1").debug5("Filtered by loguru")
+            get_origin_logger(logger, origin="device1").info("Logged")
+        assert [message.strip() for message in messages] == ["INFO Logged"]
+    finally:
+        logger.remove(handler_id)
@@ -0,0 +1,65 @@
+import copy
+import time
+from threading import Event
+from unittest.mock import MagicMock, patch
+
+from mapadroid.utils.MappingManager import MappingManager
+from tests.conftest import args
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_fast_startup_adds_areas_once_initialized():
+    fast_args = copy.copy(args)
+    fast_args.fast_startup = True
+    fast_args.route_init_processes = 2
+    data_manager = MagicMock()
+    areas = {1: MagicMock(), 2: MagicMock()}
+    data_manager.get_root_resource.side_effect = lambda section: areas if section == "area" else {}
+    release_area_2 = Event()
+
+    def create_routemanager(_self, area_id, _area):
+        return {"name": "area{}".format(area_id)}, {"mode": "iv_mitm", "routemanager": MagicMock()}
+
+    def initialize_route(_self, area, _area_dict):
+        if area["name"] == "area2":
+            release_area_2.wait(10)
+
+    with patch.object(MappingManager, "_MappingManager__create_routemanager", create_routemanager), \
+            patch.object(MappingManager, "_MappingManager__initialize_route", initialize_route):
+        mapping_manager = MappingManager(MagicMock(), fast_args, data_manager)
+        assert wait_for(lambda: mapping_manager.routemanager_present(1))
+        assert not mapping_manager.routemanager_initializing(1)
+        assert mapping_manager.routemanager_initializing(2)
+        assert not mapping_manager.routemanager_present(2)
+
+        release_area_2.set()
+        assert wait_for(lambda: mapping_manager.routemanager_present(2))
+        assert not mapping_manager.routemanager_initializing(2)
+        assert sorted(mapping_manager.get_all_routemanager_names()) == [1, 2]
+
+
+def test_only_routes_initializes_the_areas_before_returning():
+    route_args = copy.copy(args)
+    route_args.fast_startup = True
+    route_args.only_routes = True
+    data_manager = MagicMock()
+    areas = {1: MagicMock()}
+    data_manager.get_root_resource.side_effect = lambda section: areas if section == "area" else {}
+    initialize_route = MagicMock()
+
+    def create_routemanager(_self, area_id, _area):
+        return {"name": "area{}".format(area_id)}, {"mode": "iv_mitm", "routemanager": MagicMock()}
+
+    with patch.object(MappingManager, "_MappingManager__create_routemanager", create_routemanager), \
+            patch.object(MappingManager, "_MappingManager__initialize_route", initialize_route):
+        mapping_manager = MappingManager(MagicMock(), route_args, data_manager)
+        # the routes have been calculated once the mappings are created
+        assert initialize_route.call_count == 1
+        assert mapping_manager.routemanager_present(1)
+        assert not mapping_manager.routemanager_initializing(1)
@@ -0,0 +1,78 @@
+import time
+from multiprocessing import Process, Queue
+
+from mapadroid.db.PooledQueryExecutor import get_written_table
+from mapadroid.utils.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_disabled_metrics_record_nothing():
+    registry = MetricsRegistry()
+    counter = Counter("test_requests_total", "Requests", registry=registry)
+    counter.inc()
+    assert registry.get_values() == {}
+
+
+def test_text_format():
+    registry = MetricsRegistry()
+    counter = Counter("test_payloads_total", "Payloads sent", ["host"], registry=registry)
+    gauge = Gauge("test_queue_depth", "Queue depth", ["processor"], registry=registry)
+    histogram = Histogram("test_duration_seconds", "Duration", ["type"], registry=registry, buckets=(0.1, 1.0))
+    registry.enable()
+    counter.labels("example.com").inc(2)
+    counter.labels("example.com").inc()
+    gauge.labels(0).set(5)
+    gauge.labels(0).set(3)
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.labels(106).observe(value)
+
+    assert registry.generate_latest().splitlines() == [
+        "# HELP test_duration_seconds Duration",
+        "# TYPE test_duration_seconds histogram",
+        "test_duration_seconds_bucket{type=\"106\",le=\"0.1\"} 2.0",
+        "test_duration_seconds_bucket{type=\"106\",le=\"1.0\"} 3.0",
+        "test_duration_seconds_bucket{type=\"106\",le=\"+Inf\"} 4.0",
+        "test_duration_seconds_sum{type=\"106\"} 2.65",
+        "test_duration_seconds_count{type=\"106\"} 4.0",
+        "# HELP test_payloads_total Payloads sent",
+        "# TYPE test_payloads_total counter",
+        "test_payloads_total{host=\"example.com\"} 3.0",
+        "# HELP test_queue_depth Queue depth",
+        "# TYPE test_queue_depth gauge",
+        "test_queue_depth{processor=\"0\"} 3.0",
+    ]
+
+
+def record_in_child(counter: Counter, histogram: Histogram, registry: MetricsRegistry):
+    counter.inc(2)
+    histogram.observe(0.5)
+    registry.flush()
+
+
+def test_values_of_forked_processes_are_aggregated():
+    registry = MetricsRegistry()
+    counter = Counter("test_protos_total", "Protos", registry=registry)
+    histogram = Histogram("test_latency_seconds", "Latency", registry=registry, buckets=(1.0,))
+    registry.enable(Queue())
+    try:
+        counter.inc()
+        children = [Process(target=record_in_child, args=(counter, histogram, registry)) for _ in range(2)]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join()
+        deadline = time.time() + 10
+        while registry.get_values().get(("test_latency_seconds", ())) != [2, 0, 1.0] and time.time() < deadline:
+            time.sleep(0.01)
+        # the value of the parent has not been sent again by the children
+        assert registry.get_values() == {("test_protos_total", ()): 5.0,
+                                         ("test_latency_seconds", ()): [2, 0, 1.0]}
+    finally:
+        registry.disable()
+
+
+def test_written_table():
+    assert get_written_table("INSERT INTO pokemon (encounter_id) VALUES (%s)") == "pokemon"
+    assert get_written_table("INSERT IGNORE INTO `trs_spawn` (spawnpoint) VALUES (%s)") == "trs_spawn"
+    assert get_written_table("update gym set name = %s") == "gym"
+    assert get_written_table("DELETE FROM trs_quest WHERE GUID = %s") == "trs_quest"
+    assert get_written_table("SELECT * FROM pokemon") is None
@@ -0,0 +1,81 @@
+import os
+from io import BytesIO
+from threading import Event
+from unittest.mock import patch
+
+from PIL import Image
+
+from mapadroid.utils import screenshotservice
+from mapadroid.utils.screenshotservice import ScreenshotService
+
+
+def screenshot(color, image_format="JPEG"):
+    encoded = BytesIO()
+    Image.new("RGB", (1080, 1920), color).save(encoded, format=image_format)
+    return encoded.getvalue()
+
+
+def test_thumbnail_of_published_frame():
+    service = ScreenshotService(workers=2)
+    data = screenshot("red")
+    frame = service.publish("origin", data)
+    assert frame.mimetype == "image/jpeg"
+
+    published, thumbnail = service.get_thumbnail("origin")
+    assert published is frame
+    with Image.open(BytesIO(thumbnail)) as img:
+        assert img.size == (250, 444)
+    assert service.get_screen_size("origin") == (1080, 1920)
+    assert service.get_thumbnail("unknown") is None
+
+
+def test_file_is_read_once_per_change(tmp_path):
+    service = ScreenshotService(workers=2)
+    path = str(tmp_path / "screenshot_origin.png")
+    with open(path, "wb") as fh:
+        fh.write(screenshot("red", "PNG"))
+
+    frame = service.get_frame("origin", path)
+    assert frame.mimetype == "image/png"
+    # unchanged files are served from memory
+    assert service.get_frame("origin", path) is frame
+
+    with open(path, "wb") as fh:
+        fh.write(screenshot("blue", "PNG"))
+    os.utime(path, (frame.modified + 5, frame.modified + 5))
+    changed = service.get_frame("origin", path)
+    assert changed is not frame
+    assert changed.etag != frame.etag
+
+
+def test_published_frame_is_not_read_again(tmp_path):
+    service = ScreenshotService(workers=2)
+    path = str(tmp_path / "screenshot_origin.jpg")
+    data = screenshot("green")
+    with open(path, "wb") as fh:
+        fh.write(data)
+    frame = service.publish("origin", data, path)
+    assert service.get_frame("origin", path) is frame
+
+
+def test_broken_screenshot_has_no_thumbnail():
+    service = ScreenshotService(workers=1)
+    service.publish("origin", b"not an image")
+    assert service.get_thumbnail("origin") is None
+    assert service.is_corrupted("origin")
+
+
+def test_pending_thumbnail_is_not_corrupted():
+    service = ScreenshotService(workers=1)
+    blocked = Event()
+    # keep the only worker busy
+    service._pool.submit(blocked.wait)
+    try:
+        service.publish("origin", screenshot("red"))
+        with patch.object(screenshotservice, "THUMBNAIL_TIMEOUT", 0.01):
+            assert service.get_thumbnail("origin") is None
+        assert not service.is_corrupted("origin")
+    finally:
+        blocked.set()
+    assert service.get_thumbnail("origin") is not None
+    assert not service.is_corrupted("unknown")
@@ -0,0 +1,78 @@
+from unittest.mock import MagicMock
+
+from mapadroid.db.DbPogoProtoSubmit import DbPogoProtoSubmit
+from mapadroid.db.DbWebhookReader import KEYS_PER_QUERY, DbWebhookReader
+from mapadroid.webhook.webhookchangefeed import WebhookChangeFeed
+from tests.conftest import args
+
+WEATHER_PROTO = {
+    "cells": [],
+    "time_of_day_value": 1,
+    "client_weather": [{
+        "cell_id": 5169891187259080704,
+        "display_weather": {"cloud_level": 1},
+        "gameplay_weather": {"gameplay_condition": 3}
+    }]
+}
+
+
+def test_feed_merges_published_changes():
+    feed = WebhookChangeFeed()
+    feed.publish({"pokemon": [1, 2], "raid": []})
+    feed.publish({"pokemon": [2, 3], "gym": ["gym1"]})
+    changes, complete = feed.collect()
+    assert complete
+    assert changes["pokemon"] == {1, 2, 3}
+    assert changes["gym"] == {"gym1"}
+    assert changes["raid"] == set()
+    changes, _ = feed.collect()
+    assert changes["pokemon"] == set()
+
+
+def test_feed_reports_dropped_changes_once():
+    feed = WebhookChangeFeed(maxsize=1)
+    assert feed.publish({"pokemon": [1]})
+    assert not feed.publish({"pokemon": [2]})
+    changes, complete = feed.collect()
+    assert not complete
+    assert changes["pokemon"] == {1}
+    _, complete = feed.collect()
+    assert complete
+
+
+def test_proto_submit_publishes_after_flush():
+    db_exec = MagicMock()
+    db_exec.execute_batch.return_value = True
+    feed = WebhookChangeFeed()
+    proto_submit = DbPogoProtoSubmit(db_exec, args)
+    proto_submit.set_change_feed(feed)
+
+    proto_submit.start_write_batch()
+    proto_submit.weather("origin", WEATHER_PROTO, 1600000000)
+    changes, _ = feed.collect()
+    assert changes["weather"] == set()
+    proto_submit.flush_write_batch()
+    changes, _ = feed.collect()
+    assert changes["weather"] == {5169891187259080704}
+
+    proto_submit.weather("origin", WEATHER_PROTO, 1600000000)
+    changes, _ = feed.collect()
+    assert changes["weather"] == {5169891187259080704}
+
+
+def test_reader_queries_keys_in_chunks():
+    db_exec = MagicMock()
+    db_exec.execute.return_value = []
+    reader = DbWebhookReader(db_exec, None)
+    gym_ids = ["gym{}".format(index) for index in range(KEYS_PER_QUERY + 1)]
+    assert reader.get_gyms_by_ids(gym_ids) == []
+    assert db_exec.execute.call_count == 2
+    query, query_args = db_exec.execute.call_args_list[0][0]
+    assert "gym.gym_id IN (" in query
+    assert len(query_args) == KEYS_PER_QUERY
+    assert db_exec.execute.call_args_list[1][0][1] == ("gym{}".format(KEYS_PER_QUERY),)
+
+    reader.get_mon_by_encounter_ids([1], {"encounter"})
+    query, query_args = db_exec.execute.call_args[0]
+    assert "pokemon.encounter_id IN (%s) AND seen_type in ('encounter')" in query
+    assert query_args == (1,)
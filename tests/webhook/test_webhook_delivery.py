@@ -0,0 +1,72 @@
+import time
+from threading import Event, Thread
+from unittest.mock import MagicMock
+
+from mapadroid.webhook.webhookdelivery import (BACKLOG_POLICY_QUEUE,
+                                               WebhookDestination)
+
+
+def response(status_code):
+    result = MagicMock()
+    result.status_code = status_code
+    return result
+
+
+def wait_until(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_delivery_retries_with_backoff():
+    destination = WebhookDestination("http://localhost/hook", None, retries=2, retry_backoff=0.01)
+    destination._session.post = MagicMock(side_effect=[Exception("refused"), response(503), response(200)])
+    destination.start()
+    destination.enqueue([[{"type": "raid", "message": {}}]])
+    assert wait_until(lambda: destination.sent == 1)
+    destination.stop()
+    statistics = destination.get_statistics()
+    assert statistics["retried"] == 2
+    assert statistics["failed"] == 0
+    assert statistics["backlog"] == 0
+
+
+def test_delivery_does_not_retry_rejected_payloads():
+    destination = WebhookDestination("http://localhost/hook", None, retries=3, retry_backoff=0.01)
+    destination._session.post = MagicMock(return_value=response(400))
+    destination.start()
+    destination.enqueue([[{"type": "raid", "message": {}}]])
+    assert wait_until(lambda: destination.failed == 1)
+    destination.stop()
+    assert destination._session.post.call_count == 1
+
+
+def test_full_backlog_drops_oldest_payload():
+    destination = WebhookDestination("http://localhost/hook", None, max_backlog=2)
+    destination.enqueue([["first"], ["second"], ["third"]])
+    assert destination.dropped == 1
+    assert list(destination._backlog) == [["second"], ["third"]]
+
+
+def test_full_backlog_with_queue_policy_waits_for_room():
+    release = Event()
+
+    def post(*args, **kwargs):
+        release.wait(5)
+        return response(200)
+
+    destination = WebhookDestination("http://localhost/hook", None, max_backlog=1,
+                                     backlog_policy=BACKLOG_POLICY_QUEUE)
+    destination._session.post = MagicMock(side_effect=post)
+    destination.start()
+    producer = Thread(target=destination.enqueue, args=([[{"type": "raid", "message": {}}]] * 3,))
+    producer.start()
+    time.sleep(0.2)
+    # one payload is being sent, one waits in the backlog, the producer waits for room for the third
+    assert producer.is_alive()
+    release.set()
+    producer.join(5)
+    assert wait_until(lambda: destination.sent == 3)
+    destination.stop()
+    assert destination.dropped == 0